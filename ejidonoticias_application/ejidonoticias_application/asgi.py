@@ -5,12 +5,24 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Con este punto de entrada (p. ej. ``uvicorn ejidonoticias_application.asgi:application``)
+la portada y las noticias se sirven con las vistas asíncronas de
+noticias/views_asincronas.py. ``manage.py bench_asgi`` compara ambos modelos.
 """
 
 import os
 
 from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ejidonoticias_application.settings')
 
+
+class PeticionASGI(ASGIRequest):
+    # Con ASGI la portada y las noticias usan sus vistas asíncronas
+    urlconf = 'ejidonoticias_application.urls_asgi'
+
+
 application = get_asgi_application()
+application.request_class = PeticionASGI
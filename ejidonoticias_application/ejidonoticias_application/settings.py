@@ -39,21 +39,25 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'noticias.apps.EstaticosConfig',
     'ckeditor',
     'ckeditor_uploader',
     'django.contrib.humanize',
+    'django.contrib.postgres',
     
 ]
 
 MIDDLEWARE = [
+    'noticias.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'noticias.replicas.ReplicasMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'noticias.presupuesto_consultas.PresupuestoConsultasMiddleware',
 ]
 
 ROOT_URLCONF = 'ejidonoticias_application.urls'
@@ -80,17 +84,58 @@ WSGI_APPLICATION = 'ejidonoticias_application.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+def _base_de_datos(host):
+    base = {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
-        'HOST': os.environ.get('DB_HOST'), # Este será 'db' (el nombre del servicio en compose)
+        'HOST': host,
         'PORT': 5432, # Puerto por defecto de Postgres
+        # Conexiones persistentes: cada petición no paga abrir una conexión.
+        # Antes de reutilizarlas se comprueba que siguen vivas.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
+    # Con DB_POOL=1, pool de conexiones de psycopg 3 en cada proceso
+    # (necesita 'psycopg[pool]' en vez de psycopg2)
+    if os.environ.get('DB_POOL') == '1':
+        from psycopg_pool import ConnectionPool
+
+        base['CONN_MAX_AGE'] = 0  # el pool sustituye a las conexiones persistentes
+        base['OPTIONS'] = {'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX', '10')),
+            'timeout': 10,
+            'check': ConnectionPool.check_connection,
+        }}
+    return base
+
+
+DATABASES = {
+    'default': _base_de_datos(os.environ.get('DB_HOST')), # Este será 'db' (el nombre del servicio en compose)
 }
 
+# Réplicas de solo lectura para las vistas públicas (ver noticias/replicas.py):
+# DB_REPLICAS=host1,host2. En los tests apuntan a la base de datos principal.
+REPLICAS = []
+for _numero, _host in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica_{_numero}'] = {**_base_de_datos(_host.strip()), 'TEST': {'MIRROR': 'default'}}
+    REPLICAS.append(f'replica_{_numero}')
+# Sin réplicas, 'replica_1' es una espejo del primario para los tests del
+# enrutado (noticias/tests.py). No está en REPLICAS: nada lee de ella y no
+# se llega a abrir su conexión
+DATABASES.setdefault('replica_1', {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}})
+
+DATABASE_ROUTERS = ['noticias.replicas.RouterReplicas']
+
+# Segundos que las lecturas van al primario tras un cambio de contenido
+# (retraso máximo de la replicación), tras una escritura en el admin (solo
+# quien escribió) y tras fallar una réplica
+REPLICAS_RETRASO_MAX = 5
+REPLICAS_PEGADO = 15
+REPLICAS_REINTENTO = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -128,6 +173,15 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# collectstatic deja aquí los estáticos con hash en el nombre, el manifiesto
+# y sus variantes .gz/.br/.avif/.webp (ver noticias/almacen_estaticos.py)
+STATIC_ROOT = os.environ.get('STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'noticias.almacen_estaticos.AlmacenEstaticos'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -140,3 +194,57 @@ CKEDITOR_UPLOAD_PATH = "uploads/"
 
 CKEDITOR_RESTRICT_BY_USER = True
 CKEDITOR_BROWSE_SHOW_DIRS = True
+
+# Caché compartida entre los workers de gunicorn (en disco, sin servicios
+# externos). Usada por la caché de páginas y el contador de vistas.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', '/var/tmp/ejidonoticias_cache'),
+        # Con el valor por defecto (300) se purgarían las versiones de los
+        # grupos de páginas (una por noticia) y se rehacería todo sin necesidad
+        'OPTIONS': {'MAX_ENTRIES': 50_000},
+    }
+}
+
+# Segundos que una página cacheada se sirve sin regenerarse
+# (ver noticias/cache_paginas.py)
+CACHE_PAGINAS_TTL = 300
+
+# En desarrollo, falla cualquier vista que supere su @presupuesto_consultas
+# (ver noticias/presupuesto_consultas.py)
+PRESUPUESTO_CONSULTAS_ESTRICTO = DEBUG
+
+# Segundos que las vistas de las noticias esperan en el buffer antes de
+# escribirse en lote en la base de datos (ver noticias/contador_vistas.py)
+VISTAS_INTERVALO_VACIADO = 10
+
+# Límite del beacon de vistas de las páginas exportadas, que es anónimo: cada
+# cliente cuenta una vista por noticia y como mucho VISTAS_LIMITE_CLIENTE en
+# total cada VISTAS_VENTANA_CLIENTE segundos. Detrás de un proxy, la cabecera
+# de META con la IP del visitante (p. ej. HTTP_X_REAL_IP)
+VISTAS_VENTANA_CLIENTE = 600
+VISTAS_LIMITE_CLIENTE = 60
+VISTAS_CABECERA_CLIENTE = os.environ.get('VISTAS_CABECERA_CLIENTE', 'REMOTE_ADDR')
+
+# Horas en que la puntuación de "lo más visto" pierde la mitad de su valor
+# (ver noticias/tendencias.py)
+TENDENCIAS_VIDA_MEDIA = 24
+
+# Métricas por petición: cabecera Server-Timing y /metricas/ para Prometheus
+# (ver noticias/metricas.py)
+METRICAS_MUESTREO = float(os.environ.get('METRICAS_MUESTREO', '1.0'))
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+METRICAS_DIR = os.environ.get('METRICAS_DIR', '/var/tmp/ejidonoticias_metricas')
+METRICAS_INTERVALO = 10
+METRICAS_SERVER_TIMING = True
+
+# Máximo de píxeles de un banner subido (ancho x alto). Se comprueba con la
+# cabecera, antes de decodificar (ver noticias/imagenes.py)
+IMAGENES_MAX_PIXELES = 60_000_000
+
+# Exportación estática para nginx/CDN (ver noticias/estatico.py). Las páginas
+# se rehacen al cambiar su contenido o, como mucho, cada ESTATICO_MAX_EDAD
+# segundos (contadores de vistas y "lo más visto").
+ESTATICO_DIR = os.environ.get('ESTATICO_DIR', '/var/tmp/ejidonoticias_estatico')
+ESTATICO_MAX_EDAD = 3600
@@ -0,0 +1,16 @@
+"""
+URLs del servidor ASGI (ver asgi.py): la portada y la página de noticia
+van a sus versiones asíncronas (noticias/views_asincronas.py); todo lo
+demás, a las mismas vistas que con WSGI.
+"""
+from django.urls import path
+
+from noticias import views_asincronas
+
+from . import urls
+
+urlpatterns = [
+    path('', views_asincronas.index, name='index'),
+    path('blog/<str:slug>/', views_asincronas.blog, name='blog'),
+    *urls.urlpatterns,
+]
@@ -1,7 +1,37 @@
 from django.contrib import admin
-from .models import Categoria, Tag, Noticia, RedSocial
+from django.utils import timezone
+from .models import Categoria, ImagenFuente, Tag, Noticia, RedSocial, TareaImagen
 
 admin.site.register(Categoria)
 admin.site.register(Tag)
 admin.site.register(Noticia)
 admin.site.register(RedSocial)
+
+
+@admin.register(TareaImagen)
+class TareaImagenAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'estado', 'intentos', 'max_intentos', 'disponible_en', 'fecha_actualizacion')
+    list_filter = ('estado', 'tipo')
+    readonly_fields = ('tipo', 'objeto_id', 'intentos', 'error', 'fecha_creacion', 'fecha_actualizacion')
+    actions = ['reintentar']
+
+    @admin.action(description="Reintentar las tareas seleccionadas")
+    def reintentar(self, request, queryset):
+        actualizadas = queryset.exclude(estado=TareaImagen.Estado.PROCESANDO).update(
+            estado=TareaImagen.Estado.PENDIENTE, intentos=0, disponible_en=timezone.now(),
+        )
+        self.message_user(request, f"{actualizadas} tareas vuelven a la cola.")
+
+
+@admin.register(ImagenFuente)
+class ImagenFuenteAdmin(admin.ModelAdmin):
+    # Solo lectura: la mantienen las subidas, las tareas y limpiar_media
+    list_display = ('__str__', 'tipo', 'referencias', 'original', 'banner', 'fecha_actualizacion')
+    list_filter = ('tipo',)
+    search_fields = ('sha256',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,190 @@
+"""
+Almacenamiento de los estáticos (``STORAGES['staticfiles']``).
+
+``collectstatic`` copia ``noticias/static`` a ``STATIC_ROOT`` y, como
+``ManifestStaticFilesStorage``:
+
+- añade el hash del contenido al nombre (``style.css`` ->
+  ``style.5e0f3c1a2b9d.css``) y reescribe las referencias de los CSS/JS;
+- guarda el manifiesto ``staticfiles.json``, con el que ``{% static %}``
+  resuelve los nombres con hash en las plantillas.
+
+Además, junto a cada archivo con hash:
+
+- los de texto (CSS, JS, SVG, fuentes sin comprimir...) llevan su ``.gz``
+  y, si está instalado ``brotli``, su ``.br``;
+- las imágenes JPEG/PNG (los fondos que usa el CSS) llevan su ``.avif`` y
+  ``.webp`` (``fondo.1a2b3c4d5e6f.jpg.webp``), cuando pesan menos.
+
+Qué variantes tiene cada archivo se guarda en ``variantes.json``: una
+segunda pasada de ``collectstatic`` solo procesa los archivos nuevos.
+
+Como el nombre cambia con el contenido, nginx puede servirlos con caché
+inmutable y elegir la variante según ``Accept`` / ``Accept-Encoding``::
+
+    map $http_accept $imagen_moderna {
+        default         "";
+        "~image/avif"   ".avif";
+        "~image/webp"   ".webp";
+    }
+
+    location /static/ {
+        alias /app/staticfiles/;
+        gzip_static on;
+        brotli_static on;
+
+        location ~ "\\.[0-9a-f]{12}\\.(jpe?g|png)$" {
+            add_header Vary Accept;
+            add_header Cache-Control "public, max-age=31536000, immutable";
+            try_files $uri$imagen_moderna $uri =404;
+        }
+        location ~ "\\.[0-9a-f]{12}\\.\\w+$" {
+            add_header Cache-Control "public, max-age=31536000, immutable";
+        }
+    }
+"""
+import gzip
+import io
+import json
+import logging
+import os
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from PIL import Image
+
+try:
+    import brotli
+except ImportError:  # sin brotli solo se generan los .gz
+    brotli = None
+
+EXTENSIONES_TEXTO = {'.css', '.js', '.map', '.svg', '.json', '.txt', '.xml', '.ico', '.ttf', '.otf', '.eot'}
+EXTENSIONES_IMAGEN = {'.jpg', '.jpeg', '.png'}
+
+# Orden de preferencia y calidad, como las de los banners (ver variantes.py)
+FORMATOS_IMAGEN = (('AVIF', 55), ('WEBP', 80))
+
+# Por debajo de esto no compensa arrancar procesos (cada uno carga Django)
+MIN_PARA_POOL = 20
+
+logger = logging.getLogger(__name__)
+
+_CON_HASH = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+
+def _escribir(ruta: str, datos: bytes) -> None:
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'wb') as archivo:
+        archivo.write(datos)
+    os.replace(temporal, ruta)
+
+
+def _comprimidas(datos: bytes) -> dict[str, bytes]:
+    comprimidas = {'.gz': gzip.compress(datos, 9, mtime=0)}
+    if brotli is not None:
+        comprimidas['.br'] = brotli.compress(datos, quality=11)
+    return comprimidas
+
+
+def _imagenes(datos: bytes) -> dict[str, bytes]:
+    from .variantes import formato_disponible
+
+    with Image.open(io.BytesIO(datos)) as imagen:
+        imagen = imagen.convert('RGBA' if imagen.has_transparency_data else 'RGB')
+    codificadas = {}
+    for formato, calidad in FORMATOS_IMAGEN:
+        if formato_disponible(formato):
+            salida = io.BytesIO()
+            imagen.save(salida, formato, quality=calidad)
+            codificadas[f'.{formato.lower()}'] = salida.getvalue()
+    return codificadas
+
+
+def generar_variantes(ruta: str) -> list[str]:
+    """
+    Escribe junto a ``ruta`` sus variantes comprimidas o en formatos
+    modernos y devuelve sus extensiones. Solo se guardan las que pesan
+    menos que el original.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension in EXTENSIONES_TEXTO:
+        generar = _comprimidas
+    elif extension in EXTENSIONES_IMAGEN:
+        generar = _imagenes
+    else:
+        return []
+
+    with open(ruta, 'rb') as archivo:
+        datos = archivo.read()
+    guardadas = []
+    for sufijo, variante in generar(datos).items():
+        if len(variante) < len(datos):
+            _escribir(ruta + sufijo, variante)
+            guardadas.append(sufijo)
+    return guardadas
+
+
+class AlmacenEstaticos(ManifestStaticFilesStorage):
+    nombre_variantes = 'variantes.json'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rotas = set()
+
+    def _leer_variantes(self) -> dict:
+        try:
+            with self.open(self.nombre_variantes) as archivo:
+                return json.loads(archivo.read())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _guardar_variantes(self) -> None:
+        if self.exists(self.nombre_variantes):
+            self.delete(self.nombre_variantes)
+        self._save(self.nombre_variantes, ContentFile(json.dumps(self.variantes, sort_keys=True).encode()))
+
+    def url_converter(self, name, hashed_files, template=None):
+        convertir = super().url_converter(name, hashed_files, template)
+
+        def tolerante(coincidencia):
+            # La plantilla del tema referencia imágenes y mapas que no se
+            # distribuyen (ya daban 404): se dejan como están en vez de fallar
+            try:
+                return convertir(coincidencia)
+            except ValueError:
+                # post_process da varias pasadas: un aviso por referencia
+                rota = (name, coincidencia.groupdict()['url'])
+                if rota not in self._rotas:
+                    self._rotas.add(rota)
+                    logger.warning("%s referencia un estático que no existe: %s", *rota)
+                return coincidencia.groupdict()['matched']
+
+        return tolerante
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        con_hash = set(self.hashed_files.values())
+        # --clear o archivos que ya no están: sus entradas sobran
+        self.variantes = {nombre: sufijos for nombre, sufijos in self._leer_variantes().items()
+                          if nombre in con_hash and self.exists(nombre)}
+        pendientes = sorted(nombre for nombre in con_hash
+                            if nombre not in self.variantes and _CON_HASH.search(nombre))
+
+        rutas = [self.path(nombre) for nombre in pendientes]
+        if len(rutas) < MIN_PARA_POOL:
+            resultados = map(generar_variantes, rutas)
+            self._registrar_variantes(pendientes, resultados)
+        else:
+            from .procesos import pool_procesos
+
+            with pool_procesos(os.cpu_count() or 1) as pool:
+                self._registrar_variantes(pendientes, pool.map(generar_variantes, rutas, chunksize=4))
+
+    def _registrar_variantes(self, nombres, resultados) -> None:
+        for nombre, sufijos in zip(nombres, resultados):
+            self.variantes[nombre] = sufijos
+        self._guardar_variantes()
@@ -0,0 +1,277 @@
+"""
+API JSON de solo lectura para la app móvil.
+
+- ``/api/noticias/``: listado con los mismos filtros que ``/noticias/``
+  (``q``, ``category``, ``tag``), paginado por cursor (ver paginacion.py)
+  de ``API_POR_PAGINA`` en ``API_POR_PAGINA``. Con ``q`` también se pagina
+  por fecha, no por relevancia: el cursor necesita un orden por columnas.
+- ``/api/noticias/<slug>/``: una noticia, con su contenido saneado y sus
+  relacionadas.
+- ``/api/categorias/`` y ``/api/tags/``.
+
+``?fields=titulo,slug,banner`` limita los campos de cada noticia; cada
+campo declara qué columnas necesita y el queryset se recorta con
+``only()`` a esas, más los JOIN (categoría, autor) que pida. Los tags de
+toda la página se leen en una consulta. Ninguna consulta por noticia, sea
+cual sea la combinación de campos.
+
+Las respuestas pasan por las mismas piezas que el HTML: réplicas, ETag
+(``@condicional``), caché de páginas y presupuesto de consultas. Leer una
+noticia por la API no cuenta como visita: la app la cuenta con el mismo
+beacon que las páginas exportadas (``POST /vista/<id>/``).
+"""
+from collections import defaultdict
+from typing import Callable, NamedTuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+
+from . import relacionadas, tablas_globales
+from .busqueda import filtrar
+from .cache_paginas import cache_pagina, depende_de
+from .condicional import Validacion, condicional, validar_blog, validar_listado
+from .models import Noticia, Tag
+from .paginacion import CursorInvalido, paginar_por_cursor
+from .presupuesto_consultas import presupuesto_consultas
+from .replicas import en_replica
+
+API_POR_PAGINA = 20
+
+
+class Campo(NamedTuple):
+    columnas: tuple  # para only(); con '__' piden el select_related
+    serializar: Callable  # (noticia, contexto) -> valor
+
+
+class Contexto:
+    """
+    Lo que comparten las noticias de una respuesta: la raíz de las URL
+    absolutas (``reverse`` y ``build_absolute_uri`` por noticia pesan más
+    que el resto de la serialización) y los tags de toda la página, en
+    una consulta.
+    """
+    MARCA = 'slug-de-la-noticia'
+
+    def __init__(self, request, noticias):
+        self.request = request
+        self.noticias = noticias
+        self.raiz = request.build_absolute_uri('/')[:-1]
+        self.prefijo, self.sufijo = reverse('blog', args=[self.MARCA]).split(self.MARCA)
+        self._tags = None
+
+    def absoluta(self, url: str) -> str:
+        # MEDIA_URL puede ser ya absoluta (CDN)
+        if url.startswith('/') and not url.startswith('//'):
+            return self.raiz + url
+        return url
+
+    def url_noticia(self, noticia) -> str:
+        return self.raiz + self.prefijo + noticia.slug + self.sufijo
+
+    def tags(self, noticia) -> list:
+        if self._tags is None:
+            self._tags = defaultdict(list)
+            filas = Noticia.tags.through.objects.filter(noticia_id__in=[otra.pk for otra in self.noticias]) \
+                                                .order_by('tag__nombre') \
+                                                .values_list('noticia_id', 'tag_id', 'tag__nombre', 'tag__slug')
+            for noticia_id, pk, nombre, slug in filas:
+                self._tags[noticia_id].append({'id': pk, 'nombre': nombre, 'slug': slug})
+        return self._tags[noticia.pk]
+
+
+def _banner(noticia, contexto) -> dict:
+    almacen = noticia.banner.storage
+    variantes = noticia.variantes or {}
+    return {
+        'url': contexto.absoluta(noticia.banner.url),
+        'mediano': contexto.absoluta(noticia.banner_medium_url),
+        'pequeno': contexto.absoluta(noticia.banner_small_url),
+        # '640w.avif' -> URL; 'original' es el ancho de partida (ver variantes.py)
+        'ancho': variantes.get('original'),
+        'variantes': {clave: contexto.absoluta(almacen.url(ruta))
+                      for clave, ruta in variantes.items() if clave != 'original'},
+    }
+
+
+def _relacionadas(noticia, contexto) -> list:
+    # Solo en el detalle: una consulta para la noticia
+    tarjetas = relacionadas.de_noticia(Noticia.objects.publicadas().only('id', 'titulo', 'slug'), pk=noticia.pk)
+    return [{'id': otra.pk, 'titulo': otra.titulo, 'url': contexto.url_noticia(otra)} for otra in tarjetas]
+
+
+def _simple(nombre: str) -> Campo:
+    return Campo((nombre,), lambda noticia, contexto: getattr(noticia, nombre))
+
+
+CAMPOS = {
+    'id': Campo(('id',), lambda noticia, contexto: noticia.pk),
+    'titulo': _simple('titulo'),
+    'slug': _simple('slug'),
+    'subtitulo': _simple('subtitulo'),
+    'extracto': _simple('extracto'),
+    'palabras': _simple('palabras'),
+    'tiempo_lectura': _simple('tiempo_lectura'),
+    'vistas': _simple('vistas'),
+    'fecha_publicacion': _simple('fecha_publicacion'),
+    'fecha_actualizacion': _simple('fecha_actualizacion'),
+    'url': Campo(('slug',), lambda noticia, contexto: contexto.url_noticia(noticia)),
+    'banner': Campo(('banner', 'banner_medium', 'banner_small', 'variantes'), _banner),
+    'categoria': Campo(
+        ('categoria__id', 'categoria__nombre', 'categoria__slug'),
+        lambda noticia, contexto: {'id': noticia.categoria.pk, 'nombre': noticia.categoria.nombre,
+                                   'slug': noticia.categoria.slug},
+    ),
+    'autor': Campo(
+        ('autor__id', 'autor__username'),
+        lambda noticia, contexto: noticia.autor.username if noticia.autor else None,
+    ),
+    'tags': Campo((), lambda noticia, contexto: contexto.tags(noticia)),
+}
+
+# Solo en el detalle: el cuerpo pesa y las relacionadas cuestan una consulta
+CAMPOS_DETALLE = {
+    **CAMPOS,
+    'contenido': _simple('contenido_html'),
+    'relacionadas': Campo(('id',), _relacionadas),
+}
+
+# Sin ?fields=: todo lo del listado (sin 'palabras') o todo lo del detalle
+POR_DEFECTO_LISTADO = tuple(nombre for nombre in CAMPOS if nombre != 'palabras')
+POR_DEFECTO_DETALLE = tuple(CAMPOS_DETALLE)
+
+
+class CamposInvalidos(ValueError):
+    pass
+
+
+def campos_pedidos(request, disponibles: dict, por_defecto: tuple) -> tuple:
+    """Nombres de ``?fields=``, en el orden pedido, o los de por defecto."""
+    parametro = request.GET.get('fields')
+    if not parametro:
+        return por_defecto
+    nombres = tuple(dict.fromkeys(nombre.strip() for nombre in parametro.split(',') if nombre.strip()))
+    desconocidos = [nombre for nombre in nombres if nombre not in disponibles]
+    if desconocidos or not nombres:
+        raise CamposInvalidos(f"Campos desconocidos: {', '.join(desconocidos) or '(ninguno)'}. "
+                              f"Disponibles: {', '.join(disponibles)}")
+    return nombres
+
+
+def proyectar(queryset, campos: dict, nombres, siempre=('id',)):
+    """Recorta el queryset a las columnas y JOIN de ``nombres``."""
+    columnas = set(siempre)
+    for nombre in nombres:
+        columnas.update(campos[nombre].columnas)
+    relaciones = {columna.split('__')[0] for columna in columnas if '__' in columna}
+    if relaciones:
+        queryset = queryset.select_related(*sorted(relaciones))
+    return queryset.only(*sorted(columnas))
+
+
+def serializar(noticias, campos: dict, nombres, request) -> list[dict]:
+    noticias = list(noticias)
+    contexto = Contexto(request, noticias)
+    serializadores = [(nombre, campos[nombre].serializar) for nombre in nombres]
+    return [{nombre: serializar(noticia, contexto) for nombre, serializar in serializadores}
+            for noticia in noticias]
+
+
+def _json(datos, status=200) -> JsonResponse:
+    return JsonResponse(datos, status=status, encoder=DjangoJSONEncoder,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def _error(mensaje: str, status: int = 400) -> JsonResponse:
+    return _json({'error': mensaje}, status=status)
+
+
+# --- Vistas ---
+
+@presupuesto_consultas(5)
+@en_replica
+@condicional(lambda request: validar_listado(request, API_POR_PAGINA))
+@cache_pagina()
+def noticias(request) -> JsonResponse:
+    try:
+        nombres = campos_pedidos(request, CAMPOS, POR_DEFECTO_LISTADO)
+    except CamposInvalidos as error:
+        return _error(str(error))
+
+    query = request.GET.get('q')
+    categoria = request.GET.get('category')
+    tag = request.GET.get('tag')
+
+    lista = Noticia.objects.publicadas()
+    if categoria:
+        lista = lista.filter(categoria__slug__iexact=categoria)
+    if tag:
+        lista = lista.filter(tags__slug__iexact=tag).distinct()
+    if query:
+        lista = filtrar(lista, query)
+    # El cursor se construye con la fecha y el id de la última
+    lista = proyectar(lista, CAMPOS, nombres, siempre=('id', 'fecha_publicacion'))
+
+    try:
+        pagina = paginar_por_cursor(lista, request.GET.get('cursor'), API_POR_PAGINA)
+    except CursorInvalido:
+        return _error("Cursor inválido")
+
+    def enlace(cursor):
+        if cursor is None:
+            return None
+        parametros = request.GET.copy()
+        parametros['cursor'] = cursor
+        return request.build_absolute_uri(f'{request.path}?{parametros.urlencode()}')
+
+    # Como en el HTML: solo el listado general y el de cada categoría
+    if not (query or tag):
+        depende_de(request, f'categoria:{categoria.lower()}' if categoria else 'listado')
+
+    return _json({
+        'resultados': serializar(pagina, CAMPOS, nombres, request),
+        'siguiente': enlace(pagina.cursor_antiguas),
+        'anterior': enlace(pagina.cursor_recientes),
+    })
+
+
+@presupuesto_consultas(5)
+@en_replica
+@condicional(validar_blog)
+@cache_pagina()
+def noticia(request, slug: str) -> JsonResponse:
+    try:
+        nombres = campos_pedidos(request, CAMPOS_DETALLE, POR_DEFECTO_DETALLE)
+    except CamposInvalidos as error:
+        return _error(str(error))
+
+    encontrada = proyectar(Noticia.objects.publicadas(), CAMPOS_DETALLE, nombres,
+                           siempre=('id', 'categoria__slug')).filter(slug=slug).first()
+    if encontrada is None:
+        raise Http404("Noticia inexistente")
+
+    depende_de(request, f'noticia:{encontrada.pk}', f'categoria:{encontrada.categoria.slug.lower()}')
+    return _json(serializar([encontrada], CAMPOS_DETALLE, nombres, request)[0])
+
+
+@presupuesto_consultas(1)
+@en_replica
+@condicional(lambda request: Validacion([], (), por_tramos=False))
+@cache_pagina()
+def categorias(request) -> JsonResponse:
+    # Categorías en el grupo 'global' (ver signals.py), que va en todas
+    depende_de(request)
+    return _json({'resultados': [
+        {'id': categoria.pk, 'nombre': categoria.nombre, 'slug': categoria.slug,
+         'banner': request.build_absolute_uri(categoria.banner.url)}
+        for categoria in tablas_globales.categorias()
+    ]})
+
+
+@presupuesto_consultas(1)
+@en_replica
+@condicional(lambda request: Validacion([], ('listado',), por_tramos=False))
+@cache_pagina()
+def tags(request) -> JsonResponse:
+    depende_de(request, 'listado')
+    return _json({'resultados': list(Tag.objects.order_by('nombre').values('id', 'nombre', 'slug'))})
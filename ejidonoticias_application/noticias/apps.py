@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig
 
 
 class NoticiasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'noticias'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+
+class EstaticosConfig(StaticFilesConfig):
+    # Restos del sistema operativo y fuentes SCSS: no se publican
+    ignore_patterns = StaticFilesConfig.ignore_patterns + ['Thumbs.db', 'desktop.ini', '*.scss']
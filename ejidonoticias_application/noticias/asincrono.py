@@ -0,0 +1,67 @@
+"""
+Utilidades para las vistas asíncronas (ver views_asincronas.py).
+
+El ORM de Django es síncrono: sus métodos ``a...`` ejecutan la consulta con
+``sync_to_async(thread_sensitive=True)``, es decir, en un único hilo
+compartido, una detrás de otra. Para que las consultas independientes de
+una página vayan de verdad a la vez, ``en_paralelo`` lanza cada una en su
+propio hilo del pool (``thread_sensitive=False``), que abre su propia
+conexión.
+
+Al terminar cada trabajo se cierran las conexiones del hilo según
+``CONN_MAX_AGE``, como hace Django al terminar una petición; si no, cada
+hilo del pool dejaría una conexión abierta indefinidamente.
+
+Las contextvars se copian a los hilos: las métricas y el presupuesto de
+consultas (ver ``presupuesto_consultas.observar_consultas``) ven también
+estas consultas.
+"""
+import asyncio
+import logging
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Referencias a las tareas en segundo plano: asyncio solo guarda referencias
+# débiles y una tarea sin referencias puede desaparecer antes de terminar.
+_tareas = set()
+
+
+def _ejecutar(funcion):
+    try:
+        return funcion()
+    finally:
+        for conexion in connections.all(initialized_only=True):
+            conexion.close_if_unusable_or_obsolete()
+
+
+async def en_hilo(funcion, *args, **kwargs):
+    """Ejecuta ``funcion`` (síncrona, con ORM) en un hilo del pool."""
+    return await sync_to_async(_ejecutar, thread_sensitive=False)(partial(funcion, *args, **kwargs))
+
+
+async def en_paralelo(*funciones) -> list:
+    """
+    Ejecuta a la vez las funciones (sin argumentos) y devuelve sus
+    resultados en orden. Si alguna lanza, se propaga la excepción.
+    """
+    return await asyncio.gather(*(en_hilo(funcion) for funcion in funciones))
+
+
+def en_segundo_plano(funcion, *args, **kwargs) -> None:
+    """
+    Lanza ``funcion`` en un hilo sin esperarla: la respuesta no se retrasa.
+    Los errores se registran en el log.
+    """
+    tarea = asyncio.get_running_loop().create_task(en_hilo(funcion, *args, **kwargs))
+    _tareas.add(tarea)
+    tarea.add_done_callback(_terminada)
+
+
+def _terminada(tarea) -> None:
+    _tareas.discard(tarea)
+    if not tarea.cancelled() and tarea.exception() is not None:
+        logger.error("Error en una tarea en segundo plano", exc_info=tarea.exception())
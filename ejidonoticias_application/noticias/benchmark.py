@@ -0,0 +1,146 @@
+"""
+Utilidades de medición compartidas por los comandos ``bench_*``.
+
+``medir`` ejecuta una función N veces y resume latencia (p50/p95/p99),
+rendimiento y consultas SQL; ``memoria_pico`` repite unas pocas ejecuciones
+bajo ``tracemalloc`` (aparte, porque ralentiza mucho). Los resultados son
+diccionarios simples para volcarlos a JSON y comparar entre commits con
+``comparar``.
+"""
+import gc
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .presupuesto_consultas import contar_consultas
+
+
+def percentil(valores_ordenados, p: float) -> float:
+    """Percentil con interpolación lineal sobre una lista ya ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    posicion = (len(valores_ordenados) - 1) * p / 100
+    abajo = int(posicion)
+    arriba = min(abajo + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[abajo] + (valores_ordenados[arriba] - valores_ordenados[abajo]) * (posicion - abajo)
+
+
+def medir(funcion, repeticiones: int, calentamiento: int = 0) -> dict:
+    """
+    Llama a ``funcion(i)`` ``repeticiones`` veces. Si devuelve algo falso
+    la ejecución cuenta como error.
+    """
+    for i in range(calentamiento):
+        funcion(i)
+
+    tiempos, consultas, errores = [], [], 0
+    inicio_total = time.perf_counter()
+    for i in range(repeticiones):
+        with contar_consultas() as contador:
+            inicio = time.perf_counter()
+            correcto = funcion(i)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(len(contador.consultas))
+        if not correcto:
+            errores += 1
+    total = time.perf_counter() - inicio_total
+
+    tiempos.sort()
+    return {
+        'repeticiones': repeticiones,
+        'errores': errores,
+        'peticiones_por_segundo': round(repeticiones / total, 2) if total else 0,
+        'p50_ms': round(percentil(tiempos, 50), 3),
+        'p95_ms': round(percentil(tiempos, 95), 3),
+        'p99_ms': round(percentil(tiempos, 99), 3),
+        'max_ms': round(tiempos[-1], 3) if tiempos else 0,
+        'consultas_media': round(sum(consultas) / len(consultas), 2) if consultas else 0,
+        'consultas_max': max(consultas, default=0),
+    }
+
+
+def memoria_pico(funcion, repeticiones: int = 3) -> int:
+    """Pico de memoria asignada (KiB) durante una ejecución de ``funcion``."""
+    gc.collect()
+    picos = []
+    for i in range(repeticiones):
+        tracemalloc.start()
+        try:
+            funcion(i)
+            picos.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return max(picos, default=0) // 1024
+
+
+def rss_maximo_kib() -> int:
+    """Pico de memoria residente del proceso (KiB)."""
+    # En Linux, VmHWM es del espacio de memoria actual; ru_maxrss en cambio
+    # se hereda del padre a través de fork/exec y falsea procesos recién lanzados.
+    try:
+        with open('/proc/self/status') as estado:
+            for linea in estado:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1])
+    except OSError:
+        pass
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def entorno() -> dict:
+    """Datos para saber qué se midió al comparar resultados."""
+    return {
+        'fecha': timezone.now().isoformat(),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'base_de_datos': connection.vendor,
+        'cache': settings.CACHES['default']['BACKEND'],
+        'debug': settings.DEBUG,
+    }
+
+
+def guardar(resultado: dict, ruta: str) -> None:
+    Path(ruta).write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+def comparar(actual: dict, anterior: dict, metricas=('p50_ms', 'p95_ms', 'consultas_media')) -> list[str]:
+    """
+    Líneas legibles con la diferencia porcentual de cada escenario común.
+    """
+    lineas = []
+    for nombre, datos in actual['escenarios'].items():
+        previo = anterior.get('escenarios', {}).get(nombre)
+        if not previo:
+            continue
+        cambios = []
+        for metrica in metricas:
+            antes, ahora = previo.get(metrica), datos.get(metrica)
+            if antes is None or ahora is None:
+                continue
+            variacion = (ahora - antes) / antes * 100 if antes else 0
+            cambios.append(f"{metrica} {antes} -> {ahora} ({variacion:+.1f}%)")
+        lineas.append(f"{nombre}: " + ", ".join(cambios))
+    return lineas
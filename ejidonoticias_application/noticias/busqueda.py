@@ -0,0 +1,238 @@
+"""
+Motor de búsqueda de noticias.
+
+En PostgreSQL cada noticia guarda un ``tsvector`` (columna ``busqueda``)
+con índice GIN, construido con la configuración ``es_unaccent`` (español
+sin acentos) y con pesos:
+
+    A - título
+    B - subtítulo y nombres de los tags
+    C - contenido
+
+El vector se recalcula al guardar la noticia o cambiar sus tags (ver
+signals.py) y los resultados se ordenan por relevancia.
+
+En SQLite (tests y desarrollo local) se usa un índice invertido en memoria
+con los mismos pesos, que se reconstruye cuando cambia alguna noticia.
+Las coincidencias se filtran en la base de datos con ``pk__in``: se quedan
+las ``MAX_RESULTADOS_LOCALES`` más relevantes, para no pasarse del límite
+de parámetros de SQLite con una palabra frecuente.
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.html import strip_tags
+
+CONFIGURACION_BUSQUEDA = 'es_unaccent'
+
+PESOS = {'A': 1.0, 'B': 0.4, 'C': 0.2}
+
+# Por debajo de los 999 parámetros de las versiones antiguas de SQLite,
+# con margen para los demás filtros del queryset
+MAX_RESULTADOS_LOCALES = 900
+
+# Palabras vacías que la configuración 'spanish' de PostgreSQL también ignora
+PALABRAS_VACIAS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'que', 'se', 'su', 'un', 'una', 'y',
+}
+
+
+def usa_postgres() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+# --- PostgreSQL ---
+
+def _vector_busqueda():
+    """
+    Expresión que construye el tsvector ponderado de cada fila.
+    Los tags se agregan con una subconsulta para hacerlo en un solo UPDATE.
+    """
+    from django.contrib.postgres.aggregates import StringAgg
+    from django.contrib.postgres.search import SearchVector
+    from .models import Tag
+
+    tags = Tag.objects.filter(noticias=OuterRef('pk')) \
+                      .order_by() \
+                      .values('noticias') \
+                      .annotate(texto=StringAgg('nombre', ' ')) \
+                      .values('texto')
+
+    return (
+        SearchVector('titulo', weight='A', config=CONFIGURACION_BUSQUEDA)
+        + SearchVector(Coalesce('subtitulo', Value('')), weight='B', config=CONFIGURACION_BUSQUEDA)
+        + SearchVector(Coalesce(Subquery(tags), Value('')), weight='B', config=CONFIGURACION_BUSQUEDA)
+        + SearchVector('contenido', weight='C', config=CONFIGURACION_BUSQUEDA)
+    )
+
+
+def actualizar_vectores(queryset) -> int:
+    """
+    Recalcula la columna ``busqueda`` de las noticias del queryset.
+    En SQLite solo invalida el índice en memoria.
+    """
+    if not usa_postgres():
+        invalidar_indice()
+        return 0
+    return queryset.update(busqueda=_vector_busqueda())
+
+
+def _buscar_postgres(queryset, query: str):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    consulta = SearchQuery(query, config=CONFIGURACION_BUSQUEDA, search_type='websearch')
+    return queryset.filter(busqueda=consulta) \
+                   .annotate(rango=SearchRank(F('busqueda'), consulta)) \
+                   .order_by('-rango', '-fecha_publicacion')
+
+
+# --- SQLite: índice invertido en memoria ---
+
+def tokenizar(texto: str) -> list[str]:
+    """
+    Quita HTML, acentos y palabras vacías, pasa a minúsculas y separa en palabras.
+    """
+    texto = unicodedata.normalize('NFKD', strip_tags(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return [p for p in re.findall(r'\w+', texto.lower()) if p not in PALABRAS_VACIAS]
+
+
+class IndiceInvertido:
+    """
+    Mapa palabra -> {id de noticia: puntuación}.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indice = None
+
+    def invalidar(self):
+        with self._lock:
+            self._indice = None
+
+    def _construir(self):
+        from .models import Noticia
+
+        indice = defaultdict(lambda: defaultdict(float))
+        # Los tags en una sola consulta: prefetch_related la trocea en lotes
+        # de ~1000 ids en SQLite y con muchas noticias se dispara el número.
+        tags = defaultdict(list)
+        for noticia_id, nombre in Noticia.tags.through.objects.values_list('noticia_id', 'tag__nombre'):
+            tags[noticia_id].append(nombre)
+
+        noticias = Noticia.objects.order_by().values_list('id', 'titulo', 'subtitulo', 'contenido')
+        for pk, titulo, subtitulo, contenido in noticias.iterator(chunk_size=500):
+            campos = (
+                (titulo, 'A'),
+                (subtitulo, 'B'),
+                (' '.join(tags[pk]), 'B'),
+                (contenido, 'C'),
+            )
+            for texto, peso in campos:
+                for palabra in tokenizar(texto):
+                    indice[palabra][pk] += PESOS[peso]
+        return indice
+
+    def buscar(self, query: str) -> dict[int, float]:
+        """
+        Devuelve {id: puntuación} de las noticias que contienen TODAS las
+        palabras de la búsqueda.
+        """
+        with self._lock:
+            if self._indice is None:
+                self._indice = self._construir()
+            indice = self._indice
+
+        resultados = None
+        for palabra in set(tokenizar(query)):
+            coincidencias = indice.get(palabra, {})
+            if resultados is None:
+                resultados = dict(coincidencias)
+            else:
+                resultados = {
+                    pk: puntos + coincidencias[pk]
+                    for pk, puntos in resultados.items() if pk in coincidencias
+                }
+        return resultados or {}
+
+    def mejores(self, query: str, maximo: int = MAX_RESULTADOS_LOCALES) -> dict[int, float]:
+        """Como ``buscar()``, solo las ``maximo`` de mayor puntuación."""
+        resultados = self.buscar(query)
+        if len(resultados) <= maximo:
+            return resultados
+        return dict(heapq.nsmallest(maximo, resultados.items(), key=lambda item: (-item[1], -item[0])))
+
+
+_indice_local = IndiceInvertido()
+
+
+def invalidar_indice() -> None:
+    _indice_local.invalidar()
+
+
+class ResultadosLocales:
+    """
+    Secuencia perezosa de noticias en orden de relevancia. Se comporta como
+    un queryset ante el Paginator: len() y slices, que cargan solo la página.
+    """
+
+    def __init__(self, queryset, ids: list[int]):
+        self.queryset = queryset
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice):
+            return self[indice:indice + 1][0]
+        ids = self.ids[indice]
+        noticias = self.queryset.in_bulk(ids)
+        return [noticias[pk] for pk in ids if pk in noticias]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def _buscar_local(queryset, query: str):
+    puntuaciones = _indice_local.mejores(query)
+    if not puntuaciones:
+        return queryset.none()
+
+    # Nos quedamos con las que además cumplen los filtros del queryset
+    # (publicadas, categoría, tag...) y ordenamos en Python.
+    permitidas = set(queryset.filter(pk__in=puntuaciones.keys())
+                             .values_list('pk', flat=True))
+    ids = sorted(permitidas, key=lambda pk: (-puntuaciones[pk], -pk))
+    return ResultadosLocales(queryset.order_by(), ids)
+
+
+def buscar(queryset, query: str):
+    """
+    Filtra el queryset por la búsqueda y lo ordena por relevancia.
+    """
+    if usa_postgres():
+        return _buscar_postgres(queryset, query)
+    return _buscar_local(queryset, query)
+
+
+def filtrar(queryset, query: str):
+    """
+    Filtra el queryset por la búsqueda sin ordenar por relevancia (p. ej.
+    para paginar por cursor, que necesita su propio orden).
+    """
+    if usa_postgres():
+        from django.contrib.postgres.search import SearchQuery
+
+        return queryset.filter(busqueda=SearchQuery(query, config=CONFIGURACION_BUSQUEDA, search_type='websearch'))
+    return queryset.filter(pk__in=list(_indice_local.mejores(query)))
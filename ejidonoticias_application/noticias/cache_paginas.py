@@ -0,0 +1,210 @@
+"""
+Caché de páginas completas para visitantes anónimos.
+
+Cada página cacheada guarda, junto al HTML, la versión de los "grupos" de
+contenido de los que depende (``inicio``, ``noticia:<id>``,
+``categoria:<slug>``...). Las signals suben la versión de un grupo cuando
+cambia su contenido, y al servir comparamos versiones: si alguna cambió la
+entrada está obsoleta. Así solo se invalidan las páginas afectadas.
+
+Todas las páginas dependen además del grupo ``global`` (menú lateral de
+categorías, redes sociales), y caducan a los ``CACHE_PAGINAS_TTL``
+segundos para refrescar contadores de vistas y listas de populares.
+
+Protección contra estampida: cuando una entrada queda obsoleta, solo el
+proceso que consigue el candado la regenera; el resto sigue sirviendo la
+copia obsoleta mientras tanto.
+
+Solo usa get/set/add/delete de la caché de Django, así que funciona con
+los backends de memoria local y de archivos.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+PREFIJO = 'noticias:pagina'
+
+# Cabeceras que no se deben reutilizar entre visitantes
+CABECERAS_EXCLUIDAS = {'set-cookie', 'vary'}
+
+
+def _ttl() -> int:
+    return getattr(settings, 'CACHE_PAGINAS_TTL', 300)
+
+
+def _clave_version(grupo: str) -> str:
+    return f'{PREFIJO}:version:{grupo}'
+
+
+def invalidar(*grupos: str) -> None:
+    """
+    Sube la versión de los grupos: toda página que dependa de ellos se
+    regenerará en la siguiente visita.
+    """
+    # Usamos la hora en ns en vez de incr(): si la caché pierde la clave,
+    # nunca volvemos a una versión antigua que coincida con una entrada vieja.
+    version = time.time_ns()
+    cache.set_many({_clave_version(grupo): version for grupo in grupos}, timeout=None)
+
+
+def versiones(grupos, crear_con=None) -> dict:
+    """
+    Versión actual de cada grupo. Con ``crear_con`` se inicializan las que
+    falten con ese valor.
+    """
+    claves = {_clave_version(grupo): grupo for grupo in grupos}
+    actuales = cache.get_many(claves.keys())
+    if crear_con is not None:
+        for clave in claves.keys() - actuales.keys():
+            cache.add(clave, crear_con, timeout=None)
+            actuales[clave] = cache.get(clave, crear_con)
+    return {claves[clave]: version for clave, version in actuales.items()}
+
+
+def depende_de(request, *grupos: str, **datos) -> None:
+    """
+    Llamada desde la vista: marca la respuesta como cacheable y declara de
+    qué grupos depende. ``datos`` se guarda con la entrada y se pasa al
+    callback ``al_servir`` en cada visita servida desde caché.
+    """
+    request._cache_pagina = {'grupos': ('global',) + grupos, 'datos': datos}
+
+
+def _clave_pagina(request) -> str:
+    ruta = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'{PREFIJO}:{ruta}'
+
+
+def es_cacheable(request) -> bool:
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # La exportación estática necesita el HTML recién renderizado
+    if getattr(request, 'exportacion', False):
+        return False
+    # Solo miramos la sesión si el navegador trae cookie de sesión
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+        return False
+    return True
+
+
+def _vigente(entrada) -> bool:
+    if entrada['expira'] < time.time():
+        return False
+    return versiones(entrada['versiones']) == entrada['versiones']
+
+
+def _responder(entrada, estado_cache) -> HttpResponse:
+    respuesta = HttpResponse(entrada['contenido'], status=entrada['status'])
+    for nombre, valor in entrada['cabeceras']:
+        respuesta[nombre] = valor
+    respuesta['X-Cache'] = estado_cache
+    return respuesta
+
+
+def _consultar(request, al_servir):
+    """
+    Busca la página en caché. Devuelve ``(respuesta, tengo_candado)``: la
+    respuesta si se puede servir, o None si hay que renderizar.
+    """
+    clave = _clave_pagina(request)
+    entrada = cache.get(clave)
+    if entrada is None:
+        return None, False
+
+    if _vigente(entrada):
+        if al_servir:
+            al_servir(request, entrada['datos'])
+        return _responder(entrada, 'HIT'), False
+
+    # Obsoleta: solo un proceso la regenera, el resto sirve la vieja
+    if cache.add(f'{clave}:candado', 1, timeout=30):
+        return None, True
+    if al_servir:
+        al_servir(request, entrada['datos'])
+    return _responder(entrada, 'STALE'), False
+
+
+def _soltar_candado(request) -> None:
+    cache.delete(f'{_clave_pagina(request)}:candado')
+
+
+def cache_pagina(al_servir=None):
+    """
+    Decorador de vistas, síncronas o asíncronas. ``al_servir(request, datos)``
+    se ejecuta también cuando la página sale de caché (p. ej. para contar la
+    visita).
+    """
+    def decorador(vista):
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura_asincrona(request, *args, **kwargs):
+                # La caché y la sesión son síncronas: fuera del bucle de eventos
+                if not await sync_to_async(es_cacheable)(request):
+                    return await vista(request, *args, **kwargs)
+
+                respuesta, tengo_candado = await sync_to_async(_consultar)(request, al_servir)
+                if respuesta is not None:
+                    return respuesta
+                try:
+                    inicio = time.time_ns()
+                    respuesta = await vista(request, *args, **kwargs)
+                    await sync_to_async(_guardar)(request, _clave_pagina(request), respuesta, inicio)
+                finally:
+                    if tengo_candado:
+                        await sync_to_async(_soltar_candado)(request)
+                return respuesta
+            return envoltura_asincrona
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if not es_cacheable(request):
+                return vista(request, *args, **kwargs)
+
+            respuesta, tengo_candado = _consultar(request, al_servir)
+            if respuesta is not None:
+                return respuesta
+            try:
+                inicio = time.time_ns()
+                respuesta = vista(request, *args, **kwargs)
+                _guardar(request, _clave_pagina(request), respuesta, inicio)
+            finally:
+                if tengo_candado:
+                    _soltar_candado(request)
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def _guardar(request, clave, respuesta, inicio: int) -> None:
+    declarado = getattr(request, '_cache_pagina', None)
+    if declarado is None or respuesta.status_code != 200 or respuesta.cookies:
+        return
+    if getattr(respuesta, 'streaming', False):
+        return
+
+    actuales = versiones(declarado['grupos'], crear_con=inicio)
+    if any(version > inicio for version in actuales.values()):
+        # El contenido cambió mientras renderizábamos: no guardamos una
+        # página que quizá ya esté desactualizada.
+        return
+
+    entrada = {
+        'contenido': respuesta.content,
+        'status': respuesta.status_code,
+        'cabeceras': [
+            (nombre, valor) for nombre, valor in respuesta.items()
+            if nombre.lower() not in CABECERAS_EXCLUIDAS
+        ],
+        'versiones': actuales,
+        'datos': declarado['datos'],
+        'expira': time.time() + _ttl(),
+    }
+    # La entrada vive más que su TTL para poder servirla obsoleta mientras
+    # otro proceso la regenera.
+    cache.set(clave, entrada, timeout=_ttl() * 4)
+    respuesta['X-Cache'] = 'MISS'
@@ -0,0 +1,179 @@
+"""
+Peticiones condicionales (ETag / Last-Modified / 304) en las páginas públicas.
+
+Antes de llamar a la vista, una función de validación barata (una consulta
+por índice, sin renderizar) obtiene ``(id, fecha_actualizacion)`` de lo que
+muestra la página: la noticia, o las noticias listadas. Con eso, las
+versiones de sus grupos en la caché de páginas (ver cache_paginas.py; suben
+también cuando algo deja de listarse) y el tramo de ``CACHE_PAGINAS_TTL``
+en curso (contadores de vistas y "lo más visto", que cambian sin tocar
+``fecha_actualizacion``) se calculan los validadores. Si el navegador o la
+CDN ya tiene esa versión, se responde 304 sin ejecutar la vista.
+
+Solo para visitantes anónimos: sus respuestas llevan
+``Cache-Control: public, no-cache`` para que las cachés intermedias las
+guarden pero revaliden siempre. Las de usuarios identificados son privadas.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as tz
+from functools import wraps
+from typing import NamedTuple
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from . import cache_paginas
+from .models import Noticia
+from .paginacion import CursorInvalido, paginar_por_cursor
+
+
+class Validacion(NamedTuple):
+    # (id, fecha_actualizacion) de cada noticia mostrada, y lo que haga
+    # falta para distinguir la página (p. ej. si hay página siguiente)
+    marcas: list
+    grupos: tuple
+    datos: dict = {}
+    # False si la página no muestra contadores de vistas ni "lo más visto":
+    # no cambia al pasar cada tramo de CACHE_PAGINAS_TTL
+    por_tramos: bool = True
+
+
+def _ttl() -> int:
+    return getattr(settings, 'CACHE_PAGINAS_TTL', 300)
+
+
+def validadores(validacion: Validacion) -> tuple[str, datetime]:
+    """``(etag, ultima_modificacion)`` de una página."""
+    # Se crean las que falten, como al guardar en la caché de páginas: si no,
+    # la primera respuesta y las siguientes tendrían ETag distinto
+    versiones = cache_paginas.versiones(('global',) + tuple(validacion.grupos), crear_con=time.time_ns())
+    tramo = int(time.time() // _ttl()) if validacion.por_tramos else None
+
+    huella = hashlib.md5(repr((validacion.marcas, sorted(versiones.items()), tramo)).encode()).hexdigest()
+
+    instantes = [valor for marca in validacion.marcas for valor in marca if isinstance(valor, datetime)]
+    instantes += [datetime.fromtimestamp(version / 1e9, tz=tz.utc) for version in versiones.values()]
+    if tramo is not None:
+        instantes.append(datetime.fromtimestamp(tramo * _ttl(), tz=tz.utc))
+    return f'W/"{huella}"', max(instantes)
+
+
+def _antes(request, calcular, args, kwargs):
+    """
+    ``(respuesta_304, validadores, validacion)``; todo None si la petición
+    no se valida (usuario identificado, exportación, página no cacheable).
+    """
+    if not cache_paginas.es_cacheable(request):
+        return None, None, None
+    validacion = calcular(request, *args, **kwargs)
+    if validacion is None:
+        return None, None, None
+    etag, ultima_modificacion = validadores(validacion)
+    respuesta = get_conditional_response(
+        request, etag=etag, last_modified=int(ultima_modificacion.timestamp()),
+    )
+    return respuesta, (etag, ultima_modificacion), validacion
+
+
+def _despues(request, respuesta, calculados):
+    if calculados is None:
+        if request.user.is_authenticated and not respuesta.has_header('Cache-Control'):
+            patch_cache_control(respuesta, private=True)
+        return respuesta
+
+    etag, ultima_modificacion = calculados
+    if respuesta.status_code in (200, 304):
+        respuesta.headers.setdefault('ETag', etag)
+        respuesta.headers.setdefault('Last-Modified', http_date(ultima_modificacion.timestamp()))
+        patch_cache_control(respuesta, public=True, no_cache=True)
+        patch_vary_headers(respuesta, ['Cookie'])
+    return respuesta
+
+
+def condicional(calcular, al_no_modificada=None):
+    """
+    Decorador de vistas (síncronas o asíncronas). ``calcular(request, ...)``
+    recibe los mismos argumentos que la vista y devuelve una
+    ``Validacion`` o None. ``al_no_modificada(request, datos)`` se ejecuta
+    cuando se responde 304 (p. ej. para contar la visita).
+    """
+    def decorador(vista):
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura_asincrona(request, *args, **kwargs):
+                from .asincrono import en_hilo
+
+                respuesta, calculados, validacion = await en_hilo(_antes, request, calcular, args, kwargs)
+                if respuesta is None:
+                    respuesta = await vista(request, *args, **kwargs)
+                elif al_no_modificada and respuesta.status_code == 304:
+                    await en_hilo(al_no_modificada, request, validacion.datos)
+                return await en_hilo(_despues, request, respuesta, calculados)
+            return envoltura_asincrona
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            respuesta, calculados, validacion = _antes(request, calcular, args, kwargs)
+            if respuesta is None:
+                respuesta = vista(request, *args, **kwargs)
+            elif al_no_modificada and respuesta.status_code == 304:
+                al_no_modificada(request, validacion.datos)
+            return _despues(request, respuesta, calculados)
+        return envoltura
+    return decorador
+
+
+# --- Validaciones de cada página ---
+
+def validar_index(request) -> Validacion:
+    marcas = list(Noticia.objects.publicadas().order_by('-id')
+                  .values_list('pk', 'fecha_actualizacion')[:15])
+    return Validacion(marcas, ('inicio',))
+
+
+def validar_blog(request, slug: str) -> Validacion | None:
+    fila = Noticia.objects.filter(slug=slug, publicado=True) \
+                          .values_list('pk', 'fecha_actualizacion', 'categoria__slug') \
+                          .first()
+    if fila is None:
+        return None  # el 404 lo da la vista
+    pk, fecha_actualizacion, categoria = fila
+    return Validacion([(pk, fecha_actualizacion)],
+                      (f'noticia:{pk}', f'categoria:{categoria.lower()}'),
+                      {'noticia_id': pk})
+
+
+def validar_listado(request, por_pagina: int, facetas: bool = False) -> Validacion | None:
+    # Solo las páginas que se cachean: listado general y por categoría, por
+    # cursor. Con facetas, la de una categoría cuenta también las demás
+    if any(request.GET.get(parametro) for parametro in ('q', 'tag', 'page')):
+        return None
+    categoria = request.GET.get('category')
+    noticias = Noticia.objects.publicadas().only('id', 'fecha_publicacion', 'fecha_actualizacion')
+    if categoria:
+        noticias = noticias.filter(categoria__slug__iexact=categoria)
+    try:
+        pagina = paginar_por_cursor(noticias, request.GET.get('cursor'), por_pagina)
+    except CursorInvalido:
+        return None
+    marcas = [(noticia.pk, noticia.fecha_actualizacion) for noticia in pagina]
+    marcas.append(('siguientes', pagina.hay_antiguas, pagina.hay_recientes))
+    if not categoria:
+        return Validacion(marcas, ('listado',))
+    return Validacion(marcas, (f'categoria:{categoria.lower()}',) + (('listado',) if facetas else ()))
+
+
+# Feeds y sitemaps (ver sindicacion.py): sin contadores, y cualquier cambio
+# en lo que muestran sube la versión de su grupo. Bastan las versiones,
+# sin consultas.
+
+def validar_feed(request, formato: str, categoria: str | None = None, tag: str | None = None) -> Validacion:
+    # Los tags de una noticia invalidan 'listado' (ver signals.py)
+    return Validacion([], (f'categoria:{categoria.lower()}' if categoria else 'listado',), por_tramos=False)
+
+
+def validar_mapa(request, numero: int | None = None) -> Validacion:
+    return Validacion([], (f'mapa:{numero}' if numero is not None else 'listado',), por_tramos=False)
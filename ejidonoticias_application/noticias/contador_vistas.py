@@ -0,0 +1,181 @@
+"""
+Contador de vistas con buffer en memoria.
+
+En lugar de lanzar un UPDATE por cada visita a una noticia (lo que bloquea
+la misma fila una y otra vez cuando una nota se vuelve viral), las visitas
+se acumulan en un buffer del proceso y se escriben en lote con UN solo
+UPDATE por intervalo.
+
+- Un temporizador vacía el buffer ``VISTAS_INTERVALO_VACIADO`` segundos
+  después de la primera visita pendiente, así que si el worker muere de
+  golpe se pierde como máximo una ventana.
+- Al apagarse el proceso de forma ordenada (``atexit``) se vacía lo pendiente.
+- ``manage.py vaciar_vistas`` pide a todos los workers que vacíen su buffer
+  en su siguiente visita (la señal viaja por la caché compartida).
+- El beacon anónimo de las páginas exportadas pasa antes por
+  ``vista_admitida``, que limita las vistas por cliente.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.db.models import Case, F, IntegerField, Value, When
+
+logger = logging.getLogger(__name__)
+
+# Clave de caché con la marca de tiempo de la última petición de vaciado
+CLAVE_VACIADO_FORZADO = 'noticias:vistas:vaciado_forzado'
+PREFIJO_CLIENTE = 'noticias:vistas:cliente'
+# Noticias por UPDATE: cada una lleva 3 parámetros (When, then y pk__in) y
+# SQLite antiguo admite como mucho 999 por consulta
+LOTE_UPDATE = 300
+
+_pendientes = Counter()
+_lock = threading.Lock()
+_temporizador = None
+_ultimo_vaciado = time.time()
+
+
+def _intervalo() -> float:
+    return getattr(settings, 'VISTAS_INTERVALO_VACIADO', 10)
+
+
+def registrar_vista(noticia_id: int) -> None:
+    """
+    Suma una vista a la noticia en el buffer. No toca la base de datos.
+    """
+    global _temporizador
+
+    with _lock:
+        _pendientes[noticia_id] += 1
+
+        # Programamos el vaciado solo cuando el buffer pasa de vacío a
+        # pendiente; así hay como mucho un temporizador vivo por proceso.
+        if _temporizador is None:
+            _temporizador = threading.Timer(_intervalo(), _vaciar_en_segundo_plano)
+            _temporizador.daemon = True
+            _temporizador.start()
+
+    forzado = cache.get(CLAVE_VACIADO_FORZADO)
+    if forzado and forzado > _ultimo_vaciado:
+        vaciar_vistas()
+
+
+def cliente_de(request) -> str:
+    return request.META.get(settings.VISTAS_CABECERA_CLIENTE, '').split(',')[-1].strip()
+
+
+def vista_admitida(cliente: str, noticia_id: int) -> bool:
+    """
+    Una vista por cliente y noticia, y ``VISTAS_LIMITE_CLIENTE`` en total,
+    por ventana de ``VISTAS_VENTANA_CLIENTE`` segundos. Las cuentas viven en
+    la caché compartida, así que valen para todos los workers.
+    """
+    ventana = settings.VISTAS_VENTANA_CLIENTE
+    if not cache.add(f'{PREFIJO_CLIENTE}:{cliente}:{noticia_id}', 1, timeout=ventana):
+        return False
+    clave = f'{PREFIJO_CLIENTE}:{cliente}'
+    cache.add(clave, 0, timeout=ventana)
+    try:
+        return cache.incr(clave) <= settings.VISTAS_LIMITE_CLIENTE
+    except ValueError:
+        # Caducó entre add() e incr(): empieza otra ventana
+        cache.add(clave, 1, timeout=ventana)
+        return True
+
+
+def vistas_pendientes(noticia_id: int) -> int:
+    """
+    Vistas que todavía no se han escrito en la base de datos.
+    """
+    with _lock:
+        return _pendientes.get(noticia_id, 0)
+
+
+def aplicar_pendientes(noticias):
+    """
+    Suma las vistas pendientes al atributo ``vistas`` de cada noticia y
+    devuelve la lista (el orden no cambia: lo decide quien consulta).
+    """
+    noticias = list(noticias)
+    with _lock:
+        for noticia in noticias:
+            noticia.vistas += _pendientes.get(noticia.pk, 0)
+    return noticias
+
+
+def vaciar_vistas() -> int:
+    """
+    Escribe todas las vistas del buffer con un UPDATE por cada
+    ``LOTE_UPDATE`` noticias. Devuelve cuántas noticias se actualizaron.
+    """
+    global _temporizador, _ultimo_vaciado
+    from .models import Noticia
+
+    with _lock:
+        lote = dict(_pendientes)
+        _pendientes.clear()
+        if _temporizador is not None:
+            _temporizador.cancel()
+            _temporizador = None
+        _ultimo_vaciado = time.time()
+
+    if not lote:
+        return 0
+
+    pendientes = sorted(lote.items())
+    actualizadas = 0
+    while pendientes:
+        tramo = dict(pendientes[:LOTE_UPDATE])
+        incremento = Case(
+            *[When(pk=pk, then=Value(cantidad)) for pk, cantidad in tramo.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        try:
+            actualizadas += Noticia.objects.filter(pk__in=tramo.keys()) \
+                                           .update(vistas=F('vistas') + incremento)
+        except Exception:
+            # Si la base de datos no está disponible devolvemos al buffer
+            # las vistas aún sin escribir para reintentarlo en la siguiente
+            # ventana (las de los tramos anteriores ya están guardadas).
+            with _lock:
+                _pendientes.update(dict(pendientes))
+            raise
+        pendientes = pendientes[LOTE_UPDATE:]
+    return actualizadas
+
+
+def _vaciar_en_segundo_plano() -> None:
+    """
+    Vaciado disparado por el temporizador. Corre en su propio hilo, así que
+    cerramos la conexión que abrió para no dejarla colgada.
+    """
+    try:
+        vaciar_vistas()
+    finally:
+        connections.close_all()
+
+
+def solicitar_vaciado() -> None:
+    """
+    Pide a todos los procesos que vacíen su buffer en su siguiente visita.
+    """
+    cache.set(CLAVE_VACIADO_FORZADO, time.time(), timeout=None)
+
+
+def _vaciar_al_salir() -> None:
+    # Al salir la base de datos puede no estar ya (p. ej. la de los tests,
+    # destruida antes que el intérprete): se avisa en lugar de reventar
+    try:
+        vaciar_vistas()
+    except DatabaseError:
+        logger.warning("No se pudieron guardar las vistas pendientes al salir", exc_info=True)
+
+
+atexit.register(_vaciar_al_salir)
@@ -0,0 +1,262 @@
+"""
+Procesado del cuerpo de las noticias al guardar.
+
+El HTML de CKEditor se analiza una sola vez, en ``Noticia.save`` (o con
+``manage.py procesar_contenido`` para las filas existentes), y de ahí salen
+los campos que leen las plantillas:
+
+- ``palabras``: número de palabras del texto plano.
+- ``tiempo_lectura``: minutos, a ``PALABRAS_POR_MINUTO``.
+- ``extracto``: comienzo del texto plano, para tarjetas y feeds.
+- ``contenido_html``: el HTML saneado con una lista blanca de etiquetas y
+  atributos (sin scripts, manejadores ``on*`` ni URLs ``javascript:``), y
+  con ``loading="lazy"`` en las imágenes. Los vídeos incrustados
+  (``<iframe>``) se conservan solo si vienen de ``VIDEOS_PERMITIDOS`` por
+  https; el resto de incrustados (``<object>``, ``<embed>``, iframes de
+  otros sitios) se descartan y se anotan en ``descartado`` para que
+  ``procesar_contenido`` informe de las noticias afectadas.
+
+Se usa ``html.parser`` de la biblioteca estándar para no añadir
+dependencias.
+"""
+import math
+import re
+from html import escape
+from html.parser import HTMLParser
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+PALABRAS_POR_MINUTO = 200
+LONGITUD_EXTRACTO = 280
+
+ETIQUETAS_PERMITIDAS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'cite', 'code', 'col', 'colgroup',
+    'dd', 'del', 'div', 'dl', 'dt', 'em', 'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4',
+    'h5', 'h6', 'hr', 'i', 'img', 'ins', 'li', 'ol', 'p', 'pre', 's', 'small', 'span',
+    'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+ETIQUETAS_VACIAS = {'br', 'col', 'embed', 'hr', 'img'}
+# Cierre implícito: '<li>uno<li>dos' son hermanos, no anidados
+CIERRE_IMPLICITO = {'dd', 'dt', 'li', 'p', 'td', 'th', 'tr'}
+# Se descartan con todo su contenido, no solo la etiqueta
+ETIQUETAS_DESCARTADAS = {'script', 'style', 'iframe', 'object', 'embed', 'noscript', 'template'}
+# Contenido incrustado: se anota cuando se descarta (ver ``descartado``)
+ETIQUETAS_INCRUSTADAS = {'iframe', 'object', 'embed'}
+# Reproductores de vídeo cuyos iframes se conservan (solo por https)
+VIDEOS_PERMITIDOS = {
+    'www.youtube.com', 'youtube.com', 'www.youtube-nocookie.com', 'player.vimeo.com',
+}
+# Etiquetas de bloque: separan palabras en el texto plano
+ETIQUETAS_BLOQUE = {
+    'blockquote', 'br', 'dd', 'div', 'dt', 'figcaption', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'hr', 'li', 'p', 'pre', 'td', 'th', 'tr',
+}
+
+ATRIBUTOS_PERMITIDOS = {
+    '*': {'class', 'style', 'title'},
+    'a': {'href', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'ol': {'start'},
+    'iframe': {'src', 'width', 'height', 'allowfullscreen'},
+}
+ESQUEMAS_PERMITIDOS = {'', 'http', 'https', 'mailto', 'tel'}
+# Propiedades CSS que usa CKEditor (tamaño de imágenes, alineación, tamaño
+# de letra)
+ESTILOS_PERMITIDOS = {
+    'width', 'height', 'text-align', 'float', 'margin', 'margin-left', 'margin-right', 'font-size',
+}
+# Colores del texto y de fondo: nombre, hexadecimal o rgb()/hsl()
+ESTILOS_COLOR = {'color', 'background-color'}
+_VALOR_CSS_SEGURO = re.compile(r'^[\w\s.,%#-]+$')
+_COLOR_CSS_SEGURO = re.compile(r'^(?:#[0-9a-f]{3,8}|[a-z]+|(?:rgba?|hsla?)\([\d\s.,%]+\))$', re.IGNORECASE)
+
+
+class ContenidoProcesado(NamedTuple):
+    html: str
+    palabras: int
+    tiempo_lectura: int
+    extracto: str
+    # Incrustados que se han perdido, p. ej. ('iframe www.dailymotion.com', 'embed')
+    descartado: tuple[str, ...] = ()
+
+
+def _url_segura(url: str) -> bool:
+    # Los navegadores ignoran espacios y controles dentro del esquema
+    limpia = re.sub(r'[\x00-\x20]', '', url)
+    try:
+        return urlsplit(limpia).scheme.lower() in ESQUEMAS_PERMITIDOS
+    except ValueError:
+        return False
+
+
+def _video_permitido(url: str) -> bool:
+    try:
+        partes = urlsplit(url.strip())
+    except ValueError:
+        return False
+    return partes.scheme.lower() == 'https' and (partes.hostname or '') in VIDEOS_PERMITIDOS
+
+
+def _estilo_seguro(estilo: str) -> str:
+    declaraciones = []
+    for declaracion in estilo.split(';'):
+        propiedad, _, valor = declaracion.partition(':')
+        propiedad, valor = propiedad.strip().lower(), valor.strip()
+        if propiedad in ESTILOS_COLOR:
+            seguro = _COLOR_CSS_SEGURO.match(valor)
+        else:
+            seguro = propiedad in ESTILOS_PERMITIDOS and _VALOR_CSS_SEGURO.match(valor)
+        if seguro:
+            declaraciones.append(f'{propiedad}:{valor}')
+    return '; '.join(declaraciones)
+
+
+class _Procesador(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.texto = []
+        self._abiertas = []
+        self._descartando = 0
+        self.descartado = []
+
+    # --- Etiquetas ---
+
+    def handle_starttag(self, etiqueta, atributos):
+        if etiqueta in ETIQUETAS_DESCARTADAS:
+            if not self._descartando and etiqueta in ETIQUETAS_INCRUSTADAS:
+                self._incrustado(etiqueta, atributos)
+            if etiqueta not in ETIQUETAS_VACIAS:
+                self._descartando += 1
+            return
+        if self._descartando:
+            return
+        if etiqueta in ETIQUETAS_BLOQUE:
+            self.texto.append(' ')
+        if etiqueta not in ETIQUETAS_PERMITIDAS:
+            return
+
+        if etiqueta in CIERRE_IMPLICITO and self._abiertas and self._abiertas[-1] == etiqueta:
+            self.html.append(f'</{self._abiertas.pop()}>')
+
+        limpios = self._atributos(etiqueta, atributos)
+        if etiqueta == 'img':
+            limpios.append(('loading', 'lazy'))
+            limpios.append(('decoding', 'async'))
+        elif etiqueta == 'a' and ('target', '_blank') in limpios:
+            limpios = [(n, v) for n, v in limpios if n != 'rel'] + [('rel', 'noopener noreferrer')]
+
+        texto_atributos = ''.join(f' {nombre}="{escape(valor)}"' for nombre, valor in limpios)
+        self.html.append(f'<{etiqueta}{texto_atributos}>')
+        if etiqueta not in ETIQUETAS_VACIAS:
+            self._abiertas.append(etiqueta)
+
+    def handle_startendtag(self, etiqueta, atributos):
+        self.handle_starttag(etiqueta, atributos)
+        if etiqueta in ETIQUETAS_DESCARTADAS:
+            self.handle_endtag(etiqueta)  # '<embed .../>' no deja nada abierto
+        elif etiqueta not in ETIQUETAS_VACIAS and etiqueta in ETIQUETAS_PERMITIDAS and not self._descartando:
+            self.handle_endtag(etiqueta)
+
+    def _incrustado(self, etiqueta, atributos):
+        # El iframe de un vídeo permitido se escribe completo aquí (sin su
+        # contenido alternativo, que se sigue descartando); el resto se anota
+        src = dict(atributos).get('src') or ''
+        if etiqueta == 'iframe' and _video_permitido(src):
+            limpios = self._atributos(etiqueta, atributos)
+            limpios.append(('loading', 'lazy'))
+            texto_atributos = ''.join(f' {nombre}="{escape(valor)}"' for nombre, valor in limpios)
+            self.html.append(f'<iframe{texto_atributos}></iframe>')
+            return
+        host = urlsplit(src).hostname if etiqueta == 'iframe' and _url_segura(src) else None
+        self.descartado.append(f'{etiqueta} {host}' if host else etiqueta)
+
+    def handle_endtag(self, etiqueta):
+        if etiqueta in ETIQUETAS_DESCARTADAS:
+            if etiqueta not in ETIQUETAS_VACIAS:
+                self._descartando = max(0, self._descartando - 1)
+            return
+        if self._descartando:
+            return
+        if etiqueta in ETIQUETAS_BLOQUE:
+            self.texto.append(' ')
+        if etiqueta not in self._abiertas:
+            return  # cierre sin apertura: se ignora
+        # Cerramos también las que quedaron abiertas dentro (HTML mal anidado)
+        while self._abiertas:
+            abierta = self._abiertas.pop()
+            self.html.append(f'</{abierta}>')
+            if abierta == etiqueta:
+                break
+
+    def _atributos(self, etiqueta, atributos):
+        permitidos = ATRIBUTOS_PERMITIDOS['*'] | ATRIBUTOS_PERMITIDOS.get(etiqueta, set())
+        limpios = []
+        for nombre, valor in atributos:
+            if nombre == 'allowfullscreen' and nombre in permitidos:
+                valor = ''  # atributo booleano: el parser lo da como None
+            if nombre not in permitidos or valor is None:
+                continue
+            if nombre in ('href', 'src') and not _url_segura(valor):
+                continue
+            if nombre == 'style':
+                valor = _estilo_seguro(valor)
+                if not valor:
+                    continue
+            limpios.append((nombre, valor))
+        return limpios
+
+    # --- Texto ---
+
+    def handle_data(self, datos):
+        if self._descartando:
+            return
+        self.html.append(escape(datos, quote=False))
+        self.texto.append(datos)
+
+    def cerrar(self):
+        self.close()
+        while self._abiertas:
+            self.html.append(f'</{self._abiertas.pop()}>')
+
+
+def _extracto(texto: str, longitud: int = LONGITUD_EXTRACTO) -> str:
+    if len(texto) <= longitud:
+        return texto
+    # Cortamos en el último espacio para no partir una palabra
+    recorte = texto[:longitud].rsplit(' ', 1)[0]
+    return recorte.rstrip(' ,;:.') + '…'
+
+
+def procesar(html: str) -> ContenidoProcesado:
+    procesador = _Procesador()
+    procesador.feed(html or '')
+    procesador.cerrar()
+
+    texto = ' '.join(''.join(procesador.texto).split())
+    palabras = len(texto.split())
+    return ContenidoProcesado(
+        html=''.join(procesador.html),
+        palabras=palabras,
+        tiempo_lectura=max(1, math.ceil(palabras / PALABRAS_POR_MINUTO)),
+        extracto=_extracto(texto),
+        descartado=tuple(procesador.descartado),
+    )
+
+
+def aplicar(noticia, resultado: ContenidoProcesado | None = None) -> list[str]:
+    """
+    Rellena los campos derivados de ``noticia.contenido`` (no guarda).
+    Devuelve los nombres de los campos tocados. ``resultado`` evita volver
+    a procesar si ya se tiene.
+    """
+    if resultado is None:
+        resultado = procesar(noticia.contenido)
+    noticia.contenido_html = resultado.html
+    noticia.palabras = resultado.palabras
+    noticia.tiempo_lectura = resultado.tiempo_lectura
+    noticia.extracto = resultado.extracto
+    return ['contenido_html', 'palabras', 'tiempo_lectura', 'extracto']
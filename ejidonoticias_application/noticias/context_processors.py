@@ -1,10 +1,10 @@
-from .models import RedSocial
+from . import tablas_globales
 
 def redes_sociales_context_processor(request):
     """
     Context processor para agregar las redes sociales a todas las plantillas.
     """
-    redes = RedSocial.objects.all()
+    # Pasamos la función sin llamarla: la plantilla la evalúa solo si la usa
     return {
-        'redes_sociales': redes
+        'redes_sociales': tablas_globales.redes_sociales
     }
\ No newline at end of file
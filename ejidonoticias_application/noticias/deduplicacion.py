@@ -0,0 +1,194 @@
+"""
+Deduplicación por contenido de los banners subidos.
+
+La misma foto se sube a menudo para varias noticias o categorías, y cada
+vez se decodificaba, reducía y codificaba de nuevo. Ahora cada subida se
+identifica por su SHA-256 al llegar:
+
+- El original se guarda una sola vez, en ``originales/ab/cd/<sha256>.<ext>``
+  (ruta por contenido: dos subidas iguales caen en el mismo archivo).
+- ``ImagenFuente`` apunta, por contenido y tipo de banner (el de categoría
+  se recorta distinto), a lo que se generó: banners, miniaturas y
+  variantes. Si ya está procesada, la noticia o categoría nueva recibe
+  esas rutas al guardarse, sin tarea y sin pasar por Pillow.
+- Si no, se encola la tarea como siempre (ver tareas.py). La primera que
+  termina registra su resultado en la fuente; las demás con la misma
+  imagen lo reutilizan. El original se borra cuando ya no lo necesita
+  nadie (``soltar_original``).
+
+``ImagenFuente.referencias`` cuenta las noticias y categorías que la usan
+(``contar``: al guardar con otro banner y al borrar). Los archivos de una
+fuente son compartidos, así que nada los borra al cambiar un banner: de
+eso se encarga ``manage.py limpiar_media``, que tiene por referenciados
+los de toda fuente en uso y borra antes las fuentes sin referencias
+(``purgar``), con el mismo periodo de gracia que los archivos.
+
+Los banners de antes de esto (``imagen_fuente`` vacío) siguen como
+estaban: sus archivos no se comparten.
+"""
+import hashlib
+import os
+from collections import Counter
+from typing import NamedTuple
+
+from django.db.models import F
+from django.utils import timezone
+
+CARPETA = 'originales'
+
+# Lo que se genera de un original por contenido se llama como su SHA-256,
+# recortado: entero (64) más carpeta y sufijo ('-medium.webp') pasa de los
+# 100 caracteres de los ImageField y Django lo trunca con un sufijo al azar
+LONGITUD_NOMBRE = 16
+
+# Campos de archivo que comparte cada tipo de banner (además de 'variantes')
+CAMPOS = {
+    'noticia': ('banner', 'banner_medium', 'banner_small'),
+    'categoria': ('banner',),
+}
+
+
+class Asignada(NamedTuple):
+    procesada: bool  # ya tiene banners y variantes: no hace falta tarea
+    escrito: str | None  # original que se acaba de escribir en el storage
+
+
+def huella(archivo) -> str:
+    """SHA-256 del contenido de ``archivo`` (un ``File`` de Django), por bloques."""
+    sha256 = hashlib.sha256()
+    for bloque in archivo.chunks():
+        sha256.update(bloque)
+    return sha256.hexdigest()
+
+
+def ruta_original(sha256: str, extension: str) -> str:
+    return f'{CARPETA}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension.lower()}'
+
+
+def nombre_base(ruta: str) -> str:
+    """Nombre, sin carpeta ni extensión, para lo que se genere de ``ruta``."""
+    base = os.path.splitext(os.path.basename(ruta))[0]
+    if ruta.startswith(f'{CARPETA}/'):
+        return base[:LONGITUD_NOMBRE]
+    return base
+
+
+def aplicar(objeto, fuente) -> None:
+    """Pone al objeto los banners y variantes ya generados de ``fuente``."""
+    for campo in CAMPOS[fuente.tipo]:
+        setattr(objeto, campo, getattr(fuente, campo) or None)
+    objeto.variantes = dict(fuente.variantes)
+    objeto.imagen_fuente = fuente
+
+
+def asignar(objeto, tipo: str, archivo) -> Asignada:
+    """
+    Para un banner recién llegado (``archivo``): si ya se procesó una imagen
+    idéntica del mismo tipo, le pone al objeto su resultado. Si no, guarda
+    el original en su ruta por contenido (si no estaba ya) y se lo pone de
+    banner. No guarda el objeto ni cuenta la referencia (ver ``contar``).
+    """
+    from .models import ImagenFuente
+
+    sha256 = huella(archivo)
+    fuente, _ = ImagenFuente.objects.get_or_create(sha256=sha256, tipo=tipo)
+    if fuente.procesada:
+        aplicar(objeto, fuente)
+        return Asignada(True, None)
+
+    storage = objeto.banner.storage
+    escrito = None
+    if not fuente.original or not storage.exists(fuente.original):
+        # Puede estar ya, subido para el otro tipo de banner
+        nombre = ruta_original(sha256, os.path.splitext(archivo.name)[1])
+        if not storage.exists(nombre):
+            nombre = escrito = storage.save(nombre, archivo)
+        ImagenFuente.objects.filter(pk=fuente.pk).update(original=nombre)
+        fuente.original = nombre
+
+    objeto.banner = fuente.original
+    objeto.variantes = {}
+    objeto.imagen_fuente = fuente
+    return Asignada(False, escrito)
+
+
+def registrar(fuente, objeto) -> bool:
+    """
+    Tras procesar el banner de ``objeto``, guarda el resultado en su fuente
+    para los siguientes. Si otro worker se adelantó, el objeto se queda con
+    lo suyo y se borra lo recién generado. Devuelve si se registró.
+    """
+    from .models import ImagenFuente
+
+    generados = {campo: getattr(objeto, campo).name or '' for campo in CAMPOS[fuente.tipo]}
+    registrada = ImagenFuente.objects.filter(pk=fuente.pk, banner='').update(
+        variantes=objeto.variantes, fecha_actualizacion=timezone.now(), **generados,
+    )
+    if registrada:
+        return True
+
+    rutas = archivos(objeto, fuente.tipo)
+    aplicar(objeto, ImagenFuente.objects.get(pk=fuente.pk))
+    for ruta in rutas - archivos(objeto, fuente.tipo):
+        objeto.banner.storage.delete(ruta)
+    return False
+
+
+def archivos(objeto, tipo: str) -> set[str]:
+    """Rutas de los banners y variantes que tiene puestos ``objeto``."""
+    rutas = {getattr(objeto, campo).name for campo in CAMPOS[tipo]}
+    # 'original' es el ancho de partida, no una ruta
+    rutas.update(ruta for clave, ruta in (objeto.variantes or {}).items() if clave != 'original')
+    return {ruta for ruta in rutas if ruta}
+
+
+def soltar_original(fuente) -> None:
+    """
+    Borra el original de ``fuente`` cuando ya no lo necesita nadie: todas
+    las fuentes con ese contenido están procesadas y ninguna noticia o
+    categoría lo tiene aún de banner (su tarea está pendiente).
+    """
+    from .models import Categoria, ImagenFuente, Noticia
+
+    if not fuente.original:
+        return
+    hermanas = ImagenFuente.objects.filter(sha256=fuente.sha256)
+    if hermanas.filter(banner='').exists():
+        return
+    for modelo in (Noticia, Categoria):
+        if modelo.objects.filter(imagen_fuente__sha256=fuente.sha256, banner=fuente.original).exists():
+            return
+    Noticia._meta.get_field('banner').storage.delete(fuente.original)
+    hermanas.update(original='')
+
+
+# --- Referencias ---
+
+def sumar(cuentas) -> None:
+    """Suma ``{imagen_fuente_id: n}`` a las referencias."""
+    from .models import ImagenFuente
+
+    ahora = timezone.now()
+    for pk, cantidad in cuentas.items():
+        if pk and cantidad:
+            ImagenFuente.objects.filter(pk=pk).update(referencias=F('referencias') + cantidad,
+                                                      fecha_actualizacion=ahora)
+
+
+def contar(anterior: int | None, nueva: int | None) -> None:
+    """Un objeto deja de usar la fuente ``anterior`` y pasa a usar ``nueva`` (ids)."""
+    if anterior != nueva:
+        sumar(Counter({anterior: -1, nueva: 1}))
+
+
+def purgar(limite) -> int:
+    """
+    Borra las fuentes sin referencias que no se tocan desde antes de
+    ``limite``. Sus archivos quedan huérfanos para ``limpiar_media``.
+    """
+    from .models import ImagenFuente
+
+    # Además del contador, que ninguna fila la apunte (on_delete=PROTECT)
+    sin_uso = ImagenFuente.objects.filter(referencias__lte=0, fecha_actualizacion__lte=limite,
+                                          noticias__isnull=True, categorias__isnull=True)
+    return sin_uso.delete()[0]
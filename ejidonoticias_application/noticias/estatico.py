@@ -0,0 +1,242 @@
+"""
+Exportación estática de las páginas públicas para servirlas sin Django.
+
+``manage.py exportar_estatico`` renderiza con las vistas de siempre la
+portada, la página de cada noticia publicada, el listado general y el de
+cada categoría, y los escribe en ``ESTATICO_DIR`` junto con sus versiones
+``.gz`` y ``.br`` precomprimidas (``gzip_static`` / ``brotli_static``)::
+
+    /index.html
+    /blog/<slug>/index.html
+    /noticias/index.html
+    /noticias/categoria/<slug>/index.html       <- /noticias/?category=<slug>
+
+El mapa de dependencias es el mismo que el de la caché de páginas (ver
+cache_paginas.py): cada vista declara con ``depende_de`` los grupos de los
+que depende su HTML, y el manifiesto guarda la versión de cada grupo en el
+momento de renderizar. En las pasadas siguientes solo se vuelven a
+renderizar las páginas con algún grupo cuya versión cambió (las signals ya
+las suben al guardar), las nuevas y las que superan ``ESTATICO_MAX_EDAD``
+(contadores de vistas y "lo más visto"); las que ya no existen se borran.
+
+Las signals además marcan la exportación como pendiente
+(``marcar_pendiente``) y ``exportar_estatico --vigilar`` lanza la pasada
+incremental en cuanto lo ve.
+
+Las vistas no cuentan visitas al exportar: la página exportada de cada
+noticia lleva un ``sendBeacon`` a ``/vista/<id>/``.
+
+Ejemplo de nginx (solo visitantes anónimos y sin parámetros extra)::
+
+    location = /noticias/ {
+        set $pagina /sin-estatico;
+        if ($args = "") { set $pagina /noticias/index.html; }
+        if ($args ~ "^category=([-\\w]+)$") { set $pagina /noticias/categoria/$1/index.html; }
+        include estatico.conf;
+    }
+    location / {
+        set $pagina /sin-estatico;
+        if ($args = "") { set $pagina ${uri}index.html; }
+        include estatico.conf;
+    }
+
+    # estatico.conf
+    if ($cookie_sessionid) { set $pagina /sin-estatico; }
+    root /srv/ejidonoticias/estatico;
+    gzip_static on;
+    brotli_static on;
+    try_files $pagina @django;
+"""
+import gzip
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.urls import resolve
+
+from . import cache_paginas
+from .models import Categoria, Noticia
+
+try:
+    import brotli
+except ImportError:  # sin brotli solo se generan los .gz
+    brotli = None
+
+CLAVE_PENDIENTE = 'noticias:estatico:pendiente'
+MANIFIESTO = '.manifiesto.json'
+_SLUG_SEGURO = re.compile(r'^[-\w]+$')
+
+
+def destino() -> Path:
+    return Path(getattr(settings, 'ESTATICO_DIR', '/var/tmp/ejidonoticias_estatico'))
+
+
+def _max_edad() -> int:
+    return getattr(settings, 'ESTATICO_MAX_EDAD', 3600)
+
+
+def marcar_pendiente() -> None:
+    """Llamada desde las signals: hay contenido nuevo que exportar."""
+    cache.set(CLAVE_PENDIENTE, time.time_ns(), timeout=None)
+
+
+def pendiente_desde(marca: int) -> bool:
+    return (cache.get(CLAVE_PENDIENTE) or 0) > marca
+
+
+# --- Qué se exporta y dónde ---
+
+def urls() -> list[str]:
+    lista = ['/', '/noticias/']
+    lista += [
+        f'/noticias/?category={slug}'
+        for slug in Categoria.objects.order_by('pk').values_list('slug', flat=True)
+        if _SLUG_SEGURO.match(slug)
+    ]
+    lista += [
+        f'/blog/{slug}/'
+        for slug in Noticia.objects.publicadas().order_by('pk').values_list('slug', flat=True)
+        if _SLUG_SEGURO.match(slug)
+    ]
+    return lista
+
+
+def archivo(url: str) -> str:
+    """Ruta relativa del HTML de ``url`` dentro de la exportación."""
+    ruta, _, consulta = url.partition('?')
+    if consulta.startswith('category='):
+        ruta = f"/noticias/categoria/{consulta.removeprefix('category=')}/"
+    return ruta.lstrip('/') + 'index.html'
+
+
+# --- Renderizado ---
+
+def renderizar(url: str) -> tuple[bytes | None, tuple]:
+    """
+    HTML de ``url`` renderizado por su vista como para un visitante anónimo,
+    y los grupos de los que depende. ``None`` si no es exportable.
+    """
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    request.exportacion = True
+    coincidencia = resolve(request.path_info)
+    request.resolver_match = coincidencia
+    respuesta = coincidencia.func(request, *coincidencia.args, **coincidencia.kwargs)
+
+    declarado = getattr(request, '_cache_pagina', None)
+    if respuesta.status_code != 200 or declarado is None:
+        return None, ()
+    return respuesta.content, declarado['grupos']
+
+
+def _escribir_atomico(ruta: Path, datos: bytes) -> None:
+    temporal = ruta.with_name(f'.{ruta.name}.tmp')
+    temporal.write_bytes(datos)
+    os.replace(temporal, ruta)
+
+
+def escribir(raiz: Path, relativa: str, contenido: bytes) -> bool:
+    """
+    Escribe el HTML y sus versiones comprimidas. Si no cambió no toca los
+    archivos (se conservan fechas y ETags en nginx/CDN). Devuelve si escribió.
+    """
+    ruta = raiz / relativa
+    try:
+        if ruta.read_bytes() == contenido:
+            return False
+    except FileNotFoundError:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+
+    # Primero las comprimidas: nunca hay un .gz más viejo que su HTML
+    _escribir_atomico(ruta.with_name(ruta.name + '.gz'), gzip.compress(contenido, 9, mtime=0))
+    if brotli is not None:
+        _escribir_atomico(ruta.with_name(ruta.name + '.br'), brotli.compress(contenido, quality=11))
+    _escribir_atomico(ruta, contenido)
+    return True
+
+
+def borrar(raiz: Path, relativa: str) -> None:
+    ruta = raiz / relativa
+    for sufijo in ('', '.gz', '.br'):
+        ruta.with_name(ruta.name + sufijo).unlink(missing_ok=True)
+    try:
+        ruta.parent.rmdir()  # solo si quedó vacío
+    except OSError:
+        pass
+
+
+def exportar_lote(lista_urls, raiz: str) -> dict:
+    """
+    Renderiza y escribe ``lista_urls``. Devuelve ``{url: (grupos, escrita)}``;
+    sin grupos si la página ya no es exportable.
+    """
+    resultado = {}
+    for url in lista_urls:
+        contenido, grupos = renderizar(url)
+        escrita = contenido is not None and escribir(Path(raiz), archivo(url), contenido)
+        resultado[url] = (list(grupos), escrita)
+    return resultado
+
+
+# --- Manifiesto: mapa de dependencias de la exportación ---
+
+def leer_manifiesto(raiz: Path) -> dict:
+    try:
+        return json.loads((raiz / MANIFIESTO).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_manifiesto(raiz: Path, manifiesto: dict) -> None:
+    raiz.mkdir(parents=True, exist_ok=True)
+    _escribir_atomico(raiz / MANIFIESTO, json.dumps(manifiesto).encode())
+
+
+def obsoletas(manifiesto: dict, todas: bool = False) -> tuple[list[str], list[str]]:
+    """
+    ``(a_renderizar, a_borrar)`` comparando el manifiesto con las páginas
+    actuales y con las versiones de sus grupos en la caché.
+    """
+    actuales = urls()
+    grupos = {grupo for entrada in manifiesto.values() for grupo in entrada['versiones']}
+    versiones = cache_paginas.versiones(grupos)
+    limite = time.time() - _max_edad()
+
+    a_renderizar = [
+        url for url in actuales
+        if todas
+        or url not in manifiesto
+        or manifiesto[url]['generada'] < limite
+        or any(versiones.get(grupo) != version for grupo, version in manifiesto[url]['versiones'].items())
+    ]
+    a_borrar = sorted(manifiesto.keys() - set(actuales))
+    return a_renderizar, a_borrar
+
+
+def registrar(manifiesto: dict, resultados: dict, inicio: int) -> None:
+    """
+    Apunta en el manifiesto las versiones de los grupos de cada página. Si
+    un grupo cambió mientras se renderizaba, la página queda obsoleta para
+    la siguiente pasada (igual que en la caché de páginas).
+    """
+    grupos = {grupo for lista, _ in resultados.values() for grupo in lista}
+    versiones = cache_paginas.versiones(grupos, crear_con=inicio)
+    ahora = time.time()
+    for url, (lista, _) in resultados.items():
+        if not lista:
+            manifiesto.pop(url, None)
+            continue
+        manifiesto[url] = {
+            'archivo': archivo(url),
+            'versiones': {
+                grupo: versiones.get(grupo) if versiones.get(grupo, inicio + 1) <= inicio else None
+                for grupo in lista
+            },
+            'generada': ahora,
+        }
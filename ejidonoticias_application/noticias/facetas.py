@@ -0,0 +1,240 @@
+"""
+Recuentos por categoría y por tag (facetas) del listado ``/noticias/``.
+
+Cada faceta cuenta con los demás filtros aplicados, pero no con el suyo:
+con ``?category=deportes&tag=futbol`` las categorías dicen cuántas
+noticias de fútbol hay en cada una y los tags cuántas de deportes lleva
+cada uno, así se puede cambiar de categoría sin perder el tag y al revés.
+
+Sin ``q`` no se agrupa nada al servir. ``ContadorFaceta`` guarda las
+noticias publicadas por categoría, por tag y por cada par (categoría, tag),
+que es todo lo que piden las combinaciones de los dos filtros: una
+consulta por índice. Las signals suman y restan al publicar, despublicar,
+cambiar de categoría, borrar o cambiar los tags de una noticia (ver
+signals.py); ``recalcular_todas()`` los rehace desde cero tras las cargas
+en bloque (``manage.py recalcular_facetas``).
+
+Con ``q`` los recuentos dependen de la búsqueda: una sola consulta, la
+unión de los dos GROUP BY sobre las noticias encontradas.
+
+El resultado se cachea por combinación de filtros. La clave lleva las
+versiones de los grupos ``global`` y ``listado`` de la caché de páginas
+(ver cache_paginas.py): cualquier cambio de noticias, tags o categorías la
+deja obsoleta.
+"""
+import hashlib
+import time
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+
+from . import cache_paginas
+
+PREFIJO = 'noticias:facetas'
+TIEMPO_CACHE = 60 * 60
+
+# Los tags con más noticias; el activo sale siempre
+MAX_TAGS = 20
+
+TAMANO_LOTE = 1000
+
+# Campos de Noticia que cambian los recuentos al guardarse
+CAMPOS_RELEVANTES = {'categoria', 'publicado'}
+
+
+class Faceta(NamedTuple):
+    nombre: str
+    slug: str
+    total: int
+    activa: bool
+
+
+class Facetas(NamedTuple):
+    categorias: list[Faceta]
+    tags: list[Faceta]
+
+
+# --- Lectura ---
+
+def _clave(categoria: str | None, tag: str | None, query: str | None) -> str:
+    version = cache_paginas.versiones(('global', 'listado'), crear_con=time.time_ns())
+    filtros = '\n'.join(((categoria or '').lower(), (tag or '').lower(), ' '.join((query or '').lower().split())))
+    return (f"{PREFIJO}:{hashlib.md5(filtros.encode()).hexdigest()}:"
+            f"{version.get('global')}:{version.get('listado')}")
+
+
+def _filas_contadores(categoria: str | None, tag: str | None):
+    from .models import ContadorFaceta
+
+    por_categoria = Q(categoria__isnull=False) & (Q(tag__slug__iexact=tag) if tag else Q(tag__isnull=True))
+    por_tag = Q(tag__isnull=False) & (Q(categoria__slug__iexact=categoria) if categoria
+                                      else Q(categoria__isnull=True))
+    filas = ContadorFaceta.objects.filter(por_categoria | por_tag, total__gt=0) \
+                                  .values_list('categoria__nombre', 'categoria__slug',
+                                               'tag__nombre', 'tag__slug', 'total')
+    # Con los dos filtros, la fila (categoría, tag) activa cuenta en las dos facetas
+    for nombre_categoria, slug_categoria, nombre_tag, slug_tag, total in filas:
+        if slug_categoria is not None and (slug_tag.lower() == tag.lower() if tag else slug_tag is None):
+            yield 'categoria', nombre_categoria, slug_categoria, total
+        if slug_tag is not None and (slug_categoria.lower() == categoria.lower() if categoria
+                                     else slug_categoria is None):
+            yield 'tag', nombre_tag, slug_tag, total
+
+
+def _filas_busqueda(categoria: str | None, tag: str | None, query: str):
+    from .busqueda import filtrar
+    from .models import Noticia
+
+    encontradas = filtrar(Noticia.objects.publicadas(), query)
+    por_categoria = encontradas.filter(tags__slug__iexact=tag) if tag else encontradas
+    por_tag = encontradas.filter(categoria__slug__iexact=categoria) if categoria else encontradas
+
+    categorias = por_categoria.order_by() \
+                              .values('categoria__nombre', 'categoria__slug') \
+                              .annotate(total=Count('pk')) \
+                              .values_list(Value('categoria'), 'categoria__nombre', 'categoria__slug', 'total')
+    tags = Noticia.tags.through.objects.filter(noticia__in=por_tag.values('pk')) \
+                                       .order_by() \
+                                       .values('tag__nombre', 'tag__slug') \
+                                       .annotate(total=Count('noticia_id')) \
+                                       .values_list(Value('tag'), 'tag__nombre', 'tag__slug', 'total')
+    return categorias.union(tags, all=True)
+
+
+def _ordenar(facetas: list[Faceta]) -> list[Faceta]:
+    return sorted(facetas, key=lambda faceta: (-faceta.total, faceta.nombre.lower()))
+
+
+def contar(categoria: str | None = None, tag: str | None = None, query: str | None = None) -> Facetas:
+    """Facetas del listado con esos filtros (los de ``?category=``, ``?tag=`` y ``?q=``)."""
+    clave = _clave(categoria, tag, query)
+    facetas = cache.get(clave)
+    if facetas is not None:
+        return facetas
+
+    filas = _filas_busqueda(categoria, tag, query) if query else _filas_contadores(categoria, tag)
+    por_tipo = defaultdict(list)
+    activos = {'categoria': (categoria or '').lower(), 'tag': (tag or '').lower()}
+    for tipo, nombre, slug, total in filas:
+        por_tipo[tipo].append(Faceta(nombre, slug, total, slug.lower() == activos[tipo]))
+
+    tags = _ordenar(por_tipo['tag'])
+    tags = tags[:MAX_TAGS] + [faceta for faceta in tags[MAX_TAGS:] if faceta.activa]
+    facetas = Facetas(_ordenar(por_tipo['categoria']), tags)
+    cache.set(clave, facetas, TIEMPO_CACHE)
+    return facetas
+
+
+# --- Mantenimiento incremental (desde signals.py) ---
+
+def pares(noticias=None, tags=None) -> list[tuple]:
+    """
+    ``(categoria_id, tag_id)`` de cada tag de las noticias publicadas,
+    limitado a los ids de ``noticias`` y de ``tags`` que se pasen.
+    """
+    from .models import Noticia
+
+    filas = Noticia.tags.through.objects.filter(noticia__publicado=True)
+    if noticias is not None:
+        filas = filas.filter(noticia_id__in=noticias)
+    if tags is not None:
+        filas = filas.filter(tag_id__in=tags)
+    return list(filas.values_list('noticia__categoria_id', 'tag_id'))
+
+
+def _deltas(filas, signo: int, deltas: Counter | None = None) -> Counter:
+    deltas = Counter() if deltas is None else deltas
+    for categoria_id, tag_id in filas:
+        deltas[(None, tag_id)] += signo
+        deltas[(categoria_id, tag_id)] += signo
+    return deltas
+
+
+def sumar(deltas: Counter) -> None:
+    """Aplica los incrementos ``{(categoria_id, tag_id): delta}`` a los contadores."""
+    from .models import ContadorFaceta
+
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # Los contadores que aún no existan se crean a 0 y se suman como el resto
+    ContadorFaceta.objects.bulk_create(
+        [ContadorFaceta(categoria_id=categoria_id, tag_id=tag_id) for categoria_id, tag_id in deltas],
+        ignore_conflicts=True,
+    )
+    # Una UPDATE por cada incremento distinto (casi siempre +1 o -1)
+    por_delta = defaultdict(Q)
+    for (categoria_id, tag_id), delta in deltas.items():
+        por_delta[delta] |= Q(categoria_id=categoria_id, tag_id=tag_id)
+    for delta, condicion in por_delta.items():
+        ContadorFaceta.objects.filter(condicion).update(total=F('total') + delta)
+
+
+def tags_anadidos(noticias, tags) -> None:
+    sumar(_deltas(pares(noticias, tags), 1))
+
+
+def tags_quitados(quitados) -> None:
+    """``quitados``: los ``pares()`` apuntados antes de quitar los tags."""
+    sumar(_deltas(quitados, -1))
+
+
+def noticia_guardada(noticia, anterior: tuple | None, creada: bool) -> None:
+    """``anterior`` es ``(categoria_id, publicado)`` antes de guardar, o None."""
+    antes = anterior[0] if anterior and anterior[1] else None
+    ahora = noticia.categoria_id if noticia.publicado else None
+    if antes == ahora:
+        return
+    # Recién creada aún no tiene tags: llegan después, con m2m_changed
+    tags = [] if creada else list(noticia.tags.values_list('pk', flat=True))
+    deltas = Counter()
+    for categoria_id, signo in ((antes, -1), (ahora, 1)):
+        if categoria_id is not None:
+            deltas[(categoria_id, None)] += signo
+            _deltas([(categoria_id, tag_id) for tag_id in tags], signo, deltas)
+    sumar(deltas)
+
+
+def noticia_borrada(noticia) -> None:
+    if not noticia.publicado:
+        return
+    deltas = _deltas(pares([noticia.pk]), -1)
+    deltas[(noticia.categoria_id, None)] -= 1
+    sumar(deltas)
+
+
+# --- Recálculo completo ---
+
+def recalcular_todas(modelo_noticia=None, modelo_contador=None) -> int:
+    """
+    Rehace todos los contadores desde las noticias publicadas. Devuelve
+    cuántos hay.
+    """
+    if modelo_noticia is None:
+        from .models import ContadorFaceta as modelo_contador, Noticia as modelo_noticia
+
+    publicadas = modelo_noticia.objects.filter(publicado=True).order_by()
+    etiquetas = modelo_noticia.tags.through.objects.filter(noticia__publicado=True).order_by()
+    contadores = [
+        modelo_contador(categoria_id=categoria_id, total=total)
+        for categoria_id, total in publicadas.values('categoria_id').annotate(total=Count('pk'))
+                                             .values_list('categoria_id', 'total')
+    ]
+    contadores += [
+        modelo_contador(tag_id=tag_id, total=total)
+        for tag_id, total in etiquetas.values('tag_id').annotate(total=Count('pk'))
+                                      .values_list('tag_id', 'total')
+    ]
+    contadores += [
+        modelo_contador(categoria_id=categoria_id, tag_id=tag_id, total=total)
+        for categoria_id, tag_id, total in etiquetas.values('noticia__categoria_id', 'tag_id')
+                                                    .annotate(total=Count('pk'))
+                                                    .values_list('noticia__categoria_id', 'tag_id', 'total')
+    ]
+    with transaction.atomic():
+        modelo_contador.objects.all().delete()
+        modelo_contador.objects.bulk_create(contadores, batch_size=TAMANO_LOTE)
+    return len(contadores)
@@ -0,0 +1,237 @@
+"""
+Archivos huérfanos del storage de media.
+
+Nada borra lo que deja de usarse: el banner original y las miniaturas
+cuando se sustituye el banner de una noticia, las variantes viejas, las
+subidas de CKEditor que no llegaron a publicarse o cuya noticia se borró.
+``manage.py limpiar_media`` busca los archivos a los que no apunta nada y
+los borra o los mueve a una papelera.
+
+Se considera referenciado:
+
+- ``banner``, ``banner_medium`` y ``banner_small`` de cada noticia y el
+  ``banner`` de cada categoría;
+- las rutas del JSON ``variantes`` de ambas (ver variantes.py);
+- cualquier URL bajo ``MEDIA_URL`` dentro de ``contenido`` y
+  ``contenido_html`` (el ``src`` de las imágenes, pero también enlaces a
+  PDFs subidos o ``url()`` en estilos);
+- la miniatura ``_thumb`` que crea CKEditor de cada subida referenciada;
+- los archivos de las imágenes fuente con referencias o tocadas dentro del
+  periodo de gracia (ver deduplicacion.py). Las demás se borran antes de
+  buscar huérfanos, y sus archivos con ellos si nadie más los usa.
+
+Solo se recorren las carpetas que escribe la aplicación (las de
+``upload_to``, ``CKEDITOR_UPLOAD_PATH`` y la de originales), y se
+respetan los archivos modificados hace menos del periodo de gracia: una
+subida cuyo formulario aún no se ha guardado no está referenciada todavía.
+
+Memoria acotada con millones de archivos: ni las referencias ni el árbol
+se cargan enteros. Las referencias se ordenan por tramos de
+``TAMANO_TRAMO`` en archivos temporales y se mezclan con ``heapq.merge``;
+el árbol se recorre en profundidad con cada carpeta ordenada por nombre,
+que es el mismo orden (``clave()``). Cruzar los dos flujos es una mezcla
+de listas ordenadas: en memoria, un tramo de referencias y el listado de
+las carpetas abiertas.
+"""
+import heapq
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from html import unescape
+from itertools import islice
+from urllib.parse import unquote, urlsplit
+
+from ckeditor_uploader.utils import get_thumb_filename
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import deduplicacion
+
+TAMANO_TRAMO = 100_000
+FILAS_POR_BLOQUE = 1000
+
+GRACIA_HORAS = 24
+
+
+def clave(ruta: str) -> tuple:
+    """Orden del recorrido en profundidad: por componentes, no por caracteres."""
+    return tuple(ruta.split('/'))
+
+
+def _raiz(upload_to: str) -> str:
+    # 'noticias/banners/%Y/%m/%d/' -> 'noticias/banners'
+    return upload_to.split('%')[0].strip('/')
+
+
+def carpetas_gestionadas() -> list[str]:
+    """Las carpetas del storage que escribe la aplicación."""
+    from .models import Categoria, Noticia
+
+    campos = [Noticia._meta.get_field(nombre) for nombre in ('banner', 'banner_medium', 'banner_small')]
+    campos.append(Categoria._meta.get_field('banner'))
+    carpetas = {_raiz(campo.upload_to) for campo in campos}
+    carpetas.add(settings.CKEDITOR_UPLOAD_PATH.strip('/'))
+    carpetas.add(deduplicacion.CARPETA)
+    # Sin anidadas: 'noticias' ya incluye 'noticias/banners'
+    return sorted(carpeta for carpeta in carpetas
+                  if not any(carpeta.startswith(otra + '/') for otra in carpetas))
+
+
+# --- Referencias ---
+
+def _patron_media():
+    # Vale también con la URL absoluta del sitio delante, o con MEDIA_URL en un CDN
+    return re.compile(re.escape(urlsplit(settings.MEDIA_URL).path) + r'''([^"'\s<>?#)]+)''')
+
+
+def _en_html(html: str, patron) -> list[str]:
+    return [unquote(unescape(ruta)) for ruta in patron.findall(html)] if html else []
+
+
+def _en_variantes(variantes) -> list[str]:
+    # 'original' es el ancho de partida, no una ruta
+    return [ruta for clave_, ruta in (variantes or {}).items() if clave_ != 'original']
+
+
+def referencias(limite=None):
+    """
+    Rutas referenciadas desde la base de datos, sin orden y con repetidas.
+    De las imágenes fuente sin referencias, solo las tocadas después de
+    ``limite``.
+    """
+    from .models import Categoria, ImagenFuente, Noticia
+
+    patron = _patron_media()
+    subidas = settings.CKEDITOR_UPLOAD_PATH.strip('/') + '/'
+    filas = Noticia.objects.values_list('banner', 'banner_medium', 'banner_small', 'variantes',
+                                        'contenido', 'contenido_html')
+    for banner, mediano, pequeno, variantes, contenido, contenido_html in filas.iterator(FILAS_POR_BLOQUE):
+        yield from (ruta for ruta in (banner, mediano, pequeno) if ruta)
+        yield from _en_variantes(variantes)
+        for ruta in {*_en_html(contenido, patron), *_en_html(contenido_html, patron)}:
+            yield ruta
+            if ruta.startswith(subidas):
+                yield get_thumb_filename(ruta)
+
+    for banner, variantes in Categoria.objects.values_list('banner', 'variantes').iterator(FILAS_POR_BLOQUE):
+        # El banner por defecto es una URL externa, no un archivo
+        if banner and '://' not in banner:
+            yield banner
+        yield from _en_variantes(variantes)
+
+    fuentes = ImagenFuente.objects.all()
+    if limite is not None:
+        fuentes = fuentes.filter(Q(referencias__gt=0) | Q(fecha_actualizacion__gt=limite))
+    filas = fuentes.values_list('original', 'banner', 'banner_medium', 'banner_small', 'variantes')
+    for *rutas, variantes in filas.iterator(FILAS_POR_BLOQUE):
+        yield from (ruta for ruta in rutas if ruta)
+        yield from _en_variantes(variantes)
+
+
+@contextmanager
+def ordenadas(rutas, tamano_tramo: int = TAMANO_TRAMO):
+    """
+    Las ``rutas`` en orden de ``clave()`` y sin repetidas, ordenando en
+    disco por tramos. Se usa como ``with ordenadas(referencias()) as rutas:``.
+    """
+    rutas = iter(rutas)
+    with tempfile.TemporaryDirectory(prefix='limpiar_media_') as directorio:
+        tramos = []
+        while tramo := list(islice(rutas, tamano_tramo)):
+            nombre = os.path.join(directorio, f'{len(tramos)}.txt')
+            with open(nombre, 'w', encoding='utf-8') as archivo:
+                archivo.writelines(f'{ruta}\n' for ruta in sorted(set(tramo), key=clave) if '\n' not in ruta)
+            tramos.append(nombre)
+
+        archivos = [open(nombre, encoding='utf-8') for nombre in tramos]
+        try:
+            mezcla = heapq.merge(*((linea[:-1] for linea in archivo) for archivo in archivos), key=clave)
+            yield (ruta for ruta, siguiente in _con_siguiente(mezcla) if ruta != siguiente)
+        finally:
+            for archivo in archivos:
+                archivo.close()
+
+
+def _con_siguiente(iterable):
+    iterador = iter(iterable)
+    actual = next(iterador, None)
+    while actual is not None:
+        siguiente = next(iterador, None)
+        yield actual, siguiente
+        actual = siguiente
+
+
+# --- Árbol del storage ---
+
+def recorrer(storage, carpeta: str, excluir=frozenset()):
+    """
+    Archivos bajo ``carpeta``, en orden de ``clave()``. Se salta los
+    ocultos y las carpetas de ``excluir``.
+    """
+    try:
+        directorios, archivos = storage.listdir(carpeta)
+    except FileNotFoundError:
+        return
+    entradas = sorted([(nombre, True) for nombre in directorios] + [(nombre, False) for nombre in archivos])
+    for nombre, es_directorio in entradas:
+        if nombre.startswith('.'):
+            continue
+        ruta = f'{carpeta}/{nombre}' if carpeta else nombre
+        if not es_directorio:
+            yield ruta
+        elif ruta not in excluir:
+            yield from recorrer(storage, ruta, excluir)
+
+
+def sin_referencia(archivos, referenciadas):
+    """Los ``archivos`` que no están en ``referenciadas`` (ambos en orden de ``clave()``)."""
+    referenciadas = iter(referenciadas)
+    actual = next(referenciadas, None)
+    clave_actual = clave(actual) if actual is not None else None
+    for ruta in archivos:
+        clave_ruta = clave(ruta)
+        while clave_actual is not None and clave_actual < clave_ruta:
+            actual = next(referenciadas, None)
+            clave_actual = clave(actual) if actual is not None else None
+        if clave_actual != clave_ruta:
+            yield ruta
+
+
+def huerfanos(storage, carpetas, gracia: timedelta = timedelta(hours=GRACIA_HORAS), excluir=frozenset(),
+              tamano_tramo: int = TAMANO_TRAMO):
+    """
+    ``(ruta, bytes)`` de cada archivo sin referencias de las ``carpetas``,
+    modificado hace más de ``gracia``.
+    """
+    limite = timezone.now() - gracia
+    with ordenadas(referencias(limite), tamano_tramo) as referenciadas:
+        archivos = (ruta for carpeta in sorted(carpetas, key=clave)
+                    for ruta in recorrer(storage, carpeta, excluir))
+        for ruta in sin_referencia(archivos, referenciadas):
+            try:
+                if storage.get_modified_time(ruta) > limite:
+                    continue
+                yield ruta, storage.size(ruta)
+            except FileNotFoundError:
+                continue  # borrado mientras tanto
+
+
+# --- Borrar o apartar ---
+
+def apartar(storage, ruta: str, papelera: str) -> None:
+    """Mueve ``ruta`` a la carpeta local ``papelera``, con la misma ruta relativa."""
+    destino = os.path.join(papelera, *ruta.split('/'))
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    try:
+        origen = storage.path(ruta)
+    except NotImplementedError:
+        # Storage remoto: se descarga y se borra
+        with storage.open(ruta, 'rb') as entrada, open(destino, 'wb') as salida:
+            shutil.copyfileobj(entrada, salida)
+        storage.delete(ruta)
+    else:
+        shutil.move(origen, destino)
@@ -0,0 +1,126 @@
+"""
+Decodificación y escritura de imágenes con memoria acotada.
+
+Una foto de móvil de 40 MP ocupa ~120 MB decodificada en RGB. Para no
+tenerla nunca entera en memoria:
+
+- ``abrir_reducida`` decodifica ya reducida: en JPEG con ``draft`` (el
+  decodificador escala 1/2, 1/4 u 1/8 por DCT sin pasar por el tamaño
+  completo) y en el resto con ``reduce`` antes del filtro final.
+- ``cascada`` genera cada tamaño a partir del anterior, no del original.
+- ``guardar_en_campo`` / ``guardar_en_storage`` codifican a un archivo
+  temporal con desbordamiento a disco y lo pasan al storage tal cual, sin
+  copias intermedias en ``bytes``.
+
+``comprobar_pixeles`` rechaza imágenes por encima de
+``IMAGENES_MAX_PIXELES`` antes de decodificar nada (solo lee la cabecera).
+"""
+import math
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image
+
+# reduce() promedia bloques de píxeles: el filtro final debe partir de al
+# menos el doble del tamaño destino para que no se note. El escalado por
+# DCT de draft() filtra bien y le basta con no bajar del tamaño destino.
+MARGEN_REDUCE = 2
+
+# Por encima de esto el archivo temporal de salida pasa de memoria a disco
+MAX_EN_MEMORIA = 2 * 1024 * 1024
+
+
+class ImagenDemasiadoGrande(ValueError):
+    pass
+
+
+def max_pixeles() -> int:
+    return getattr(settings, 'IMAGENES_MAX_PIXELES', 60_000_000)
+
+
+def comprobar_pixeles(img: Image.Image) -> None:
+    pixeles = img.width * img.height
+    if pixeles > max_pixeles():
+        raise ImagenDemasiadoGrande(
+            f"La imagen tiene {pixeles / 1e6:.0f} MP; el máximo es {max_pixeles() / 1e6:.0f} MP."
+        )
+
+
+def validar_pixeles(archivo) -> None:
+    """Validador para ImageField: rechaza la subida en el formulario."""
+    if not archivo:
+        return
+    try:
+        posicion = archivo.tell()
+        with Image.open(archivo) as img:
+            comprobar_pixeles(img)
+        archivo.seek(posicion)
+    except ImagenDemasiadoGrande as error:
+        raise ValidationError(str(error), code='imagen_demasiado_grande')
+    except (OSError, ValueError):
+        # Formato ilegible: ya lo rechaza la validación del propio ImageField
+        pass
+
+
+def abrir_reducida(archivo, caja: tuple[int, int], cubrir: bool = False) -> Image.Image:
+    """
+    Abre ``archivo`` decodificándolo lo más pequeño posible sin que el
+    resultado final pierda calidad. Con ``cubrir`` el destino debe llenar
+    la caja (recorte); si no, caber en ella.
+    """
+    img = Image.open(archivo)
+    comprobar_pixeles(img)
+
+    escalas = (caja[0] / img.width, caja[1] / img.height)
+    escala = min(1, max(escalas) if cubrir else min(escalas))
+    necesario = (math.ceil(img.width * escala), math.ceil(img.height * escala))
+
+    # Solo JPEG implementa draft(); en el resto no hace nada
+    img.draft('RGB' if img.mode == 'RGB' else None, necesario)
+    factor = int(min(img.width / necesario[0], img.height / necesario[1]) / MARGEN_REDUCE)
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img
+
+
+def contener(img: Image.Image, caja: tuple[int, int]) -> Image.Image:
+    """Nueva imagen que cabe en ``caja`` (sin ampliar), o la misma si ya cabe."""
+    if img.width <= caja[0] and img.height <= caja[1]:
+        return img
+    escala = min(caja[0] / img.width, caja[1] / img.height)
+    tamano = (max(1, round(img.width * escala)), max(1, round(img.height * escala)))
+    return img.resize(tamano, Image.Resampling.LANCZOS)
+
+
+def cascada(img: Image.Image, tamanos):
+    """
+    Para cada entrada ``(caja, ...)`` de ``tamanos`` (de mayor a menor) da
+    ``(entrada, imagen)``, reduciendo cada imagen desde la anterior.
+    """
+    actual = img
+    for entrada in tamanos:
+        actual = contener(actual, entrada[0])
+        yield entrada, actual
+
+
+def _codificar(img: Image.Image, formato: str, **opciones):
+    salida = tempfile.SpooledTemporaryFile(max_size=MAX_EN_MEMORIA)
+    if img.mode not in ('RGB', 'RGBA', 'L'):
+        img = img.convert('RGB')
+    img.save(salida, format=formato, **opciones)
+    salida.seek(0)
+    return salida
+
+
+def guardar_en_campo(campo, nombre: str, img: Image.Image, formato: str, **opciones) -> None:
+    """Codifica ``img`` y la asigna al FieldFile (sin guardar el modelo)."""
+    with _codificar(img, formato, **opciones) as salida:
+        campo.save(nombre, File(salida, name=nombre), save=False)
+
+
+def guardar_en_storage(storage, nombre: str, img: Image.Image, formato: str, **opciones) -> str:
+    """Codifica ``img`` y la guarda en ``storage``; devuelve la ruta final."""
+    with _codificar(img, formato, **opciones) as salida:
+        return storage.save(nombre, File(salida, name=nombre))
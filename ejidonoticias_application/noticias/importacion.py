@@ -0,0 +1,355 @@
+"""
+Importación de noticias en bloque (``manage.py import_noticias``).
+
+La entrada es un archivo JSON Lines (un objeto por línea) o CSV con
+cabecera, con estos campos:
+
+- ``titulo`` y ``contenido`` (HTML), obligatorios;
+- ``slug`` (si falta, se saca del título), ``subtitulo``;
+- ``categoria``: nombre de la categoría; se crea si no existe;
+- ``tags``: lista de nombres (en CSV, separados por ``|``); se crean los
+  que no existen;
+- ``banner``: ruta de la imagen, relativa a ``--imagenes``;
+- ``autor`` (nombre de usuario), ``fecha_publicacion`` (ISO 8601),
+  ``publicado`` y ``vistas``, opcionales.
+
+El archivo se lee en streaming y se guarda por lotes: la memoria no crece
+con el tamaño del archivo. Cada lote es una transacción con un
+``bulk_create`` de las noticias y otro de sus tags; las categorías y tags
+se buscan (y crean) por slug, una consulta por lote.
+
+El slug es la clave de la importación: las noticias cuyo slug ya existe
+se saltan, así que si se corta basta con volver a lanzarla. Las filas
+inválidas se saltan y se informa de su línea.
+
+Como con ``sembrado.py``, ``bulk_create`` no pasa por ``save()`` ni por las
+signals: los campos derivados del contenido se calculan antes de insertar
+y los vectores de búsqueda, las tendencias, las relacionadas y las cachés
+se actualizan a mano. Los banners pasan por la deduplicación por
+contenido (ver deduplicacion.py): los que ya se procesaron para otra
+noticia se reutilizan; el resto se copian al storage y cada uno deja su
+``TareaImagen``, que procesa el propio comando en un pool de procesos o,
+con ``--encolar``, el worker de ``procesar_imagenes``.
+"""
+import csv
+import json
+import os
+from collections import Counter
+from datetime import datetime, time
+from itertools import islice
+from typing import NamedTuple
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.text import slugify
+
+from . import cache_paginas, contenido, deduplicacion, estatico, facetas, relacionadas, replicas, tablas_globales
+from .busqueda import actualizar_vectores
+from .models import Categoria, Noticia, Tag, TareaImagen
+from .tendencias import actualizar_tendencias
+
+TAMANO_LOTE = 500
+
+SEPARADOR_TAGS = '|'
+
+VERDADERO = {'1', 'true', 'si', 'sí', 'yes'}
+FALSO = {'0', 'false', 'no'}
+
+# Campos que se validan con clean_fields; el resto se resuelve aparte
+NO_VALIDADOS = {'banner', 'banner_medium', 'banner_small', 'categoria', 'autor', 'contenido'}
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+class LoteImportado(NamedTuple):
+    leidas: int
+    creadas: int
+    existentes: int
+    invalidas: list  # (línea, motivo)
+    tareas: list  # ids de TareaImagen de los banners
+
+
+# --- Lectura del archivo ---
+
+def leer_filas(archivo, formato: str):
+    """Genera ``(línea, fila)`` de un archivo de texto abierto, sin cargarlo entero."""
+    if formato == 'csv':
+        # Los cuerpos de las noticias superan el límite por defecto (128 KiB)
+        csv.field_size_limit(32 * 1024 * 1024)
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, fila
+        return
+
+    for numero, linea in enumerate(archivo, start=1):
+        if not linea.strip():
+            continue
+        try:
+            fila = json.loads(linea)
+        except ValueError as error:
+            yield numero, FilaInvalida(f"JSON inválido: {error}")
+            continue
+        yield numero, fila if isinstance(fila, dict) else FilaInvalida("la línea no es un objeto JSON")
+
+
+def _texto(fila, campo) -> str:
+    valor = fila.get(campo)
+    return '' if valor is None else str(valor).strip()
+
+
+def _booleano(valor) -> bool:
+    if isinstance(valor, bool):
+        return valor
+    texto = str(valor).strip().lower()
+    if texto in VERDADERO or texto == '':
+        return True
+    if texto in FALSO:
+        return False
+    raise FilaInvalida(f"'publicado' no es un booleano: {valor!r}")
+
+
+def _fecha(valor):
+    if not valor:
+        return timezone.now()
+    fecha = parse_datetime(valor)
+    if fecha is None:
+        dia = parse_date(valor)
+        if dia is None:
+            raise FilaInvalida(f"'fecha_publicacion' no es una fecha ISO 8601: {valor!r}")
+        fecha = datetime.combine(dia, time.min)
+    return timezone.make_aware(fecha) if timezone.is_naive(fecha) else fecha
+
+
+def _tags(valor) -> list[str]:
+    if isinstance(valor, list):
+        nombres = [str(nombre).strip() for nombre in valor]
+    else:
+        nombres = [nombre.strip() for nombre in (valor or '').split(SEPARADOR_TAGS)]
+    return [nombre for nombre in nombres if nombre]
+
+
+# --- Categorías, tags y autores: por slug, con lo ya resuelto en memoria ---
+
+class Resolutor:
+    """
+    Traduce nombres a ids creando lo que falte. Guarda lo resuelto: crece
+    con el vocabulario (categorías, tags, autores), no con las noticias.
+    """
+
+    def __init__(self, informar):
+        self.informar = informar
+        self.categorias = {}
+        self.tags = {}
+        self.autores = {}
+        self.categorias_creadas = 0
+        self.tags_creados = 0
+
+    @staticmethod
+    def _slug(nombre: str, modelo) -> tuple[str, str]:
+        longitud = modelo._meta.get_field('nombre').max_length
+        nombre = nombre[:longitud].strip()
+        return slugify(nombre)[:modelo._meta.get_field('slug').max_length], nombre
+
+    def _resolver(self, modelo, conocidos: dict, nombres) -> int:
+        # nombre por slug de lo que aún no está en memoria
+        faltan = {}
+        for nombre in nombres:
+            slug, nombre = self._slug(nombre, modelo)
+            if slug and slug not in conocidos:
+                faltan.setdefault(slug, nombre)
+        if not faltan:
+            return 0
+
+        conocidos.update(modelo.objects.filter(slug__in=faltan).values_list('slug', 'pk'))
+        nuevos = [modelo(nombre=nombre, slug=slug) for slug, nombre in faltan.items() if slug not in conocidos]
+        if not nuevos:
+            return 0
+        # ignore_conflicts: otro proceso pudo crearlos entre medias
+        modelo.objects.bulk_create(nuevos, ignore_conflicts=True)
+        conocidos.update(modelo.objects.filter(slug__in=[nuevo.slug for nuevo in nuevos])
+                                       .values_list('slug', 'pk'))
+        return len(nuevos)
+
+    def resolver(self, filas) -> None:
+        self.categorias_creadas += self._resolver(Categoria, self.categorias, (fila['categoria'] for fila in filas))
+        self.tags_creados += self._resolver(Tag, self.tags, (tag for fila in filas for tag in fila['tags']))
+
+        usuarios = {fila['autor'] for fila in filas if fila['autor']} - self.autores.keys()
+        if usuarios:
+            self.autores.update(get_user_model().objects.filter(username__in=usuarios)
+                                                        .values_list('username', 'pk'))
+            for usuario in sorted(usuarios - self.autores.keys()):
+                self.informar(f"El autor '{usuario}' no existe: sus noticias quedan sin autor.")
+                self.autores[usuario] = None
+
+    def categoria(self, nombre: str) -> int:
+        slug = self._slug(nombre, Categoria)[0]
+        if slug not in self.categorias:
+            # Mismo nombre que una categoría existente con otro slug
+            raise FilaInvalida(f"no se pudo crear la categoría '{nombre}'")
+        return self.categorias[slug]
+
+    def ids_tags(self, nombres) -> set[int]:
+        return {self.tags[slug] for slug in (self._slug(nombre, Tag)[0] for nombre in nombres)
+                if slug in self.tags}
+
+
+# --- Importación ---
+
+def _leer_fila(fila: dict) -> dict:
+    if isinstance(fila, FilaInvalida):
+        raise fila
+    titulo = _texto(fila, 'titulo')
+    if not titulo or not _texto(fila, 'contenido'):
+        raise FilaInvalida("faltan 'titulo' o 'contenido'")
+    if not _texto(fila, 'categoria'):
+        raise FilaInvalida("falta 'categoria'")
+    if not _texto(fila, 'banner'):
+        raise FilaInvalida("falta 'banner'")
+    try:
+        vistas = int(fila.get('vistas') or 0)
+    except (TypeError, ValueError):
+        raise FilaInvalida(f"'vistas' no es un número: {fila.get('vistas')!r}")
+    return {
+        'titulo': titulo,
+        'slug': _texto(fila, 'slug') or slugify(titulo)[:Noticia._meta.get_field('slug').max_length],
+        'subtitulo': _texto(fila, 'subtitulo') or None,
+        'contenido': fila['contenido'],
+        'categoria': _texto(fila, 'categoria'),
+        'tags': _tags(fila.get('tags')),
+        'banner': _texto(fila, 'banner'),
+        'autor': _texto(fila, 'autor'),
+        'fecha_publicacion': _fecha(_texto(fila, 'fecha_publicacion')),
+        'publicado': _booleano(fila.get('publicado', '')),
+        'vistas': vistas,
+    }
+
+
+def _asignar_banner(noticia: Noticia, origen: str) -> deduplicacion.Asignada:
+    # Como una subida desde el admin: por contenido, reutilizando lo procesado
+    with open(origen, 'rb') as archivo:
+        return deduplicacion.asignar(noticia, 'noticia', File(archivo, name=os.path.basename(origen)))
+
+
+def _noticias_del_lote(bloque, resolutor: Resolutor, imagenes: str, invalidas: list):
+    """Filas del lote ya validadas, como ``(línea, noticia, ids de tags)``."""
+    filas = []
+    for numero, fila in bloque:
+        try:
+            filas.append((numero, _leer_fila(fila)))
+        except FilaInvalida as error:
+            invalidas.append((numero, str(error)))
+    resolutor.resolver([fila for _, fila in filas])
+
+    noticias = []
+    for numero, fila in filas:
+        try:
+            noticia = Noticia(
+                titulo=fila['titulo'], slug=fila['slug'], subtitulo=fila['subtitulo'],
+                contenido=fila['contenido'],
+                categoria_id=resolutor.categoria(fila['categoria']),
+                autor_id=resolutor.autores.get(fila['autor']),
+                fecha_publicacion=fila['fecha_publicacion'],
+                publicado=fila['publicado'],
+                vistas=fila['vistas'],
+            )
+            noticia.clean_fields(exclude=NO_VALIDADOS)
+            origen = os.path.join(imagenes, fila['banner'])
+            if not os.path.isfile(origen):
+                raise FilaInvalida(f"no existe el banner {origen}")
+        except ValidationError as error:
+            invalidas.append((numero, '; '.join(f"{campo}: {' '.join(mensajes)}"
+                                                for campo, mensajes in error.message_dict.items())))
+        except FilaInvalida as error:
+            invalidas.append((numero, str(error)))
+        else:
+            noticias.append((numero, noticia, resolutor.ids_tags(fila['tags']), origen))
+    return noticias
+
+
+def _guardar_lote(noticias, procesar: bool) -> list[int]:
+    banners = []
+    pendientes = []
+    try:
+        for _, noticia, _, origen in noticias:
+            asignada = _asignar_banner(noticia, origen)
+            if asignada.escrito:
+                banners.append(asignada.escrito)
+            if not asignada.procesada:
+                pendientes.append(noticia)
+            contenido.aplicar(noticia)
+
+        with transaction.atomic():
+            creadas = Noticia.objects.bulk_create([noticia for _, noticia, _, _ in noticias])
+            Relacion = Noticia.tags.through
+            Relacion.objects.bulk_create([
+                Relacion(noticia_id=noticia.pk, tag_id=tag_id)
+                for (_, noticia, tags, _) in noticias
+                for tag_id in tags
+            ])
+            # Las que procesa este comando nacen reclamadas: el worker no las
+            # coge, y el intento va contado como en reclamar_tareas()
+            estado = TareaImagen.Estado.PROCESANDO if procesar else TareaImagen.Estado.PENDIENTE
+            tareas = TareaImagen.objects.bulk_create([
+                TareaImagen(tipo=TareaImagen.Tipo.BANNER_NOTICIA, objeto_id=noticia.pk, estado=estado,
+                            intentos=int(procesar))
+                for noticia in pendientes
+            ])
+            deduplicacion.sumar(Counter(noticia.imagen_fuente_id for noticia in creadas))
+            actualizar_vectores(Noticia.objects.filter(pk__in=[noticia.pk for noticia in creadas]))
+    except BaseException:
+        # Sin las filas, los originales recién copiados no los usa nadie
+        for nombre in banners:
+            Noticia._meta.get_field('banner').storage.delete(nombre)
+        raise
+    return [tarea.pk for tarea in tareas]
+
+
+def importar(filas, imagenes: str, tamano_lote: int = TAMANO_LOTE, procesar: bool = True,
+             informar=lambda mensaje: None):
+    """
+    Importa ``filas`` (``(línea, fila)``, ver ``leer_filas``) por lotes.
+    Genera un ``LoteImportado`` por lote; con ``procesar``, sus tareas de
+    banner las debe ejecutar quien llama. Al terminar actualiza lo que
+    mantienen las signals: ver ``terminar``.
+    """
+    filas = iter(filas)
+    resolutor = Resolutor(informar)
+    creadas = 0
+    while bloque := list(islice(filas, tamano_lote)):
+        invalidas = []
+        noticias = _noticias_del_lote(bloque, resolutor, imagenes, invalidas)
+
+        # Una sola vez cada slug: la primera aparición en el archivo manda
+        unicas = {}
+        for entrada in noticias:
+            unicas.setdefault(entrada[1].slug, entrada)
+        existentes = set(Noticia.objects.filter(slug__in=unicas).values_list('slug', flat=True))
+        nuevas = [entrada for slug, entrada in unicas.items() if slug not in existentes]
+
+        tareas = _guardar_lote(nuevas, procesar) if nuevas else []
+        creadas += len(nuevas)
+        yield LoteImportado(len(bloque), len(nuevas), len(noticias) - len(nuevas), sorted(invalidas), tareas)
+
+    if creadas:
+        terminar(categorias_creadas=bool(resolutor.categorias_creadas))
+    if resolutor.categorias_creadas or resolutor.tags_creados:
+        informar(f"Creadas {resolutor.categorias_creadas} categorías y {resolutor.tags_creados} tags.")
+
+
+def terminar(categorias_creadas: bool = True) -> None:
+    """Lo que harían las signals de cada noticia, una vez para toda la importación."""
+    actualizar_tendencias()
+    facetas.recalcular_todas()
+    _, cambiadas = relacionadas.calcular_todas()
+    cache_paginas.invalidar('global', *(f'noticia:{pk}' for pk in cambiadas))
+    if categorias_creadas:
+        tablas_globales.invalidar('categorias')
+    estatico.marcar_pendiente()
+    replicas.marcar_escritura()
@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from noticias.contador_vistas import solicitar_vaciado
+from noticias.tendencias import actualizar_tendencias
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las puntuaciones de tendencia (decaimiento + vistas nuevas). "
+        "Pensado para ejecutarse periódicamente, p. ej. cada hora."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=float, default=None,
+                            help="Repite cada N segundos en lugar de ejecutarse una vez")
+        parser.add_argument('--espera', type=float,
+                            default=getattr(settings, 'VISTAS_INTERVALO_VACIADO', 10) + 1,
+                            help="Segundos que se espera a que los procesos web escriban "
+                                 "sus vistas antes de contar (por defecto, un intervalo de vaciado)")
+
+    def handle(self, *args, **options):
+        while True:
+            # Las vistas en el buffer de los procesos web no están aún en la base
+            # de datos. solicitar_vaciado() solo deja la petición en la caché: cada
+            # proceso vacía en su siguiente visita, y su temporizador como mucho
+            # VISTAS_INTERVALO_VACIADO segundos después de la primera pendiente
+            solicitar_vaciado()
+            time.sleep(options['espera'])
+            cambiadas = actualizar_tendencias()
+            self.stdout.write(f"Tendencias actualizadas: {cambiadas} noticias con vistas nuevas.")
+            if options['cada'] is None:
+                break
+            time.sleep(options['cada'])
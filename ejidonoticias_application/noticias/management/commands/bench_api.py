@@ -0,0 +1,107 @@
+import json
+
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+
+from noticias import api, benchmark
+from noticias.models import Noticia
+
+SIN_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+# Conjuntos de ?fields= que se miden
+PROYECCIONES = {
+    'minima': ('id', 'titulo', 'url'),
+    'tarjeta': ('id', 'titulo', 'url', 'extracto', 'fecha_publicacion', 'banner', 'categoria'),
+    'por_defecto': api.POR_DEFECTO_LISTADO,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la serialización de la API JSON (ver noticias/api.py): noticias "
+        "por segundo y consultas con cada proyección de ?fields=, frente al "
+        "serializador de Django sobre el modelo completo; y latencia y bytes "
+        "de /api/noticias/ frente al HTML de /noticias/. Sembrar antes con "
+        "seed_noticias. ¡Usar solo en una base de pruebas!"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--noticias', type=int, default=1000,
+                            help="Noticias serializadas por repetición")
+        parser.add_argument('--repeticiones', type=int, default=10)
+        parser.add_argument('--salida', help="Guarda el resultado en este archivo JSON")
+        parser.add_argument('--comparar', help="JSON de una ejecución anterior para comparar")
+
+    def handle(self, *args, **options):
+        cantidad = options['noticias']
+        if Noticia.objects.publicadas().count() < cantidad:
+            raise CommandError(f"Hacen falta {cantidad} noticias publicadas: ejecuta antes seed_noticias.")
+        request = RequestFactory().get('/api/noticias/')
+        recientes = Noticia.objects.publicadas().order_by('-fecha_publicacion', '-id')
+
+        escenarios = {
+            # Lo que haría una API ingenua: filas completas y una consulta de tags por noticia
+            'django_serializers': lambda i: serializers.serialize('json', recientes[:cantidad]),
+        }
+        for nombre, campos in PROYECCIONES.items():
+            escenarios[f'api_{nombre}'] = self.serializacion(request, recientes, campos, cantidad)
+
+        resultado = {
+            'entorno': benchmark.entorno(),
+            'noticias': cantidad,
+            'opciones': {clave: options[clave] for clave in ('noticias', 'repeticiones')},
+            'escenarios': {},
+        }
+        self.stdout.write(f"Serialización de {cantidad} noticias:")
+        for nombre, funcion in escenarios.items():
+            datos = benchmark.medir(funcion, options['repeticiones'], calentamiento=1)
+            datos['noticias_por_segundo'] = round(cantidad * datos['peticiones_por_segundo'])
+            datos['bytes'] = len(funcion(0))
+            resultado['escenarios'][nombre] = datos
+            self.stdout.write(
+                f"{nombre:20} {datos['noticias_por_segundo']:9d} noticias/s  p50={datos['p50_ms']:8.2f}ms  "
+                f"consultas={datos['consultas_media']:6.1f}  {datos['bytes'] // 1024} KiB"
+            )
+
+        # Una página, por HTTP y sin caché: lo que ahorra la app móvil
+        self.stdout.write("\nUna página, sin caché de páginas:")
+        with override_settings(ALLOWED_HOSTS=['testserver'], CACHES=SIN_CACHE):
+            for nombre, url in (('html_noticias', reverse('noticias')),
+                                ('api_noticias', reverse('api_noticias')),
+                                ('api_noticias_minima', reverse('api_noticias') + '?fields=id,titulo,url')):
+                funcion = self.peticion(url)
+                datos = benchmark.medir(funcion, options['repeticiones'] * 5, calentamiento=2)
+                datos['bytes'] = len(Client().get(url).content)
+                resultado['escenarios'][nombre] = datos
+                self.stdout.write(
+                    f"{nombre:20} {datos['peticiones_por_segundo']:8.1f} req/s  p50={datos['p50_ms']:7.2f}ms  "
+                    f"consultas={datos['consultas_media']:5.1f}  {datos['bytes'] // 1024} KiB"
+                )
+
+        if options['salida']:
+            benchmark.guardar(resultado, options['salida'])
+            self.stdout.write(f"Resultado guardado en {options['salida']}")
+        if options['comparar']:
+            with open(options['comparar']) as archivo:
+                anterior = json.load(archivo)
+            self.stdout.write(f"\nComparado con {anterior['entorno'].get('commit') or options['comparar']}:")
+            for linea in benchmark.comparar(resultado, anterior):
+                self.stdout.write(linea)
+
+    def serializacion(self, request, recientes, campos, cantidad):
+        """Consulta proyectada, serialización y JSON, como en la vista."""
+        def serializar(i):
+            noticias = api.proyectar(recientes, api.CAMPOS, campos)[:cantidad]
+            filas = api.serializar(noticias, api.CAMPOS, campos, request)
+            return json.dumps(filas, cls=DjangoJSONEncoder, ensure_ascii=False)
+        return serializar
+
+    def peticion(self, url):
+        cliente = Client()
+
+        def peticion(i):
+            return cliente.get(url).status_code == 200
+        return peticion
@@ -0,0 +1,209 @@
+import asyncio
+import contextvars
+import io
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+
+from noticias import benchmark
+from noticias.models import Noticia
+from noticias.presupuesto_consultas import observar_consultas
+
+SIN_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+# --- Peticiones en el propio proceso ---
+
+def _entorno_wsgi(ruta):
+    return {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': ruta, 'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(),
+    }
+
+
+def _peticion_wsgi(aplicacion, ruta):
+    estado = []
+    cuerpo = b''.join(aplicacion(_entorno_wsgi(ruta), lambda status, cabeceras: estado.append(status)))
+    return estado[0].startswith('200') and bool(cuerpo)
+
+
+async def _peticion_asgi(aplicacion, ruta):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': ruta, 'raw_path': ruta.encode(),
+        'query_string': b'', 'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    mensajes = []
+    entrada = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    respondida = asyncio.Event()
+
+    async def recibir():
+        # El cuerpo una vez; después, como un cliente que espera la respuesta
+        if entrada:
+            return entrada.pop()
+        await respondida.wait()
+        return {'type': 'http.disconnect'}
+
+    async def enviar(mensaje):
+        mensajes.append(mensaje)
+        if mensaje['type'] == 'http.response.body' and not mensaje.get('more_body'):
+            respondida.set()
+
+    await aplicacion(scope, recibir, enviar)
+    return mensajes[0].get('status') == 200
+
+
+# --- Peticiones a un servidor externo (gunicorn, uvicorn...) ---
+
+def _peticion_http(url):
+    try:
+        with urllib.request.urlopen(url, timeout=30) as respuesta:
+            return respuesta.status == 200 and bool(respuesta.read())
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def _latencia_sql(milisegundos):
+    # Simula la ida y vuelta a una base de datos en otra máquina
+    def observador(execute, sql, params, many, context):
+        time.sleep(milisegundos / 1000)
+        return execute(sql, params, many, context)
+    return observador
+
+
+# --- Carga concurrente ---
+
+def _resumen(tiempos, errores, total):
+    tiempos.sort()
+    return {
+        'peticiones': len(tiempos),
+        'errores': errores,
+        'peticiones_por_segundo': round(len(tiempos) / total, 2) if total else 0,
+        'p50_ms': round(benchmark.percentil(tiempos, 50), 3),
+        'p95_ms': round(benchmark.percentil(tiempos, 95), 3),
+        'p99_ms': round(benchmark.percentil(tiempos, 99), 3),
+    }
+
+
+def carga_hilos(funcion, peticiones, concurrencia):
+    """``peticiones`` llamadas a ``funcion()`` desde ``concurrencia`` hilos."""
+    tiempos, errores, lock = [], 0, threading.Lock()
+    # Los hilos del pool no heredan las contextvars (observadores de consultas)
+    contexto = contextvars.copy_context()
+
+    def una(_):
+        nonlocal errores
+        inicio = time.perf_counter()
+        correcto = contexto.copy().run(funcion)
+        duracion = (time.perf_counter() - inicio) * 1000
+        with lock:
+            tiempos.append(duracion)
+            errores += not correcto
+
+    inicio_total = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(una, range(peticiones)))
+    return _resumen(tiempos, errores, time.perf_counter() - inicio_total)
+
+
+async def carga_asincrona(funcion, peticiones, concurrencia):
+    """``peticiones`` llamadas a ``await funcion()`` con ``concurrencia`` a la vez."""
+    tiempos, errores = [], 0
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una():
+        nonlocal errores
+        async with semaforo:
+            inicio = time.perf_counter()
+            correcto = await funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            errores += not correcto
+
+    inicio_total = time.perf_counter()
+    await asyncio.gather(*(una() for _ in range(peticiones)))
+    return _resumen(tiempos, errores, time.perf_counter() - inicio_total)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara WSGI (vistas síncronas) con ASGI (vistas asíncronas de la "
+        "portada y la noticia) bajo carga concurrente. Por defecto llama a "
+        "las dos aplicaciones en este proceso; con --url-wsgi/--url-asgi "
+        "mide servidores reales (p. ej. gunicorn y uvicorn)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=200,
+                            help="Peticiones por ruta, modo y nivel de concurrencia")
+        parser.add_argument('--concurrencia', type=int, nargs='*', default=[1, 8, 32])
+        parser.add_argument('--rutas', nargs='*', default=None,
+                            help="Por defecto, la portada y una noticia publicada")
+        parser.add_argument('--con-cache', action='store_true',
+                            help="Deja activa la caché de páginas (por defecto se mide sin ella)")
+        parser.add_argument('--latencia-sql', type=float, default=0,
+                            help="Milisegundos extra por consulta, para simular la red hasta la base de datos")
+        parser.add_argument('--url-wsgi', help="URL base de un servidor WSGI, p. ej. http://localhost:8000")
+        parser.add_argument('--url-asgi', help="URL base de un servidor ASGI, p. ej. http://localhost:8001")
+        parser.add_argument('--salida', help="Guarda el resultado en este archivo JSON")
+
+    def handle(self, *args, **options):
+        rutas = options['rutas']
+        if rutas is None:
+            noticia = Noticia.objects.publicadas().order_by('-id').first()
+            if noticia is None:
+                raise CommandError("No hay noticias publicadas: ejecuta antes 'manage.py seed_noticias'.")
+            rutas = ['/', f'/blog/{noticia.slug}/']
+
+        externo = options['url_wsgi'] or options['url_asgi']
+        ajustes = {} if externo else {'ALLOWED_HOSTS': ['localhost']}
+        if not options['con_cache'] and not externo:
+            ajustes['CACHES'] = SIN_CACHE
+
+        resultado = {
+            'entorno': benchmark.entorno(),
+            'opciones': {clave: options[clave] for clave in ('peticiones', 'concurrencia', 'con_cache', 'latencia_sql')},
+            'escenarios': {},
+        }
+        with override_settings(**ajustes), observar_consultas(_latencia_sql(options['latencia_sql'])):
+            modos = self.modos(options)
+            for ruta in rutas:
+                for concurrencia in options['concurrencia']:
+                    for modo, medir in modos.items():
+                        medir(ruta, 5, concurrencia)  # calentamiento
+                        datos = medir(ruta, options['peticiones'], concurrencia)
+                        resultado['escenarios'][f'{modo} {ruta} c={concurrencia}'] = datos
+                        self.stdout.write(
+                            f"{modo:4} {ruta:40} c={concurrencia:<3} "
+                            f"{datos['peticiones_por_segundo']:8.1f} pet/s  p50 {datos['p50_ms']:8.2f} ms  "
+                            f"p95 {datos['p95_ms']:8.2f} ms  p99 {datos['p99_ms']:8.2f} ms  "
+                            f"errores {datos['errores']}"
+                        )
+
+        if options['salida']:
+            benchmark.guardar(resultado, options['salida'])
+            self.stdout.write(f"Resultado guardado en {options['salida']}")
+
+    def modos(self, options):
+        modos = {}
+        if options['url_wsgi'] or options['url_asgi']:
+            for modo, base in (('wsgi', options['url_wsgi']), ('asgi', options['url_asgi'])):
+                if base:
+                    modos[modo] = lambda ruta, n, c, base=base: carga_hilos(
+                        lambda: _peticion_http(base.rstrip('/') + ruta), n, c)
+            return modos
+
+        # Las mismas aplicaciones que sirven gunicorn/uvicorn, sin la red
+        from ejidonoticias_application.asgi import application as aplicacion_asgi
+        aplicacion_wsgi = get_wsgi_application()
+        modos['wsgi'] = lambda ruta, n, c: carga_hilos(lambda: _peticion_wsgi(aplicacion_wsgi, ruta), n, c)
+        modos['asgi'] = lambda ruta, n, c: asyncio.run(
+            carga_asincrona(lambda: _peticion_asgi(aplicacion_asgi, ruta), n, c))
+        return modos
@@ -0,0 +1,96 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from noticias import contenido
+from noticias.busqueda import actualizar_vectores, buscar, usa_postgres
+from noticias.models import Categoria, Noticia
+from noticias.sembrado import texto_aleatorio
+
+BUSQUEDAS = ["agua", "educacion", "festival música", "reforestación bosque", "torneo de fútbol"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la latencia de la búsqueda de texto completo contra el "
+        "filtro titulo__icontains anterior. ¡Usar solo en una base de pruebas!"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sembrar', type=int, default=0,
+                            help="Crea noticias hasta tener este total (ej. 100000)")
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options['sembrar']:
+            self.sembrar(options['sembrar'])
+
+        total = Noticia.objects.count()
+        motor = "tsvector + GIN" if usa_postgres() else "índice en memoria"
+        self.stdout.write(f"{total} noticias, motor: {motor}\n")
+
+        base = Noticia.objects.publicadas()
+        for query in BUSQUEDAS:
+            antes = self.medir(
+                lambda: base.filter(titulo__icontains=query).order_by('-fecha_publicacion'),
+                options['repeticiones'],
+            )
+            ahora = self.medir(lambda: buscar(base, query), options['repeticiones'])
+            self.stdout.write(
+                f"{query!r:26} icontains p50={antes[0]:8.2f}ms p95={antes[1]:8.2f}ms | "
+                f"búsqueda p50={ahora[0]:8.2f}ms p95={ahora[1]:8.2f}ms"
+            )
+
+    def medir(self, construir_queryset, repeticiones):
+        """
+        Mide lo mismo que hace la vista: COUNT del paginador + primera página.
+        """
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            queryset = construir_queryset()
+            queryset.count()
+            list(queryset[:15])
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        return statistics.median(tiempos), tiempos[int(len(tiempos) * 0.95) - 1]
+
+    def sembrar(self, objetivo):
+        faltan = objetivo - Noticia.objects.count()
+        if faltan <= 0:
+            return
+
+        # bulk_create evita Categoria.save(), que intenta abrir el banner
+        Categoria.objects.bulk_create(
+            [Categoria(nombre='Bench', slug='bench', banner='categorias/bench.webp')],
+            ignore_conflicts=True,
+        )
+        categoria = Categoria.objects.get(slug='bench')
+        self.stdout.write(f"Sembrando {faltan} noticias...")
+        # bulk_create no llama a save(): no se procesan imágenes, contenido ni
+        # signals, así que el contenido se procesa a mano y los vectores se
+        # calculan al final con actualizar_vectores
+        inicio = Noticia.objects.count()
+        lote = []
+        for i in range(inicio, objetivo):
+            lote.append(Noticia(
+                titulo=texto_aleatorio(6).capitalize(),
+                slug=f"bench-{i}",
+                subtitulo=texto_aleatorio(10),
+                contenido="".join(f"<p>{texto_aleatorio(40)}</p>" for _ in range(5)),
+                banner="noticias/banners/bench.webp",
+                categoria=categoria,
+            ))
+            contenido.aplicar(lote[-1])
+            if len(lote) == 5000:
+                self.guardar_lote(lote)
+                lote = []
+        if lote:
+            self.guardar_lote(lote)
+
+    @transaction.atomic
+    def guardar_lote(self, lote):
+        creadas = Noticia.objects.bulk_create(lote)
+        actualizar_vectores(Noticia.objects.filter(pk__in=[n.pk for n in creadas]))
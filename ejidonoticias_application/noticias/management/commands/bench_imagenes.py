@@ -0,0 +1,107 @@
+import io
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from noticias import benchmark
+from noticias.procesos import pool_procesos
+
+# Megapíxeles de prueba, con proporción 4:3 como las fotos de móvil
+TAMANOS_MP = (2, 12, 24, 40)
+
+
+def _crear_jpeg(ruta, megapixeles):
+    from PIL import Image, ImageFilter
+
+    ancho = int((megapixeles * 1e6 * 4 / 3) ** 0.5)
+    alto = int(ancho * 3 / 4)
+    # Ruido suavizado: se comprime como una foto, no como un color plano
+    canales = [Image.effect_noise((ancho // 8, alto // 8), 80).resize((ancho, alto)) for _ in range(3)]
+    img = Image.merge('RGB', canales).filter(ImageFilter.GaussianBlur(2))
+    img.save(ruta, format='JPEG', quality=90)
+    return ancho, alto
+
+
+def _procesar_actual(ruta, directorio):
+    """El flujo real: Noticia.procesar_banner() sobre un storage temporal."""
+    from django.test import override_settings
+    from noticias.models import Noticia
+
+    with override_settings(MEDIA_ROOT=directorio):
+        noticia = Noticia(banner=os.path.relpath(ruta, directorio))
+        noticia.procesar_banner()
+
+
+def _procesar_anterior(ruta, directorio):
+    """
+    Referencia: el algoritmo anterior (decodificación completa, copias del
+    original para cada miniatura y buffers en memoria).
+    """
+    from django.core.files.base import ContentFile
+    from PIL import Image
+
+    img = Image.open(ruta)
+    if img.width > 1920 or img.height > 1080:
+        img.thumbnail((1920, 1080), Image.Resampling.LANCZOS)
+    salidas = []
+    for caja, calidad in (((1920, 1080), 80), ((800, 600), 75), ((300, 200), 70)):
+        copia = img.copy()
+        copia.thumbnail(caja, Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        copia.save(buffer, format='WEBP', quality=calidad)
+        salidas.append(ContentFile(buffer.getvalue()))
+
+
+def _medir_en_proceso(modo, ruta, directorio):
+    # Cada medición corre en un proceso nuevo: ru_maxrss es el máximo de
+    # toda la vida del proceso y no se puede reiniciar.
+    base = benchmark.rss_maximo_kib()
+    inicio = time.perf_counter()
+    (_procesar_actual if modo == 'cascada' else _procesar_anterior)(ruta, directorio)
+    segundos = time.perf_counter() - inicio
+    return {
+        'segundos': round(segundos, 3),
+        'rss_base_kib': base,
+        'rss_pico_kib': benchmark.rss_maximo_kib(),
+        'rss_incremento_kib': benchmark.rss_maximo_kib() - base,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide tiempo y pico de RSS del procesado de banners por tamaño de "
+        "subida, comparando la cascada actual con el algoritmo anterior."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixeles', type=int, nargs='*', default=list(TAMANOS_MP))
+        parser.add_argument('--repeticiones', type=int, default=1)
+        parser.add_argument('--salida', help="Guarda el resultado en este archivo JSON")
+
+    def handle(self, *args, **options):
+        resultado = {'entorno': benchmark.entorno(), 'escenarios': {}}
+        with tempfile.TemporaryDirectory() as directorio:
+            for megapixeles in options['megapixeles']:
+                ruta = os.path.join(directorio, f'foto-{megapixeles}mp.jpg')
+                ancho, alto = _crear_jpeg(ruta, megapixeles)
+                tamano_kib = os.path.getsize(ruta) // 1024
+
+                for modo in ('anterior', 'cascada'):
+                    medidas = []
+                    for _ in range(options['repeticiones']):
+                        with pool_procesos(1) as pool:
+                            medidas.append(pool.submit(_medir_en_proceso, modo, ruta, directorio).result())
+                    datos = min(medidas, key=lambda m: m['segundos'])
+                    datos.update({'ancho': ancho, 'alto': alto, 'archivo_kib': tamano_kib})
+                    resultado['escenarios'][f'{megapixeles}mp_{modo}'] = datos
+                    self.stdout.write(
+                        f"{megapixeles:3d} MP ({ancho}x{alto}, {tamano_kib} KiB) {modo:9} "
+                        f"{datos['segundos']:7.3f}s  RSS +{datos['rss_incremento_kib'] // 1024} MiB "
+                        f"(pico {datos['rss_pico_kib'] // 1024} MiB)"
+                    )
+
+        if options['salida']:
+            benchmark.guardar(resultado, options['salida'])
+            self.stdout.write(f"Resultado guardado en {options['salida']}")
@@ -0,0 +1,126 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from noticias import benchmark
+from noticias.models import Noticia, Tag
+
+SIN_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia (p50/p95/p99), rendimiento, consultas y memoria de las "
+        "vistas públicas y del guardado en el admin, con el cliente de pruebas. "
+        "Sembrar antes con seed_noticias. ¡Usar solo en una base de pruebas!"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=50)
+        parser.add_argument('--calentamiento', type=int, default=5)
+        parser.add_argument('--sin-cache', action='store_true',
+                            help="Usa DummyCache: mide las vistas sin caché de páginas ni tablas")
+        parser.add_argument('--solo', nargs='*', default=None,
+                            help="Nombres de los escenarios a ejecutar")
+        parser.add_argument('--salida', help="Guarda el resultado en este archivo JSON")
+        parser.add_argument('--comparar', help="JSON de una ejecución anterior para comparar")
+
+    def handle(self, *args, **options):
+        noticia = Noticia.objects.publicadas().select_related('categoria').order_by('-fecha_publicacion').first()
+        if noticia is None:
+            raise CommandError("No hay noticias publicadas: ejecuta antes seed_noticias.")
+        tag = Tag.objects.annotate(total=Count('noticias')).order_by('-total').first()
+
+        escenarios = {
+            'index': self.get(reverse('index')),
+            'blog': self.get(reverse('blog', kwargs={'slug': noticia.slug})),
+            'noticias': self.get(reverse('noticias')),
+            'noticias_q': self.get(reverse('noticias') + '?q=agua'),
+            'noticias_categoria': self.get(reverse('noticias') + f'?category={noticia.categoria.slug}'),
+        }
+        if tag is not None:
+            escenarios['noticias_tag'] = self.get(reverse('noticias') + f'?tag={tag.slug}')
+        escenarios['admin_guardar'] = self.guardar_en_admin(noticia)
+        if options['solo']:
+            escenarios = {nombre: f for nombre, f in escenarios.items() if nombre in options['solo']}
+
+        ajustes = {'ALLOWED_HOSTS': ['testserver']}
+        if options['sin_cache']:
+            ajustes['CACHES'] = SIN_CACHE
+
+        with override_settings(**ajustes):
+            resultado = {
+                'entorno': benchmark.entorno(),
+                'noticias': Noticia.objects.count(),
+                'opciones': {clave: options[clave] for clave in ('repeticiones', 'calentamiento', 'sin_cache')},
+                'escenarios': {},
+            }
+            for nombre, funcion in escenarios.items():
+                datos = benchmark.medir(funcion, options['repeticiones'], options['calentamiento'])
+                datos['memoria_pico_kib'] = benchmark.memoria_pico(funcion)
+                resultado['escenarios'][nombre] = datos
+                self.stdout.write(
+                    f"{nombre:20} {datos['peticiones_por_segundo']:8.1f} req/s  "
+                    f"p50={datos['p50_ms']:7.2f}ms p95={datos['p95_ms']:7.2f}ms p99={datos['p99_ms']:7.2f}ms  "
+                    f"consultas={datos['consultas_media']:5.1f}  memoria={datos['memoria_pico_kib']} KiB"
+                    + (f"  errores={datos['errores']}" if datos['errores'] else "")
+                )
+        resultado['rss_max_kib'] = benchmark.rss_maximo_kib()
+        self.stdout.write(f"RSS máximo del proceso: {resultado['rss_max_kib']} KiB")
+
+        if options['salida']:
+            benchmark.guardar(resultado, options['salida'])
+            self.stdout.write(f"Resultado guardado en {options['salida']}")
+        if options['comparar']:
+            with open(options['comparar']) as archivo:
+                anterior = json.load(archivo)
+            self.stdout.write(f"\nComparado con {anterior['entorno'].get('commit') or options['comparar']}:")
+            for linea in benchmark.comparar(resultado, anterior):
+                self.stdout.write(linea)
+
+    def get(self, url):
+        cliente = Client()
+
+        def peticion(i):
+            return cliente.get(url).status_code == 200
+        return peticion
+
+    def guardar_en_admin(self, noticia):
+        """
+        POST al formulario de cambio del admin, como al pulsar "Guardar":
+        validación del formulario, save(), signals e invalidación de cachés.
+        """
+        Usuario = get_user_model()
+        admin, _ = Usuario.objects.get_or_create(
+            username='bench-admin', defaults={'is_staff': True, 'is_superuser': True},
+        )
+        cliente = Client()
+        cliente.force_login(admin)
+        url = reverse('admin:noticias_noticia_change', args=[noticia.pk])
+        # El admin muestra y recibe la fecha en la zona horaria local
+        fecha = timezone.localtime(noticia.fecha_publicacion)
+        datos = {
+            'titulo': noticia.titulo,
+            'slug': noticia.slug,
+            'subtitulo': noticia.subtitulo or '',
+            'contenido': noticia.contenido,
+            'categoria': noticia.categoria_id,
+            'autor': noticia.autor_id or admin.pk,
+            'tags': list(noticia.tags.values_list('pk', flat=True)),
+            'vistas': noticia.vistas,
+            'fecha_publicacion_0': fecha.strftime('%Y-%m-%d'),
+            'fecha_publicacion_1': fecha.strftime('%H:%M:%S'),
+            'publicado': 'on',
+            '_save': 'Guardar',
+        }
+
+        def peticion(i):
+            # Cambiar el contenido en cada guardado para que sea una edición real
+            respuesta = cliente.post(url, dict(datos, subtitulo=f"{datos['subtitulo'][:240]} {i}"))
+            return respuesta.status_code == 302
+        return peticion
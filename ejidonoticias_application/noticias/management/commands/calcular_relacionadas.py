@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from noticias import cache_paginas
+from noticias.relacionadas import calcular_todas
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las noticias relacionadas de todo el archivo (ver "
+        "noticias/relacionadas.py). Los cambios del día a día ya los aplican "
+        "las signals; esto es para después de importar noticias en bloque o "
+        "de cambiar los pesos."
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total, cambiadas = calcular_todas()
+        # Solo se regeneran las páginas cuyas relacionadas cambiaron
+        cache_paginas.invalidar(*(f'noticia:{pk}' for pk in cambiadas))
+        self.stdout.write(self.style.SUCCESS(
+            f"Relacionadas de {total} noticias en {time.perf_counter() - inicio:.1f} s: "
+            f"{len(cambiadas)} cambiaron."
+        ))
@@ -0,0 +1,98 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+
+from noticias import replicas
+from noticias.models import Noticia
+from noticias.presupuesto_consultas import observar_consultas
+
+# Caché propia: sin la caché de páginas todas las visitas llegan a la base de datos
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Comprueba el enrutado a las réplicas (ver noticias/replicas.py): "
+        "anota en qué base de datos se ejecuta cada consulta de las vistas "
+        "públicas en cada situación. Sirve con dos bases SQLite o Postgres."
+    )
+
+    def handle(self, *args, **options):
+        if not replicas.aliases():
+            raise CommandError(
+                "No hay réplicas configuradas: define DB_REPLICAS (o REPLICAS y "
+                "DATABASES['replica_1'] en unos settings locales)."
+            )
+        noticia = Noticia.objects.publicadas().order_by('-id').first()
+        if noticia is None:
+            raise CommandError("No hay noticias publicadas: ejecuta antes 'manage.py seed_noticias'.")
+        rutas = ['/', '/noticias/', f'/blog/{noticia.slug}/']
+
+        fallos = []
+        with override_settings(CACHES=CACHE_LOCAL, ALLOWED_HOSTS=['testserver']):
+            cliente = Client()
+            for ruta in rutas:
+                fallos += self.comprobar(f"Visita anónima a {ruta}", lambda: cliente.get(ruta), replica=True)
+
+            fallos += self.comprobar("Lecturas tras escribir en la misma petición",
+                                     lambda: self.leer_escribir_leer(noticia), replica=None)
+
+            pegado = Client()
+            pegado.cookies[replicas.COOKIE] = self.cookie_tras_guardar()
+            for ruta in rutas:
+                fallos += self.comprobar(f"{ruta} justo después de guardar en el admin",
+                                         lambda: pegado.get(ruta), replica=False)
+
+            replicas.marcar_escritura()
+            fallos += self.comprobar("/ justo después de un cambio de contenido",
+                                     lambda: cliente.get('/'), replica=False)
+
+        if fallos:
+            raise CommandError("Enrutado incorrecto:\n" + "\n".join(fallos))
+        self.stdout.write(self.style.SUCCESS("El enrutado a las réplicas es correcto."))
+
+    def comprobar(self, descripcion, funcion, replica):
+        """
+        Ejecuta ``funcion`` anotando la base de datos de cada lectura.
+        ``replica``: True si todas deben ir a réplicas, False si todas al
+        primario, None si se comprueba dentro de ``funcion``.
+        """
+        lecturas = []
+
+        def observador(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                lecturas.append(context['connection'].alias)
+            return execute(sql, params, many, context)
+
+        with observar_consultas(observador):
+            resultado = funcion()
+
+        if replica is None:
+            errores = resultado
+        else:
+            errores = [alias for alias in lecturas if (alias in replicas.aliases()) != replica]
+        bases = ', '.join(sorted(set(lecturas))) or '-'
+        self.stdout.write(f"{'FALLO' if errores else 'ok   '} {descripcion}: {len(lecturas)} lecturas en {bases}")
+        return [f"{descripcion}: {errores}"] if errores else []
+
+    def leer_escribir_leer(self, noticia):
+        # Lo que hace el router dentro de una vista con @en_replica
+        replica = replicas.aliases()[0]
+        with replicas.leyendo_de(replica):
+            antes = Noticia.objects.filter(pk=noticia.pk).db
+            Noticia.objects.filter(pk=noticia.pk).update(vistas=F('vistas'))
+            despues = Noticia.objects.filter(pk=noticia.pk).db
+        esperado = (replica, DEFAULT_DB_ALIAS)
+        return [] if (antes, despues) == esperado else [f"{(antes, despues)} en vez de {esperado}"]
+
+    def cookie_tras_guardar(self) -> str:
+        # Un POST de un usuario identificado, sin tocar la base de datos
+        request = RequestFactory().post('/admin/noticias/noticia/1/change/')
+        request.user = User(username='comprobar_replicas')
+        respuesta = replicas.ReplicasMiddleware(lambda request: HttpResponse())(request)
+        if replicas.COOKIE not in respuesta.cookies:
+            raise CommandError("ReplicasMiddleware no marcó la escritura con la cookie")
+        return respuesta.cookies[replicas.COOKIE].value
@@ -0,0 +1,91 @@
+import multiprocessing
+import time
+from concurrent.futures import as_completed
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from noticias.procesos import cerrar_conexiones, pool_procesos
+
+# Por debajo de esto no compensa arrancar procesos (cada uno carga Django)
+MIN_PARA_POOL = 50
+PAGINAS_POR_TRABAJO = 25
+
+
+def _exportar(urls, raiz):
+    # Import tardío: este módulo se carga en los hijos antes de django.setup()
+    from noticias import estatico
+
+    try:
+        return estatico.exportar_lote(urls, raiz)
+    finally:
+        cerrar_conexiones()
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta la portada, las noticias publicadas y los listados por "
+        "categoría como HTML estático con versiones .gz/.br (ver "
+        "noticias/estatico.py). Solo rehace las páginas cuyo contenido cambió."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--destino', help="Directorio de salida (por defecto, ESTATICO_DIR)")
+        parser.add_argument('--procesos', type=int, default=multiprocessing.cpu_count(),
+                            help="Procesos del pool (por defecto, uno por núcleo)")
+        parser.add_argument('--todas', action='store_true',
+                            help="Rehace todas las páginas aunque no hayan cambiado")
+        parser.add_argument('--vigilar', action='store_true',
+                            help="Sigue en marcha y exporta en cuanto las signals avisan de cambios")
+        parser.add_argument('--cada', type=float, default=300,
+                            help="Con --vigilar, pasada completa al menos cada N segundos")
+
+    def handle(self, *args, **options):
+        from noticias import estatico
+
+        raiz = Path(options['destino']) if options['destino'] else estatico.destino()
+        todas = options['todas']
+        while True:
+            marca = time.time_ns()
+            self.pasada(estatico, raiz, todas, options['procesos'])
+            if not options['vigilar']:
+                break
+            todas = False
+
+            # Esperamos a que las signals avisen o a que toque la pasada periódica
+            limite = time.monotonic() + options['cada']
+            while time.monotonic() < limite and not estatico.pendiente_desde(marca):
+                time.sleep(1)
+
+    def pasada(self, estatico, raiz, todas, procesos):
+        manifiesto = estatico.leer_manifiesto(raiz)
+        a_renderizar, a_borrar = estatico.obsoletas(manifiesto, todas=todas)
+
+        for url in a_borrar:
+            estatico.borrar(raiz, manifiesto.pop(url)['archivo'])
+
+        inicio = time.time_ns()
+        resultados = {}
+        if len(a_renderizar) < MIN_PARA_POOL or procesos <= 1:
+            resultados = estatico.exportar_lote(a_renderizar, str(raiz))
+        else:
+            trabajos = [a_renderizar[i:i + PAGINAS_POR_TRABAJO]
+                        for i in range(0, len(a_renderizar), PAGINAS_POR_TRABAJO)]
+            with pool_procesos(procesos) as pool:
+                futuros = [pool.submit(_exportar, trabajo, str(raiz)) for trabajo in trabajos]
+                for futuro in as_completed(futuros):
+                    resultados.update(futuro.result())
+                    self.stdout.write(f"{len(resultados)}/{len(a_renderizar)}")
+
+        # Las que dejaron de ser exportables (despublicadas mientras tanto)
+        for url, (grupos, _) in resultados.items():
+            if not grupos and url in manifiesto:
+                estatico.borrar(raiz, manifiesto[url]['archivo'])
+        estatico.registrar(manifiesto, resultados, inicio)
+        estatico.guardar_manifiesto(raiz, manifiesto)
+
+        escritas = sum(1 for _, escrita in resultados.values() if escrita)
+        self.stdout.write(self.style.SUCCESS(
+            f"Exportación: {len(resultados)} renderizadas, {escritas} escritas, "
+            f"{len(a_borrar)} borradas, {len(manifiesto)} en total."
+        ))
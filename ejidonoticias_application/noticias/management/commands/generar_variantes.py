@@ -0,0 +1,80 @@
+import multiprocessing
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from noticias.procesos import cerrar_conexiones, pool_procesos
+
+
+def _generar(tipo, pk):
+    # Import tardío: este módulo se carga en los hijos antes de django.setup()
+    from noticias.models import Categoria, ImagenFuente, Noticia
+    from noticias.variantes import generar_variantes
+
+    modelo = Noticia if tipo == 'noticia' else Categoria
+    try:
+        objeto = modelo.objects.only('banner', 'variantes', 'imagen_fuente').get(pk=pk)
+        variantes = generar_variantes(objeto, tipo)
+        # update() y no save(): no dispara signals ni encola tareas
+        modelo.objects.filter(pk=pk).update(variantes=variantes)
+        if objeto.imagen_fuente_id:
+            # Archivos compartidos (ver deduplicacion.py): también para las demás
+            ImagenFuente.objects.filter(pk=objeto.imagen_fuente_id).update(variantes=variantes)
+            modelo.objects.filter(imagen_fuente=objeto.imagen_fuente_id).update(variantes=variantes)
+        return tipo, pk, len(variantes), None
+    except Exception as error:
+        return tipo, pk, 0, str(error)
+    finally:
+        cerrar_conexiones()
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las variantes AVIF/WebP registradas en noticias/variantes.py para "
+        "los banners existentes. Solo procesa las filas a las que les falta alguna, "
+        "así que se puede interrumpir y volver a lanzar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=multiprocessing.cpu_count(),
+                            help="Procesos del pool (por defecto, uno por núcleo)")
+        parser.add_argument('--todas', action='store_true',
+                            help="Regenera también las filas que ya tienen todas las variantes")
+
+    def handle(self, *args, **options):
+        from noticias import cache_paginas, tablas_globales
+        from noticias.models import Categoria, Noticia
+        from noticias.variantes import faltantes
+
+        pendientes = []
+        for tipo, modelo in (('noticia', Noticia), ('categoria', Categoria)):
+            # Una vez por imagen fuente: las que la comparten reciben lo mismo
+            fuentes = set()
+            for objeto in modelo.objects.exclude(banner='').only('banner', 'variantes', 'imagen_fuente').iterator():
+                if objeto.imagen_fuente_id in fuentes or not (options['todas'] or faltantes(objeto, tipo)):
+                    continue
+                if objeto.imagen_fuente_id:
+                    fuentes.add(objeto.imagen_fuente_id)
+                pendientes.append((tipo, objeto.pk))
+
+        if not pendientes:
+            self.stdout.write("No hay variantes pendientes.")
+            return
+
+        errores = 0
+        with pool_procesos(options['procesos']) as pool:
+            futuros = [pool.submit(_generar, tipo, pk) for tipo, pk in pendientes]
+            for hechos, futuro in enumerate(as_completed(futuros), start=1):
+                tipo, pk, generadas, error = futuro.result()
+                if error:
+                    errores += 1
+                    self.stderr.write(f"{tipo} {pk}: {error}")
+                elif hechos % 50 == 0 or hechos == len(pendientes):
+                    self.stdout.write(f"{hechos}/{len(pendientes)}")
+
+        # update() no pasa por las signals: invalidamos a mano
+        cache_paginas.invalidar('global')  # todas las páginas dependen de 'global'
+        tablas_globales.invalidar('categorias')
+        self.stdout.write(self.style.SUCCESS(
+            f"Variantes generadas para {len(pendientes) - errores} banners ({errores} con error)."
+        ))
@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import ExitStack, nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from noticias.procesos import cerrar_conexiones, pool_procesos
+
+
+def _ejecutar(tarea_id):
+    # Import tardío: este módulo se carga en los hijos antes de django.setup()
+    from noticias.tareas import ejecutar_tarea
+
+    try:
+        return ejecutar_tarea(tarea_id)
+    finally:
+        cerrar_conexiones()
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa noticias de un archivo JSON Lines o CSV por lotes, creando "
+        "las categorías y tags que falten y procesando los banners en un pool "
+        "de procesos (ver noticias/importacion.py). Las noticias cuyo slug ya "
+        "existe se saltan: si se corta, se vuelve a lanzar y sigue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Archivo .jsonl o .csv ('-' para la entrada estándar)")
+        parser.add_argument('--formato', choices=['jsonl', 'csv'],
+                            help="Por defecto, según la extensión del archivo")
+        parser.add_argument('--imagenes',
+                            help="Carpeta de los banners (por defecto, la del archivo)")
+        parser.add_argument('--lote', type=int, default=None,
+                            help="Noticias por transacción")
+        parser.add_argument('--procesos', type=int, default=multiprocessing.cpu_count(),
+                            help="Procesos del pool de banners (por defecto, uno por núcleo)")
+        parser.add_argument('--encolar', action='store_true',
+                            help="No procesa los banners: los deja en la cola de procesar_imagenes")
+
+    def handle(self, *args, **options):
+        from noticias.importacion import TAMANO_LOTE, importar, leer_filas
+
+        archivo = options['archivo']
+        formato = options['formato'] or ('csv' if archivo.lower().endswith('.csv') else 'jsonl')
+        if archivo == '-':
+            imagenes = options['imagenes'] or os.getcwd()
+            entrada = nullcontext(sys.stdin)
+        else:
+            if not os.path.isfile(archivo):
+                raise CommandError(f"No existe {archivo}")
+            imagenes = options['imagenes'] or os.path.dirname(os.path.abspath(archivo))
+            entrada = open(archivo, encoding='utf-8-sig', newline='')
+
+        procesar = not options['encolar']
+        procesos = max(1, options['procesos'])
+        tamano_lote = options['lote'] or TAMANO_LOTE
+        # Banners en vuelo: el siguiente lote se prepara mientras el pool
+        # procesa el anterior, sin acumular futuros
+        max_en_vuelo = max(tamano_lote, procesos * 4)
+
+        inicio = time.perf_counter()
+        totales = Counter()
+        estados = Counter()
+        en_vuelo = set()
+        with ExitStack() as pila:
+            filas = leer_filas(pila.enter_context(entrada), formato)
+            pool = pila.enter_context(pool_procesos(procesos)) if procesar else None
+
+            for lote in importar(filas, imagenes, tamano_lote=tamano_lote, procesar=procesar,
+                                 informar=self.stdout.write):
+                totales.update(leidas=lote.leidas, creadas=lote.creadas,
+                               existentes=lote.existentes, invalidas=len(lote.invalidas))
+                for numero, motivo in lote.invalidas:
+                    self.stderr.write(f"Línea {numero}: {motivo}")
+                if pool is not None:
+                    en_vuelo.update(pool.submit(_ejecutar, tarea_id) for tarea_id in lote.tareas)
+                    while len(en_vuelo) > max_en_vuelo:
+                        hechos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                        estados.update(futuro.result() for futuro in hechos)
+
+                segundos = time.perf_counter() - inicio
+                self.stdout.write(
+                    f"{totales['leidas']} filas ({totales['leidas'] / segundos:.0f} filas/s): "
+                    f"{totales['creadas']} nuevas, {totales['existentes']} ya existían, "
+                    f"{totales['invalidas']} inválidas"
+                )
+
+            segundos = time.perf_counter() - inicio
+            self.stdout.write(self.style.SUCCESS(
+                f"{totales['creadas']} noticias importadas de {totales['leidas']} filas en "
+                f"{segundos:.1f} s ({totales['leidas'] / segundos:.0f} filas/s)."
+            ))
+            if en_vuelo:
+                self.stdout.write(f"Esperando a {len(en_vuelo)} banners...")
+            estados.update(futuro.result() for futuro in wait(en_vuelo).done)
+
+        if procesar:
+            resumen = ', '.join(f"{cantidad} {estado}" for estado, cantidad in sorted(estados.items()))
+            self.stdout.write(f"Banners: {resumen or 'ninguno'} ({time.perf_counter() - inicio:.1f} s en total).")
+        elif totales['creadas']:
+            self.stdout.write("Banners encolados: los procesa 'manage.py procesar_imagenes'.")
@@ -0,0 +1,84 @@
+import os
+import time
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from noticias import deduplicacion, huerfanos
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra (o mueve a una papelera) los archivos de media a los que no "
+        "apunta ninguna noticia ni categoría: banners y miniaturas sustituidos, "
+        "variantes viejas y subidas de CKEditor sin usar (ver "
+        "noticias/huerfanos.py). Probar antes con --dry-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Solo lista los huérfanos, sin tocar nada")
+        parser.add_argument('--papelera',
+                            help="Carpeta local a la que mover los huérfanos en vez de borrarlos "
+                                 "(mejor fuera de MEDIA_ROOT, para que no entre en las copias)")
+        parser.add_argument('--gracia', type=float, default=huerfanos.GRACIA_HORAS,
+                            help="Horas: se respetan los archivos modificados hace menos")
+        parser.add_argument('--carpeta', action='append', dest='carpetas',
+                            help="Carpeta del storage a revisar (repetible). Por defecto, las de "
+                                 "upload_to, CKEDITOR_UPLOAD_PATH y originales")
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        carpetas = [carpeta.strip('/') for carpeta in options['carpetas'] or huerfanos.carpetas_gestionadas()]
+        if '' in carpetas:
+            raise CommandError("Revisar la raíz entera del storage no está permitido: indica carpetas.")
+
+        papelera = options['papelera'] and os.path.abspath(options['papelera'])
+        excluir = frozenset()
+        if papelera:
+            # Si la papelera está dentro del storage, no se revisa a sí misma
+            try:
+                relativa = os.path.relpath(papelera, storage.path(''))
+            except NotImplementedError:
+                relativa = None
+            if relativa and not relativa.startswith('..'):
+                excluir = frozenset({relativa.replace(os.sep, '/')})
+
+        accion = 'Huérfano' if options['dry_run'] else ('Apartado' if papelera else 'Borrado')
+        inicio = time.perf_counter()
+        gracia = timedelta(hours=options['gracia'])
+        if not options['dry_run']:
+            # Imágenes fuente sin uso: sus archivos pasan a ser huérfanos
+            purgadas = deduplicacion.purgar(timezone.now() - gracia)
+            if purgadas:
+                self.stdout.write(f"{purgadas} imágenes fuente sin referencias borradas.")
+        cantidad = bytes_totales = errores = 0
+        self.stdout.write(f"Revisando {', '.join(carpetas)} (gracia de {options['gracia']:g} h)...")
+        for ruta, tamano in huerfanos.huerfanos(storage, carpetas, gracia, excluir):
+            if not options['dry_run']:
+                try:
+                    if papelera:
+                        huerfanos.apartar(storage, ruta, papelera)
+                    else:
+                        storage.delete(ruta)
+                except OSError as error:
+                    errores += 1
+                    self.stderr.write(f"{ruta}: {error}")
+                    continue
+            cantidad += 1
+            bytes_totales += tamano
+            if options['dry_run'] or options['verbosity'] > 1:
+                self.stdout.write(f"{accion}: {ruta} ({tamano // 1024} KiB)")
+
+        resumen = (f"{cantidad} archivos huérfanos, {bytes_totales / 2 ** 20:.1f} MiB, "
+                   f"en {time.perf_counter() - inicio:.1f} s")
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{resumen}. No se ha tocado nada (--dry-run)."))
+        elif papelera:
+            self.stdout.write(self.style.SUCCESS(f"{resumen}: movidos a {papelera}."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{resumen}: borrados."))
+        if errores:
+            self.stderr.write(f"{errores} no se pudieron {'mover' if papelera else 'borrar'}.")
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from noticias import cache_paginas, contenido
+from noticias.models import Noticia
+
+CAMPOS = ['contenido_html', 'palabras', 'tiempo_lectura', 'extracto']
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula los campos derivados del contenido (HTML saneado, palabras, "
+        "tiempo de lectura y extracto) de las noticias existentes, por lotes. "
+        "Solo procesa las que aún no los tienen, así que se puede interrumpir "
+        "y volver a lanzar. Al terminar lista las noticias que pierden "
+        "contenido incrustado (iframes de sitios no permitidos, <object>, "
+        "<embed>) para revisarlas a mano."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500,
+                            help="Noticias por lote (una transacción cada uno)")
+        parser.add_argument('--todas', action='store_true',
+                            help="Reprocesa también las que ya están procesadas")
+
+    def handle(self, *args, **options):
+        filas = Noticia.objects.order_by('pk').only('pk', 'contenido', *CAMPOS)
+        if not options['todas']:
+            filas = filas.filter(contenido_html='')
+        total = filas.count()
+        if not total:
+            self.stdout.write("No hay noticias pendientes.")
+            return
+
+        # Paginación por pk: no depende de qué filas ya se han actualizado
+        procesadas, ultimo = 0, 0
+        afectadas = []
+        while True:
+            lote = list(filas.filter(pk__gt=ultimo)[:options['lote']])
+            if not lote:
+                break
+            for noticia in lote:
+                resultado = contenido.procesar(noticia.contenido)
+                contenido.aplicar(noticia, resultado)
+                if resultado.descartado:
+                    afectadas.append((noticia.pk, resultado.descartado))
+            # bulk_update y no save(): no dispara signals ni encola tareas
+            with transaction.atomic():
+                Noticia.objects.bulk_update(lote, CAMPOS)
+            ultimo = lote[-1].pk
+            procesadas += len(lote)
+            self.stdout.write(f"{procesadas}/{total}")
+
+        # bulk_update no pasa por las signals: invalidamos a mano
+        cache_paginas.invalidar('global')
+        for pk, descartado in afectadas:
+            self.stdout.write(self.style.WARNING(f"Noticia {pk}: se descarta {', '.join(descartado)}"))
+        self.stdout.write(self.style.SUCCESS(f"Contenido procesado en {procesadas} noticias."))
@@ -0,0 +1,60 @@
+import multiprocessing
+import time
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+
+from noticias.procesos import cerrar_conexiones, pool_procesos
+
+
+def _ejecutar(tarea_id):
+    # Import tardío: este módulo se carga en los hijos antes de django.setup()
+    from noticias.tareas import ejecutar_tarea
+
+    try:
+        return tarea_id, ejecutar_tarea(tarea_id)
+    finally:
+        cerrar_conexiones()
+
+
+class Command(BaseCommand):
+    help = "Worker de la cola de imágenes: genera banners y miniaturas pendientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=multiprocessing.cpu_count(),
+                            help="Procesos del pool (por defecto, uno por núcleo)")
+        parser.add_argument('--espera', type=float, default=5,
+                            help="Segundos entre consultas cuando la cola está vacía")
+        parser.add_argument('--una-vez', action='store_true',
+                            help="Procesa lo pendiente y termina")
+
+    def handle(self, *args, **options):
+        from noticias.tareas import devolver_tareas, reclamar_tareas
+
+        procesos = max(1, options['procesos'])
+        pool = pool_procesos(procesos)
+        try:
+            while True:
+                ids = reclamar_tareas(procesos)
+                if not ids:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['espera'])
+                    continue
+
+                futuros = [pool.submit(_ejecutar, tarea_id) for tarea_id in ids]
+                try:
+                    for futuro in as_completed(futuros):
+                        tarea_id, estado = futuro.result()
+                        self.stdout.write(f"Tarea {tarea_id}: {estado}")
+                except BrokenProcessPool:
+                    # Un hijo murió (p. ej. sin memoria) y se lleva el pool: no
+                    # se sabe con qué tarea, así que las del lote sin resultado
+                    # se reintentan con el intento ya contado
+                    devolver_tareas(ids)
+                    self.stderr.write(f"El pool de procesos se cayó con las tareas {ids}: se reintentarán.")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = pool_procesos(procesos)
+        finally:
+            pool.shutdown()
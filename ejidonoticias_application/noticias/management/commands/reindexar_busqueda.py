@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from noticias.busqueda import actualizar_vectores, usa_postgres
+from noticias.models import Noticia
+
+
+class Command(BaseCommand):
+    help = "Recalcula el vector de búsqueda de todas las noticias, por lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000,
+                            help="Noticias por UPDATE (por defecto 2000)")
+
+    def handle(self, *args, **options):
+        if not usa_postgres():
+            actualizar_vectores(Noticia.objects.none())
+            self.stdout.write("SQLite: se usará el índice en memoria, nada que recalcular.")
+            return
+
+        lote = options['lote']
+        ultimo_id = 0
+        total = 0
+        # Recorremos por rangos de id para no bloquear toda la tabla de golpe
+        while True:
+            ids = list(Noticia.objects.filter(pk__gt=ultimo_id)
+                                      .order_by('pk')
+                                      .values_list('pk', flat=True)[:lote])
+            if not ids:
+                break
+            total += actualizar_vectores(Noticia.objects.filter(pk__in=ids))
+            ultimo_id = ids[-1]
+            self.stdout.write(f"  {total} noticias indexadas...")
+
+        self.stdout.write(self.style.SUCCESS(f"Listo: {total} noticias indexadas."))
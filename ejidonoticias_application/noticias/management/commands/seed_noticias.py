@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from noticias.sembrado import sembrar
+
+
+class Command(BaseCommand):
+    help = (
+        "Siembra noticias, categorías y tags de prueba con HTML de CKEditor e "
+        "imágenes reales, para benchmarks (ver bench_paginas). Los datos son "
+        "reproducibles con la misma --semilla. ¡Usar solo en una base de pruebas!"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--noticias', type=int, default=1000,
+                            help="Total de noticias sembradas a alcanzar")
+        parser.add_argument('--categorias', type=int, default=8)
+        parser.add_argument('--tags', type=int, default=40)
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        creadas = sembrar(
+            options['noticias'],
+            categorias=options['categorias'],
+            tags=options['tags'],
+            semilla=options['semilla'],
+            informar=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f"{creadas} noticias nuevas sembradas."))
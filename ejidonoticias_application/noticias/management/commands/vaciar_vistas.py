@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from noticias.contador_vistas import solicitar_vaciado, vaciar_vistas
+
+
+class Command(BaseCommand):
+    help = "Fuerza el vaciado del buffer de vistas a la base de datos."
+
+    def handle(self, *args, **options):
+        # Los workers del servidor comparten la caché: les avisamos para que
+        # vacíen su buffer en la siguiente visita que reciban.
+        solicitar_vaciado()
+        actualizadas = vaciar_vistas()
+        self.stdout.write(self.style.SUCCESS(
+            f"Vaciado solicitado. Noticias actualizadas en este proceso: {actualizadas}"
+        ))
@@ -0,0 +1,417 @@
+"""
+Métricas de rendimiento por petición.
+
+``MetricasMiddleware`` mide, para una muestra de las peticiones
+(``METRICAS_MUESTREO``), el número y el tiempo de las consultas SQL, el
+tiempo de renderizado de plantillas (incluidos los ``{% include %}`` y los
+context processors, que se evalúan al renderizar) y el tiempo total. Los
+devuelve en la cabecera ``Server-Timing`` (visible en las DevTools del
+navegador) y los acumula por nombre de URL en histogramas.
+
+Cada proceso de gunicorn acumula en memoria y vuelca sus histogramas cada
+``METRICAS_INTERVALO`` segundos a un archivo propio en ``METRICAS_DIR``.
+Los archivos de los procesos que ya terminaron se suman a uno acumulado
+(``compactar()``), para que el directorio no crezca con los reinicios.
+El endpoint ``/metricas/`` suma los archivos de todos los procesos y los
+expone en formato de texto de Prometheus. Está protegido con
+``METRICAS_TOKEN`` (cabecera ``Authorization: Bearer ...``); sin token
+configurado solo lo ven los usuarios staff.
+
+Coste en peticiones no muestreadas: una llamada a ``random()``.
+"""
+import atexit
+import contextvars
+import fcntl
+import hmac
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import Template as PlantillaDjango
+
+from .presupuesto_consultas import observar_consultas
+
+# Límites superiores de las cubetas (segundos y número de consultas)
+CUBETAS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CUBETAS_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+HISTOGRAMAS = {
+    'peticion_duracion_segundos': ("Tiempo total de la petición", CUBETAS_SEGUNDOS),
+    'sql_duracion_segundos': ("Tiempo en consultas SQL por petición", CUBETAS_SEGUNDOS),
+    'plantillas_duracion_segundos': ("Tiempo renderizando plantillas por petición", CUBETAS_SEGUNDOS),
+    'sql_consultas': ("Consultas SQL por petición", CUBETAS_CONSULTAS),
+}
+PREFIJO = 'ejidonoticias_'
+
+SIN_RUTA = '<sin_ruta>'
+
+_medicion_actual = contextvars.ContextVar('medicion_actual', default=None)
+
+
+def _ajuste(nombre, por_defecto):
+    return getattr(settings, f'METRICAS_{nombre}', por_defecto)
+
+
+# --- Medición de una petición ---
+
+class Medicion:
+    __slots__ = ('consultas', 'sql', 'plantillas', '_profundidad', '_lock')
+
+    def __init__(self):
+        self.consultas = 0
+        # Suma de todas las consultas: en las vistas asíncronas, que lanzan
+        # varias a la vez, puede superar al tiempo real transcurrido
+        self.sql = 0.0
+        self.plantillas = 0.0
+        self._profundidad = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Observador de consultas (ver presupuesto_consultas.observar_consultas)
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self._lock:
+                self.sql += duracion
+                self.consultas += 1
+
+
+_render_original = PlantillaDjango.render
+
+
+def _render_medido(self, context=None, request=None):
+    medicion = _medicion_actual.get()
+    if medicion is None:
+        return _render_original(self, context, request)
+
+    # Solo cuenta la plantilla exterior: un render_to_string dentro de otro
+    # render no debe sumarse dos veces.
+    medicion._profundidad += 1
+    inicio = time.perf_counter()
+    try:
+        return _render_original(self, context, request)
+    finally:
+        medicion._profundidad -= 1
+        if medicion._profundidad == 0:
+            medicion.plantillas += time.perf_counter() - inicio
+
+
+def _instrumentar_plantillas():
+    if PlantillaDjango.render is not _render_medido:
+        PlantillaDjango.render = _render_medido
+
+
+# --- Acumulación por proceso ---
+
+class Registro:
+    """
+    Histogramas y contadores acumulados desde que arrancó el proceso.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (métrica, vista) -> [conteo por cubeta..., conteo +Inf]
+        self.cubetas = {}
+        self.sumas = defaultdict(float)
+        # (vista, código) -> peticiones
+        self.respuestas = defaultdict(int)
+        self._ultimo_volcado = time.monotonic()
+
+    def observar(self, vista: str, codigo: int, valores: dict) -> None:
+        with self._lock:
+            for metrica, valor in valores.items():
+                limites = HISTOGRAMAS[metrica][1]
+                cubetas = self.cubetas.setdefault((metrica, vista), [0] * (len(limites) + 1))
+                for i, limite in enumerate(limites):
+                    if valor <= limite:
+                        cubetas[i] += 1
+                        break
+                else:
+                    cubetas[-1] += 1
+                self.sumas[(metrica, vista)] += valor
+            self.respuestas[(vista, codigo)] += 1
+
+    def instantanea(self) -> dict:
+        with self._lock:
+            return {
+                'cubetas': [[metrica, vista, list(cubetas)] for (metrica, vista), cubetas in self.cubetas.items()],
+                'sumas': [[metrica, vista, suma] for (metrica, vista), suma in self.sumas.items()],
+                'respuestas': [[vista, codigo, total] for (vista, codigo), total in self.respuestas.items()],
+            }
+
+    def toca_volcar(self) -> bool:
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora - self._ultimo_volcado < _ajuste('INTERVALO', 10):
+                return False
+            self._ultimo_volcado = ahora
+            return True
+
+
+_registro = Registro()
+
+
+def _tras_fork() -> None:
+    # Lo medido antes del fork es del padre: el hijo empieza de cero
+    global _registro
+    _registro = Registro()
+
+
+os.register_at_fork(after_in_child=_tras_fork)
+
+# Lo de los procesos que ya terminaron, sumado por compactar()
+ACUMULADO = 'acumulado.json'
+
+# (pid, nombre) del archivo de este proceso
+_archivo = None
+
+
+def _archivo_proceso() -> str:
+    # Al volcar y no al importar: con 'gunicorn --preload' los workers nacen
+    # de un fork del master y heredarían su nombre. pid + hora de arranque:
+    # un pid reutilizado no pisa el archivo de otro proceso
+    global _archivo
+    pid = os.getpid()
+    if _archivo is None or _archivo[0] != pid:
+        _archivo = (pid, f'{pid}-{time.time_ns()}.json')
+    return _archivo[1]
+
+
+def _directorio() -> Path:
+    return Path(_ajuste('DIR', '/var/tmp/ejidonoticias_metricas'))
+
+
+def _escribir(ruta: Path, datos: dict) -> None:
+    # Reemplazo atómico: quien lee ve el archivo anterior o el nuevo, entero
+    temporal = ruta.with_name(f'.{ruta.name}.tmp')
+    temporal.write_text(json.dumps(datos))
+    os.replace(temporal, ruta)
+
+
+def volcar() -> None:
+    """Escribe la instantánea de este proceso."""
+    directorio = _directorio()
+    directorio.mkdir(parents=True, exist_ok=True)
+    _escribir(directorio / _archivo_proceso(), _registro.instantanea())
+
+
+def _volcar_al_salir():
+    try:
+        volcar()
+    except OSError:
+        pass
+
+
+atexit.register(_volcar_al_salir)
+
+
+# --- Middleware ---
+
+class MetricasMiddleware:
+    """
+    Debe ir el primero de MIDDLEWARE para que el tiempo total incluya al resto.
+    Funciona con WSGI y con ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _instrumentar_plantillas()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= _ajuste('MUESTREO', 1.0):
+            return self.get_response(request)
+
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with observar_consultas(medicion):
+                respuesta = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        return self._registrar(request, respuesta, medicion, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        if random.random() >= _ajuste('MUESTREO', 1.0):
+            return await self.get_response(request)
+
+        # La contextvar llega a los hilos donde se ejecutan las consultas y
+        # se renderizan las plantillas (sync_to_async copia el contexto)
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with observar_consultas(medicion):
+                respuesta = await self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        return self._registrar(request, respuesta, medicion, time.perf_counter() - inicio)
+
+    def _registrar(self, request, respuesta, medicion, total):
+        if _ajuste('SERVER_TIMING', True):
+            respuesta['Server-Timing'] = (
+                f'db;dur={medicion.sql * 1000:.1f};desc="{medicion.consultas} consultas", '
+                f'tpl;dur={medicion.plantillas * 1000:.1f}, '
+                f'total;dur={total * 1000:.1f}'
+            )
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else SIN_RUTA
+        _registro.observar(vista, respuesta.status_code, {
+            'peticion_duracion_segundos': total,
+            'sql_duracion_segundos': medicion.sql,
+            'plantillas_duracion_segundos': medicion.plantillas,
+            'sql_consultas': medicion.consultas,
+        })
+        if _registro.toca_volcar():
+            try:
+                volcar()
+            except OSError:
+                pass
+        return respuesta
+
+
+# --- Exposición en formato Prometheus ---
+
+def autorizado(request) -> bool:
+    token = _ajuste('TOKEN', '')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                   f'Bearer {token}'.encode())
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def _leer(archivo: Path) -> dict | None:
+    try:
+        return json.loads(archivo.read_text())
+    except (OSError, ValueError):
+        return None  # otro proceso lo está reemplazando o borrando
+
+
+def _sumar(total: dict, datos: dict) -> None:
+    for metrica, vista, conteos in datos['cubetas']:
+        if metrica not in HISTOGRAMAS or len(conteos) != len(HISTOGRAMAS[metrica][1]) + 1:
+            continue  # archivo de una versión con otras cubetas
+        actual = total['cubetas'].setdefault((metrica, vista), [0] * len(conteos))
+        for i, conteo in enumerate(conteos):
+            actual[i] += conteo
+    for metrica, vista, suma in datos['sumas']:
+        total['sumas'][(metrica, vista)] += suma
+    for vista, codigo, cantidad in datos['respuestas']:
+        total['respuestas'][(vista, codigo)] += cantidad
+
+
+def _vacio() -> dict:
+    return {'cubetas': {}, 'sumas': defaultdict(float), 'respuestas': defaultdict(int)}
+
+
+def _vivo(archivo: Path) -> bool:
+    try:
+        pid = int(archivo.name.split('-')[0])
+    except ValueError:
+        return True  # no es de un proceso: no se toca
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # existe, de otro usuario
+    return True
+
+
+def compactar() -> int:
+    """
+    Suma a ``ACUMULADO`` los archivos de los procesos que ya no existen y
+    los borra: el directorio no crece con cada reinicio de los workers y
+    los contadores no bajan. Devuelve cuántos se compactaron.
+    """
+    directorio = _directorio()
+    if all(_vivo(archivo) for archivo in directorio.glob('*-*.json')):
+        return 0
+    with open(directorio / '.compactar.lock', 'w') as candado:
+        try:
+            fcntl.flock(candado, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0  # ya compacta otro proceso
+        anterior = _leer(directorio / ACUMULADO) or {'cubetas': [], 'sumas': [], 'respuestas': []}
+        # Sumados en una compactación que no llegó a borrarlos
+        ya_sumados = set(anterior.get('compactados', []))
+        total = _vacio()
+        _sumar(total, anterior)
+        compactados = []
+        for archivo in directorio.glob('*-*.json'):
+            if _vivo(archivo):
+                continue
+            if archivo.name not in ya_sumados:
+                datos = _leer(archivo)
+                if datos is None:
+                    continue
+                _sumar(total, datos)
+            compactados.append(archivo.name)
+        _escribir(directorio / ACUMULADO, {
+            'cubetas': [[metrica, vista, conteos] for (metrica, vista), conteos in total['cubetas'].items()],
+            'sumas': [[metrica, vista, suma] for (metrica, vista), suma in total['sumas'].items()],
+            'respuestas': [[vista, codigo, cantidad] for (vista, codigo), cantidad in total['respuestas'].items()],
+            'compactados': compactados,
+        })
+        for nombre in compactados:
+            (directorio / nombre).unlink(missing_ok=True)
+    return len(compactados)
+
+
+def _sumar_procesos() -> dict:
+    volcar()
+    compactar()
+    total = _vacio()
+    for archivo in _directorio().glob('*.json'):
+        datos = _leer(archivo)
+        if datos is not None:
+            _sumar(total, datos)
+    return total
+
+
+def _etiqueta(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def texto_prometheus() -> str:
+    datos = _sumar_procesos()
+    lineas = []
+    for metrica, (ayuda, limites) in HISTOGRAMAS.items():
+        nombre = PREFIJO + metrica
+        lineas += [f'# HELP {nombre} {ayuda} (peticiones muestreadas)', f'# TYPE {nombre} histogram']
+        for (m, vista), conteos in sorted(datos['cubetas'].items()):
+            if m != metrica:
+                continue
+            etiqueta = _etiqueta(vista)
+            acumulado = 0
+            for limite, conteo in zip(list(limites) + ['+Inf'], conteos):
+                acumulado += conteo
+                lineas.append(f'{nombre}_bucket{{vista="{etiqueta}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{nombre}_sum{{vista="{etiqueta}"}} {datos["sumas"][(metrica, vista)]}')
+            lineas.append(f'{nombre}_count{{vista="{etiqueta}"}} {acumulado}')
+
+    nombre = PREFIJO + 'respuestas_total'
+    lineas += [f'# HELP {nombre} Respuestas por vista y código (peticiones muestreadas)',
+               f'# TYPE {nombre} counter']
+    for (vista, codigo), total in sorted(datos['respuestas'].items()):
+        lineas.append(f'{nombre}{{vista="{_etiqueta(vista)}",codigo="{codigo}"}} {total}')
+
+    nombre = PREFIJO + 'metricas_muestreo'
+    lineas += [f'# HELP {nombre} Fracción de peticiones medidas', f'# TYPE {nombre} gauge',
+               f'{nombre} {_ajuste("MUESTREO", 1.0)}']
+    return '\n'.join(lineas) + '\n'
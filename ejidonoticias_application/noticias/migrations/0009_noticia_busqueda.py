@@ -0,0 +1,48 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# La configuración 'es_unaccent' es la española de PostgreSQL con unaccent
+# delante del stemmer, para que "educación" y "educacion" sean lo mismo.
+SQL_CONFIGURACION = """
+    CREATE EXTENSION IF NOT EXISTS unaccent;
+    CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = pg_catalog.spanish);
+    ALTER TEXT SEARCH CONFIGURATION es_unaccent
+        ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+"""
+
+SQL_INDICE = "CREATE INDEX noticias_noticia_busqueda_gin ON noticias_noticia USING gin (busqueda);"
+
+
+def solo_postgres(sql):
+    """
+    Ejecuta el SQL únicamente en PostgreSQL; en SQLite la búsqueda usa
+    el índice en memoria de busqueda.py.
+    """
+    def ejecutar(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return ejecutar
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('noticias', '0008_prepulate_socialmedia'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            solo_postgres(SQL_CONFIGURACION),
+            reverse_code=solo_postgres("DROP TEXT SEARCH CONFIGURATION IF EXISTS es_unaccent;"),
+        ),
+        migrations.AddField(
+            model_name='noticia',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            solo_postgres(SQL_INDICE),
+            reverse_code=solo_postgres("DROP INDEX IF EXISTS noticias_noticia_busqueda_gin;"),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('noticias', '0010_noticia_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaImagen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('noticia', 'Banner de noticia'), ('categoria', 'Banner de categoría')], max_length=20, verbose_name='Tipo')),
+                ('objeto_id', models.PositiveBigIntegerField(verbose_name='ID del objeto')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completada', 'Completada'), ('fallida', 'Fallida')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('max_intentos', models.PositiveSmallIntegerField(default=3, verbose_name='Máximo de intentos')),
+                ('error', models.TextField(blank=True, verbose_name='Último error')),
+                ('disponible_en', models.DateTimeField(default=django.utils.timezone.now, help_text='Los reintentos esperan hasta esta fecha', verbose_name='Disponible desde')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Creada')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Actualizada')),
+            ],
+            options={
+                'verbose_name': 'Tarea de imagen',
+                'verbose_name_plural': 'Tareas de imágenes',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'disponible_en'], name='tareaimagen_cola_idx')],
+            },
+        ),
+    ]
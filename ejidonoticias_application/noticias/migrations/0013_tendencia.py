@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def crear_tendencias(apps, schema_editor):
+    # Igual que tendencias.puntuacion_inicial: las vistas históricas cuentan
+    # como si hubieran llegado al publicarse la noticia.
+    Noticia = apps.get_model('noticias', 'Noticia')
+    Tendencia = apps.get_model('noticias', 'Tendencia')
+    ahora = timezone.now()
+    vida_media = getattr(settings, 'TENDENCIAS_VIDA_MEDIA', 24)
+
+    lote = []
+    for pk, vistas, fecha in Noticia.objects.values_list('pk', 'vistas', 'fecha_publicacion').iterator():
+        horas = max((ahora - fecha).total_seconds() / 3600, 0)
+        lote.append(Tendencia(noticia_id=pk, puntuacion=vistas * 0.5 ** (horas / vida_media),
+                              vistas_contadas=vistas, fecha_actualizacion=ahora))
+        if len(lote) >= 1000:
+            Tendencia.objects.bulk_create(lote)
+            lote = []
+    Tendencia.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('noticias', '0012_variantes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tendencia',
+            fields=[
+                ('noticia', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tendencia', serialize=False, to='noticias.noticia', verbose_name='Noticia')),
+                ('puntuacion', models.FloatField(default=0, verbose_name='Puntuación')),
+                ('vistas_contadas', models.PositiveIntegerField(default=0, help_text='Vistas de la noticia en el último cálculo', verbose_name='Vistas contadas')),
+                ('fecha_actualizacion', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Actualizada')),
+            ],
+            options={
+                'verbose_name': 'Tendencia',
+                'verbose_name_plural': 'Tendencias',
+                'indexes': [models.Index(fields=['-puntuacion'], name='tendencia_puntuacion_idx')],
+            },
+        ),
+        migrations.RunPython(crear_tendencias, migrations.RunPython.noop),
+    ]
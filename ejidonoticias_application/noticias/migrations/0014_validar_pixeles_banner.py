@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:59
+
+import noticias.imagenes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('noticias', '0013_tendencia'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='categoria',
+            name='banner',
+            field=models.ImageField(default='https://placehold.co/600x400.webp', help_text='Imagen principal de la categoría.', upload_to='categorias/%Y/%m/%d/', validators=[noticias.imagenes.validar_pixeles], verbose_name='Banner Principal'),
+        ),
+        migrations.AlterField(
+            model_name='noticia',
+            name='banner',
+            field=models.ImageField(help_text='Imagen principal. Se redimensionará a 1920x1080 si es más grande.', upload_to='noticias/banners/%Y/%m/%d/', validators=[noticias.imagenes.validar_pixeles], verbose_name='Banner Principal'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('noticias', '0014_validar_pixeles_banner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noticia',
+            name='contenido_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='Contenido saneado'),
+        ),
+        migrations.AddField(
+            model_name='noticia',
+            name='extracto',
+            field=models.CharField(blank=True, editable=False, max_length=300, verbose_name='Extracto'),
+        ),
+        migrations.AddField(
+            model_name='noticia',
+            name='palabras',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Palabras'),
+        ),
+        migrations.AlterField(
+            model_name='noticia',
+            name='tiempo_lectura',
+            field=models.PositiveSmallIntegerField(default=1, editable=False, help_text='Tiempo estimado de lectura en minutos, calculado a partir del contenido', verbose_name='Tiempo de lectura (min)'),
+        ),
+    ]
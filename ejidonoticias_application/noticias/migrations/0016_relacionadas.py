@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def calcular_relacionadas(apps, schema_editor):
+    # relacionadas.py no importa los modelos: recibe los de la migración
+    from noticias.relacionadas import calcular_todas
+
+    calcular_todas(apps.get_model('noticias', 'Noticia'), apps.get_model('noticias', 'Relacionada'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('noticias', '0015_contenido_procesado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Relacionada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicion', models.PositiveSmallIntegerField(verbose_name='Posición')),
+                ('puntuacion', models.FloatField(verbose_name='Puntuación')),
+                ('noticia', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='relacionadas', to='noticias.noticia', verbose_name='Noticia')),
+                ('relacionada', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='como_relacionada', to='noticias.noticia', verbose_name='Relacionada')),
+            ],
+            options={
+                'verbose_name': 'Noticia relacionada',
+                'verbose_name_plural': 'Noticias relacionadas',
+                'constraints': [models.UniqueConstraint(fields=('noticia', 'posicion'), name='relacionada_noticia_posicion_uniq')],
+            },
+        ),
+        migrations.RunPython(calcular_relacionadas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def calcular_facetas(apps, schema_editor):
+    # facetas.py no importa los modelos: recibe los de la migración
+    from noticias.facetas import recalcular_todas
+
+    recalcular_todas(apps.get_model('noticias', 'Noticia'), apps.get_model('noticias', 'ContadorFaceta'))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('noticias', '0016_relacionadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorFaceta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0, verbose_name='Noticias')),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='noticias.categoria', verbose_name='Categoría')),
+                ('tag', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='noticias.tag', verbose_name='Tag')),
+            ],
+            options={
+                'verbose_name': 'Contador de faceta',
+                'verbose_name_plural': 'Contadores de facetas',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('categoria__isnull', False), ('tag__isnull', False)), fields=('categoria', 'tag'), name='contador_faceta_par_uniq'), models.UniqueConstraint(condition=models.Q(('tag__isnull', True)), fields=('categoria',), name='contador_faceta_categoria_uniq'), models.UniqueConstraint(condition=models.Q(('categoria__isnull', True)), fields=('tag',), name='contador_faceta_tag_uniq'), models.CheckConstraint(condition=models.Q(('categoria__isnull', False), ('tag__isnull', False), _connector='OR'), name='contador_faceta_no_vacio')],
+            },
+        ),
+        migrations.RunPython(calcular_facetas, migrations.RunPython.noop),
+    ]
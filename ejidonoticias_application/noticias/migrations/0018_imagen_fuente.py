@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('noticias', '0017_contadores_facetas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImagenFuente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('tipo', models.CharField(choices=[('noticia', 'Banner de noticia'), ('categoria', 'Banner de categoría')], max_length=20, verbose_name='Tipo')),
+                ('original', models.CharField(blank=True, help_text='Vacío cuando ya no hace falta (procesada)', max_length=255, verbose_name='Original')),
+                ('banner', models.CharField(blank=True, help_text='Vacío mientras no se haya procesado', max_length=255, verbose_name='Banner')),
+                ('banner_medium', models.CharField(blank=True, max_length=255, verbose_name='Banner mediano')),
+                ('banner_small', models.CharField(blank=True, max_length=255, verbose_name='Banner pequeño')),
+                ('variantes', models.JSONField(blank=True, default=dict, verbose_name='Variantes')),
+                ('referencias', models.IntegerField(default=0, help_text='Noticias o categorías que la usan', verbose_name='Referencias')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Creada')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Actualizada')),
+            ],
+            options={
+                'verbose_name': 'Imagen fuente',
+                'verbose_name_plural': 'Imágenes fuente',
+                'constraints': [models.UniqueConstraint(fields=('sha256', 'tipo'), name='imagenfuente_sha256_tipo_uniq')],
+            },
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='imagen_fuente',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='categorias', to='noticias.imagenfuente'),
+        ),
+        migrations.AddField(
+            model_name='noticia',
+            name='imagen_fuente',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='noticias', to='noticias.imagenfuente'),
+        ),
+    ]
@@ -1,11 +1,12 @@
 from django.db import models
-import os
-import io
 from PIL import Image, ImageOps
 from django.conf import settings
 from django.utils import timezone
-from django.core.files.base import ContentFile # <--- Importación necesaria
 from ckeditor_uploader.fields import RichTextUploadingField
+from django.contrib.postgres.search import SearchVectorField
+from . import contenido as procesado_contenido
+from . import deduplicacion
+from .imagenes import abrir_reducida, cascada, guardar_en_campo, validar_pixeles
 
 # --- Modelo de Categorías ---
 # Una noticia pertenece a UNA categoría (Relación Uno a Muchos)
@@ -18,8 +19,14 @@ class Categoria(models.Model):
         upload_to='categorias/%Y/%m/%d/',
         verbose_name="Banner Principal",
         help_text="Imagen principal de la categoría.",
+        validators=[validar_pixeles],
         default="https://placehold.co/600x400.webp"
     )
+    # Variantes responsivas generadas (clave -> ruta). Ver variantes.py
+    variantes = models.JSONField(default=dict, blank=True, editable=False)
+    # Imagen compartida de la que salen banner y variantes (ver deduplicacion.py)
+    imagen_fuente = models.ForeignKey('ImagenFuente', on_delete=models.PROTECT, null=True, blank=True,
+                                      editable=False, related_name='categorias')
 
     class Meta:
         verbose_name = "Categoría"
@@ -31,10 +38,15 @@ class Categoria(models.Model):
 
     # --- INICIO: LÓGICA DE PROCESAMIENTO DE IMAGEN ---
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, procesar_imagenes=True, **kwargs):
         """
         Sobrescribe el guardado para procesar el banner de la categoría.
+        El procesado se encola (ver tareas.py): aquí solo se guarda el original.
         """
+        if not procesar_imagenes:
+            super().save(*args, **kwargs)
+            return
+
         try:
             instancia_db = Categoria.objects.get(pk=self.pk)
             banner_antiguo = instancia_db.banner
@@ -43,23 +55,30 @@ class Categoria(models.Model):
             banner_antiguo = None
 
         procesar_imagen = False
+        fuente_anterior = instancia_db.imagen_fuente_id if instancia_db else None
         
-        # Comprobamos que 'self.banner' tenga el atributo 'file'.
-        # Esto es crucial para filtrar el 'default' (que es un string)
-        # y procesar solo cuando se sube un archivo nuevo.
-        if self.banner and hasattr(self.banner, 'file'):
+        # Solo procesamos cuando se sube un archivo nuevo ('_committed' es
+        # False hasta que se escribe en el storage). Así se filtra también
+        # el 'default', que es un string y no un archivo.
+        if self.banner and not self.banner._committed:
             if not instancia_db or banner_antiguo != self.banner:
                 procesar_imagen = True
 
         if procesar_imagen:
-            self.procesar_banner_categoria()
-            
-            # Opcional: Borrar el banner antiguo si existía y era un archivo
-            if instancia_db and banner_antiguo and banner_antiguo != self.banner:
+            # Opcional: Borrar el banner antiguo si existía y era un archivo.
+            # Los de una imagen fuente se comparten: los borra limpiar_media
+            if instancia_db and banner_antiguo and banner_antiguo != self.banner and not fuente_anterior:
                 if hasattr(banner_antiguo, 'path'): # No intentar borrar el default
                     banner_antiguo.storage.delete(banner_antiguo.name)
 
+            # Si ya se procesó una imagen idéntica, se reutiliza sin tarea
+            procesar_imagen = not deduplicacion.asignar(self, 'categoria', self.banner.file).procesada
+
         super().save(*args, **kwargs)
+        deduplicacion.contar(fuente_anterior, self.imagen_fuente_id)
+
+        if procesar_imagen:
+            TareaImagen.encolar(self)
 
     def procesar_banner_categoria(self):
         """
@@ -68,10 +87,11 @@ class Categoria(models.Model):
         if not self.banner or not hasattr(self.banner, 'file'):
             return
 
-        img = Image.open(self.banner)
-        
         # Definimos el tamaño exacto
         tamano_deseado = (614, 256)
+
+        # Decodificamos ya reducida: nunca tenemos el original entero en memoria
+        img = abrir_reducida(self.banner, tamano_deseado, cubrir=True)
         
         # --- 1. Redimensionar y Recortar ---
         # ImageOps.fit() escala y recorta la imagen para que coincida
@@ -79,20 +99,13 @@ class Categoria(models.Model):
         # Esto evita que la imagen se estire o distorsione.
         img_procesada = ImageOps.fit(img, tamano_deseado, Image.Resampling.LANCZOS)
 
-        # Obtenemos la ruta base y el nombre (sin extensión)
-        ruta_base_nombre, _ = os.path.splitext(self.banner.name)
-        
-        # --- 2. Guardar como WebP ---
-        buffer_banner = io.BytesIO()
-        img_procesada.save(buffer_banner, format='WEBP', quality=85)
-        
-        # Generamos el nuevo nombre de archivo
-        nombre_banner = f"{ruta_base_nombre}.webp"
+        # Obtenemos el nombre (sin extensión ni carpeta: el original ya está
+        # guardado y upload_to volverá a poner la carpeta de la fecha)
+        ruta_base_nombre = deduplicacion.nombre_base(self.banner.name)
         
-        # Asignamos el nuevo archivo usando el método .save() del campo
-        self.banner.save(nombre_banner, 
-                         ContentFile(buffer_banner.getvalue()), 
-                         save=False) # save=False para evitar bucle
+        # --- 2. Guardar como WebP (save=False para evitar bucle) ---
+        guardar_en_campo(self.banner, f"{ruta_base_nombre}.webp",
+                         img_procesada, 'WEBP', quality=85)
 
     # --- FIN: LÓGICA DE PROCESAMIENTO ---
 
@@ -125,7 +138,47 @@ class RedSocial(models.Model):
     def __str__(self):
         return self.nombre
 
+# --- QuerySet de Noticias ---
+# Centraliza qué columnas y relaciones cargan las vistas, para que cada
+# plantilla reciba exactamente lo que pinta y no haya consultas N+1.
+class NoticiaQuerySet(models.QuerySet):
+
+    # Campos que usan las tarjetas de los listados (grid, relacionadas,
+    # populares, banner del inicio). 'contenido' queda fuera a propósito.
+    CAMPOS_TARJETA = (
+        'id', 'titulo', 'slug', 'banner', 'banner_medium', 'banner_small', 'variantes',
+        'vistas', 'tiempo_lectura', 'extracto', 'fecha_publicacion',
+        'categoria__id', 'categoria__nombre', 'categoria__slug',
+        'autor__id', 'autor__username',
+    )
+
+    def publicadas(self):
+        return self.filter(publicado=True)
+
+    def tarjetas(self):
+        """
+        Proyección ligera para listados: categoría y autor en el mismo JOIN,
+        sin cargar el cuerpo de la noticia.
+        """
+        return self.select_related('categoria', 'autor').only(*self.CAMPOS_TARJETA)
+
+    def detalle(self):
+        """
+        Noticia completa para la página del artículo, con sus tags precargados.
+        """
+        return self.select_related('categoria', 'autor').prefetch_related('tags')
+
+
 # --- Modelo Principal: Noticia ---
+# Banner y miniaturas de cada noticia: (caja, calidad WebP, campo, sufijo),
+# de mayor a menor porque cada una se genera a partir de la anterior.
+TAMANOS_BANNER = (
+    ((1920, 1080), 80, 'banner', ''),
+    ((800, 600), 75, 'banner_medium', '-medium'),
+    ((300, 200), 70, 'banner_small', '-small'),
+)
+
+
 class Noticia(models.Model):
     # ... (campos: titulo, slug, subtitulo, contenido) ...
     titulo = models.CharField(max_length=255, verbose_name="Título")
@@ -133,12 +186,18 @@ class Noticia(models.Model):
                             help_text="URL amigable, autogenerada o manual. Ej: 'mi-gran-noticia-2025'")
     subtitulo = models.CharField(max_length=255, blank=True, null=True, verbose_name="Subtítulo")
     contenido = RichTextUploadingField(verbose_name="Contenido")
+    # --- Derivados de 'contenido', calculados al guardar (ver contenido.py) ---
+    contenido_html = models.TextField(blank=True, editable=False,
+                                      verbose_name="Contenido saneado")
+    palabras = models.PositiveIntegerField(default=0, editable=False, verbose_name="Palabras")
+    extracto = models.CharField(max_length=300, blank=True, editable=False, verbose_name="Extracto")
     
     # --- Banner y Thumbnails ---
     banner = models.ImageField(
         upload_to='noticias/banners/%Y/%m/%d/',
         verbose_name="Banner Principal",
-        help_text="Imagen principal. Se redimensionará a 1920x1080 si es más grande."
+        help_text="Imagen principal. Se redimensionará a 1920x1080 si es más grande.",
+        validators=[validar_pixeles],
     )
     # --- NUEVOS CAMPOS PARA THUMBNAILS ---
     banner_medium = models.ImageField(
@@ -153,6 +212,11 @@ class Noticia(models.Model):
         blank=True, null=True,
         editable=False # Oculto en el admin, se genera solo
     )
+    # Variantes responsivas AVIF/WebP (clave -> ruta). Ver variantes.py
+    variantes = models.JSONField(default=dict, blank=True, editable=False)
+    # Imagen compartida de la que salen banners y variantes (ver deduplicacion.py)
+    imagen_fuente = models.ForeignKey('ImagenFuente', on_delete=models.PROTECT, null=True, blank=True,
+                                      editable=False, related_name='noticias')
     # --- Fin de nuevos campos ---
     
     # ... (campos: categoria, autor, tags) ...
@@ -180,9 +244,10 @@ class Noticia(models.Model):
     vistas = models.PositiveIntegerField(default=0, verbose_name="Vistas",
                                        help_text="Contador de vistas")
     tiempo_lectura = models.PositiveSmallIntegerField(
-        default=5,
+        default=1,
+        editable=False,
         verbose_name="Tiempo de lectura (min)",
-        help_text="Tiempo estimado de lectura en minutos"
+        help_text="Tiempo estimado de lectura en minutos, calculado a partir del contenido"
     )
     fecha_publicacion = models.DateTimeField(
         default=timezone.now,
@@ -194,86 +259,257 @@ class Noticia(models.Model):
     )
     publicado = models.BooleanField(default=True, verbose_name="¿Publicado?")
 
+    # tsvector para la búsqueda de texto completo (ver busqueda.py).
+    # Se mantiene con signals; el índice GIN se crea en la migración 0009.
+    busqueda = SearchVectorField(null=True, editable=False)
+
+    objects = NoticiaQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Noticia"
         verbose_name_plural = "Noticias"
         ordering = ['-fecha_publicacion']
+        indexes = [
+            # Paginación por cursor del listado (ver paginacion.py)
+            models.Index(fields=['-fecha_publicacion', '-id'], name='noticia_fecha_id_idx'),
+        ]
 
     def __str__(self):
         return self.titulo
 
     # --- INICIO: LÓGICA DE PROCESAMIENTO DE IMÁGENES ---
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, procesar_imagenes=True, **kwargs):
         """
-        Sobrescribe el guardado para procesar el banner.
+        Sobrescribe el guardado para procesar el contenido y el banner.
+        El contenido se procesa aquí mismo (es barato); el banner se encola
+        (ver tareas.py): aquí solo se guarda el original y las plantillas lo
+        usan hasta que existan las versiones reducidas.
         """
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'contenido' in update_fields:
+            campos = procesado_contenido.aplicar(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *campos}
+
+        if not procesar_imagenes:
+            super().save(*args, **kwargs)
+            return
+
         try:
             instancia_db = Noticia.objects.get(pk=self.pk)
         except Noticia.DoesNotExist:
             instancia_db = None
 
         # Procesar solo si el banner es nuevo o cambió
-        if not instancia_db or (instancia_db.banner != self.banner):
-            if self.banner:
-                self.procesar_banner()
+        procesar_imagen = bool(self.banner) and (not instancia_db or instancia_db.banner != self.banner)
+        fuente_anterior = instancia_db.imagen_fuente_id if instancia_db else None
+
+        if procesar_imagen:
+            # Las miniaturas anteriores ya no corresponden al banner nuevo
+            self.banner_medium = None
+            self.banner_small = None
+            self.variantes = {}
+            self.imagen_fuente = None
+            # Subida nueva: se guarda por contenido y, si ya se procesó
+            # una imagen idéntica, se reutiliza sin tarea (ver deduplicacion.py)
+            if not self.banner._committed:
+                procesar_imagen = not deduplicacion.asignar(self, 'noticia', self.banner.file).procesada
 
         super().save(*args, **kwargs)
+        deduplicacion.contar(fuente_anterior, self.imagen_fuente_id)
+
+        if procesar_imagen:
+            TareaImagen.encolar(self)
+
+    # --- URLs con respaldo: el original mientras no existan las miniaturas ---
+
+    @property
+    def banner_medium_url(self):
+        return (self.banner_medium or self.banner).url
+
+    @property
+    def banner_small_url(self):
+        return (self.banner_small or self.banner).url
 
     def procesar_banner(self):
         """
         Redimensiona, convierte a WebP y crea thumbnails del banner.
-        (Versión corregida usando el método .save() del campo)
         """
         if not self.banner:
             return
 
-        img = Image.open(self.banner)
-        
-        # 1. Redimensionar Banner Principal
-        if img.width > 1920 or img.height > 1080:
-            img.thumbnail((1920, 1080), Image.Resampling.LANCZOS)
+        # Decodificamos ya reducida al tamaño del banner (draft en JPEG)
+        img = abrir_reducida(self.banner, TAMANOS_BANNER[0][0])
 
-        # Obtenemos el nombre base (sin extensión) y la ruta
-        # Ej: 'noticias/banners/2025/11/14/mi-foto'
-        ruta_base_nombre, _ = os.path.splitext(self.banner.name)
-        
-        # --- 2. Guardar Banner Principal como WebP ---
-        buffer_banner = io.BytesIO()
-        img.save(buffer_banner, format='WEBP', quality=80)
-        
-        # Generamos el nuevo nombre de archivo
-        nombre_banner = f"{ruta_base_nombre}.webp"
-        
-        # Forma correcta:
-        # Llama a .save() EN EL CAMPO, no en el modelo
-        # (save=False evita que se guarde el modelo, solo asigna el archivo)
-        self.banner.save(nombre_banner, 
-                         ContentFile(buffer_banner.getvalue()), 
-                         save=False)
-
-        # --- 3. Crear Thumbnail Mediano (800px ancho) ---
-        thumb_medium = img.copy()
-        thumb_medium.thumbnail((800, 600), Image.Resampling.LANCZOS)
-        
-        buffer_medium = io.BytesIO()
-        thumb_medium.save(buffer_medium, format='WEBP', quality=75)
-        
-        nombre_medium = f"{ruta_base_nombre}-medium.webp"
-        self.banner_medium.save(nombre_medium, 
-                                ContentFile(buffer_medium.getvalue()), 
-                                save=False)
-
-        # --- 4. Crear Thumbnail Pequeño (300px ancho) ---
-        thumb_small = img.copy()
-        thumb_small.thumbnail((300, 200), Image.Resampling.LANCZOS)
-        
-        buffer_small = io.BytesIO()
-        thumb_small.save(buffer_small, format='WEBP', quality=70)
-        
-        nombre_small = f"{ruta_base_nombre}-small.webp"
-        self.banner_small.save(nombre_small, 
-                               ContentFile(buffer_small.getvalue()), 
-                               save=False)
+        # Obtenemos el nombre base (sin extensión ni carpeta: upload_to la
+        # vuelve a poner). Ej: 'noticias/banners/2025/11/14/mi-foto' -> 'mi-foto'
+        ruta_base_nombre = deduplicacion.nombre_base(self.banner.name)
+
+        # Banner, mediano y pequeño: cada uno se reduce desde el anterior.
+        # .save() EN EL CAMPO con save=False: solo asigna el archivo.
+        for (_, calidad, campo, sufijo), reducida in cascada(img, TAMANOS_BANNER):
+            guardar_en_campo(getattr(self, campo), f"{ruta_base_nombre}{sufijo}.webp",
+                             reducida, 'WEBP', quality=calidad)
+
+    # --- FIN: LÓGICA DE PROCESAMIENTO DE IMÁGENES ---
+
+# --- Cola de tareas de imágenes ---
+# Procesar banners (decodificar, redimensionar, codificar WebP) tarda
+# segundos: se hace fuera de la petición, en 'manage.py procesar_imagenes'.
+class TareaImagen(models.Model):
+
+    class Tipo(models.TextChoices):
+        BANNER_NOTICIA = 'noticia', 'Banner de noticia'
+        BANNER_CATEGORIA = 'categoria', 'Banner de categoría'
+
+    class Estado(models.TextChoices):
+        PENDIENTE = 'pendiente', 'Pendiente'
+        PROCESANDO = 'procesando', 'Procesando'
+        COMPLETADA = 'completada', 'Completada'
+        FALLIDA = 'fallida', 'Fallida'
+
+    tipo = models.CharField(max_length=20, choices=Tipo.choices, verbose_name="Tipo")
+    objeto_id = models.PositiveBigIntegerField(verbose_name="ID del objeto")
+    estado = models.CharField(max_length=20, choices=Estado.choices,
+                              default=Estado.PENDIENTE, verbose_name="Estado")
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name="Intentos")
+    max_intentos = models.PositiveSmallIntegerField(default=3, verbose_name="Máximo de intentos")
+    error = models.TextField(blank=True, verbose_name="Último error")
+    disponible_en = models.DateTimeField(default=timezone.now, verbose_name="Disponible desde",
+                                         help_text="Los reintentos esperan hasta esta fecha")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Creada")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Actualizada")
+
+    class Meta:
+        verbose_name = "Tarea de imagen"
+        verbose_name_plural = "Tareas de imágenes"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_en'], name='tareaimagen_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.objeto_id} ({self.get_estado_display()})"
+
+    @classmethod
+    def encolar(cls, objeto):
+        """
+        Crea la tarea para procesar el banner del objeto, salvo que ya
+        haya una pendiente para él.
+        """
+        tipo = cls.Tipo.BANNER_NOTICIA if isinstance(objeto, Noticia) else cls.Tipo.BANNER_CATEGORIA
+        tarea, _ = cls.objects.get_or_create(
+            tipo=tipo, objeto_id=objeto.pk, estado=cls.Estado.PENDIENTE,
+        )
+        return tarea
+
+
+# --- Imágenes por contenido (ver deduplicacion.py) ---
+# Una fila por imagen subida (su SHA-256) y tipo de banner: el original y lo
+# que se generó a partir de él, para reutilizarlo si se vuelve a subir.
+class ImagenFuente(models.Model):
+    sha256 = models.CharField(max_length=64, verbose_name="SHA-256")
+    tipo = models.CharField(max_length=20, choices=TareaImagen.Tipo.choices, verbose_name="Tipo")
+    original = models.CharField(max_length=255, blank=True, verbose_name="Original",
+                                help_text="Vacío cuando ya no hace falta (procesada)")
+    banner = models.CharField(max_length=255, blank=True, verbose_name="Banner",
+                              help_text="Vacío mientras no se haya procesado")
+    banner_medium = models.CharField(max_length=255, blank=True, verbose_name="Banner mediano")
+    banner_small = models.CharField(max_length=255, blank=True, verbose_name="Banner pequeño")
+    variantes = models.JSONField(default=dict, blank=True, verbose_name="Variantes")
+    referencias = models.IntegerField(default=0, verbose_name="Referencias",
+                                      help_text="Noticias o categorías que la usan")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Creada")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Actualizada")
+
+    class Meta:
+        verbose_name = "Imagen fuente"
+        verbose_name_plural = "Imágenes fuente"
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'tipo'], name='imagenfuente_sha256_tipo_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.get_tipo_display()}, {self.referencias} refs)"
 
-    # --- FIN: LÓGICA DE PROCESAMIENTO DE IMÁGENES ---
\ No newline at end of file
+    @property
+    def procesada(self) -> bool:
+        return bool(self.banner)
+
+
+# --- Tendencias ---
+# Puntuación de "lo más visto" con decaimiento exponencial, precalculada por
+# 'manage.py actualizar_tendencias' (ver noticias/tendencias.py).
+class Tendencia(models.Model):
+    noticia = models.OneToOneField(Noticia, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='tendencia', verbose_name="Noticia")
+    puntuacion = models.FloatField(default=0, verbose_name="Puntuación")
+    vistas_contadas = models.PositiveIntegerField(default=0, verbose_name="Vistas contadas",
+                                                  help_text="Vistas de la noticia en el último cálculo")
+    fecha_actualizacion = models.DateTimeField(default=timezone.now, verbose_name="Actualizada")
+
+    class Meta:
+        verbose_name = "Tendencia"
+        verbose_name_plural = "Tendencias"
+        indexes = [
+            models.Index(fields=['-puntuacion'], name='tendencia_puntuacion_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.noticia_id}: {self.puntuacion:.2f}"
+
+
+# --- Noticias relacionadas precalculadas (ver relacionadas.py) ---
+
+class Relacionada(models.Model):
+    noticia = models.ForeignKey(Noticia, on_delete=models.CASCADE, related_name='relacionadas',
+                                db_index=False,  # lo cubre el índice único con la posición
+                                verbose_name="Noticia")
+    relacionada = models.ForeignKey(Noticia, on_delete=models.CASCADE, related_name='como_relacionada',
+                                    verbose_name="Relacionada")
+    posicion = models.PositiveSmallIntegerField(verbose_name="Posición")
+    puntuacion = models.FloatField(verbose_name="Puntuación")
+
+    class Meta:
+        verbose_name = "Noticia relacionada"
+        verbose_name_plural = "Noticias relacionadas"
+        constraints = [
+            models.UniqueConstraint(fields=['noticia', 'posicion'], name='relacionada_noticia_posicion_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.noticia_id} -> {self.relacionada_id} ({self.puntuacion:.3f})"
+
+
+# --- Recuentos de las facetas del listado (ver facetas.py) ---
+# Noticias publicadas por categoría (tag vacío), por tag (categoría vacía)
+# y por cada par categoría-tag. Las signals los mantienen al día.
+
+class ContadorFaceta(models.Model):
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, null=True, blank=True,
+                                  related_name='+', verbose_name="Categoría")
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, null=True, blank=True,
+                            related_name='+', verbose_name="Tag")
+    # Sin PositiveIntegerField: si el contador se desviara (p. ej. un
+    # bulk_create sin recalcular), restar no debe romper el guardado
+    total = models.IntegerField(default=0, verbose_name="Noticias")
+
+    class Meta:
+        verbose_name = "Contador de faceta"
+        verbose_name_plural = "Contadores de facetas"
+        constraints = [
+            # Índices parciales: NULL no choca con NULL en un índice único
+            models.UniqueConstraint(fields=['categoria', 'tag'],
+                                    condition=models.Q(categoria__isnull=False, tag__isnull=False),
+                                    name='contador_faceta_par_uniq'),
+            models.UniqueConstraint(fields=['categoria'], condition=models.Q(tag__isnull=True),
+                                    name='contador_faceta_categoria_uniq'),
+            models.UniqueConstraint(fields=['tag'], condition=models.Q(categoria__isnull=True),
+                                    name='contador_faceta_tag_uniq'),
+            models.CheckConstraint(condition=models.Q(categoria__isnull=False) | models.Q(tag__isnull=False),
+                                   name='contador_faceta_no_vacio'),
+        ]
+
+    def __str__(self):
+        return f"{self.categoria_id or '*'} / {self.tag_id or '*'}: {self.total}"
@@ -0,0 +1,95 @@
+"""
+Paginación por cursor (keyset) para los listados de noticias.
+
+En lugar de ``OFFSET n`` + ``COUNT(*)``, cada página se pide "a partir de"
+la última noticia vista, usando el par (fecha_publicacion, id) que tiene
+índice compuesto. El coste de una página es el mismo sea la primera o la
+número mil, y no hace falta contar el total.
+
+Los cursores viajan en la URL como un token opaco (base64).
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+# Dirección del cursor: hacia noticias más antiguas o más recientes
+ANTIGUAS = 'a'
+RECIENTES = 'r'
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(direccion: str, noticia) -> str:
+    crudo = f"{direccion}|{noticia.fecha_publicacion.isoformat()}|{noticia.pk}"
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token: str):
+    try:
+        relleno = '=' * (-len(token) % 4)
+        direccion, fecha, pk = base64.urlsafe_b64decode(token + relleno).decode().split('|')
+        if direccion not in (ANTIGUAS, RECIENTES):
+            raise ValueError(direccion)
+        return direccion, datetime.fromisoformat(fecha), int(pk)
+    except (ValueError, UnicodeDecodeError) as error:
+        raise CursorInvalido(token) from error
+
+
+class PaginaCursor:
+    """
+    Página de resultados sin total: sabe si hay más antiguas o más recientes
+    y da el cursor para pedirlas.
+    """
+
+    def __init__(self, object_list, hay_antiguas, hay_recientes):
+        self.object_list = object_list
+        self.hay_antiguas = hay_antiguas
+        self.hay_recientes = hay_recientes
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def cursor_antiguas(self):
+        if self.hay_antiguas and self.object_list:
+            return codificar_cursor(ANTIGUAS, self.object_list[-1])
+        return None
+
+    @property
+    def cursor_recientes(self):
+        if self.hay_recientes and self.object_list:
+            return codificar_cursor(RECIENTES, self.object_list[0])
+        return None
+
+
+def paginar_por_cursor(queryset, token: str | None, por_pagina: int) -> PaginaCursor:
+    """
+    Devuelve la página del queryset que indica el cursor (o la primera).
+    El queryset se ordena por (-fecha_publicacion, -id); se pide una fila
+    de más para saber si existe la página siguiente.
+    """
+    if not token:
+        filas = list(queryset.order_by('-fecha_publicacion', '-id')[:por_pagina + 1])
+        return PaginaCursor(filas[:por_pagina], len(filas) > por_pagina, False)
+
+    direccion, fecha, pk = decodificar_cursor(token)
+
+    if direccion == ANTIGUAS:
+        filas = list(
+            queryset.filter(Q(fecha_publicacion__lt=fecha) | Q(fecha_publicacion=fecha, id__lt=pk))
+                    .order_by('-fecha_publicacion', '-id')[:por_pagina + 1]
+        )
+        return PaginaCursor(filas[:por_pagina], len(filas) > por_pagina, True)
+
+    # Hacia las recientes recorremos en orden ascendente y damos la vuelta
+    filas = list(
+        queryset.filter(Q(fecha_publicacion__gt=fecha) | Q(fecha_publicacion=fecha, id__gt=pk))
+                .order_by('fecha_publicacion', 'id')[:por_pagina + 1]
+    )
+    return PaginaCursor(filas[:por_pagina][::-1], True, len(filas) > por_pagina)
@@ -0,0 +1,248 @@
+"""
+Presupuesto de consultas SQL por vista.
+
+Cada vista declara cuántas consultas puede hacer como máximo con el
+decorador ``@presupuesto_consultas(n)``. El presupuesto se comprueba en:
+
+- Los tests, con ``PresupuestoConsultasMixin.assertDentroDePresupuesto``.
+- Desarrollo, con ``PresupuestoConsultasMiddleware`` (solo activo si
+  ``PRESUPUESTO_CONSULTAS_ESTRICTO`` es True), que lanza una excepción en
+  cuanto una vista se pasa de su presupuesto.
+
+Los dos activan ``medir()`` y es el decorador el que cuenta, solo dentro
+de la vista y con la sesión y el usuario ya cargados: las consultas de
+``request.user`` son de los middlewares de sesión y autenticación, y no
+deben tumbar la vista cuando quien la visita ha iniciado sesión.
+
+Las consultas se observan con ``observar_consultas``: el observador va en
+una contextvar y cada conexión lleva un único wrapper que lo consulta. Así
+se cuentan también las consultas que las vistas asíncronas lanzan en otros
+hilos (ver asincrono.py), que usan otras conexiones.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+class PresupuestoConsultasExcedido(AssertionError):
+    pass
+
+
+def presupuesto_consultas(maximo: int):
+    """
+    Declara el número máximo de consultas que puede ejecutar una vista.
+    Solo se cuentan dentro de ``medir()`` (el middleware y el mixin).
+    """
+    def decorador(vista):
+        if iscoroutinefunction(vista):
+            @wraps(vista)
+            async def envoltura(request, *args, **kwargs):
+                medicion = _medicion.get()
+                if medicion is None:
+                    return await vista(request, *args, **kwargs)
+                await _acargar_usuario(request)
+                with contar_consultas() as contador:
+                    try:
+                        return await vista(request, *args, **kwargs)
+                    finally:
+                        medicion.anotar(envoltura, contador)
+        else:
+            @wraps(vista)
+            def envoltura(request, *args, **kwargs):
+                medicion = _medicion.get()
+                if medicion is None:
+                    return vista(request, *args, **kwargs)
+                _cargar_usuario(request)
+                with contar_consultas() as contador:
+                    try:
+                        return vista(request, *args, **kwargs)
+                    finally:
+                        medicion.anotar(envoltura, contador)
+        envoltura.presupuesto_consultas = maximo
+        return envoltura
+    return decorador
+
+
+def _cargar_usuario(request) -> None:
+    # request.user lee la sesión y el usuario la primera vez que se usa: son
+    # consultas de SessionMiddleware y AuthenticationMiddleware, no de la vista
+    usuario = getattr(request, 'user', None)
+    if usuario is not None:
+        usuario.is_authenticated
+
+
+async def _acargar_usuario(request) -> None:
+    # request.auser() y request.user guardan cada uno su copia
+    if hasattr(request, 'auser'):
+        await request.auser()
+    await sync_to_async(_cargar_usuario)(request)
+
+
+# --- Observadores de consultas ---
+
+_observadores = contextvars.ContextVar('observadores_consultas', default=())
+
+
+def _despachar(execute, sql, params, many, context):
+    # Wrapper fijo de cada conexión: encadena los observadores del contexto
+    for observador in reversed(_observadores.get()):
+        execute = _encadenar(observador, execute)
+    return execute(sql, params, many, context)
+
+
+def _encadenar(observador, execute):
+    return lambda sql, params, many, context: observador(execute, sql, params, many, context)
+
+
+def _instalar(conexion) -> None:
+    if _despachar not in conexion.execute_wrappers:
+        conexion.execute_wrappers.insert(0, _despachar)
+
+
+@receiver(connection_created)
+def _instalar_en_conexion_nueva(sender, connection, **kwargs):
+    _instalar(connection)
+
+
+@contextmanager
+def observar_consultas(observador):
+    """
+    ``observador(execute, sql, params, many, context)`` ve todas las
+    consultas de este contexto, en este hilo o en los que herede.
+    """
+    # Las conexiones que ya estaban abiertas no pasaron por connection_created
+    for conexion in connections.all(initialized_only=True):
+        _instalar(conexion)
+    token = _observadores.set(_observadores.get() + (observador,))
+    try:
+        yield observador
+    finally:
+        _observadores.reset(token)
+
+
+class _ContadorConsultas:
+    """
+    Observador que cuenta las consultas de todas las conexiones.
+    """
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.consultas.append(sql)
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def contar_consultas():
+    with observar_consultas(_ContadorConsultas()) as contador:
+        yield contador
+
+
+def _comprobar(contador, maximo, descripcion):
+    if len(contador.consultas) > maximo:
+        detalle = "\n".join(
+            f"{i}. {sql}" for i, sql in enumerate(contador.consultas, start=1)
+        )
+        raise PresupuestoConsultasExcedido(
+            f"{descripcion} ejecutó {len(contador.consultas)} consultas "
+            f"(presupuesto: {maximo}):\n{detalle}"
+        )
+
+
+class _Medicion:
+    """
+    Consultas de cada vista con presupuesto que se ejecuta dentro de
+    ``medir()``: ``(vista, contador)``.
+    """
+    def __init__(self):
+        self.vistas = []
+
+    def anotar(self, vista, contador):
+        self.vistas.append((vista, contador))
+
+    def comprobar(self):
+        for vista, contador in self.vistas:
+            _comprobar(contador, vista.presupuesto_consultas, f"La vista {vista.__module__}.{vista.__qualname__}")
+
+
+_medicion = contextvars.ContextVar('medicion_presupuesto', default=None)
+
+
+@contextmanager
+def medir():
+    """
+    Mide las vistas con ``@presupuesto_consultas`` que se ejecuten dentro.
+    Anidado (el mixin con el middleware activo) reutiliza la medición de fuera.
+    """
+    medicion = _medicion.get()
+    if medicion is not None:
+        yield medicion
+        return
+    medicion = _Medicion()
+    token = _medicion.set(medicion)
+    try:
+        yield medicion
+    finally:
+        _medicion.reset(token)
+
+
+class PresupuestoConsultasMixin:
+    """
+    Mixin para TestCase que verifica el presupuesto declarado por la vista.
+
+        class IndexTests(PresupuestoConsultasMixin, TestCase):
+            def test_index(self):
+                self.assertDentroDePresupuesto('/')
+    """
+
+    def assertDentroDePresupuesto(self, url, maximo=None, **kwargs):
+        with medir() as medicion:
+            inicio = len(medicion.vistas)
+            respuesta = self.client.get(url, **kwargs)
+        vistas = medicion.vistas[inicio:]
+        if not vistas:
+            self.fail(f"La vista de {url} no declara @presupuesto_consultas")
+        for vista, contador in vistas:
+            _comprobar(contador, vista.presupuesto_consultas if maximo is None else maximo, f"GET {url}")
+        return respuesta
+
+
+class PresupuestoConsultasMiddleware:
+    """
+    Middleware de desarrollo: falla si una vista supera su presupuesto.
+    Solo se activa si PRESUPUESTO_CONSULTAS_ESTRICTO es True.
+
+    Solo cuentan las consultas de la vista: el decorador resuelve la sesión
+    y el usuario antes de empezar a contar (ver ``_cargar_usuario``).
+    Funciona con WSGI y con ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PRESUPUESTO_CONSULTAS_ESTRICTO', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with medir() as medicion:
+            respuesta = self.get_response(request)
+        medicion.comprobar()
+        return respuesta
+
+    async def __acall__(self, request):
+        with medir() as medicion:
+            respuesta = await self.get_response(request)
+        medicion.comprobar()
+        return respuesta
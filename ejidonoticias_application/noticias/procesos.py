@@ -0,0 +1,29 @@
+"""
+Pool de procesos para los comandos que procesan imágenes en paralelo.
+
+Los hijos arrancan con 'spawn': cargan Django desde cero y abren su propia
+conexión a la base de datos. Las funciones que se envían al pool deben
+importar los modelos dentro de la función, no a nivel de módulo.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connections
+
+
+def _inicializar_proceso():
+    django.setup()
+
+
+def pool_procesos(procesos: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=max(1, procesos),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_inicializar_proceso,
+    )
+
+
+def cerrar_conexiones():
+    """Para llamar al terminar cada trabajo dentro de un hijo del pool."""
+    connections.close_all()
@@ -0,0 +1,300 @@
+"""
+Noticias relacionadas por similitud de tags, categoría y fecha.
+
+Puntuación de cada par de noticias publicadas (a, b):
+
+    PESO_TAGS * coseno TF-IDF de sus tags
+  + PESO_CATEGORIA si son de la misma categoría
+  + PESO_FECHA * 0.5 ** (días entre sus fechas de publicación / VIDA_MEDIA_DIAS)
+
+Con IDF, compartir un tag raro pesa más que compartir uno que llevan
+cientos de noticias. Las ``K`` mejores de cada noticia se guardan en
+``Relacionada``; la página de la noticia las lee con una consulta por el
+índice único (noticia, posicion).
+
+El cálculo es el producto disperso de la matriz noticias x tags por su
+traspuesta, con un índice invertido en memoria: por cada tag y cada
+categoría, sus noticias ordenadas por fecha. Las candidatas de una noticia
+son las ``CANDIDATAS_POR_LISTA`` más cercanas en fecha de cada una de sus
+listas, así el coste por noticia no crece con el tamaño del archivo.
+
+Se recalcula:
+
+- entero con ``manage.py calcular_relacionadas`` (y al crear la tabla);
+- de forma incremental desde las signals, tras el commit, cuando cambian
+  los tags, la categoría, la fecha o la publicación de una noticia: la
+  propia noticia, las que la listaban y sus nuevas vecinas. Para eso no se
+  carga el archivo entero sino un corpus parcial (``Corpus.alrededor_de``)
+  con las candidatas de esas noticias y el IDF de los recuentos globales.
+"""
+import bisect
+import heapq
+import math
+import operator
+import threading
+from collections import defaultdict
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+PESO_TAGS = 1.0
+PESO_CATEGORIA = 0.3
+PESO_FECHA = 0.2
+VIDA_MEDIA_DIAS = 30
+
+# Se guardan algunas más de las que se muestran: las que se despublican
+# se filtran al leer hasta el siguiente cálculo
+K = 8
+MOSTRADAS = 5
+
+CANDIDATAS_POR_LISTA = 100
+TAMANO_LOTE = 1000
+# Valores por consulta en los pk__in del corpus parcial, y ventanas de
+# candidatas (unos 3 parámetros cada una) por consulta: SQLite antiguo
+# admite como mucho 999 parámetros
+TRAMO_IN = 500
+VENTANAS_POR_CONSULTA = 100
+
+# Campos de Noticia que cambian las relacionadas al guardarse
+CAMPOS_RELEVANTES = {'categoria', 'publicado', 'fecha_publicacion'}
+
+
+class Corpus:
+    """Índice en memoria de las noticias publicadas: categoría, fecha y tags."""
+
+    def __init__(self, noticias, etiquetas, frecuencias=None, total=None):
+        # noticias: (pk, categoria_id, fecha_publicacion); etiquetas: (noticia_id, tag_id).
+        # frecuencias (tag_id -> noticias publicadas con el tag) y total, para
+        # un corpus parcial: el IDF es el del archivo entero, no el de la muestra
+        self.categoria = {}
+        self.dia = {}
+        for pk, categoria_id, fecha in noticias:
+            self.categoria[pk] = categoria_id
+            self.dia[pk] = fecha.timestamp() / 86400
+
+        self.tags = defaultdict(set)
+        for pk, tag_id in etiquetas:
+            if pk in self.dia:
+                self.tags[pk].add(tag_id)
+
+        listas = defaultdict(list)
+        for pk, categoria_id in self.categoria.items():
+            listas[('categoria', categoria_id)].append(pk)
+        for pk, tags in self.tags.items():
+            for tag_id in tags:
+                listas[('tag', tag_id)].append(pk)
+
+        if frecuencias is None:
+            total = len(self.dia)
+            frecuencias = {clave[1]: len(pks) for clave, pks in listas.items() if clave[0] == 'tag'}
+        self.peso = {tag_id: math.log(1 + total / cantidad) for tag_id, cantidad in frecuencias.items()}
+        self.norma = {pk: math.sqrt(sum(self.peso[tag_id] ** 2 for tag_id in tags))
+                      for pk, tags in self.tags.items()}
+
+        # Cada lista ordenada por fecha, con sus días aparte para bisect
+        self.listas = {}
+        for clave, pks in listas.items():
+            pks.sort(key=self.dia.__getitem__)
+            self.listas[clave] = (pks, [self.dia[pk] for pk in pks])
+
+    @classmethod
+    def desde_bd(cls, modelo_noticia):
+        # Se pasa el modelo para poder usarlo también en las migraciones
+        publicadas = modelo_noticia.objects.filter(publicado=True)
+        return cls(
+            publicadas.values_list('pk', 'categoria_id', 'fecha_publicacion').iterator(chunk_size=TAMANO_LOTE),
+            modelo_noticia.tags.through.objects.filter(noticia__publicado=True)
+                                               .values_list('noticia_id', 'tag_id')
+                                               .iterator(chunk_size=TAMANO_LOTE),
+        )
+
+    @classmethod
+    def alrededor_de(cls, modelo_noticia, pks):
+        """
+        Corpus con lo justo para calcular ``vecinas`` de las noticias ``pks``:
+        ellas, las ``CANDIDATAS_POR_LISTA`` más cercanas en fecha de cada una
+        de sus listas (las mismas que tomaría ``_cercanas`` del corpus
+        entero) y los tags de todas. Cada ventana de candidatas es una
+        subconsulta con LIMIT, y van de ``VENTANAS_POR_CONSULTA`` en
+        ``VENTANAS_POR_CONSULTA``: unas pocas consultas en lugar de leer
+        todas las noticias publicadas.
+        """
+        publicadas = modelo_noticia.objects.filter(publicado=True).order_by()
+        etiquetas = modelo_noticia.tags.through.objects.filter(noticia__publicado=True).order_by()
+        campos = ('pk', 'categoria_id', 'fecha_publicacion')
+
+        filas = {fila[0]: fila for fila in _en_tramos(publicadas.values_list(*campos), 'pk', pks)}
+        tags_de = defaultdict(list)
+        for pk, tag_id in _en_tramos(etiquetas.values_list('noticia_id', 'tag_id'), 'noticia_id', filas):
+            tags_de[pk].append(tag_id)
+
+        mitad = CANDIDATAS_POR_LISTA // 2
+        ventanas = []
+        for pk, categoria_id, fecha in filas.values():
+            listas = [publicadas.filter(categoria_id=categoria_id)]
+            listas += [publicadas.filter(tags=tag_id) for tag_id in tags_de[pk]]
+            for lista in listas:
+                # Como en _cercanas: mitad antes de la fecha y mitad desde ella
+                lista = lista.values('pk')
+                ventanas.append(lista.filter(fecha_publicacion__lt=fecha).order_by('-fecha_publicacion')[:mitad])
+                ventanas.append(lista.filter(fecha_publicacion__gte=fecha).order_by('fecha_publicacion')[:mitad])
+        for inicio in range(0, len(ventanas), VENTANAS_POR_CONSULTA):
+            tramo = ventanas[inicio:inicio + VENTANAS_POR_CONSULTA]
+            condicion = reduce(operator.or_, (Q(pk__in=ventana) for ventana in tramo))
+            filas.update((fila[0], fila) for fila in publicadas.filter(condicion).values_list(*campos))
+
+        candidatas = filas.keys() - tags_de.keys()
+        for pk, tag_id in _en_tramos(etiquetas.values_list('noticia_id', 'tag_id'), 'noticia_id', candidatas):
+            tags_de[pk].append(tag_id)
+        todos = {tag_id for tags in tags_de.values() for tag_id in tags}
+        frecuencias = dict(_en_tramos(etiquetas.values('tag_id').annotate(cantidad=Count('pk'))
+                                               .values_list('tag_id', 'cantidad'), 'tag_id', todos))
+        return cls(
+            filas.values(),
+            [(pk, tag_id) for pk, tags in tags_de.items() for tag_id in tags],
+            frecuencias=frecuencias,
+            total=publicadas.count(),
+        )
+
+    def __contains__(self, pk) -> bool:
+        return pk in self.dia
+
+    def _cercanas(self, clave, dia: float):
+        pks, dias = self.listas[clave]
+        centro = bisect.bisect_left(dias, dia)
+        mitad = CANDIDATAS_POR_LISTA // 2
+        return pks[max(centro - mitad, 0):centro + mitad]
+
+    def puntuacion(self, a, b) -> float:
+        puntuacion = PESO_FECHA * 0.5 ** (abs(self.dia[a] - self.dia[b]) / VIDA_MEDIA_DIAS)
+        if self.categoria[a] == self.categoria[b]:
+            puntuacion += PESO_CATEGORIA
+        comunes = self.tags[a] & self.tags[b] if a in self.tags and b in self.tags else ()
+        if comunes:
+            producto = sum(self.peso[tag_id] ** 2 for tag_id in comunes)
+            puntuacion += PESO_TAGS * producto / (self.norma[a] * self.norma[b])
+        return puntuacion
+
+    def vecinas(self, pk, k: int = K) -> list[tuple[float, int]]:
+        """Las ``k`` mejores ``(puntuacion, pk)`` para la noticia ``pk``."""
+        dia = self.dia[pk]
+        candidatas = set(self._cercanas(('categoria', self.categoria[pk]), dia))
+        for tag_id in self.tags.get(pk, ()):
+            candidatas.update(self._cercanas(('tag', tag_id), dia))
+        candidatas.discard(pk)
+        return heapq.nlargest(k, ((self.puntuacion(pk, otra), otra) for otra in candidatas))
+
+
+def _en_tramos(queryset, campo: str, valores):
+    valores = list(valores)
+    for inicio in range(0, len(valores), TRAMO_IN):
+        yield from queryset.filter(**{f'{campo}__in': valores[inicio:inicio + TRAMO_IN]})
+
+
+def guardar(modelo_relacionada, vecinas: dict) -> set:
+    """
+    Sustituye las relacionadas de las noticias de ``vecinas`` (pk -> lista
+    de ``(puntuacion, pk)``). Solo reescribe las que cambian y las devuelve.
+    """
+    actuales = defaultdict(list)
+    filas = modelo_relacionada.objects.filter(noticia_id__in=vecinas.keys()) \
+                                      .order_by('noticia_id', 'posicion') \
+                                      .values_list('noticia_id', 'relacionada_id')
+    for noticia_id, relacionada_id in filas:
+        actuales[noticia_id].append(relacionada_id)
+
+    cambiadas = {pk for pk, lista in vecinas.items() if [otra for _, otra in lista] != actuales[pk]}
+    with transaction.atomic():
+        modelo_relacionada.objects.filter(noticia_id__in=cambiadas).delete()
+        modelo_relacionada.objects.bulk_create(
+            [
+                modelo_relacionada(noticia_id=pk, relacionada_id=otra, posicion=posicion, puntuacion=puntuacion)
+                for pk in cambiadas
+                for posicion, (puntuacion, otra) in enumerate(vecinas[pk])
+            ],
+            batch_size=TAMANO_LOTE,
+        )
+    return cambiadas
+
+
+def calcular_todas(modelo_noticia=None, modelo_relacionada=None) -> tuple[int, set]:
+    """
+    Recalcula las relacionadas de todas las noticias publicadas. Devuelve
+    cuántas se calcularon y cuáles cambiaron.
+    """
+    if modelo_noticia is None:
+        from .models import Noticia as modelo_noticia, Relacionada as modelo_relacionada
+
+    corpus = Corpus.desde_bd(modelo_noticia)
+    modelo_relacionada.objects.exclude(noticia__publicado=True).delete()
+
+    cambiadas = set()
+    pks = sorted(corpus.dia)
+    for inicio in range(0, len(pks), TAMANO_LOTE):
+        lote = pks[inicio:inicio + TAMANO_LOTE]
+        cambiadas |= guardar(modelo_relacionada, {pk: corpus.vecinas(pk) for pk in lote})
+    return len(pks), cambiadas
+
+
+def recalcular(ids) -> set:
+    """
+    Recalcula las relacionadas de las noticias ``ids``, de las que las
+    listaban y de sus nuevas vecinas. Devuelve las noticias cuya página
+    hay que regenerar.
+    """
+    from .models import Noticia, Relacionada
+
+    ids = set(ids)
+    listaban = set(Relacionada.objects.filter(relacionada_id__in=ids).values_list('noticia_id', flat=True))
+    corpus = Corpus.alrededor_de(Noticia, ids | listaban)
+
+    vecinas = {pk: corpus.vecinas(pk) for pk in ids | listaban if pk in corpus}
+    # La similitud es simétrica: una noticia que ahora entra en la lista de
+    # otra suele ganar también un puesto en la de esa otra. Sus candidatas
+    # no están en el corpus de arriba: se cargan aparte
+    nuevas = {otra for pk in ids & vecinas.keys() for _, otra in vecinas[pk]} - vecinas.keys()
+    if nuevas:
+        corpus_nuevas = Corpus.alrededor_de(Noticia, nuevas)
+        vecinas.update((pk, corpus_nuevas.vecinas(pk)) for pk in nuevas if pk in corpus_nuevas)
+
+    # Las despublicadas o borradas se quedan sin relacionadas
+    Relacionada.objects.filter(noticia_id__in=[pk for pk in ids if pk not in corpus]).delete()
+    # Las que listaban a una noticia cambiada muestran su tarjeta: también se regeneran
+    return guardar(Relacionada, vecinas) | listaban | ids
+
+
+# --- Recálculo tras el commit desde las signals ---
+
+_pendientes = threading.local()
+
+
+def marcar(*ids) -> None:
+    """
+    Apunta noticias a recalcular al terminar la transacción en curso. Los
+    cambios de una misma edición (noticia y tags) se recalculan una vez.
+    """
+    pendientes = getattr(_pendientes, 'ids', None)
+    if pendientes is None:
+        pendientes = _pendientes.ids = set()
+    pendientes.update(ids)
+    transaction.on_commit(_recalcular_pendientes)
+
+
+def _recalcular_pendientes() -> None:
+    from . import cache_paginas
+
+    ids = getattr(_pendientes, 'ids', None)
+    _pendientes.ids = set()
+    if ids:
+        cache_paginas.invalidar(*(f'noticia:{pk}' for pk in recalcular(ids)))
+
+
+def de_noticia(queryset, **noticia):
+    """
+    Tarjetas de las relacionadas de una noticia, en orden. ``queryset`` son
+    las noticias publicadas como tarjetas; ``noticia``, cómo identificarla
+    (``pk=...`` o ``slug=...``).
+    """
+    filtro = {f'como_relacionada__noticia__{campo}': valor for campo, valor in noticia.items()}
+    return queryset.filter(**filtro).order_by('como_relacionada__posicion')[:MOSTRADAS]
@@ -0,0 +1,203 @@
+"""
+Lecturas de las vistas públicas en réplicas de la base de datos.
+
+Las réplicas son las bases de datos de ``settings.REPLICAS`` (en
+producción, ``DB_REPLICAS=host1,host2``). Por defecto todo va al primario
+(``default``); solo las vistas decoradas con ``@en_replica`` leen de una
+réplica, elegida al azar al empezar la petición y la misma para todas sus
+consultas. Las escrituras van siempre al primario y, dentro de la petición,
+las lecturas posteriores a una escritura también.
+
+Para no leer datos que la réplica aún no tiene:
+
+- Tras una escritura de un usuario identificado (guardar en el admin), el
+  ``ReplicasMiddleware`` deja una cookie con la que sus lecturas van al
+  primario durante ``REPLICAS_PEGADO`` segundos.
+- Tras cualquier cambio de contenido (ver signals.py) todas las lecturas
+  van al primario durante ``REPLICAS_RETRASO_MAX`` segundos: así la caché
+  de páginas y los ETag (ver condicional.py), que se regeneran justo
+  después del cambio, no se quedan con la versión anterior.
+
+Si una réplica deja de responder, la vista se repite en el primario y la
+réplica se aparta durante ``REPLICAS_REINTENTO`` segundos.
+
+Para probar el enrutado en local basta con dos bases SQLite: la réplica es
+una copia del archivo de la principal::
+
+    DATABASES['replica_1'] = {**DATABASES['default'], 'NAME': 'copia.sqlite3'}
+    REPLICAS = ['replica_1']
+
+y ``manage.py comprobar_replicas``.
+"""
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+logger = logging.getLogger(__name__)
+
+COOKIE = 'leer_primario'
+CLAVE_ESCRITURA = 'noticias:replicas:escritura'
+
+_estado = contextvars.ContextVar('lectura_en_replica', default=None)
+
+# Réplicas que no respondieron: alias -> instante (monotonic) en que se reintenta
+_caidas = {}
+
+
+def aliases() -> list[str]:
+    return getattr(settings, 'REPLICAS', [])
+
+
+def _retraso_max() -> float:
+    return getattr(settings, 'REPLICAS_RETRASO_MAX', 5)
+
+
+def marcar_escritura() -> None:
+    """Llamada desde las signals tras el commit de un cambio de contenido."""
+    cache.set(CLAVE_ESCRITURA, time.time_ns(), timeout=int(_retraso_max()) + 1)
+
+
+def _replica_para(request) -> str | None:
+    if not aliases() or request.method not in ('GET', 'HEAD'):
+        return None
+    if COOKIE in request.COOKIES:
+        return None
+    if time.time_ns() - (cache.get(CLAVE_ESCRITURA) or 0) < _retraso_max() * 1e9:
+        return None
+
+    ahora = time.monotonic()
+    disponibles = [alias for alias in aliases() if _caidas.get(alias, 0) <= ahora]
+    return random.choice(disponibles) if disponibles else None
+
+
+@contextmanager
+def leyendo_de(alias: str):
+    """Las lecturas dentro del bloque van a ``alias`` hasta la primera escritura."""
+    token = _estado.set({'replica': alias, 'primario': False})
+    try:
+        yield
+    finally:
+        _estado.reset(token)
+
+
+def _replica_caida(alias: str) -> bool:
+    # Tras un OperationalError: si la réplica no responde, se aparta un rato
+    try:
+        connections[alias].ensure_connection()
+    except OperationalError:
+        _caidas[alias] = time.monotonic() + getattr(settings, 'REPLICAS_REINTENTO', 30)
+        logger.warning("La réplica %s no responde: se lee del primario", alias, exc_info=True)
+        return True
+    return False
+
+
+def en_replica(vista):
+    """
+    Decorador de vistas públicas de solo lectura (síncronas o asíncronas):
+    sus consultas van a una réplica cuando es seguro.
+    """
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltura_asincrona(request, *args, **kwargs):
+            from .asincrono import en_hilo
+
+            replica = await en_hilo(_replica_para, request)
+            if replica is None:
+                return await vista(request, *args, **kwargs)
+            try:
+                with leyendo_de(replica):
+                    return await vista(request, *args, **kwargs)
+            except OperationalError:
+                if not await en_hilo(_replica_caida, replica):
+                    raise
+            return await vista(request, *args, **kwargs)
+        return envoltura_asincrona
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        replica = _replica_para(request)
+        if replica is None:
+            return vista(request, *args, **kwargs)
+        try:
+            with leyendo_de(replica):
+                return vista(request, *args, **kwargs)
+        except OperationalError:
+            if not _replica_caida(replica):
+                raise
+        return vista(request, *args, **kwargs)
+    return envoltura
+
+
+class RouterReplicas:
+    """``DATABASE_ROUTERS``: decide la base de cada consulta según ``en_replica``."""
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado is None or estado['primario']:
+            return DEFAULT_DB_ALIAS
+        return estado['replica']
+
+    def db_for_write(self, model, **hints):
+        # Explícito: si no, Django escribiría en la base de la que se leyó la instancia
+        estado = _estado.get()
+        if estado is not None:
+            estado['primario'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # las réplicas tienen los mismos datos
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in aliases():
+            return False  # les llegan por replicación
+        return None
+
+
+class ReplicasMiddleware:
+    """
+    Tras una escritura de un usuario identificado (p. ej. guardar en el
+    admin), sus lecturas van al primario durante ``REPLICAS_PEGADO``
+    segundos: ve enseguida lo que acaba de guardar. Va después de
+    AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not aliases():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        respuesta = self.get_response(request)
+        if self._escritura(request) and request.user.is_authenticated:
+            self._pegar(respuesta)
+        return respuesta
+
+    async def __acall__(self, request):
+        respuesta = await self.get_response(request)
+        if self._escritura(request) and (await request.auser()).is_authenticated:
+            self._pegar(respuesta)
+        return respuesta
+
+    @staticmethod
+    def _escritura(request) -> bool:
+        return request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    @staticmethod
+    def _pegar(respuesta) -> None:
+        respuesta.set_cookie(COOKIE, '1', max_age=getattr(settings, 'REPLICAS_PEGADO', 15),
+                             httponly=True, samesite='Lax')
@@ -0,0 +1,190 @@
+"""
+Datos de prueba realistas para benchmarks (``manage.py seed_noticias``).
+
+Genera categorías, tags y noticias con HTML parecido al que produce
+CKEditor (párrafos, subtítulos, listas, citas e imágenes insertadas) y
+banners reales en el storage. Todo sale de un ``random.Random`` con
+semilla, así que dos ejecuciones con los mismos parámetros producen los
+mismos datos y los benchmarks se pueden comparar entre commits.
+
+Las filas se insertan con ``bulk_create``: no pasan por ``save()`` ni por
+las signals, así que los campos derivados del contenido se calculan antes
+de insertar y al final se recalculan a mano los vectores de búsqueda, las
+tendencias, las facetas y las relacionadas y se invalidan las cachés.
+"""
+import io
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from . import cache_paginas, contenido, facetas, relacionadas, tablas_globales
+from .busqueda import actualizar_vectores
+from .models import Categoria, Noticia, Tag
+from .tendencias import actualizar_tendencias
+
+PALABRAS = (
+    "ejido comunidad agua bosque asamblea cosecha maíz aguacate camino escuela "
+    "festival tradición música danza salud clínica lluvia incendio reforestación "
+    "ganado mercado feria iglesia jóvenes deporte fútbol torneo elección comisario "
+    "presupuesto obra puente carretera educación cultura artesanía turismo senderismo"
+).split()
+
+# Prefijo de los slugs sembrados: permite reanudar y no tocar datos reales
+PREFIJO = 'seed'
+
+IMAGENES_DISTINTAS = 8
+TAMANO_LOTE = 2000
+
+
+def texto_aleatorio(palabras: int, rnd=random) -> str:
+    return " ".join(rnd.choices(PALABRAS, k=palabras))
+
+
+def _imagen(rnd, ancho, alto) -> Image.Image:
+    # Degradado con bloques de color: comprime como una foto, no como un color liso
+    img = Image.linear_gradient('L').resize((ancho, alto)).convert('RGB')
+    dibujo = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rnd.randrange(ancho), rnd.randrange(alto)
+        color = tuple(rnd.randrange(256) for _ in range(3))
+        dibujo.rectangle((x, y, x + rnd.randrange(ancho // 3), y + rnd.randrange(alto // 3)), fill=color)
+    return img
+
+
+def _guardar_imagen(nombre, img, formato, **opciones) -> str:
+    buffer = io.BytesIO()
+    img.save(buffer, format=formato, **opciones)
+    if default_storage.exists(nombre):
+        default_storage.delete(nombre)
+    return default_storage.save(nombre, ContentFile(buffer.getvalue()))
+
+
+def crear_imagenes(rnd) -> dict:
+    """
+    Banners (con sus miniaturas) e imágenes para el contenido. Se reutilizan
+    entre noticias: lo que se mide son las vistas, no el disco.
+    """
+    banners, contenido = [], []
+    for i in range(IMAGENES_DISTINTAS):
+        img = _imagen(rnd, 1920, 1080)
+        medium, small = img.copy(), img.copy()
+        medium.thumbnail((800, 600))
+        small.thumbnail((300, 200))
+        base = f'noticias/banners/{PREFIJO}/banner-{i}'
+        banners.append((
+            _guardar_imagen(f'{base}.webp', img, 'WEBP', quality=85),
+            _guardar_imagen(f'{base}_medium.webp', medium, 'WEBP', quality=80),
+            _guardar_imagen(f'{base}_small.webp', small, 'WEBP', quality=75),
+        ))
+        contenido.append(_guardar_imagen(
+            f'uploads/{PREFIJO}/foto-{i}.jpg', _imagen(rnd, 1200, 800), 'JPEG', quality=80,
+        ))
+    return {'banners': banners, 'contenido': contenido}
+
+
+def html_ckeditor(rnd, imagenes_contenido) -> str:
+    """Cuerpo de noticia con la forma del HTML que guarda CKEditor 4."""
+    bloques = []
+    for i in range(rnd.randint(6, 14)):
+        tipo = rnd.random()
+        if i and tipo < 0.15:
+            bloques.append(f"<h2>{texto_aleatorio(rnd.randint(3, 7), rnd).capitalize()}</h2>")
+        elif tipo < 0.25:
+            src = default_storage.url(rnd.choice(imagenes_contenido))
+            bloques.append(
+                f'<p><img alt="{texto_aleatorio(3, rnd)}" src="{src}" '
+                f'style="height:400px; width:600px" /></p>'
+            )
+        elif tipo < 0.32:
+            items = "".join(f"<li>{texto_aleatorio(rnd.randint(4, 10), rnd)}</li>"
+                            for _ in range(rnd.randint(2, 5)))
+            bloques.append(f"<ul>{items}</ul>")
+        elif tipo < 0.37:
+            bloques.append(f"<blockquote><p>{texto_aleatorio(25, rnd)}</p></blockquote>")
+        else:
+            palabras = texto_aleatorio(rnd.randint(40, 120), rnd).split()
+            palabras[rnd.randrange(len(palabras))] = f"<strong>{rnd.choice(PALABRAS)}</strong>"
+            palabras[rnd.randrange(len(palabras))] = (
+                f'<a href="https://example.com/{rnd.choice(PALABRAS)}">{rnd.choice(PALABRAS)}</a>'
+            )
+            bloques.append(f"<p>{' '.join(palabras).capitalize()}</p>")
+    return "\n".join(bloques)
+
+
+def sembrar(noticias: int, categorias: int = 8, tags: int = 40, semilla: int = 42,
+            informar=lambda mensaje: None) -> int:
+    """
+    Crea datos hasta tener ``noticias`` noticias sembradas. Devuelve cuántas
+    se crearon en esta llamada.
+    """
+    rnd = random.Random(semilla)
+    ahora = timezone.now()
+
+    autor, _ = get_user_model().objects.get_or_create(username=f'{PREFIJO}-autor')
+
+    imagenes = crear_imagenes(rnd)
+    Categoria.objects.bulk_create([
+        Categoria(nombre=f'Seed {i}', slug=f'{PREFIJO}-categoria-{i}',
+                  banner=imagenes['banners'][i % IMAGENES_DISTINTAS][0])
+        for i in range(categorias)
+    ], ignore_conflicts=True)
+    Tag.objects.bulk_create([
+        Tag(nombre=f'{PALABRAS[i % len(PALABRAS)]} {i}', slug=f'{PREFIJO}-tag-{i}')
+        for i in range(tags)
+    ], ignore_conflicts=True)
+    lista_categorias = list(Categoria.objects.filter(slug__startswith=f'{PREFIJO}-'))
+    lista_tags = list(Tag.objects.filter(slug__startswith=f'{PREFIJO}-'))
+
+    existentes = Noticia.objects.filter(slug__startswith=f'{PREFIJO}-').count()
+
+    creadas = 0
+    lote = []
+    for i in range(existentes, noticias):
+        banner, medium, small = rnd.choice(imagenes['banners'])
+        noticia = Noticia(
+            titulo=texto_aleatorio(rnd.randint(5, 10), rnd).capitalize(),
+            slug=f'{PREFIJO}-{i}',
+            subtitulo=texto_aleatorio(rnd.randint(8, 16), rnd).capitalize(),
+            contenido=html_ckeditor(rnd, imagenes['contenido']),
+            banner=banner, banner_medium=medium, banner_small=small,
+            categoria=rnd.choice(lista_categorias),
+            autor=autor,
+            # Distribución de cola larga, como las vistas reales
+            vistas=min(int(rnd.paretovariate(1.2) * 20), 10**6),
+            fecha_publicacion=ahora - timedelta(minutes=(noticias - i) * 90),
+            publicado=rnd.random() > 0.03,
+        )
+        contenido.aplicar(noticia)
+        lote.append(noticia)
+        if len(lote) >= TAMANO_LOTE:
+            creadas += _guardar_lote(lote, lista_tags, rnd)
+            informar(f"{existentes + creadas}/{noticias}")
+            lote = []
+    if lote:
+        creadas += _guardar_lote(lote, lista_tags, rnd)
+
+    actualizar_tendencias()
+    facetas.recalcular_todas()
+    _, cambiadas = relacionadas.calcular_todas()
+    cache_paginas.invalidar('global', *(f'noticia:{pk}' for pk in cambiadas))
+    tablas_globales.invalidar('categorias')
+    return creadas
+
+
+@transaction.atomic
+def _guardar_lote(lote, lista_tags, rnd) -> int:
+    creadas = Noticia.objects.bulk_create(lote)
+    Relacion = Noticia.tags.through
+    Relacion.objects.bulk_create([
+        Relacion(noticia_id=noticia.pk, tag_id=tag.pk)
+        for noticia in creadas
+        for tag in rnd.sample(lista_tags, k=min(len(lista_tags), rnd.randint(1, 4)))
+    ])
+    actualizar_vectores(Noticia.objects.filter(pk__in=[noticia.pk for noticia in creadas]))
+    return len(creadas)
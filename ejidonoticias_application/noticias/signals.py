@@ -0,0 +1,264 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache_paginas, deduplicacion, estatico, facetas, relacionadas, replicas, sindicacion, tablas_globales
+from .busqueda import actualizar_vectores
+from .models import Categoria, Noticia, RedSocial, Tag, Tendencia
+
+
+# --- Búsqueda: mantener el tsvector de cada noticia al día ---
+
+@receiver(post_save, sender=Noticia)
+def actualizar_busqueda_noticia(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    actualizar_vectores(Noticia.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=Noticia.tags.through)
+def actualizar_busqueda_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # Se van a quitar todas las noticias de un tag: las apuntamos antes
+        instance._noticias_afectadas = list(instance.noticias.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        ids = [instance.pk]
+    elif action == 'post_clear':
+        ids = getattr(instance, '_noticias_afectadas', [])
+    else:
+        ids = pk_set
+    actualizar_vectores(Noticia.objects.filter(pk__in=ids))
+
+
+@receiver(post_save, sender=Tag)
+def actualizar_busqueda_tag_renombrado(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    actualizar_vectores(Noticia.objects.filter(tags=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def apuntar_noticias_del_tag(sender, instance, **kwargs):
+    instance._noticias_afectadas = list(instance.noticias.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def actualizar_busqueda_tag_borrado(sender, instance, **kwargs):
+    actualizar_vectores(Noticia.objects.filter(pk__in=instance._noticias_afectadas))
+
+
+@receiver(post_delete, sender=Noticia)
+def invalidar_busqueda(sender, instance, **kwargs):
+    # En PostgreSQL la fila borrada se va con su vector; con
+    # el índice en memoria hay que reconstruirlo.
+    actualizar_vectores(Noticia.objects.none())
+
+
+# --- Noticias relacionadas: recalcular tras el commit (ver relacionadas.py) ---
+# Solo si cambia algo de lo que las decide: el admin guarda siempre con
+# update_fields=None, así que se compara con _relacionadas_anterior, que
+# apunta apuntar_categoria_anterior (pre_save)
+
+@receiver(post_save, sender=Noticia)
+def marcar_relacionadas_noticia(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not relacionadas.CAMPOS_RELEVANTES & set(update_fields)):
+        return
+    anterior = getattr(instance, '_relacionadas_anterior', None)
+    if not created and anterior == (instance.categoria_id, instance.publicado, instance.fecha_publicacion):
+        return
+    relacionadas.marcar(instance.pk)
+
+
+@receiver(pre_delete, sender=Noticia)
+def marcar_relacionadas_noticia_borrada(sender, instance, **kwargs):
+    # Sus filas se borran en cascada: las que la listaban se apuntan antes
+    relacionadas.marcar(*instance.como_relacionada.values_list('noticia_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Noticia.tags.through)
+def marcar_relacionadas_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if action != 'post_clear' and not pk_set:
+        return  # add() de tags que ya tenía: no cambia nada
+    if not reverse:
+        ids = [instance.pk]
+    elif action == 'post_clear':
+        # _noticias_afectadas lo apunta actualizar_busqueda_tags (pre_clear)
+        ids = getattr(instance, '_noticias_afectadas', [])
+    else:
+        ids = pk_set
+    relacionadas.marcar(*ids)
+
+
+@receiver(post_delete, sender=Tag)
+def marcar_relacionadas_tag_borrado(sender, instance, **kwargs):
+    relacionadas.marcar(*instance._noticias_afectadas)
+
+
+# --- Caché de páginas: invalidar solo las páginas afectadas ---
+# Siempre tras el commit: una página que se regenere antes lee el contenido
+# anterior y se guardaría con la versión nueva, y con ella su ETag (ver
+# condicional.py), hasta el siguiente cambio.
+
+def _invalidar_paginas(*grupos: str) -> None:
+    def invalidar():
+        # Primero al primario: que la página nueva no salga de una réplica atrasada
+        replicas.marcar_escritura()
+        cache_paginas.invalidar(*grupos)
+    transaction.on_commit(invalidar)
+
+
+@receiver(pre_save, sender=Noticia)
+def apuntar_categoria_anterior(sender, instance, raw=False, **kwargs):
+    # Si la noticia cambia de categoría, también cambia el listado de la
+    # vieja. De paso, lo que necesitan las facetas (ver más abajo) y las
+    # relacionadas (ver arriba)
+    instance._categoria_anterior = instance._faceta_anterior = instance._relacionadas_anterior = None
+    if instance.pk and not raw:
+        anterior = Noticia.objects.filter(pk=instance.pk) \
+                                  .values_list('categoria__slug', 'categoria_id', 'publicado', 'fecha_publicacion') \
+                                  .first()
+        if anterior:
+            instance._categoria_anterior = anterior[0]
+            instance._faceta_anterior = anterior[1:3]
+            instance._relacionadas_anterior = anterior[1:]
+
+
+@receiver(post_save, sender=Noticia)
+@receiver(post_delete, sender=Noticia)
+def invalidar_paginas_noticia(sender, instance, **kwargs):
+    grupos = {'inicio', 'listado', f'noticia:{instance.pk}', f'categoria:{instance.categoria.slug.lower()}',
+              f'mapa:{sindicacion.mapa_de(instance.pk)}'}
+    anterior = getattr(instance, '_categoria_anterior', None)
+    if anterior:
+        grupos.add(f'categoria:{anterior.lower()}')
+    _invalidar_paginas(*grupos)
+
+
+@receiver(m2m_changed, sender=Noticia.tags.through)
+def invalidar_paginas_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        ids = [instance.pk]
+    elif action == 'post_clear':
+        ids = getattr(instance, '_noticias_afectadas', [])
+    else:
+        ids = pk_set
+    # 'listado': los feeds por tag (ver sindicacion.py)
+    _invalidar_paginas('listado', *[f'noticia:{pk}' for pk in ids])
+
+
+@receiver(post_save, sender=Tag)
+def invalidar_paginas_tag(sender, instance, created, **kwargs):
+    if created:
+        _invalidar_paginas('listado')  # el listado de tags de la API
+        return
+    ids = instance.noticias.values_list('pk', flat=True)
+    _invalidar_paginas('listado', *[f'noticia:{pk}' for pk in ids])
+
+
+@receiver(post_delete, sender=Tag)
+def invalidar_paginas_tag_borrado(sender, instance, **kwargs):
+    # _noticias_afectadas lo apunta apuntar_noticias_del_tag (pre_delete)
+    _invalidar_paginas('listado', *[f'noticia:{pk}' for pk in instance._noticias_afectadas])
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=RedSocial)
+@receiver(post_delete, sender=RedSocial)
+def invalidar_paginas_globales(sender, **kwargs):
+    # Categorías y redes sociales aparecen en el layout de todas las páginas
+    _invalidar_paginas('global')
+
+
+# --- Recuentos de las facetas del listado (ver facetas.py) ---
+# En la misma transacción que el cambio: si se deshace, se deshacen con él.
+# Las apuntadas de pre_save (_faceta_anterior) las hace apuntar_categoria_anterior.
+
+@receiver(post_save, sender=Noticia)
+def actualizar_facetas_noticia(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not facetas.CAMPOS_RELEVANTES & set(update_fields)):
+        return
+    facetas.noticia_guardada(instance, getattr(instance, '_faceta_anterior', None), created)
+
+
+@receiver(pre_delete, sender=Noticia)
+def actualizar_facetas_noticia_borrada(sender, instance, **kwargs):
+    # Antes del borrado: aún están sus tags
+    facetas.noticia_borrada(instance)
+
+
+@receiver(m2m_changed, sender=Noticia.tags.through)
+def actualizar_facetas_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    # pk_set son tags (desde la noticia) o noticias (desde el tag); None al vaciar
+    noticias, tags = (pk_set, [instance.pk]) if reverse else ([instance.pk], pk_set)
+    if action in ('pre_remove', 'pre_clear'):
+        # Lo que de verdad se quita: remove() avisa también de los que no estaban
+        instance._facetas_quitadas = facetas.pares(noticias, tags)
+    elif action == 'post_add':
+        facetas.tags_anadidos(noticias, tags)
+    elif action in ('post_remove', 'post_clear'):
+        facetas.tags_quitados(getattr(instance, '_facetas_quitadas', []))
+
+
+# --- Imágenes por contenido: referencias de cada imagen fuente (ver deduplicacion.py) ---
+# Al cambiar de banner las cuenta save(); aquí, al borrar
+
+@receiver(post_delete, sender=Noticia)
+@receiver(post_delete, sender=Categoria)
+def soltar_imagen_fuente(sender, instance, **kwargs):
+    deduplicacion.contar(instance.imagen_fuente_id, None)
+
+
+# --- Tras el commit: avisar a 'exportar_estatico --vigilar' y leer del
+# primario mientras las réplicas se ponen al día (ver replicas.py) ---
+# Qué páginas rehacer lo decide el mapa de dependencias (las versiones de
+# arriba); aquí solo se avisa de que hay algo.
+
+@receiver(post_save, sender=Noticia)
+@receiver(post_delete, sender=Noticia)
+@receiver(m2m_changed, sender=Noticia.tags.through)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=RedSocial)
+@receiver(post_delete, sender=RedSocial)
+def marcar_contenido_cambiado(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(estatico.marcar_pendiente)
+        transaction.on_commit(replicas.marcar_escritura)
+
+
+# --- Tablas globales en memoria (ver tablas_globales.py) ---
+# Tras el commit, como las páginas: un proceso que recargue antes guardaría
+# las filas anteriores con la versión nueva, y la copia local no caduca.
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_tabla_categorias(sender, **kwargs):
+    transaction.on_commit(partial(tablas_globales.invalidar, 'categorias'))
+
+
+@receiver(post_save, sender=RedSocial)
+@receiver(post_delete, sender=RedSocial)
+def invalidar_tabla_redes_sociales(sender, **kwargs):
+    transaction.on_commit(partial(tablas_globales.invalidar, 'redes_sociales'))
+
+
+# --- Tendencias: toda noticia nueva entra en el ranking (con puntuación 0) ---
+
+@receiver(post_save, sender=Noticia)
+def crear_tendencia(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Tendencia.objects.get_or_create(noticia=instance,
+                                        defaults={'vistas_contadas': instance.vistas})
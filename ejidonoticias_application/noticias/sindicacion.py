@@ -0,0 +1,189 @@
+"""
+Feeds RSS/Atom y sitemap XML.
+
+Sin ellos, agregadores y buscadores recorrían el archivo por el listado
+HTML con ``?page=N`` profundos, el acceso más caro de la web. Ahora tienen:
+
+- ``/feed/<rss|atom>/``, ``/feed/categoria/<slug>/<rss|atom>/`` y
+  ``/feed/tag/<slug>/<rss|atom>/``: las ``ELEMENTOS_FEED`` noticias más
+  recientes. Son pequeños: se guardan enteros en la caché de páginas.
+- ``/sitemap.xml``: índice con ``sitemap-secciones.xml`` (portada,
+  listado y categorías) y un ``sitemap-noticias-<n>.xml`` por cada tramo
+  de ``URLS_POR_MAPA`` ids (el máximo del protocolo). El tramo de una
+  noticia depende solo de su id: un tramo no cambia porque se añadan o
+  borren noticias de otro.
+
+Los tramos de noticias se escriben en streaming sobre ``.iterator()``: la
+memoria no crece con el archivo. No caben en la caché de páginas (habría
+que tenerlos enteros en memoria); se revalidan con ETag/Last-Modified (ver
+condicional.py) sin tocar la base de datos: la versión del grupo
+``mapa:<n>`` sube al guardar o borrar una de sus noticias (ver
+signals.py), así que un buscador que vuelve recibe 304 en los tramos que
+no cambiaron. ``lastmod`` es la ``fecha_actualizacion`` de cada noticia.
+"""
+from datetime import timezone as tz
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F, Max
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import feedgenerator
+
+from .models import Noticia
+
+TITULO_SITIO = "Ejido Noticias"
+
+ELEMENTOS_FEED = 30
+URLS_POR_MAPA = 50_000
+FILAS_POR_BLOQUE = 2000
+
+FORMATOS_FEED = {
+    'rss': feedgenerator.Rss201rev2Feed,
+    'atom': feedgenerator.Atom1Feed,
+}
+
+# Lo que pinta cada elemento del feed: nada del cuerpo de la noticia
+CAMPOS_FEED = (
+    'id', 'titulo', 'slug', 'subtitulo', 'extracto', 'fecha_publicacion', 'fecha_actualizacion',
+    'categoria__id', 'categoria__nombre', 'autor__id', 'autor__username',
+)
+
+XMLNS_MAPA = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+TIPO_XML = 'application/xml; charset=utf-8'
+
+
+def mapa_de(pk: int) -> int:
+    """Número del ``sitemap-noticias-<n>.xml`` en que sale la noticia ``pk``."""
+    return pk // URLS_POR_MAPA
+
+
+# --- Feeds ---
+
+def noticias_feed(noticias):
+    """Las más recientes del queryset, con lo que pinta el feed."""
+    return noticias.select_related('categoria', 'autor') \
+                   .only(*CAMPOS_FEED) \
+                   .prefetch_related('tags') \
+                   .order_by('-fecha_publicacion', '-id')[:ELEMENTOS_FEED]
+
+
+def responder_feed(request, formato: str, titulo: str, enlace: str, descripcion: str, noticias) -> HttpResponse:
+    feed = FORMATOS_FEED[formato](
+        title=titulo,
+        link=request.build_absolute_uri(enlace),
+        description=descripcion,
+        language='es',
+        feed_url=request.build_absolute_uri(),
+    )
+    for noticia in noticias:
+        url = request.build_absolute_uri(reverse('blog', args=[noticia.slug]))
+        feed.add_item(
+            title=noticia.titulo,
+            link=url,
+            unique_id=url,
+            description=noticia.extracto or noticia.subtitulo or '',
+            pubdate=noticia.fecha_publicacion,
+            updateddate=noticia.fecha_actualizacion,
+            author_name=noticia.autor.username if noticia.autor else None,
+            categories=[noticia.categoria.nombre, *(tag.nombre for tag in noticia.tags.all())],
+        )
+    respuesta = HttpResponse(content_type=feed.content_type)
+    feed.write(respuesta, 'utf-8')
+    return respuesta
+
+
+# --- Sitemaps ---
+
+def _lastmod(fecha) -> str:
+    return fecha.astimezone(tz.utc).isoformat(timespec='seconds')
+
+
+def _entrada(etiqueta: str, url: str, fecha=None) -> str:
+    lastmod = f'<lastmod>{_lastmod(fecha)}</lastmod>' if fecha else ''
+    return f'<{etiqueta}><loc>{escape(url)}</loc>{lastmod}</{etiqueta}>\n'
+
+
+def _documento(raiz: str, entradas) -> str:
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n<{raiz} xmlns="{XMLNS_MAPA}">\n'
+            + ''.join(entradas) + f'</{raiz}>\n')
+
+
+def responder_indice(request) -> HttpResponse:
+    """``sitemap.xml``: una consulta agrupada por tramo de ids."""
+    tramos = list(
+        Noticia.objects.publicadas()
+                       .annotate(mapa=F('pk') / URLS_POR_MAPA)
+                       .values('mapa')
+                       .annotate(ultima=Max('fecha_actualizacion'))
+                       .order_by('mapa')
+                       .values_list('mapa', 'ultima')
+    )
+    entradas = [_entrada('sitemap', request.build_absolute_uri(reverse('mapa_secciones')),
+                         max((ultima for _, ultima in tramos), default=None))]
+    entradas += [
+        _entrada('sitemap', request.build_absolute_uri(reverse('mapa_noticias', args=[mapa])), ultima)
+        for mapa, ultima in tramos
+    ]
+    return HttpResponse(_documento('sitemapindex', entradas), content_type=TIPO_XML)
+
+
+def responder_secciones(request) -> HttpResponse:
+    """Portada, listado general y listado de cada categoría con noticias."""
+    categorias = list(
+        Noticia.objects.publicadas()
+                       .values('categoria__slug')
+                       .annotate(ultima=Max('fecha_actualizacion'))
+                       .order_by('categoria__slug')
+                       .values_list('categoria__slug', 'ultima')
+    )
+    ultima = max((fecha for _, fecha in categorias), default=None)
+    listado = request.build_absolute_uri(reverse('noticias'))
+    entradas = [
+        _entrada('url', request.build_absolute_uri(reverse('index')), ultima),
+        _entrada('url', listado, ultima),
+    ]
+    entradas += [_entrada('url', f'{listado}?category={slug}', fecha) for slug, fecha in categorias]
+    return HttpResponse(_documento('urlset', entradas), content_type=TIPO_XML)
+
+
+def _bloques_tramo(noticias, prefijo: str, sufijo: str):
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{XMLNS_MAPA}">\n'
+    bloque = []
+    for slug, fecha in noticias.iterator(chunk_size=FILAS_POR_BLOQUE):
+        bloque.append(_entrada('url', prefijo + slug + sufijo, fecha))
+        if len(bloque) == FILAS_POR_BLOQUE:
+            yield ''.join(bloque)
+            bloque = []
+    bloque.append('</urlset>\n')
+    yield ''.join(bloque)
+
+
+async def _asincrono(bloques):
+    # Con ASGI, Django consumiría entero un iterador síncrono antes de
+    # enviarlo: se pide bloque a bloque en el hilo de la petición
+    fin = object()
+    while (bloque := await sync_to_async(next)(bloques, fin)) is not fin:
+        yield bloque
+
+
+def tramo(numero: int):
+    """Noticias publicadas del tramo ``numero``, como ``(slug, fecha_actualizacion)``."""
+    return Noticia.objects.publicadas() \
+                          .filter(pk__gte=numero * URLS_POR_MAPA, pk__lt=(numero + 1) * URLS_POR_MAPA) \
+                          .order_by('pk') \
+                          .values_list('slug', 'fecha_actualizacion')
+
+
+def responder_tramo(request, noticias) -> StreamingHttpResponse:
+    # La base de datos se fija ya: el contenido se genera al enviar la
+    # respuesta, fuera de la vista (y de @en_replica)
+    noticias = noticias.using(noticias.db)
+    marca = 'slug-de-la-noticia'
+    prefijo, sufijo = request.build_absolute_uri(reverse('blog', args=[marca])).split(marca)
+
+    bloques = _bloques_tramo(noticias, prefijo, sufijo)
+    if isinstance(request, ASGIRequest):
+        bloques = _asincrono(bloques)
+    return StreamingHttpResponse(bloques, content_type=TIPO_XML)
@@ -0,0 +1,84 @@
+"""
+Caché en proceso para tablas pequeñas que aparecen en todas las páginas
+(redes sociales, categorías del menú lateral) y casi nunca cambian.
+
+Cada proceso guarda su copia en memoria junto con la versión de la tabla.
+La versión vive en la caché compartida de Django, así que cuando una signal
+la sube (al guardar o borrar) todos los workers de gunicorn recargan la
+tabla en su siguiente lectura. En estado estable pintar el layout cuesta
+una lectura de caché y cero consultas a la base de datos.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+PREFIJO = 'noticias:tabla'
+
+_cargadores = {}
+_copias = {}
+_lock = threading.Lock()
+
+
+def tabla(nombre: str):
+    """
+    Registra la función que carga la tabla desde la base de datos.
+    """
+    def decorador(cargador):
+        _cargadores[nombre] = cargador
+        return cargador
+    return decorador
+
+
+def _clave_version(nombre: str) -> str:
+    return f'{PREFIJO}:version:{nombre}'
+
+
+def obtener(nombre: str) -> list:
+    clave = _clave_version(nombre)
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, time.time_ns(), timeout=None)
+        version = cache.get(clave)
+        if version is None:
+            # La caché no guarda nada (p. ej. DummyCache): sin copia local,
+            # porque no habría forma de enterarse de las invalidaciones.
+            return _cargadores[nombre]()
+
+    with _lock:
+        copia = _copias.get(nombre)
+    if copia is not None and copia[0] == version:
+        return copia[1]
+
+    # Leemos la versión ANTES de cargar: si cambia mientras tanto, la
+    # siguiente lectura verá una versión distinta y volverá a cargar.
+    datos = _cargadores[nombre]()
+    with _lock:
+        _copias[nombre] = (version, datos)
+    return datos
+
+
+def invalidar(*nombres: str) -> None:
+    cache.set_many({_clave_version(nombre): time.time_ns() for nombre in nombres}, timeout=None)
+
+
+# --- Tablas ---
+
+@tabla('redes_sociales')
+def _cargar_redes_sociales():
+    from .models import RedSocial
+    return list(RedSocial.objects.all())
+
+
+@tabla('categorias')
+def _cargar_categorias():
+    from .models import Categoria
+    return list(Categoria.objects.all())
+
+
+def redes_sociales() -> list:
+    return obtener('redes_sociales')
+
+
+def categorias(limite: int | None = None) -> list:
+    return obtener('categorias')[:limite]
@@ -0,0 +1,151 @@
+"""
+Cola de tareas en base de datos para procesar banners.
+
+``Noticia.save`` y ``Categoria.save`` guardan el original y crean una
+``TareaImagen``; el comando ``manage.py procesar_imagenes`` reclama tareas
+pendientes y las ejecuta en un pool de procesos. No hace falta ningún
+broker externo: la tabla es la cola.
+
+- Reclamar usa ``SELECT ... FOR UPDATE SKIP LOCKED`` en PostgreSQL, así que
+  se pueden correr varios workers a la vez sin pisarse.
+- Si una tarea falla se reintenta con espera exponencial hasta
+  ``max_intentos``; después queda como fallida (visible en el admin).
+- Las tareas que se quedan "procesando" más de ``TIEMPO_MAXIMO`` (worker
+  caído) vuelven a reclamarse. El intento se cuenta al reclamar, así que
+  una imagen que tumba al proceso también se queda sin intentos.
+"""
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import deduplicacion
+from .imagenes import ImagenDemasiadoGrande
+from .models import Categoria, Noticia, TareaImagen
+from .variantes import generar_variantes
+
+TIEMPO_MAXIMO = timedelta(minutes=10)
+
+ERROR_SIN_RESULTADO = "El proceso que la ejecutaba terminó sin registrar el resultado"
+
+
+def reclamar_tareas(cantidad: int) -> list[int]:
+    """
+    Marca como 'procesando' hasta ``cantidad`` tareas listas y devuelve sus ids.
+
+    El intento se cuenta aquí, en la misma UPDATE: si el proceso muere a
+    mitad (sin memoria con una imagen enorme) queda contado, y la tarea
+    acaba fallida en vez de reclamarse cada ``TIEMPO_MAXIMO`` para siempre.
+    """
+    ahora = timezone.now()
+    listas = Q(estado=TareaImagen.Estado.PENDIENTE, disponible_en__lte=ahora) | Q(
+        estado=TareaImagen.Estado.PROCESANDO,
+        fecha_actualizacion__lt=ahora - TIEMPO_MAXIMO,
+    )
+    with transaction.atomic():
+        filas = list(
+            TareaImagen.objects.select_for_update(skip_locked=True)
+                               .filter(listas)
+                               .order_by('disponible_en')
+                               .values_list('pk', 'intentos', 'max_intentos')[:cantidad]
+        )
+        ids = [pk for pk, intentos, maximo in filas if intentos < maximo]
+        agotadas = [pk for pk, intentos, maximo in filas if intentos >= maximo]
+        TareaImagen.objects.filter(pk__in=ids).update(
+            estado=TareaImagen.Estado.PROCESANDO, intentos=F('intentos') + 1, fecha_actualizacion=ahora,
+        )
+        if agotadas:
+            # Caducadas en 'procesando' sin intentos: su worker murió con ellas
+            TareaImagen.objects.filter(pk__in=agotadas).update(
+                estado=TareaImagen.Estado.FALLIDA, error=ERROR_SIN_RESULTADO, fecha_actualizacion=ahora,
+            )
+    return ids
+
+
+def devolver_tareas(ids, error: str = ERROR_SIN_RESULTADO) -> None:
+    """
+    Las tareas de ``ids`` que siguen en 'procesando' (su proceso murió sin
+    registrar el resultado) se reintentan o, sin intentos, quedan fallidas.
+    """
+    for tarea in TareaImagen.objects.filter(pk__in=ids, estado=TareaImagen.Estado.PROCESANDO):
+        _reintentar(tarea, error)
+        tarea.save()
+
+
+def _reintentar(tarea: TareaImagen, error: str) -> None:
+    tarea.error = error
+    if tarea.intentos >= tarea.max_intentos:
+        tarea.estado = TareaImagen.Estado.FALLIDA
+    else:
+        tarea.estado = TareaImagen.Estado.PENDIENTE
+        tarea.disponible_en = timezone.now() + timedelta(seconds=30 * 2 ** tarea.intentos)
+
+
+def _procesar(tarea: TareaImagen) -> None:
+    if tarea.tipo == TareaImagen.Tipo.BANNER_NOTICIA:
+        modelo = Noticia
+        campos = ['banner', 'banner_medium', 'banner_small', 'variantes', 'imagen_fuente', 'fecha_actualizacion']
+    else:
+        modelo = Categoria
+        campos = ['banner', 'variantes', 'imagen_fuente']
+    objeto = modelo.objects.select_related('imagen_fuente').get(pk=tarea.objeto_id)
+    procesar = objeto.procesar_banner if modelo is Noticia else objeto.procesar_banner_categoria
+
+    original = objeto.banner.name
+    fuente = objeto.imagen_fuente
+    if fuente is not None and fuente.procesada:
+        # Otra con la misma imagen se procesó antes: sin Pillow (ver deduplicacion.py)
+        deduplicacion.aplicar(objeto, fuente)
+    else:
+        procesar()
+        # Las variantes, del original (sigue en el storage hasta el final)
+        objeto.variantes = generar_variantes(objeto, tarea.tipo, origen=original)
+        if fuente is not None:
+            deduplicacion.registrar(fuente, objeto)
+
+    with transaction.atomic():
+        # Procesar lleva segundos: si mientras tanto se subió otro banner, lo
+        # de esta tarea ya no corresponde (la nueva subida trae su tarea)
+        actual = modelo.objects.select_for_update().filter(pk=objeto.pk).values_list('banner', flat=True).first()
+        vigente = actual == original
+        if vigente:
+            objeto.save(procesar_imagenes=False, update_fields=campos)
+
+    if vigente:
+        # El original subido ya no lo usa nadie: solo queda el WebP. Si es de
+        # una imagen fuente, quizá lo espere aún otra tarea
+        if fuente is None and original and original != objeto.banner.name:
+            objeto.banner.storage.delete(original)
+    elif fuente is None:
+        # Descartado. Lo de una imagen fuente no: queda para las que la compartan
+        for ruta in deduplicacion.archivos(objeto, tarea.tipo) - {original}:
+            objeto.banner.storage.delete(ruta)
+    if fuente is not None:
+        deduplicacion.soltar_original(fuente)
+
+
+def ejecutar_tarea(tarea_id: int) -> str:
+    """
+    Ejecuta una tarea reclamada y registra el resultado. Devuelve el estado final.
+    El intento ya lo contó ``reclamar_tareas``.
+    """
+    tarea = TareaImagen.objects.get(pk=tarea_id)
+    try:
+        _procesar(tarea)
+    except (Noticia.DoesNotExist, Categoria.DoesNotExist):
+        # El objeto se borró antes de procesarlo: no hay nada que reintentar
+        tarea.estado = TareaImagen.Estado.COMPLETADA
+        tarea.error = "El objeto ya no existe"
+    except ImagenDemasiadoGrande as error:
+        # Reintentar no cambia el tamaño de la imagen
+        tarea.estado = TareaImagen.Estado.FALLIDA
+        tarea.error = str(error)
+    except Exception:
+        _reintentar(tarea, traceback.format_exc())
+    else:
+        tarea.estado = TareaImagen.Estado.COMPLETADA
+        tarea.error = ''
+    tarea.save()
+    return tarea.estado
@@ -1,6 +1,9 @@
 # core/templatetags/custom_tags.py
 from django import template
 from django.utils.formats import number_format
+from django.utils.html import format_html, format_html_join
+
+from noticias.variantes import srcsets
 
 register = template.Library()
 
@@ -40,4 +43,29 @@ def format_read_time(minutes):
     elif minutes > 60:
         hours = minutes // 60
         return f"{hours} hrs"
-    return f"{minutes} mins"
\ No newline at end of file
+    return f"{minutes} mins"
+
+@register.simple_tag
+def imagen_responsiva(objeto, tipo, respaldo, alt="", sizes="100vw", clase=""):
+    """
+    Emite un <picture> con srcset AVIF/WebP de las variantes generadas
+    (ver noticias/variantes.py). Mientras no existan, solo el <img> de respaldo.
+
+    Uso: {% imagen_responsiva noticia "noticia" noticia.banner_small_url alt=noticia.titulo sizes="300px" %}
+    """
+    imagen = format_html(
+        '<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async">',
+        respaldo, alt, clase,
+    )
+    fuentes = srcsets(objeto, tipo)
+    if not fuentes:
+        return imagen
+
+    return format_html(
+        '<picture>{}{}</picture>',
+        format_html_join(
+            '', '<source type="{}" srcset="{}" sizes="{}">',
+            ((mime, srcset, sizes) for mime, srcset in fuentes),
+        ),
+        imagen,
+    )
@@ -0,0 +1,123 @@
+"""
+Tendencias: "lo más visto" con decaimiento exponencial.
+
+El contador ``Noticia.vistas`` es de toda la vida, así que ordenar por él
+deja arriba para siempre las noticias antiguas, y además obliga a ordenar
+la tabla entera en cada petición. En su lugar cada noticia tiene una fila
+en ``Tendencia`` con una puntuación que pierde la mitad de su valor cada
+``TENDENCIAS_VIDA_MEDIA`` horas y suma las vistas nuevas.
+
+``manage.py actualizar_tendencias`` la recalcula de forma incremental:
+
+1. Un solo UPDATE multiplica todas las puntuaciones vivas por el factor de
+   decaimiento desde la última pasada.
+2. Solo las noticias con vistas nuevas (``vistas > vistas_contadas``) se
+   leen y se reescriben.
+
+Con la puntuación indexada, las vistas piden el top-N con una consulta.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .contador_vistas import aplicar_pendientes
+from .models import Noticia, Tendencia
+
+# Por debajo de esto la puntuación se deja a cero y el UPDATE ya no la toca
+UMBRAL = 0.01
+
+TAMANO_LOTE = 1000
+
+CANDADO = 'noticias:tendencias:candado'
+
+
+def vida_media() -> float:
+    """Horas que tarda una puntuación en perder la mitad de su valor."""
+    return getattr(settings, 'TENDENCIAS_VIDA_MEDIA', 24)
+
+
+def factor_decaimiento(horas: float) -> float:
+    return 0.5 ** (max(horas, 0) / vida_media())
+
+
+def puntuacion_inicial(noticia, ahora) -> float:
+    # Sin historial suponemos que todas sus vistas llegaron al publicarse:
+    # una noticia de hace meses entra con puntuación prácticamente nula.
+    horas = (ahora - noticia.fecha_publicacion).total_seconds() / 3600
+    return noticia.vistas * factor_decaimiento(horas)
+
+
+def actualizar_tendencias(ahora=None) -> int:
+    """
+    Aplica el decaimiento y suma las vistas nuevas. Devuelve cuántas
+    noticias tenían vistas nuevas (o no tenían fila todavía).
+    """
+    ahora = ahora or timezone.now()
+    if not cache.add(CANDADO, 1, timeout=600):
+        # Dos pasadas a la vez aplicarían el decaimiento dos veces
+        return 0
+
+    try:
+        with transaction.atomic():
+            return _actualizar(ahora)
+    finally:
+        cache.delete(CANDADO)
+
+
+def _actualizar(ahora) -> int:
+    ultima = Tendencia.objects.filter(puntuacion__gt=0).aggregate(ultima=Max('fecha_actualizacion'))['ultima']
+    if ultima is not None:
+        factor = factor_decaimiento((ahora - ultima).total_seconds() / 3600)
+        Tendencia.objects.filter(puntuacion__gt=0).update(
+            puntuacion=F('puntuacion') * factor, fecha_actualizacion=ahora,
+        )
+        Tendencia.objects.filter(puntuacion__gt=0, puntuacion__lt=UMBRAL).update(puntuacion=0)
+
+    cambiadas = (
+        Noticia.objects.filter(
+            Q(tendencia__isnull=True)
+            | ~Q(vistas=F('tendencia__vistas_contadas'))
+        )
+        .select_related('tendencia')
+        .only('id', 'vistas', 'fecha_publicacion', 'tendencia')
+        .order_by('pk')
+    )
+
+    total = 0
+    lote = []
+    for noticia in cambiadas.iterator(chunk_size=TAMANO_LOTE):
+        tendencia = getattr(noticia, 'tendencia', None)
+        if tendencia is None:
+            puntuacion = puntuacion_inicial(noticia, ahora)
+        else:
+            # Si el contador bajó (p. ej. se puso a cero en el admin) no restamos
+            puntuacion = tendencia.puntuacion + max(noticia.vistas - tendencia.vistas_contadas, 0)
+        lote.append(Tendencia(noticia_id=noticia.pk, puntuacion=puntuacion,
+                              vistas_contadas=noticia.vistas, fecha_actualizacion=ahora))
+        if len(lote) >= TAMANO_LOTE:
+            total += _guardar(lote)
+            lote = []
+    if lote:
+        total += _guardar(lote)
+    return total
+
+
+def _guardar(lote) -> int:
+    Tendencia.objects.bulk_create(
+        lote, update_conflicts=True, unique_fields=['noticia'],
+        update_fields=['puntuacion', 'vistas_contadas', 'fecha_actualizacion'],
+    )
+    return len(lote)
+
+
+def populares(cantidad: int, excluir=None) -> list:
+    """
+    Las ``cantidad`` noticias publicadas con más tendencia, ya como tarjetas.
+    """
+    # Filtrar por la puntuación fuerza un INNER JOIN: el orden sale del índice
+    noticias = Noticia.objects.publicadas().tarjetas().filter(tendencia__puntuacion__gte=0)
+    if excluir is not None:
+        noticias = noticias.exclude(pk=excluir)
+    return aplicar_pendientes(noticias.order_by('-tendencia__puntuacion')[:cantidad])
@@ -1,3 +1,1716 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image, ImageFile
+
+from . import (almacen_estaticos, api, busqueda, cache_paginas, condicional, contador_vistas, contenido,
+               deduplicacion, facetas, huerfanos, imagenes, importacion, metricas, relacionadas, replicas,
+               sindicacion, tablas_globales, tareas, tendencias, variantes)
+from .models import Categoria, ContadorFaceta, ImagenFuente, Noticia, Relacionada, Tag, TareaImagen
+from .presupuesto_consultas import PresupuestoConsultasMixin
+from .replicas import en_replica
+from .sembrado import sembrar
+
+
+def imagen(nombre: str, color=(200, 30, 30), tamano=(320, 200)) -> SimpleUploadedFile:
+    datos = io.BytesIO()
+    Image.new('RGB', tamano, color).save(datos, 'JPEG')
+    return SimpleUploadedFile(nombre, datos.getvalue(), 'image/jpeg')
+
+
+def descartar_vistas() -> None:
+    # Las vistas que deja una petición en el buffer no deben llegar al
+    # siguiente test (ni al vaciado de atexit, con la base ya destruida)
+    with contador_vistas._lock:
+        contador_vistas._pendientes.clear()
+        if contador_vistas._temporizador is not None:
+            contador_vistas._temporizador.cancel()
+            contador_vistas._temporizador = None
+
+
+class EntornoTestsMixin:
+    """
+    Banners en una carpeta temporal y estáticos sin manifiesto (no hace
+    falta ``collectstatic`` para pintar las plantillas).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._media = tempfile.mkdtemp(prefix='noticias_tests_')
+        cls._ajustes = override_settings(MEDIA_ROOT=cls._media, STORAGES={
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        cls._ajustes.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._ajustes.disable()
+        shutil.rmtree(cls._media, ignore_errors=True)
+
+
+class TendenciasTests(TestCase):
+    """Puntuación con decaimiento exponencial de "lo más visto" (ver tendencias.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ahora = timezone.now()
+        categoria = Categoria.objects.create(nombre='Deportes', slug='deportes')
+        cls.reciente, cls.antigua, cls.borrador = [
+            Noticia.objects.create(titulo=f'Noticia {i}', slug=f'noticia-{i}', contenido='<p>x</p>',
+                                   categoria=categoria, vistas=100, publicado=i != 2,
+                                   fecha_publicacion=cls.ahora - timedelta(hours=horas))
+            for i, horas in enumerate((0, 48, 0))
+        ]
+        # Como tras una carga con bulk_create: sin fila en el ranking
+        tendencias.Tendencia.objects.all().delete()
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(descartar_vistas)
+
+    def puntuaciones(self):
+        return dict(tendencias.Tendencia.objects.values_list('noticia_id', 'puntuacion'))
+
+    def test_decaimiento_y_vistas_nuevas(self):
+        self.assertEqual(tendencias.actualizar_tendencias(self.ahora), 3)
+        puntuaciones = self.puntuaciones()
+        self.assertAlmostEqual(puntuaciones[self.reciente.pk], 100)
+        self.assertAlmostEqual(puntuaciones[self.antigua.pk], 25)  # dos vidas medias
+
+        # Un día después: todas a la mitad y las vistas nuevas suman enteras
+        Noticia.objects.filter(pk=self.antigua.pk).update(vistas=110)
+        self.assertEqual(tendencias.actualizar_tendencias(self.ahora + timedelta(hours=24)), 1)
+        puntuaciones = self.puntuaciones()
+        self.assertAlmostEqual(puntuaciones[self.reciente.pk], 50)
+        self.assertAlmostEqual(puntuaciones[self.antigua.pk], 12.5 + 10)
+
+        # Si el contador baja (puesto a cero en el admin) no se resta
+        Noticia.objects.filter(pk=self.reciente.pk).update(vistas=0)
+        tendencias.actualizar_tendencias(self.ahora + timedelta(hours=24))
+        self.assertAlmostEqual(self.puntuaciones()[self.reciente.pk], 50)
+
+    def test_umbral(self):
+        tendencias.actualizar_tendencias(self.ahora)
+        # Diez vidas medias después, 100 vistas son menos de UMBRAL: a cero
+        dentro_de_un_ano = self.ahora + timedelta(days=365)
+        tendencias.actualizar_tendencias(dentro_de_un_ano)
+        self.assertEqual(set(self.puntuaciones().values()), {0})
+        # Las que están a cero ya no se tocan
+        tendencias.actualizar_tendencias(dentro_de_un_ano + timedelta(days=1))
+        self.assertEqual(set(tendencias.Tendencia.objects.values_list('fecha_actualizacion', flat=True)),
+                         {dentro_de_un_ano})
+
+    def test_una_pasada_a_la_vez(self):
+        cache.add(tendencias.CANDADO, 1)
+        self.addCleanup(cache.delete, tendencias.CANDADO)
+        self.assertEqual(tendencias.actualizar_tendencias(self.ahora), 0)
+        self.assertEqual(self.puntuaciones(), {})
+
+    def test_noticia_nueva_entra_a_cero(self):
+        tendencias.actualizar_tendencias(self.ahora)
+        nueva = Noticia.objects.create(titulo='Nueva', slug='nueva', contenido='<p>x</p>',
+                                       categoria=self.reciente.categoria, vistas=7)
+        self.assertEqual(self.puntuaciones()[nueva.pk], 0)
+        self.assertEqual(tendencias.actualizar_tendencias(self.ahora), 0)
+
+    def test_populares(self):
+        tendencias.actualizar_tendencias(self.ahora)
+        self.assertEqual([n.pk for n in tendencias.populares(5)], [self.reciente.pk, self.antigua.pk])
+        self.assertEqual([n.pk for n in tendencias.populares(5, excluir=self.reciente.pk)], [self.antigua.pk])
+
+
+class ContadorVistasTests(TestCase):
+    """Buffer de vistas y su vaciado en lote (ver contador_vistas.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Deportes', slug='deportes')
+        cls.noticias = [
+            Noticia.objects.create(titulo=f'Noticia {i}', slug=f'noticia-{i}', contenido='<p>x</p>',
+                                   categoria=categoria, vistas=10)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(descartar_vistas)
+
+    def _vistas(self):
+        return dict(Noticia.objects.order_by('pk').values_list('pk', 'vistas'))
+
+    def test_buffer_sin_consultas(self):
+        primera, segunda = self.noticias[:2]
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                contador_vistas.registrar_vista(primera.pk)
+            contador_vistas.registrar_vista(segunda.pk)
+        self.assertEqual(contador_vistas.vistas_pendientes(primera.pk), 3)
+        self.assertEqual(self._vistas()[primera.pk], 10)
+
+        # Las páginas muestran las pendientes sumadas a las guardadas
+        noticias = contador_vistas.aplicar_pendientes(Noticia.objects.filter(pk__in=[segunda.pk, primera.pk])
+                                                                     .order_by('-pk'))
+        self.assertEqual([(noticia.pk, noticia.vistas) for noticia in noticias],
+                         [(segunda.pk, 11), (primera.pk, 13)])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(contador_vistas.vaciar_vistas(), 2)
+        self.assertEqual(contador_vistas.vistas_pendientes(primera.pk), 0)
+        vistas = self._vistas()
+        self.assertEqual((vistas[primera.pk], vistas[segunda.pk]), (13, 11))
+        self.assertEqual(contador_vistas.vaciar_vistas(), 0)
+
+    @mock.patch.object(contador_vistas, 'LOTE_UPDATE', 2)
+    def test_vaciado_en_lotes(self):
+        for noticia in self.noticias:
+            contador_vistas.registrar_vista(noticia.pk)
+        with CaptureQueriesContext(connections['default']) as consultas:
+            self.assertEqual(contador_vistas.vaciar_vistas(), 5)
+        self.assertEqual(len(consultas.captured_queries), 3)
+        self.assertEqual(set(self._vistas().values()), {11})
+
+    @mock.patch.object(contador_vistas, 'LOTE_UPDATE', 2)
+    def test_fallo_devuelve_solo_lo_no_escrito(self):
+        for noticia in self.noticias:
+            contador_vistas.registrar_vista(noticia.pk)
+        update = QuerySet.update
+        llamadas = []
+
+        def update_que_falla(queryset, **kwargs):
+            llamadas.append(1)
+            if len(llamadas) == 2:
+                raise OperationalError('database is locked')
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', update_que_falla), self.assertRaises(OperationalError):
+            contador_vistas.vaciar_vistas()
+        pendientes = [contador_vistas.vistas_pendientes(noticia.pk) for noticia in self.noticias]
+        self.assertEqual(pendientes, [0, 0, 1, 1, 1])
+        self.assertEqual(contador_vistas.vaciar_vistas(), 3)
+        self.assertEqual(set(self._vistas().values()), {11})
+
+    def test_solicitar_vaciado(self):
+        primera, segunda = self.noticias[:2]
+        contador_vistas.registrar_vista(primera.pk)
+        contador_vistas.solicitar_vaciado()
+        # El worker vacía en su siguiente visita, sin esperar al temporizador
+        contador_vistas.registrar_vista(segunda.pk)
+        vistas = self._vistas()
+        self.assertEqual((vistas[primera.pk], vistas[segunda.pk]), (11, 11))
+        self.assertEqual(contador_vistas.vistas_pendientes(primera.pk), 0)
+
+    def test_vaciado_al_salir_sin_base_de_datos(self):
+        with mock.patch.object(contador_vistas, 'vaciar_vistas',
+                               side_effect=OperationalError('no such table: noticias_noticia')), \
+                self.assertLogs('noticias.contador_vistas', 'WARNING'):
+            contador_vistas._vaciar_al_salir()
+
+
+class PresupuestoVistasTests(EntornoTestsMixin, PresupuestoConsultasMixin, TestCase):
+    """
+    Presupuestos de consultas de las vistas públicas, en frío (sin caché de
+    páginas ni tablas globales), para visitantes y con sesión iniciada.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = User.objects.create_user('redaccion', password='clave-de-prueba', is_staff=True)
+        categorias = [Categoria.objects.create(nombre=f'Categoría {i}', slug=f'categoria-{i}') for i in range(3)]
+        tags = [Tag.objects.create(nombre=f'Tag {i}', slug=f'tag-{i}') for i in range(4)]
+        banner = imagen('banner.jpg')
+        for i in range(20):
+            banner.seek(0)
+            noticia = Noticia.objects.create(
+                titulo=f'Noticia {i} sobre el agua', slug=f'noticia-{i}', contenido=f'<p>Texto {i} del ejido</p>',
+                banner=SimpleUploadedFile(f'banner-{i}.jpg', banner.read(), 'image/jpeg'),
+                categoria=categorias[i % 3], autor=cls.autor, vistas=i,
+            )
+            noticia.tags.set(tags[:i % 4 + 1])
+
+    def setUp(self):
+        cache.clear()
+        tablas_globales.invalidar('categorias')
+        self.addCleanup(descartar_vistas)
+
+    def _urls(self):
+        return ['/', '/blog/noticia-3/', '/noticias/', '/noticias/?q=agua',
+                '/noticias/?category=categoria-1', '/noticias/?tag=tag-2', '/noticias/?page=2']
+
+    def test_anonimo(self):
+        for url in self._urls():
+            with self.subTest(url=url):
+                respuesta = self.assertDentroDePresupuesto(url)
+                self.assertEqual(respuesta.status_code, 200)
+
+    def test_con_sesion(self):
+        # Las consultas de la sesión y del usuario no cuentan para la vista
+        self.client.force_login(self.autor)
+        for url in self._urls():
+            with self.subTest(url=url):
+                respuesta = self.assertDentroDePresupuesto(url)
+                self.assertEqual(respuesta.status_code, 200)
+
+    def test_sin_sesion_con_cookie(self):
+        # Cookie de sesión caducada o de otro sitio: el usuario sigue siendo anónimo
+        self.client.cookies['sessionid'] = 'no-existe'
+        respuesta = self.assertDentroDePresupuesto('/')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_presupuesto_excedido(self):
+        with self.assertRaises(AssertionError):
+            self.assertDentroDePresupuesto('/blog/noticia-3/', maximo=1)
+
+
+class VistasAsincronasTests(EntornoTestsMixin, TransactionTestCase):
+    """
+    Las vistas de ASGI (ver views_asincronas.py) devuelven el mismo HTML que
+    las de WSGI. TransactionTestCase: sus consultas van en otros hilos, con
+    su propia conexión, y tienen que ver los datos.
+    """
+
+    def setUp(self):
+        cache.clear()
+        categorias = [Categoria.objects.create(nombre=f'Categoría {i}', slug=f'categoria-{i}') for i in range(3)]
+        tags = [Tag.objects.create(nombre=f'Tag {i}', slug=f'tag-{i}') for i in range(4)]
+        banner = default_storage.save('noticias/banners/asincronas.jpg', imagen('asincronas.jpg'))
+        inicio = timezone.now() - timedelta(days=20)
+        for i in range(12):
+            noticia = Noticia.objects.create(
+                titulo=f'Noticia {i}', slug=f'noticia-{i}', contenido=f'<p>Texto {i}</p>', banner=banner,
+                categoria=categorias[i % 3], vistas=(i * 7) % 12, fecha_publicacion=inicio + timedelta(days=i),
+            )
+            noticia.tags.set(tags[:i % 4 + 1])
+        # Las nuevas entran a cero en el ranking: que "lo más visto" tenga orden
+        tendencias.Tendencia.objects.all().delete()
+        tendencias.actualizar_tendencias()
+        relacionadas.calcular_todas()
+        self.addCleanup(descartar_vistas)
+
+    def html(self, url, cliente):
+        cache.clear()
+        tablas_globales.invalidar('categorias')
+        descartar_vistas()
+        respuesta = async_to_sync(cliente.get)(url) if cliente is self.async_client else cliente.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.content.decode()
+
+    def test_mismo_html(self):
+        for url in ('/', '/blog/noticia-4/', '/blog/noticia-11/'):
+            with self.subTest(url=url):
+                sincrona = self.html(url, self.client)
+                with override_settings(ROOT_URLCONF='ejidonoticias_application.urls_asgi'):
+                    self.assertEqual(resolve(url).func.__module__, 'noticias.views_asincronas')
+                    asincrona = self.html(url, self.async_client)
+                self.assertHTMLEqual(asincrona, sincrona)
+
+    def test_404(self):
+        with override_settings(ROOT_URLCONF='ejidonoticias_application.urls_asgi'):
+            respuesta = async_to_sync(self.async_client.get)('/blog/no-existe/')
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class PaginacionListadoTests(EntornoTestsMixin, TestCase):
+    """Paginación numerada con tope y continuación por cursor."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Deportes', slug='deportes')
+        inicio = timezone.now() - timedelta(days=200)
+        banner = default_storage.save('noticias/banners/listado.jpg', imagen('listado.jpg'))
+        Noticia.objects.bulk_create([
+            Noticia(titulo=f'Noticia {i} sobre el agua', slug=f'noticia-{i}', contenido='<p>x</p>',
+                    categoria=categoria, fecha_publicacion=inicio + timedelta(days=i), banner=banner)
+            for i in range(100)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(descartar_vistas)
+
+    def _titulos(self, respuesta):
+        return [noticia.titulo for noticia in respuesta.context['blogs']]
+
+    def test_tope_del_listado(self):
+        self.assertEqual(self.client.get('/noticias/?page=6').status_code, 404)
+        respuesta = self.client.get('/noticias/?page=5')
+        self.assertNotContains(respuesta, 'page=6')
+        # "Siguiente" continúa por cursor justo donde acaba la página 5
+        cursor = respuesta.context['cursor_siguiente']
+        self.assertContains(respuesta, f'cursor={cursor}')
+        siguiente = self.client.get('/noticias/', {'cursor': cursor})
+        self.assertEqual(self._titulos(siguiente)[0], 'Noticia 24 sobre el agua')
+        self.assertIsNone(self.client.get('/noticias/?page=4').context['cursor_siguiente'])
+
+    def test_busqueda_sin_tope(self):
+        respuesta = self.client.get('/noticias/', {'q': 'agua', 'page': 5})
+        self.assertContains(respuesta, 'page=6')
+        self.assertIsNone(respuesta.context['cursor_siguiente'])
+        ultima = self.client.get('/noticias/', {'q': 'agua', 'page': 7})
+        self.assertEqual(ultima.status_code, 200)
+        self.assertEqual(len(self._titulos(ultima)), 10)
+
+
+class PeticionesCondicionalesTests(EntornoTestsMixin, TestCase):
+    """ETag / Last-Modified / 304 de las páginas públicas (ver condicional.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = User.objects.create_user('redaccion', password='clave-de-prueba')
+        categoria = Categoria.objects.create(nombre='Deportes', slug='deportes')
+        banner = default_storage.save('noticias/banners/condicional.jpg', imagen('condicional.jpg'))
+        cls.noticias = [
+            Noticia.objects.create(titulo=f'Noticia {i}', slug=f'noticia-{i}', contenido='<p>x</p>',
+                                   categoria=categoria, banner=banner)
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(descartar_vistas)
+
+    def test_blog(self):
+        url = '/blog/noticia-1/'
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        etag = respuesta['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('Last-Modified', respuesta)
+        self.assertEqual(respuesta['Cache-Control'], 'public, no-cache')
+        self.assertIn('Cookie', respuesta['Vary'])
+
+        # Sin ejecutar la vista: solo la consulta de validación. La visita cuenta
+        descartar_vistas()
+        with self.assertNumQueries(1):
+            no_modificada = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(no_modificada.status_code, 304)
+        self.assertEqual(no_modificada['ETag'], etag)
+        self.assertEqual(contador_vistas.vistas_pendientes(self.noticias[1].pk), 1)
+        fecha = respuesta['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=fecha).status_code, 304)
+
+        # Al cambiar la noticia cambia el ETag
+        with self.captureOnCommitCallbacks(execute=True):
+            self.noticias[1].titulo = 'Otro título'
+            self.noticias[1].save()
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_cambia_con_el_tramo(self):
+        # Los contadores de vistas y "lo más visto" cambian sin tocar la noticia
+        etag = self.client.get('/blog/noticia-1/')['ETag']
+        feed = self.client.get('/feed/rss/')['ETag']
+        with mock.patch.object(condicional, 'time') as reloj:
+            reloj.time.return_value = time.time() + settings.CACHE_PAGINAS_TTL
+            reloj.time_ns = time.time_ns
+            self.assertEqual(self.client.get('/blog/noticia-1/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+            # Los feeds no muestran contadores
+            self.assertEqual(self.client.get('/feed/rss/', HTTP_IF_NONE_MATCH=feed).status_code, 304)
+
+    def test_listados(self):
+        respuesta = self.client.get('/noticias/')
+        self.assertEqual(self.client.get('/noticias/', HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        self.assertNotEqual(self.client.get('/noticias/?category=deportes')['ETag'], respuesta['ETag'])
+        # Una noticia nueva cambia la primera página
+        with self.captureOnCommitCallbacks(execute=True):
+            Noticia.objects.create(titulo='Nueva', slug='nueva', contenido='<p>x</p>',
+                                   categoria=self.noticias[0].categoria, banner=self.noticias[0].banner.name)
+        self.assertEqual(self.client.get('/noticias/', HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+        # Las búsquedas no se validan
+        self.assertNotIn('ETag', self.client.get('/noticias/?q=noticia'))
+
+    def test_con_sesion(self):
+        self.client.force_login(self.autor)
+        respuesta = self.client.get('/blog/noticia-1/')
+        self.assertNotIn('ETag', respuesta)
+        self.assertIn('private', respuesta['Cache-Control'])
+
+
+@mock.patch.object(sindicacion, 'URLS_POR_MAPA', 2)
+class SindicacionTests(EntornoTestsMixin, TestCase):
+    """Tramos del sitemap por id y revalidación de sitemaps y feeds (ver sindicacion.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.deportes = Categoria.objects.create(nombre='Deportes', slug='deportes')
+        cls.cultura = Categoria.objects.create(nombre='Cultura', slug='cultura')
+        # Con dos URLs por tramo: 0 = {1}, 1 = {2, 3}, 2 = {4, 5}, 3 vacío, 4 = {9}
+        cls.noticias = {
+            pk: Noticia.objects.create(pk=pk, titulo=f'Noticia {pk}', slug=f'noticia-{pk}', contenido='<p>x</p>',
+                                       categoria=cls.cultura if pk == 9 else cls.deportes)
+            for pk in (1, 2, 3, 4, 5, 9)
+        }
+        Noticia.objects.create(pk=7, titulo='Borrador', slug='borrador', contenido='<p>x</p>',
+                               categoria=cls.deportes, publicado=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self, respuesta):
+        contenido = b''.join(respuesta.streaming_content if respuesta.streaming else [respuesta.content])
+        return [loc.split('</loc>')[0] for loc in contenido.decode().split('<loc>')[1:]]
+
+    def guardar(self, pk):
+        with self.captureOnCommitCallbacks(execute=True):
+            noticia = self.noticias[pk]
+            noticia.titulo += ' (editada)'
+            noticia.save()
+
+    def test_tramos(self):
+        self.assertEqual(self.urls(self.client.get('/sitemap.xml')), [
+            'http://testserver/sitemap-secciones.xml',
+            *(f'http://testserver/sitemap-noticias-{numero}.xml' for numero in (0, 1, 2, 4)),
+        ])
+        self.assertEqual(self.urls(self.client.get('/sitemap-noticias-1.xml')),
+                         ['http://testserver/blog/noticia-2/', 'http://testserver/blog/noticia-3/'])
+        # Los borradores no salen: el tramo 3 solo tiene uno
+        self.assertEqual(self.client.get('/sitemap-noticias-3.xml').status_code, 404)
+        self.assertEqual(self.urls(self.client.get('/sitemap-noticias-4.xml')), ['http://testserver/blog/noticia-9/'])
+
+        # Una noticia nueva cae en su tramo sin mover las demás
+        Noticia.objects.create(pk=6, titulo='Noticia 6', slug='noticia-6', contenido='<p>x</p>',
+                               categoria=self.deportes)
+        self.assertEqual(self.urls(self.client.get('/sitemap-noticias-2.xml')),
+                         ['http://testserver/blog/noticia-4/', 'http://testserver/blog/noticia-5/'])
+        self.assertEqual(self.urls(self.client.get('/sitemap-noticias-3.xml')), ['http://testserver/blog/noticia-6/'])
+
+    def test_etag_por_tramo(self):
+        etags = {numero: self.client.get(f'/sitemap-noticias-{numero}.xml')['ETag'] for numero in (1, 2)}
+        indice = self.client.get('/sitemap.xml')['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/sitemap-noticias-1.xml', HTTP_IF_NONE_MATCH=etags[1]).status_code, 304)
+
+        self.guardar(3)
+        self.assertEqual(self.client.get('/sitemap-noticias-1.xml', HTTP_IF_NONE_MATCH=etags[1]).status_code, 200)
+        self.assertEqual(self.client.get('/sitemap-noticias-2.xml', HTTP_IF_NONE_MATCH=etags[2]).status_code, 304)
+        # El lastmod del índice cambia con cualquier noticia
+        self.assertEqual(self.client.get('/sitemap.xml', HTTP_IF_NONE_MATCH=indice).status_code, 200)
+
+    def test_etag_feeds(self):
+        general = self.client.get('/feed/rss/')
+        self.assertEqual(general['Content-Type'], 'application/rss+xml; charset=utf-8')
+        etags = {
+            url: self.client.get(url)['ETag']
+            for url in ('/feed/rss/', '/feed/atom/', '/feed/categoria/cultura/rss/', '/feed/categoria/deportes/rss/')
+        }
+        for url, etag in etags.items():
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304, url)
+
+        self.guardar(2)
+        cambiados = {url for url, etag in etags.items()
+                     if self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200}
+        self.assertEqual(cambiados, {'/feed/rss/', '/feed/atom/', '/feed/categoria/deportes/rss/'})
+
+
+@mock.patch.object(api, 'API_POR_PAGINA', 4)
+class ApiTests(EntornoTestsMixin, PresupuestoConsultasMixin, TestCase):
+    """``?fields=``, paginación por cursor y consultas por página de la API (ver api.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        autor = User.objects.create_user('redaccion', password='clave-de-prueba')
+        categorias = [Categoria.objects.create(nombre=f'Categoría {i}', slug=f'categoria-{i}') for i in range(2)]
+        tags = [Tag.objects.create(nombre=f'Tag {i}', slug=f'tag-{i}') for i in range(3)]
+        banner = default_storage.save('noticias/banners/api.jpg', imagen('api.jpg'))
+        inicio = timezone.now() - timedelta(days=30)
+        for i in range(11):
+            # Fechas repetidas de dos en dos: el cursor desempata por id
+            noticia = Noticia.objects.create(
+                titulo=f'Noticia {i} sobre el agua', slug=f'noticia-{i}', contenido=f'<p>Texto {i}</p>',
+                banner=banner, categoria=categorias[i % 2], autor=autor if i % 3 else None,
+                fecha_publicacion=inicio + timedelta(days=i // 2),
+            )
+            noticia.tags.set(tags[:i % 3 + 1])
+        Noticia.objects.create(titulo='Borrador', slug='borrador', contenido='<p>x</p>', banner=banner,
+                               categoria=categorias[0], publicado=False)
+        cls.orden = list(Noticia.objects.publicadas().order_by('-fecha_publicacion', '-id')
+                                        .values_list('slug', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        tablas_globales.invalidar('categorias')
+
+    def json(self, url):
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, respuesta.content)
+        return respuesta.json()
+
+    def recorrer(self, url):
+        """Slugs de todas las páginas siguiendo ``siguiente``, y el número de páginas."""
+        slugs, paginas = [], 0
+        while url:
+            datos = self.json(url)
+            self.assertLessEqual(len(datos['resultados']), api.API_POR_PAGINA)
+            slugs += [noticia['slug'] for noticia in datos['resultados']]
+            paginas += 1
+            url = datos['siguiente']
+        return slugs, paginas
+
+    def test_campos(self):
+        with CaptureQueriesContext(connections['default']) as consultas:
+            datos = self.json('/api/noticias/?fields=titulo,slug,titulo')
+        self.assertEqual([list(noticia) for noticia in datos['resultados']], [['titulo', 'slug']] * 4)
+        # Ni el cuerpo, ni JOIN, ni los tags si no se piden
+        sql = ' '.join(consulta['sql'] for consulta in consultas.captured_queries)
+        self.assertNotIn('"contenido', sql)
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('noticias_noticia_tags', sql)
+
+        noticia = self.json('/api/noticias/?fields=slug,categoria,autor,tags&category=categoria-1')['resultados'][0]
+        self.assertEqual(noticia['categoria'], {'id': noticia['categoria']['id'], 'nombre': 'Categoría 1',
+                                                'slug': 'categoria-1'})
+        pedida = Noticia.objects.get(slug=noticia['slug'])
+        self.assertEqual(noticia['autor'], pedida.autor.username if pedida.autor else None)
+        self.assertEqual([tag['slug'] for tag in noticia['tags']],
+                         sorted(pedida.tags.values_list('slug', flat=True)))
+
+        detalle = self.json('/api/noticias/noticia-3/?fields=contenido,relacionadas')
+        self.assertEqual(list(detalle), ['contenido', 'relacionadas'])
+        self.assertEqual(detalle['contenido'], '<p>Texto 3</p>')
+
+    def test_campos_invalidos(self):
+        for url in ('/api/noticias/?fields=titulo,clave', '/api/noticias/?fields=,',
+                    '/api/noticias/?fields=contenido', '/api/noticias/noticia-3/?fields=otro'):
+            with self.subTest(url=url):
+                respuesta = self.client.get(url)
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertIn('Disponibles', respuesta.json()['error'])
+
+    def test_cursor(self):
+        slugs, paginas = self.recorrer('/api/noticias/?fields=slug')
+        self.assertEqual(slugs, self.orden)
+        self.assertEqual(paginas, 3)
+        # Los filtros viajan en los enlaces
+        slugs, _ = self.recorrer('/api/noticias/?fields=slug&category=categoria-0')
+        self.assertEqual(slugs, [slug for slug in self.orden if int(slug.split('-')[1]) % 2 == 0])
+        slugs, _ = self.recorrer('/api/noticias/?fields=slug&tag=tag-2&q=agua')
+        self.assertEqual(slugs, [slug for slug in self.orden if int(slug.split('-')[1]) % 3 == 2])
+
+        # "anterior" vuelve a la misma página
+        primera = self.json('/api/noticias/?fields=slug')
+        self.assertIsNone(primera['anterior'])
+        segunda = self.json(primera['siguiente'])
+        self.assertEqual(self.json(segunda['anterior'])['resultados'], primera['resultados'])
+
+        self.assertEqual(self.client.get('/api/noticias/?cursor=no-es-un-cursor').status_code, 400)
+
+    def test_consultas_por_pagina(self):
+        # Las mismas consultas con 2 noticias por página que con 8, y dentro
+        # del presupuesto de la vista, sea cual sea la combinación de campos
+        for campos in ('', 'slug', 'tags', 'banner,categoria,autor,tags', 'url,extracto,vistas'):
+            with self.subTest(campos=campos):
+                numeros = []
+                for por_pagina in (2, 8):
+                    cache.clear()
+                    with mock.patch.object(api, 'API_POR_PAGINA', por_pagina), \
+                            CaptureQueriesContext(connections['default']) as consultas:
+                        respuesta = self.assertDentroDePresupuesto(f'/api/noticias/?fields={campos}')
+                    self.assertEqual(len(respuesta.json()['resultados']), por_pagina)
+                    numeros.append(len(consultas))
+                self.assertEqual(numeros[0], numeros[1])
+
+
+class InvalidacionTrasCommitTests(TestCase):
+    """Las versiones de la caché suben al confirmar el cambio, no antes."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_paginas(self):
+        categoria = Categoria.objects.create(nombre='Deportes', slug='deportes')
+        antes = cache_paginas.versiones(['global'], crear_con=1)
+        with self.captureOnCommitCallbacks(execute=False) as pendientes:
+            categoria.nombre = 'Deporte'
+            categoria.save()
+        self.assertEqual(cache_paginas.versiones(['global']), antes)
+        for callback in pendientes:
+            callback()
+        self.assertNotEqual(cache_paginas.versiones(['global']), antes)
+
+    def test_tablas_globales(self):
+        Categoria.objects.create(nombre='Deportes', slug='deportes')
+        self.assertEqual([categoria.slug for categoria in tablas_globales.categorias()], ['deportes'])
+        with self.captureOnCommitCallbacks(execute=False) as pendientes:
+            Categoria.objects.create(nombre='Cultura', slug='cultura')
+            # Otro proceso que recargue antes del commit no ve la nueva
+            self.assertEqual([categoria.slug for categoria in tablas_globales.categorias()], ['deportes'])
+        for callback in pendientes:
+            callback()
+        self.assertEqual([categoria.slug for categoria in tablas_globales.categorias()], ['cultura', 'deportes'])
+
+
+class MetricasTests(EntornoTestsMixin, TestCase):
+    """Cabecera Server-Timing y agregación para Prometheus (ver metricas.py)."""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp(prefix='metricas_tests_')
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = override_settings(METRICAS_DIR=directorio, METRICAS_TOKEN='', METRICAS_MUESTREO=1.0)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.directorio = metricas.Path(directorio)
+        registro = mock.patch.object(metricas, '_registro', metricas.Registro())
+        registro.start()
+        self.addCleanup(registro.stop)
+
+    def pedir(self, consultas=2):
+        def vista(request):
+            for _ in range(consultas):
+                Categoria.objects.count()
+            return HttpResponse('ok')
+        return metricas.MetricasMiddleware(vista)(RequestFactory().get('/'))
+
+    def test_server_timing(self):
+        cabecera = self.pedir()['Server-Timing']
+        self.assertRegex(cabecera, r'^db;dur=[\d.]+;desc="2 consultas", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+        with override_settings(METRICAS_MUESTREO=0.0):
+            self.assertNotIn('Server-Timing', self.pedir())
+        with override_settings(METRICAS_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.pedir())
+
+    def test_suma_de_procesos(self):
+        self.pedir(consultas=2)
+        self.pedir(consultas=4)
+        # Un worker que ya terminó (pid inexistente) dejó su archivo
+        terminado = metricas.Registro()
+        terminado.observar('blog', 200, {'sql_consultas': 30})
+        terminado.observar(metricas.SIN_RUTA, 404, {'sql_consultas': 1})
+        (self.directorio / '999999999-1.json').write_text(json.dumps(terminado.instantanea()))
+
+        texto = metricas.texto_prometheus()
+        consultas = 'ejidonoticias_sql_consultas'
+        # Histogramas acumulados por cubeta: 1 (404), 2, 4 -> 'le="5"' cuenta 3
+        self.assertIn(f'{consultas}_bucket{{vista="<sin_ruta>",le="1"}} 1\n', texto)
+        self.assertIn(f'{consultas}_bucket{{vista="<sin_ruta>",le="2"}} 2\n', texto)
+        self.assertIn(f'{consultas}_bucket{{vista="<sin_ruta>",le="5"}} 3\n', texto)
+        self.assertIn(f'{consultas}_sum{{vista="<sin_ruta>"}} 7.0\n', texto)
+        self.assertIn(f'{consultas}_count{{vista="<sin_ruta>"}} 3\n', texto)
+        self.assertIn(f'{consultas}_bucket{{vista="blog",le="20"}} 0\n', texto)
+        self.assertIn(f'{consultas}_bucket{{vista="blog",le="50"}} 1\n', texto)
+        self.assertIn('ejidonoticias_respuestas_total{vista="<sin_ruta>",codigo="200"} 2\n', texto)
+        self.assertIn('ejidonoticias_respuestas_total{vista="<sin_ruta>",codigo="404"} 1\n', texto)
+
+        # El archivo del worker terminado pasa al acumulado: nada baja
+        self.assertFalse((self.directorio / '999999999-1.json').exists())
+        self.assertTrue((self.directorio / metricas.ACUMULADO).exists())
+        self.assertEqual(metricas.texto_prometheus(), texto)
+
+    def test_endpoint_protegido(self):
+        url = reverse('metricas')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with override_settings(METRICAS_TOKEN='secreto'):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer otro').status_code, 404)
+            respuesta = self.client.get(url, HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+        # Las peticiones anteriores, con el nombre de la vista
+        self.assertIn('ejidonoticias_respuestas_total{vista="metricas",codigo="404"} 2\n', respuesta.content.decode())
+
+
+class AlmacenEstaticosTests(SimpleTestCase):
+    """``collectstatic`` con hash, comprimidos y formatos modernos (ver almacen_estaticos.py)."""
+
+    def setUp(self):
+        self.origen = tempfile.mkdtemp(prefix='estaticos_origen_')
+        self.destino = tempfile.mkdtemp(prefix='estaticos_destino_')
+        for carpeta in (self.origen, self.destino):
+            self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        ajustes = override_settings(
+            STATICFILES_DIRS=[self.origen], STATIC_ROOT=self.destino,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={**settings.STORAGES,
+                      'staticfiles': {'BACKEND': 'noticias.almacen_estaticos.AlmacenEstaticos'}},
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.escribir('css/estilo.css', b'body { background: url("../img/fondo.png"); }\n'
+                                        b'.logo { background: url("../img/no-existe.png"); }\n' * 20)
+        self.escribir('js/vacio.js', b';')
+        ruido = io.BytesIO()
+        Image.effect_noise((128, 128), 40).convert('RGB').save(ruido, 'PNG')
+        self.escribir('img/fondo.png', ruido.getvalue())
+
+    def escribir(self, nombre, datos):
+        ruta = os.path.join(self.origen, *nombre.split('/'))
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as archivo:
+            archivo.write(datos)
+
+    def recopilar(self):
+        with mock.patch.object(almacen_estaticos.logger, 'warning') as aviso:
+            call_command('collectstatic', interactive=False, verbosity=0)
+        return [llamada.args[1:] for llamada in aviso.call_args_list]
+
+    def leer(self, nombre):
+        with open(os.path.join(self.destino, *nombre.split('/')), 'rb') as archivo:
+            return archivo.read()
+
+    def test_recopilar(self):
+        avisos = self.recopilar()
+        manifiesto = json.loads(self.leer('staticfiles.json'))['paths']
+        css, fondo = manifiesto['css/estilo.css'], manifiesto['img/fondo.png']
+        self.assertRegex(css, r'^css/estilo\.[0-9a-f]{12}\.css$')
+
+        # Referencias reescritas al nombre con hash; las rotas, como estaban
+        contenido_css = self.leer(css)
+        self.assertIn(f'url("../{fondo}")'.encode(), contenido_css)
+        self.assertIn(b'url("../img/no-existe.png")', contenido_css)
+        self.assertEqual(avisos, [('css/estilo.css', '../img/no-existe.png')])  # una vez, no por pasada
+
+        self.assertEqual(gzip.decompress(self.leer(css + '.gz')), contenido_css)
+        variantes = json.loads(self.leer('variantes.json'))
+        esperadas = ['.gz', '.br'] if almacen_estaticos.brotli else ['.gz']
+        self.assertEqual(variantes[css], esperadas)
+        # Solo se guardan las que pesan menos: un JS de un byte no se comprime
+        self.assertEqual(variantes[manifiesto['js/vacio.js']], [])
+        self.assertFalse(os.path.exists(os.path.join(self.destino, manifiesto['js/vacio.js'] + '.gz')))
+        for sufijo in variantes[fondo]:
+            self.assertLess(len(self.leer(fondo + sufijo)), len(self.leer(fondo)))
+        self.assertIn('.webp', variantes[fondo])
+
+    def test_segunda_pasada_solo_lo_nuevo(self):
+        self.recopilar()
+        self.escribir('js/nuevo.js', b'console.log("ejido");\n' * 50)
+        generar = almacen_estaticos.generar_variantes
+        with mock.patch.object(almacen_estaticos, 'generar_variantes', side_effect=generar) as espia:
+            self.recopilar()
+        manifiesto = json.loads(self.leer('staticfiles.json'))['paths']
+        self.assertEqual([llamada.args[0] for llamada in espia.call_args_list],
+                         [os.path.join(self.destino, manifiesto['js/nuevo.js'])])
+        self.assertIn(manifiesto['css/estilo.css'], json.loads(self.leer('variantes.json')))
+
+
+class ContenidoTests(SimpleTestCase):
+    """El saneado conserva los vídeos y el formato que pone CKEditor."""
+
+    def test_videos_permitidos(self):
+        resultado = contenido.procesar(
+            '<iframe src="https://www.youtube.com/embed/abc" width="560" allowfullscreen onload="x()">'
+            'alternativo</iframe><p>Texto</p>'
+        )
+        self.assertEqual(
+            resultado.html,
+            '<iframe src="https://www.youtube.com/embed/abc" width="560" allowfullscreen="" loading="lazy">'
+            '</iframe><p>Texto</p>',
+        )
+        self.assertEqual(resultado.descartado, ())
+
+    def test_incrustados_descartados(self):
+        resultado = contenido.procesar(
+            '<iframe src="https://otro.example/video"></iframe><iframe src="http://www.youtube.com/embed/abc">'
+            '</iframe><object data="x"><embed src="y"></object><embed src="z"><p>Sigue</p>'
+        )
+        self.assertEqual(resultado.html, '<p>Sigue</p>')
+        self.assertEqual(resultado.descartado, ('iframe otro.example', 'iframe www.youtube.com', 'object', 'embed'))
+
+    def test_estilos_de_color(self):
+        resultado = contenido.procesar(
+            '<span style="color:rgb(255, 0, 0); background-color:#ff0; font-size:18px; '
+            'color:url(x); background-color:expression(alert(1))">Hola</span>'
+        )
+        self.assertEqual(
+            resultado.html, '<span style="color:rgb(255, 0, 0); background-color:#ff0; font-size:18px">Hola</span>'
+        )
+
+
+class BusquedaTests(TestCase):
+    """Búsqueda de ``/noticias/?q=``; en SQLite, con el índice en memoria (ver busqueda.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Local', slug='local')
+        cls.en_titulo = Noticia.objects.create(titulo='Educación en el ejido', slug='titulo', categoria=categoria,
+                                               contenido='<p>Asamblea de padres</p>')
+        cls.en_contenido = Noticia.objects.create(titulo='Asamblea', slug='contenido', categoria=categoria,
+                                                  contenido='<p>Se habló de <strong>educación</strong></p>')
+        cls.en_tag = Noticia.objects.create(titulo='Nueva escuela', slug='tag', categoria=categoria,
+                                            contenido='<p>Inauguración</p>')
+        cls.en_tag.tags.add(Tag.objects.create(nombre='Educación', slug='educacion'))
+        cls.sin_publicar = Noticia.objects.create(titulo='Educación (borrador)', slug='borrador',
+                                                  categoria=categoria, contenido='', publicado=False)
+
+    def setUp(self):
+        busqueda.invalidar_indice()
+
+    def buscar(self, query):
+        return [noticia.pk for noticia in busqueda.buscar(Noticia.objects.publicadas(), query)]
+
+    def test_orden_por_relevancia(self):
+        # Título (A) antes que tags (B) y que contenido (C); sin las no publicadas
+        self.assertEqual(self.buscar('educación'),
+                         [self.en_titulo.pk, self.en_tag.pk, self.en_contenido.pk])
+
+    def test_sin_acentos_ni_mayusculas_ni_palabras_vacias(self):
+        self.assertEqual(self.buscar('EDUCACION'), self.buscar('educación'))
+        self.assertEqual(self.buscar('la educacion de'), self.buscar('educación'))
+
+    def test_todas_las_palabras(self):
+        self.assertCountEqual(self.buscar('educación asamblea'), [self.en_titulo.pk, self.en_contenido.pk])
+        self.assertEqual(self.buscar('educación piscina'), [])
+        # El HTML no cuenta como texto
+        self.assertEqual(self.buscar('strong'), [])
+
+    def test_indice_al_dia(self):
+        self.assertEqual(self.buscar('piscina'), [])
+        nueva = Noticia.objects.create(titulo='Piscina municipal', slug='piscina', contenido='',
+                                       categoria=self.en_titulo.categoria)
+        self.assertEqual(self.buscar('piscina'), [nueva.pk])
+        self.en_contenido.tags.add(Tag.objects.create(nombre='Piscina', slug='piscina'))
+        self.assertEqual(self.buscar('piscina'), [nueva.pk, self.en_contenido.pk])
+
+    def test_filtrar_y_mejores(self):
+        filtradas = busqueda.filtrar(Noticia.objects.publicadas(), 'educación')
+        self.assertEqual(set(filtradas.values_list('pk', flat=True)),
+                         {self.en_titulo.pk, self.en_tag.pk, self.en_contenido.pk})
+        # Con una palabra frecuente, solo las de mayor puntuación
+        self.assertEqual(set(busqueda._indice_local.mejores('educación', maximo=2)),
+                         {self.en_titulo.pk, self.sin_publicar.pk})
+
+
+class ContarVistaTests(TestCase):
+    """El beacon anónimo no deja inflar las vistas ni atascar el buffer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Deportes', slug='deportes')
+        cls.publicada = Noticia.objects.create(titulo='Publicada', slug='publicada', contenido='<p>x</p>',
+                                               categoria=categoria)
+        cls.borrador = Noticia.objects.create(titulo='Borrador', slug='borrador', contenido='<p>x</p>',
+                                              categoria=categoria, publicado=False)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(descartar_vistas)
+
+    def _beacon(self, noticia_id, ip='10.0.0.1'):
+        return self.client.post(reverse('contar_vista', args=[noticia_id]), REMOTE_ADDR=ip)
+
+    def test_solo_noticias_publicadas(self):
+        self.assertEqual(self._beacon(self.borrador.pk).status_code, 404)
+        self.assertEqual(self._beacon(self.publicada.pk + 1000).status_code, 404)
+        self.assertEqual(self._beacon(self.publicada.pk).status_code, 204)
+        self.assertEqual(contador_vistas.vistas_pendientes(self.publicada.pk), 1)
+
+    def test_limite_por_cliente(self):
+        self.assertEqual(self._beacon(self.publicada.pk).status_code, 204)
+        self.assertEqual(self._beacon(self.publicada.pk).status_code, 429)
+        self.assertEqual(self._beacon(self.publicada.pk, ip='10.0.0.2').status_code, 204)
+        self.assertEqual(contador_vistas.vistas_pendientes(self.publicada.pk), 2)
+
+    @override_settings(VISTAS_LIMITE_CLIENTE=1)
+    def test_limite_total_por_cliente(self):
+        self.assertEqual(self._beacon(self.publicada.pk).status_code, 204)
+        Noticia.objects.filter(pk=self.borrador.pk).update(publicado=True)
+        self.assertEqual(self._beacon(self.borrador.pk).status_code, 429)
+
+    def test_noticias_creadas_en_bloque(self):
+        # bulk_create (sembrado, importación) no dispara signals
+        self.assertEqual(self._beacon(self.publicada.pk).status_code, 204)
+        nueva, = Noticia.objects.bulk_create([
+            Noticia(titulo='En bloque', slug='en-bloque', contenido='<p>x</p>', categoria=self.publicada.categoria),
+        ])
+        self.assertEqual(self._beacon(nueva.pk).status_code, 204)
+        Noticia.objects.filter(pk=nueva.pk).update(publicado=False)
+        self.assertEqual(self._beacon(nueva.pk, ip='10.0.0.2').status_code, 404)
+
+    def test_vaciado_de_muchas_noticias(self):
+        # Más ids de los que caben en un UPDATE con SQLite
+        for noticia_id in range(self.borrador.pk + 1, self.borrador.pk + 2000):
+            contador_vistas.registrar_vista(noticia_id)
+        contador_vistas.registrar_vista(self.publicada.pk)
+        self.assertEqual(contador_vistas.vaciar_vistas(), 1)
+        self.assertEqual(contador_vistas.vistas_pendientes(self.publicada.pk), 0)
+        self.publicada.refresh_from_db()
+        self.assertEqual(self.publicada.vistas, 1)
+
+
+
+@en_replica
+def _vista_lectura(request):
+    return HttpResponse(Categoria.objects.all().db)
+
+
+@en_replica
+def _vista_escritura(request):
+    antes = Categoria.objects.all().db
+    Categoria.objects.create(nombre='Cultura', slug='cultura')
+    despues = Categoria.objects.all().db
+    return HttpResponse(f'{antes} {despues}')
+
+
+@override_settings(REPLICAS=['replica_1'])
+class ReplicasTests(EntornoTestsMixin, TestCase):
+    """Enrutado de lecturas y escrituras con ``@en_replica``."""
+
+    databases = {'default', 'replica_1'}
+
+    @classmethod
+    def setUpClass(cls):
+        # La espejo sería otra conexión, fuera de la transacción del test: no
+        # vería sus datos (y en SQLite en memoria se bloquearían las tablas).
+        # Qué base elige el router se comprueba con _bases_de_lectura()
+        cls._conexion_replica = connections['replica_1']
+        connections['replica_1'] = connections['default']
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica_1'] = cls._conexion_replica
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.addCleanup(replicas._caidas.clear)
+        self.addCleanup(descartar_vistas)
+
+    @contextmanager
+    def _bases_de_lectura(self):
+        bases = []
+        original = replicas.RouterReplicas.db_for_read
+
+        def db_for_read(router, model, **hints):
+            bases.append(original(router, model, **hints))
+            return bases[-1]
+
+        with mock.patch.object(replicas.RouterReplicas, 'db_for_read', db_for_read):
+            yield bases
+
+    def test_lectura_en_replica(self):
+        with self._bases_de_lectura() as bases:
+            respuesta = self.client.get('/noticias/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(set(bases), {'replica_1'})
+        self.assertEqual(_vista_lectura(self.factory.get('/')).content, b'replica_1')
+
+    def test_escritura_en_primario(self):
+        respuesta = _vista_escritura(self.factory.get('/'))
+        # Tras escribir, las lecturas de la petición van también al primario
+        self.assertEqual(respuesta.content, b'replica_1 default')
+        self.assertEqual(_vista_lectura(self.factory.post('/')).content, b'default')
+
+    def test_cookie_tras_post_identificado(self):
+        respuesta = self.client.post(reverse('contar_vista', args=[1]))
+        self.assertNotIn(replicas.COOKIE, respuesta.cookies)
+
+        self.client.force_login(User.objects.create_user('redaccion'))
+        respuesta = self.client.post(reverse('contar_vista', args=[1]))
+        self.assertIn(replicas.COOKIE, respuesta.cookies)
+        with self._bases_de_lectura() as bases:
+            self.client.get('/noticias/')
+        self.assertEqual(set(bases), {'default'})
+
+    def test_primario_tras_cambio_de_contenido(self):
+        replicas.marcar_escritura()
+        self.assertEqual(_vista_lectura(self.factory.get('/')).content, b'default')
+
+    def test_replica_caida(self):
+        bases = []
+
+        @en_replica
+        def vista(request):
+            bases.append(Categoria.objects.all().db)
+            if len(bases) == 1:
+                raise OperationalError('could not connect to server')
+            return HttpResponse()
+
+        with mock.patch.object(connections['replica_1'], 'ensure_connection',
+                               side_effect=OperationalError('could not connect to server')), \
+                self.assertLogs('noticias.replicas', 'WARNING'):
+            vista(self.factory.get('/'))
+        self.assertEqual(bases, ['replica_1', 'default'])
+        # Apartada durante REPLICAS_REINTENTO: la siguiente va directa al primario
+        self.assertEqual(_vista_lectura(self.factory.get('/')).content, b'default')
+
+
+class RelacionadasTests(TestCase):
+    """Recálculo incremental de las relacionadas (ver relacionadas.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        categorias = [Categoria.objects.create(nombre=f'Categoría {i}', slug=f'categoria-{i}') for i in range(2)]
+        tags = [Tag.objects.create(nombre=f'Tag {i}', slug=f'tag-{i}') for i in range(5)]
+        inicio = timezone.now() - timedelta(days=60)
+        cls.noticias = []
+        for i in range(30):
+            noticia = Noticia.objects.create(
+                titulo=f'Noticia {i}', slug=f'noticia-{i}', contenido='<p>x</p>', categoria=categorias[i % 2],
+                fecha_publicacion=inicio + timedelta(days=2 * i, hours=i), publicado=i != 7,
+            )
+            noticia.tags.set(tags[i % 5:i % 5 + 1 + i % 3])
+            cls.noticias.append(noticia)
+
+    def test_guardar_sin_cambios_no_recalcula(self):
+        noticia = Noticia.objects.get(pk=self.noticias[3].pk)
+        with mock.patch.object(relacionadas, 'marcar') as marcar:
+            noticia.titulo = 'Otro título'
+            noticia.save()
+            noticia.tags.add(*noticia.tags.all())
+            marcar.assert_not_called()
+
+            noticia.categoria = Categoria.objects.get(slug='categoria-0')
+            noticia.save()
+            marcar.assert_called_once_with(noticia.pk)
+
+    @mock.patch.object(relacionadas, 'CANDIDATAS_POR_LISTA', 6)
+    def test_corpus_parcial(self):
+        # Con listas más largas que las ventanas, las candidatas y el IDF del
+        # corpus parcial son los del corpus entero
+        completo = relacionadas.Corpus.desde_bd(Noticia)
+        pks = [self.noticias[i].pk for i in (0, 7, 12, 29)]
+        parcial = relacionadas.Corpus.alrededor_de(Noticia, pks)
+        self.assertNotIn(self.noticias[7].pk, parcial)
+        self.assertLess(len(parcial.dia), len(completo.dia))
+        for pk in pks:
+            if pk in completo:
+                self.assertEqual(parcial.vecinas(pk), completo.vecinas(pk))
+
+
+class FacetasTests(TestCase):
+    """Recuentos por categoría y tag del listado (ver facetas.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categorias = [Categoria.objects.create(nombre=f'Categoría {i}', slug=f'cat-{i}') for i in range(3)]
+        cls.tags = [Tag.objects.create(nombre=f'Tag {i}', slug=f'tag-{i}') for i in range(4)]
+        cls.noticias = []
+        for i in range(12):
+            noticia = Noticia.objects.create(
+                titulo=f'Noticia {i} sobre el {"agua" if i % 3 else "camino"}', slug=f'noticia-{i}',
+                contenido='<p>x</p>', categoria=cls.categorias[i % 3], publicado=i != 11,
+            )
+            noticia.tags.set(cls.tags[i % 4:i % 4 + 1 + i % 2])
+            cls.noticias.append(noticia)
+
+    def setUp(self):
+        cache.clear()
+        busqueda.invalidar_indice()
+
+    def contadores(self):
+        return {(fila.categoria_id, fila.tag_id): fila.total for fila in ContadorFaceta.objects.exclude(total=0)}
+
+    def esperadas(self, categoria=None, tag=None, query=None):
+        # Lo mismo contado a mano, noticia a noticia
+        noticias = Noticia.objects.publicadas()
+        if query:
+            noticias = busqueda.filtrar(noticias, query)
+        por_categoria, por_tag = Counter(), Counter()
+        for noticia in noticias.select_related('categoria').prefetch_related('tags'):
+            slugs = {tag_.slug for tag_ in noticia.tags.all()}
+            if tag is None or tag in slugs:
+                por_categoria[noticia.categoria.slug] += 1
+            if categoria is None or noticia.categoria.slug == categoria:
+                por_tag.update(slugs)
+        return dict(por_categoria), dict(por_tag)
+
+    def obtenidas(self, *filtros):
+        resultado = facetas.contar(*filtros)
+        return ({faceta.slug: faceta.total for faceta in resultado.categorias},
+                {faceta.slug: faceta.total for faceta in resultado.tags})
+
+    def test_signals_igual_que_recalcular_todas(self):
+        noticias, tags = self.noticias, self.tags
+        noticias[0].tags.add(tags[3])
+        noticias[1].tags.remove(tags[1])
+        noticias[2].tags.clear()
+        tags[2].noticias.add(noticias[4], noticias[5])
+        tags[2].noticias.remove(noticias[6])
+        noticias[3].categoria = self.categorias[0]
+        noticias[3].save()
+        noticias[7].publicado = False
+        noticias[7].save()
+        noticias[11].publicado = True
+        noticias[11].save()
+        noticias[8].delete()
+        noticias[9].titulo = 'Sin cambios en las facetas'
+        noticias[9].save(update_fields=['titulo'])
+        noticias[10].tags.set([tags[0]])
+
+        incrementales = self.contadores()
+        facetas.recalcular_todas()
+        self.assertEqual(incrementales, self.contadores())
+
+    def test_recuentos(self):
+        # La búsqueda deja fuera a las que no hablan del agua
+        self.assertLess(sum(self.esperadas(query='agua')[0].values()), sum(self.esperadas()[0].values()))
+        for filtros in ((None, None), ('cat-1', None), (None, 'tag-1'), ('cat-2', 'tag-2'),
+                        (None, None, 'agua'), ('cat-1', None, 'agua'), (None, 'tag-1', 'agua'),
+                        ('CAT-2', 'tag-2', 'agua')):
+            with self.subTest(filtros=filtros):
+                self.assertEqual(self.obtenidas(*filtros), self.esperadas(*(
+                    filtro.lower() if filtro else filtro for filtro in filtros
+                )))
+
+    def test_cache_por_filtros(self):
+        categoria = facetas.contar('cat-1')
+        with self.assertNumQueries(0):
+            self.assertEqual(facetas.contar('CAT-1'), categoria)
+        self.assertNotEqual(facetas.contar('cat-2'), categoria)
+        self.assertNotEqual(facetas.contar('cat-1', query='agua'), categoria)
+        self.assertEqual(self.obtenidas('cat-1', 'tag-1'), self.esperadas('cat-1', 'tag-1'))
+
+        # Un cambio de noticias deja obsoletas todas las combinaciones
+        with self.captureOnCommitCallbacks(execute=True):
+            self.noticias[1].tags.add(self.tags[3])
+        self.assertEqual(self.obtenidas('cat-1'), self.esperadas('cat-1'))
+        self.assertNotEqual(facetas.contar('cat-1'), categoria)
+
+
+class SembradoTests(EntornoTestsMixin, TestCase):
+    """``manage.py seed_noticias`` deja lo mismo que las signals (ver sembrado.py)."""
+
+    def test_relacionadas(self):
+        self.assertEqual(sembrar(30), 30)
+        publicadas = set(Noticia.objects.filter(publicado=True).values_list('pk', flat=True))
+        self.assertEqual(set(Relacionada.objects.values_list('noticia_id', flat=True)), publicadas)
+        # Ya están al día: recalcular no cambia nada
+        self.assertEqual(relacionadas.calcular_todas()[1], set())
+
+
+class ImportacionTests(EntornoTestsMixin, TestCase):
+    """``manage.py import_noticias``: filas inválidas y reanudación (ver importacion.py)."""
+
+    def setUp(self):
+        self.carpeta = tempfile.mkdtemp(prefix='noticias_importacion_')
+        self.addCleanup(shutil.rmtree, self.carpeta, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, os.path.join(self._media, deduplicacion.CARPETA), ignore_errors=True)
+        for numero in range(4):
+            with open(os.path.join(self.carpeta, f'banner-{numero}.jpg'), 'wb') as archivo:
+                archivo.write(imagen('banner.jpg', color=(60 * numero, 90, 120)).read())
+
+    def fila(self, slug, banner=0, **campos):
+        return {'titulo': slug.title(), 'slug': slug, 'contenido': f'<p>Cuerpo de {slug}</p>',
+                'categoria': 'Campo', 'tags': ['agua', 'riego'], 'banner': f'banner-{banner}.jpg', **campos}
+
+    def archivo(self, lineas):
+        ruta = os.path.join(self.carpeta, 'noticias.jsonl')
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            for linea in lineas:
+                archivo.write((linea if isinstance(linea, str) else json.dumps(linea)) + '\n')
+        return ruta
+
+    def importar(self, ruta):
+        salida, errores = io.StringIO(), io.StringIO()
+        call_command('import_noticias', ruta, '--encolar', '--lote', '2', stdout=salida, stderr=errores)
+        return salida.getvalue(), errores.getvalue()
+
+    def test_filas_invalidas_se_saltan(self):
+        ruta = self.archivo([
+            self.fila('primera'),
+            '{"titulo": "roto"',
+            self.fila('sin-contenido', contenido=''),
+            self.fila('mala-fecha', fecha_publicacion='ayer'),
+            self.fila('sin-banner', banner=9),
+            '["no", "es", "un", "objeto"]',
+            self.fila('primera', banner=1),
+            self.fila('segunda', banner=1, publicado='no', vistas='12'),
+        ])
+        salida, errores = self.importar(ruta)
+
+        self.assertEqual(set(Noticia.objects.values_list('slug', flat=True)), {'primera', 'segunda'})
+        lineas = [linea.split(':', 1)[0] for linea in errores.splitlines()]
+        self.assertEqual(lineas, ['Línea 2', 'Línea 3', 'Línea 4', 'Línea 5', 'Línea 6'])
+        self.assertIn("'fecha_publicacion' no es una fecha", errores)
+        self.assertIn('2 nuevas, 1 ya existían, 5 inválidas', salida)
+
+        segunda = Noticia.objects.get(slug='segunda')
+        self.assertEqual((segunda.publicado, segunda.vistas, segunda.categoria.nombre), (False, 12, 'Campo'))
+        self.assertEqual(sorted(segunda.tags.values_list('slug', flat=True)), ['agua', 'riego'])
+        self.assertEqual(segunda.extracto, 'Cuerpo de segunda')
+        # Cada banner deja su tarea para procesar_imagenes
+        self.assertEqual(TareaImagen.objects.filter(estado=TareaImagen.Estado.PENDIENTE).count(), 2)
+
+    def test_reanudar_tras_un_corte(self):
+        ruta = self.archivo([self.fila(f'noticia-{numero}', banner=numero) for numero in range(4)])
+        guardar_lote = importacion._guardar_lote
+        llamadas = []
+
+        def cortar_en_el_segundo(noticias, procesar):
+            llamadas.append(len(noticias))
+            if len(llamadas) == 2:
+                raise KeyboardInterrupt
+            return guardar_lote(noticias, procesar)
+
+        with mock.patch.object(importacion, '_guardar_lote', cortar_en_el_segundo), \
+                self.assertRaises(KeyboardInterrupt):
+            self.importar(ruta)
+        # El primer lote queda entero; del segundo no queda nada
+        self.assertEqual(set(Noticia.objects.values_list('slug', flat=True)), {'noticia-0', 'noticia-1'})
+        # ni sus originales en el storage
+        originales = {os.path.relpath(os.path.join(carpeta, nombre), self._media)
+                      for carpeta, _, nombres in os.walk(os.path.join(self._media, deduplicacion.CARPETA))
+                      for nombre in nombres}
+        self.assertEqual(originales, set(ImagenFuente.objects.values_list('original', flat=True)))
+        self.assertEqual(len(originales), 2)
+
+        salida, errores = self.importar(ruta)
+        self.assertEqual(errores, '')
+        self.assertIn('2 nuevas, 2 ya existían, 0 inválidas', salida)
+        self.assertEqual(Noticia.objects.count(), 4)
+        # Sin tareas ni tags repetidos por la primera pasada
+        self.assertEqual(TareaImagen.objects.count(), 4)
+        self.assertEqual(Noticia.tags.through.objects.count(), 8)
+        self.assertEqual(Tag.objects.count(), 2)
+
+
+class DeduplicacionTests(EntornoTestsMixin, TestCase):
+    """Banners por contenido: una tarea por imagen y sus referencias (ver deduplicacion.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre='Sociedad', slug='sociedad')
+
+    def crear(self, slug, banner):
+        return Noticia.objects.create(titulo=slug, slug=slug, contenido='<p>x</p>', categoria=self.categoria,
+                                      banner=banner)
+
+    def ejecutar(self, objeto):
+        tipo = TareaImagen.Tipo.BANNER_NOTICIA if isinstance(objeto, Noticia) else TareaImagen.Tipo.BANNER_CATEGORIA
+        tarea = TareaImagen.objects.get(tipo=tipo, objeto_id=objeto.pk, estado=TareaImagen.Estado.PENDIENTE)
+        self.assertEqual(tareas.ejecutar_tarea(tarea.pk), TareaImagen.Estado.COMPLETADA)
+        objeto.refresh_from_db()
+
+    def test_misma_imagen_se_procesa_una_vez(self):
+        primera = self.crear('primera', imagen('foto.jpg'))
+        fuente = primera.imagen_fuente
+        original = primera.banner.name
+        self.assertTrue(original.startswith(f'{deduplicacion.CARPETA}/'))
+        self.ejecutar(primera)
+
+        # Nombres cortos: caben en los 100 caracteres sin sufijo al azar
+        for campo in deduplicacion.CAMPOS['noticia']:
+            nombre = getattr(primera, campo).name
+            self.assertLessEqual(len(nombre), 100)
+            self.assertTrue(default_storage.exists(nombre))
+        self.assertEqual(primera.banner_medium.name.rsplit('/', 1)[1], f'{fuente.sha256[:16]}-medium.webp')
+        self.assertFalse(default_storage.exists(original))
+        fuente.refresh_from_db()
+        self.assertEqual(fuente.original, '')
+
+        segunda = self.crear('segunda', imagen('otra-copia.jpg'))
+        self.assertFalse(TareaImagen.objects.filter(objeto_id=segunda.pk).exists())
+        self.assertEqual(segunda.banner.name, primera.banner.name)
+        self.assertEqual(segunda.variantes, primera.variantes)
+        fuente.refresh_from_db()
+        self.assertEqual(fuente.referencias, 2)
+
+    def test_tarea_que_llega_tarde_adopta_lo_registrado(self):
+        primera = self.crear('primera', imagen('foto.jpg'))
+        segunda = self.crear('segunda', imagen('foto.jpg'))
+        # La segunda empezó antes de que terminara la primera
+        segunda = Noticia.objects.select_related('imagen_fuente').get(pk=segunda.pk)
+        self.ejecutar(primera)
+        self.assertTrue(default_storage.exists(segunda.banner.name))  # la segunda aún lo espera
+
+        segunda.procesar_banner()
+        segunda.variantes = tareas.generar_variantes(segunda, 'noticia')
+        generados = deduplicacion.archivos(segunda, 'noticia')
+        self.assertFalse(deduplicacion.registrar(segunda.imagen_fuente, segunda))
+
+        self.assertEqual(deduplicacion.archivos(segunda, 'noticia'), deduplicacion.archivos(primera, 'noticia'))
+        self.assertEqual(segunda.variantes, primera.variantes)
+        for ruta in generados - deduplicacion.archivos(primera, 'noticia'):
+            self.assertFalse(default_storage.exists(ruta))
+        for ruta in deduplicacion.archivos(primera, 'noticia'):
+            self.assertTrue(default_storage.exists(ruta))
+
+    def test_referencias(self):
+        roja = self.crear('roja', imagen('roja.jpg'))
+        otra = self.crear('otra', imagen('roja.jpg'))
+        fuente_roja = roja.imagen_fuente
+        self.assertEqual(ImagenFuente.objects.get(pk=fuente_roja.pk).referencias, 2)
+
+        otra.banner = imagen('azul.jpg', (30, 30, 200))
+        otra.save()
+        self.assertNotEqual(otra.imagen_fuente_id, fuente_roja.pk)
+        self.assertEqual(ImagenFuente.objects.get(pk=fuente_roja.pk).referencias, 1)
+        self.assertEqual(ImagenFuente.objects.get(pk=otra.imagen_fuente_id).referencias, 1)
+
+        # Guardar sin tocar el banner no cuenta
+        roja.titulo = 'Roja'
+        roja.save()
+        self.assertEqual(ImagenFuente.objects.get(pk=fuente_roja.pk).referencias, 1)
+
+        # El de categoría es otra fuente (se recorta distinto)
+        self.categoria.banner = imagen('roja.jpg')
+        self.categoria.save()
+        self.assertEqual(self.categoria.imagen_fuente.tipo, 'categoria')
+        self.assertEqual(self.categoria.imagen_fuente.sha256, fuente_roja.sha256)
+        self.assertEqual(ImagenFuente.objects.get(pk=self.categoria.imagen_fuente_id).referencias, 1)
+
+        roja.delete()
+        self.assertEqual(ImagenFuente.objects.get(pk=fuente_roja.pk).referencias, 0)
+
+    def test_original_compartido_entre_tipos(self):
+        noticia = self.crear('noticia', imagen('foto.jpg'))
+        self.categoria.banner = imagen('foto.jpg')
+        self.categoria.save()
+        original = noticia.banner.name
+        self.assertEqual(self.categoria.banner.name, original)
+
+        # La de categoría aún no se ha procesado: el original se queda
+        self.ejecutar(noticia)
+        self.assertTrue(default_storage.exists(original))
+
+        self.ejecutar(self.categoria)
+        self.assertFalse(default_storage.exists(original))
+        self.assertFalse(ImagenFuente.objects.exclude(original='').exists())
+
+    def test_purgar(self):
+        antes = timezone.now() - timedelta(days=10)
+        limite = timezone.now() - timedelta(days=7)
+        sin_uso = ImagenFuente.objects.create(sha256='a' * 64, tipo='noticia')
+        reciente = ImagenFuente.objects.create(sha256='b' * 64, tipo='noticia')
+        en_uso = self.crear('en-uso', imagen('foto.jpg')).imagen_fuente
+        # Contador desajustado: la noticia que la apunta la protege igual
+        ImagenFuente.objects.filter(pk=en_uso.pk).update(referencias=0)
+        ImagenFuente.objects.exclude(pk=reciente.pk).update(fecha_actualizacion=antes)
+
+        self.assertEqual(deduplicacion.purgar(limite), 1)
+        self.assertFalse(ImagenFuente.objects.filter(pk=sin_uso.pk).exists())
+        self.assertEqual(set(ImagenFuente.objects.values_list('pk', flat=True)), {reciente.pk, en_uso.pk})
+
+
+def codificada(tamano, formato='JPEG') -> io.BytesIO:
+    datos = io.BytesIO()
+    Image.new('RGB', tamano, (40, 120, 200)).save(datos, formato)
+    datos.seek(0)
+    return datos
+
+
+class ImagenesTests(EntornoTestsMixin, TestCase):
+    """Decodificación reducida y tamaños en cascada (ver imagenes.py)."""
+
+    def test_jpeg_con_draft(self):
+        img = imagenes.abrir_reducida(codificada((4000, 3000)), (800, 600))
+        # El decodificador escala por DCT (1/4) sin pasar por el tamaño completo
+        self.assertEqual(img.size, (1000, 750))
+        img = imagenes.abrir_reducida(codificada((4000, 3000)), (800, 200), cubrir=True)
+        self.assertEqual(img.size, (1000, 750))
+        # Sin reducir si ya cabe
+        self.assertEqual(imagenes.abrir_reducida(codificada((640, 480)), (800, 600)).size, (640, 480))
+
+    def test_otros_formatos_con_reduce(self):
+        # reduce() deja al menos el doble del destino para el filtro final
+        img = imagenes.abrir_reducida(codificada((4000, 3000), 'PNG'), (400, 300))
+        self.assertEqual(img.size, (800, 600))
+        img = imagenes.abrir_reducida(codificada((4000, 3000), 'PNG'), (1500, 1500))
+        self.assertEqual(img.size, (4000, 3000))
+
+    def test_cascada(self):
+        tamanos = (((1920, 1080), 'grande'), ((800, 600), 'mediano'), ((300, 200), 'pequeno'))
+        img = Image.new('RGB', (1000, 750))
+        with mock.patch.object(Image.Image, 'resize', autospec=True, side_effect=Image.Image.resize) as resize:
+            resultado = [(entrada[1], reducida.size) for entrada, reducida in imagenes.cascada(img, tamanos)]
+        # Sin ampliar, y cada tamaño desde el anterior
+        self.assertEqual(resultado, [('grande', (1000, 750)), ('mediano', (800, 600)), ('pequeno', (267, 200))])
+        self.assertEqual([llamada.args[0].size for llamada in resize.call_args_list], [(1000, 750), (800, 600)])
+
+    @override_settings(IMAGENES_MAX_PIXELES=1_000_000)
+    def test_limite_de_pixeles(self):
+        # Se comprueba con la cabecera, sin decodificar
+        with mock.patch.object(ImageFile.ImageFile, 'load') as load, self.assertRaises(imagenes.ImagenDemasiadoGrande):
+            imagenes.abrir_reducida(codificada((1200, 1000)), (800, 600))
+        load.assert_not_called()
+
+        subida = imagen('enorme.jpg', tamano=(1200, 1000))
+        subida.read(10)
+        with self.assertRaises(ValidationError):
+            imagenes.validar_pixeles(subida)
+        subida = imagen('normal.jpg', tamano=(1000, 1000))
+        subida.read(10)
+        imagenes.validar_pixeles(subida)
+        self.assertEqual(subida.tell(), 10)
+
+        # Si llega a la tarea (p. ej. sin pasar por el formulario) falla sin reintentos
+        categoria = Categoria.objects.create(nombre='Campo', slug='campo')
+        noticia = Noticia.objects.create(titulo='Enorme', slug='enorme', contenido='<p>x</p>', categoria=categoria,
+                                         banner=imagen('enorme.jpg', tamano=(1200, 1000)))
+        tarea = TareaImagen.objects.get(objeto_id=noticia.pk)
+        self.assertEqual(tareas.ejecutar_tarea(tarea.pk), TareaImagen.Estado.FALLIDA)
+
+    def test_guardar_en_storage(self):
+        ruta = imagenes.guardar_en_storage(default_storage, 'pruebas/salida.webp', Image.new('P', (64, 32)), 'WEBP',
+                                           quality=70)
+        with default_storage.open(ruta) as archivo, Image.open(archivo) as img:
+            self.assertEqual((img.format, img.size), ('WEBP', (64, 32)))
+
+
+class TareasImagenTests(EntornoTestsMixin, TestCase):
+    """Cola de tareas de banners en la base de datos (ver tareas.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre='Campo', slug='campo')
+
+    def tarea(self, **campos):
+        campos.setdefault('objeto_id', 10 ** 6)
+        return TareaImagen.objects.create(tipo=TareaImagen.Tipo.BANNER_NOTICIA, **campos)
+
+    def estado(self, tarea):
+        tarea.refresh_from_db()
+        return tarea.estado, tarea.intentos
+
+    def test_reclamar(self):
+        ahora = timezone.now()
+        lista = self.tarea()
+        esperando = self.tarea(disponible_en=ahora + timedelta(minutes=5))
+        en_curso = self.tarea(estado=TareaImagen.Estado.PROCESANDO, intentos=1)
+        caida = self.tarea(estado=TareaImagen.Estado.PROCESANDO, intentos=1)
+        agotada = self.tarea(estado=TareaImagen.Estado.PROCESANDO, intentos=3)
+        completada = self.tarea(estado=TareaImagen.Estado.COMPLETADA)
+        # Su worker murió: llevan en 'procesando' más de TIEMPO_MAXIMO
+        TareaImagen.objects.filter(pk__in=[caida.pk, agotada.pk]).update(
+            fecha_actualizacion=ahora - tareas.TIEMPO_MAXIMO - timedelta(seconds=1),
+        )
+
+        self.assertCountEqual(tareas.reclamar_tareas(10), [lista.pk, caida.pk])
+        self.assertEqual(self.estado(lista), (TareaImagen.Estado.PROCESANDO, 1))
+        self.assertEqual(self.estado(caida), (TareaImagen.Estado.PROCESANDO, 2))
+        self.assertEqual(self.estado(esperando), (TareaImagen.Estado.PENDIENTE, 0))
+        self.assertEqual(self.estado(en_curso), (TareaImagen.Estado.PROCESANDO, 1))
+        self.assertEqual(self.estado(completada), (TareaImagen.Estado.COMPLETADA, 0))
+        self.assertEqual(self.estado(agotada), (TareaImagen.Estado.FALLIDA, 3))
+        self.assertEqual(agotada.error, tareas.ERROR_SIN_RESULTADO)
+        # Ya reclamadas: otro worker no se las lleva
+        self.assertEqual(tareas.reclamar_tareas(10), [])
+
+    def test_reintentos(self):
+        tarea = self.tarea()
+        with mock.patch.object(tareas, '_procesar', side_effect=RuntimeError('sin disco')):
+            for intento in (1, 2):
+                self.assertEqual(tareas.reclamar_tareas(1), [tarea.pk])
+                antes = timezone.now()
+                self.assertEqual(tareas.ejecutar_tarea(tarea.pk), TareaImagen.Estado.PENDIENTE)
+                tarea.refresh_from_db()
+                self.assertIn('sin disco', tarea.error)
+                # Espera exponencial: 30 s * 2^intentos
+                espera = tarea.disponible_en - antes
+                self.assertGreaterEqual(espera, timedelta(seconds=30 * 2 ** intento))
+                self.assertLess(espera, timedelta(seconds=30 * 2 ** intento + 1))
+                self.assertEqual(tareas.reclamar_tareas(1), [])
+                TareaImagen.objects.filter(pk=tarea.pk).update(disponible_en=timezone.now())
+
+            self.assertEqual(tareas.reclamar_tareas(1), [tarea.pk])
+            self.assertEqual(tareas.ejecutar_tarea(tarea.pk), TareaImagen.Estado.FALLIDA)
+        self.assertEqual(self.estado(tarea), (TareaImagen.Estado.FALLIDA, 3))
+
+    def test_errores_sin_reintento(self):
+        grande = self.tarea()
+        error = tareas.ImagenDemasiadoGrande('La imagen tiene 90 MP')
+        with mock.patch.object(tareas, '_procesar', side_effect=error):
+            self.assertEqual(tareas.ejecutar_tarea(grande.pk), TareaImagen.Estado.FALLIDA)
+        # El objeto ya no existe: no hay nada que hacer
+        borrado = self.tarea()
+        self.assertEqual(tareas.ejecutar_tarea(borrado.pk), TareaImagen.Estado.COMPLETADA)
+
+    def test_devolver_tareas(self):
+        primera, ultima = self.tarea(), self.tarea(intentos=2)
+        tareas.reclamar_tareas(10)
+        tareas.devolver_tareas([primera.pk, ultima.pk])
+        self.assertEqual(self.estado(primera), (TareaImagen.Estado.PENDIENTE, 1))
+        self.assertEqual(self.estado(ultima), (TareaImagen.Estado.FALLIDA, 3))
+
+    def test_banner_sustituido_durante_la_tarea(self):
+        noticia = Noticia.objects.create(titulo='Feria', slug='feria', contenido='<p>x</p>',
+                                         categoria=self.categoria, banner=imagen('feria.jpg'))
+        generar = tareas.generar_variantes
+
+        def sustituir(objeto, *args, **kwargs):
+            # Mientras se procesa, alguien sube otro banner
+            Noticia.objects.filter(pk=objeto.pk).update(banner='noticias/banners/otro.jpg', banner_medium=None)
+            return generar(objeto, *args, **kwargs)
+
+        tarea = TareaImagen.objects.get(objeto_id=noticia.pk)
+        with mock.patch.object(tareas, 'generar_variantes', sustituir):
+            self.assertEqual(tareas.ejecutar_tarea(tarea.pk), TareaImagen.Estado.COMPLETADA)
+        noticia.refresh_from_db()
+        self.assertEqual(noticia.banner.name, 'noticias/banners/otro.jpg')
+        self.assertFalse(noticia.banner_medium)
+        self.assertEqual(noticia.variantes, {})
+
+
+class VariantesTareaTests(EntornoTestsMixin, TestCase):
+    """Las variantes que genera la tarea salen del original subido (ver tareas.py)."""
+
+    def ejecutar(self, objeto):
+        tarea = TareaImagen.objects.get(objeto_id=objeto.pk, estado=TareaImagen.Estado.PENDIENTE)
+        self.assertEqual(tareas.ejecutar_tarea(tarea.pk), TareaImagen.Estado.COMPLETADA)
+        objeto.refresh_from_db()
+
+    def abiertas(self):
+        # Rutas de lo que decodifica generar_variantes
+        abrir = variantes.abrir_reducida
+        rutas = []
+
+        def espia(archivo, *args, **kwargs):
+            rutas.append(archivo.name)
+            return abrir(archivo, *args, **kwargs)
+        return rutas, mock.patch.object(variantes, 'abrir_reducida', espia)
+
+    def test_noticia(self):
+        categoria = Categoria.objects.create(nombre='Campo', slug='campo')
+        noticia = Noticia.objects.create(titulo='Grande', slug='grande', contenido='<p>x</p>', categoria=categoria,
+                                         banner=imagen('grande.jpg', tamano=(2400, 1200)))
+        original = noticia.banner.path
+        rutas, espia = self.abiertas()
+        with espia:
+            self.ejecutar(noticia)
+        self.assertEqual(rutas, [original])
+
+        self.assertTrue(noticia.banner.name.endswith('.webp'))
+        self.assertEqual(noticia.variantes['original'], 2400)  # no los 1920 del banner
+        nombre = noticia.variantes['1920w.webp']
+        self.assertEqual(nombre, noticia.banner.name.removesuffix('.webp') + '-1920w.webp')
+        with default_storage.open(nombre) as archivo, Image.open(archivo) as generada:
+            self.assertEqual(generada.size, (1920, 960))
+
+    def test_categoria_con_el_recorte_del_banner(self):
+        categoria = Categoria.objects.create(nombre='Campo', slug='campo',
+                                             banner=imagen('campo.jpg', tamano=(1600, 1200)))
+        original = categoria.banner.path
+        rutas, espia = self.abiertas()
+        with espia:
+            self.ejecutar(categoria)
+        self.assertEqual(rutas, [original])
+
+        with categoria.banner.open() as archivo, Image.open(archivo) as banner:
+            self.assertEqual(banner.size, (614, 256))
+        for clave, tamano in (('614w.webp', (614, 256)), ('320w.webp', (320, 133))):
+            with default_storage.open(categoria.variantes[clave]) as archivo, Image.open(archivo) as generada:
+                self.assertEqual(generada.size, tamano)
+
+
+class LimpiarMediaTests(EntornoTestsMixin, TestCase):
+    """Búsqueda de archivos huérfanos y ``manage.py limpiar_media`` (ver huerfanos.py)."""
+
+    REFERENCIADOS = [
+        'noticias/banners/2025/01/01/usado.webp',
+        'noticias/banners/2025/01/01/usado-medium.webp',
+        'noticias/banners/2025/01/01/usado-small.webp',
+        'noticias/banners/2025/01/01/usado-640w.webp',
+        'categorias/2025/01/01/portada.jpg',
+        'uploads/2025/01/01/foto con espacio.jpg',
+        'uploads/2025/01/01/foto con espacio_thumb.jpg',
+        'originales/aa/bb/en-uso.jpg',
+        'noticias/banners/2025/01/01/en-uso-medium.webp',
+    ]
+    HUERFANOS = [
+        'noticias/banners/2025/01/01/viejo.webp',
+        'categorias/2025/01/01/anterior.jpg',
+        'uploads/2025/01/01/sin-usar.jpg',
+        'originales/cc/dd/sin-uso.jpg',
+    ]
+
+    def setUp(self):
+        self.addCleanup(self.vaciar_media)
+        hace_dos_dias = (timezone.now() - timedelta(days=2)).timestamp()
+        for ruta in self.REFERENCIADOS + self.HUERFANOS:
+            self.escribir(ruta, hace_dos_dias)
+        # Subida reciente: su formulario aún puede estar sin guardar
+        self.escribir('uploads/2025/01/01/recien-subida.jpg')
+
+        categoria = Categoria.objects.create(nombre='Cultura', slug='cultura')
+        Categoria.objects.filter(pk=categoria.pk).update(banner='categorias/2025/01/01/portada.jpg')
+        noticia = Noticia.objects.create(titulo='Usada', slug='usada', categoria=categoria, contenido='')
+        Noticia.objects.filter(pk=noticia.pk).update(
+            banner='noticias/banners/2025/01/01/usado.webp',
+            banner_medium='noticias/banners/2025/01/01/usado-medium.webp',
+            banner_small='noticias/banners/2025/01/01/usado-small.webp',
+            variantes={'original': 1920, 'webp-640': 'noticias/banners/2025/01/01/usado-640w.webp'},
+            contenido='<p><img src="https://ejido.example/media/uploads/2025/01/01/foto%20con%20espacio.jpg"></p>',
+        )
+        hace_un_mes = timezone.now() - timedelta(days=30)
+        ImagenFuente.objects.create(sha256='a' * 64, tipo='noticia', referencias=1,
+                                    original='originales/aa/bb/en-uso.jpg',
+                                    banner_medium='noticias/banners/2025/01/01/en-uso-medium.webp')
+        self.sin_uso = ImagenFuente.objects.create(sha256='c' * 64, tipo='noticia',
+                                                   original='originales/cc/dd/sin-uso.jpg')
+        ImagenFuente.objects.update(fecha_actualizacion=hace_un_mes)
+
+    def vaciar_media(self):
+        for nombre in os.listdir(self._media):
+            shutil.rmtree(os.path.join(self._media, nombre))
+
+    def escribir(self, ruta, modificado=None):
+        self.assertEqual(default_storage.save(ruta, ContentFile(b'x' * 10)), ruta)
+        if modificado is not None:
+            os.utime(default_storage.path(ruta), (modificado, modificado))
+
+    def limpiar(self, *argumentos):
+        salida = io.StringIO()
+        call_command('limpiar_media', *argumentos, stdout=salida, stderr=io.StringIO())
+        return salida.getvalue()
+
+    def test_huerfanos(self):
+        encontrados = huerfanos.huerfanos(default_storage, huerfanos.carpetas_gestionadas())
+        # Los de la imagen fuente sin referencias también, aunque siga en la base
+        self.assertEqual(sorted(ruta for ruta, _ in encontrados), sorted(self.HUERFANOS))
+
+    def test_gracia(self):
+        encontrados = dict(huerfanos.huerfanos(default_storage, ['uploads'], gracia=timedelta(0)))
+        self.assertEqual(set(encontrados), {'uploads/2025/01/01/sin-usar.jpg', 'uploads/2025/01/01/recien-subida.jpg'})
+        self.assertEqual(encontrados['uploads/2025/01/01/sin-usar.jpg'], 10)
+        encontrados = huerfanos.huerfanos(default_storage, ['uploads'], gracia=timedelta(days=3))
+        self.assertEqual(list(encontrados), [])
+
+    def test_dry_run_no_toca_nada(self):
+        salida = self.limpiar('--dry-run')
+        self.assertIn('Huérfano: noticias/banners/2025/01/01/viejo.webp', salida)
+        for ruta in self.REFERENCIADOS + self.HUERFANOS:
+            self.assertTrue(default_storage.exists(ruta), ruta)
+        self.assertTrue(ImagenFuente.objects.filter(pk=self.sin_uso.pk).exists())
+
+    def test_borra_huerfanos(self):
+        self.limpiar()
+        for ruta in self.HUERFANOS:
+            self.assertFalse(default_storage.exists(ruta), ruta)
+        for ruta in self.REFERENCIADOS + ['uploads/2025/01/01/recien-subida.jpg']:
+            self.assertTrue(default_storage.exists(ruta), ruta)
+        self.assertFalse(ImagenFuente.objects.filter(pk=self.sin_uso.pk).exists())
+
+    def test_mezcla_ordenada_igual_que_diferencia_de_conjuntos(self):
+        # Carpetas y archivos con prefijos comunes: ' ', '-' y '.' van antes
+        # que '/' carácter a carácter, pero no por componentes
+        nombres = ['fotos/1.jpg', 'fotos/1/a.jpg', 'fotos/1-2.jpg', 'fotos-1.jpg', 'fotos.jpg',
+                   'fotos 2.jpg', 'fotos 2/b.jpg', 'fotosb.jpg', 'fotos/1 b.jpg', 'fotos/a/b/c.jpg']
+        for nombre in nombres:
+            self.escribir(f'mezcla/{nombre}')
+        archivos = list(huerfanos.recorrer(default_storage, 'mezcla'))
+        self.assertEqual(sorted(archivos), sorted(f'mezcla/{nombre}' for nombre in nombres))
+        self.assertEqual(archivos, sorted(archivos, key=huerfanos.clave))
+
+        referenciadas = [f'mezcla/{nombre}' for nombre in nombres[::2]]
+        referenciadas += ['mezcla/fotos/0.jpg', 'mezcla/fotos 1.jpg', 'mezcla/fotos/1/a.jpg']  # repetidas o sin archivo
+        with huerfanos.ordenadas(referenciadas, tamano_tramo=3) as ordenadas:
+            sin_referencia = list(huerfanos.sin_referencia(iter(archivos), ordenadas))
+        self.assertEqual(sorted(sin_referencia), sorted(set(archivos) - set(referenciadas)))
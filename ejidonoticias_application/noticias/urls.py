@@ -1,12 +1,24 @@
 from django.urls import path
 from django.urls.resolvers import URLPattern
 
-from . import views
+from . import api, views
 
 urlpatterns: list[URLPattern] = [
     path(route='', view=views.index, name='index'),
     path(route='blog/<str:slug>/', view=views.blog, name='blog'),
+    path(route='vista/<int:pk>/', view=views.contar_vista, name='contar_vista'),
     path(route='404/', view=views.not_found, name='not_found'),
     path(route='noticias/', view=views.noticias, name='noticias'),
+    path(route='metricas/', view=views.metricas, name='metricas'),
+    path(route='feed/<str:formato>/', view=views.feed, name='feed'),
+    path(route='feed/categoria/<slug:categoria>/<str:formato>/', view=views.feed, name='feed_categoria'),
+    path(route='feed/tag/<slug:tag>/<str:formato>/', view=views.feed, name='feed_tag'),
+    path(route='sitemap.xml', view=views.mapa_indice, name='mapa_indice'),
+    path(route='sitemap-secciones.xml', view=views.mapa_secciones, name='mapa_secciones'),
+    path(route='sitemap-noticias-<int:numero>.xml', view=views.mapa_noticias, name='mapa_noticias'),
+    path(route='api/noticias/', view=api.noticias, name='api_noticias'),
+    path(route='api/noticias/<str:slug>/', view=api.noticia, name='api_noticia'),
+    path(route='api/categorias/', view=api.categorias, name='api_categorias'),
+    path(route='api/tags/', view=api.tags, name='api_tags'),
     
 ]
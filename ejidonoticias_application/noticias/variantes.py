@@ -0,0 +1,151 @@
+"""
+Registro declarativo de variantes de imagen.
+
+Cada tipo de banner (noticia, categoría) declara qué variantes se generan:
+ancho, formato y calidad. Añadir un tamaño es añadir una línea aquí; no
+hace falta un campo ni una migración nueva porque las rutas generadas se
+guardan en el JSON ``variantes`` del modelo.
+
+Las plantillas las usan con ``{% imagen_responsiva %}`` (custom_tags.py),
+que emite un ``<picture>`` con ``srcset`` en AVIF y WebP.
+"""
+import os
+from typing import NamedTuple
+
+from PIL import Image, ImageOps, features
+
+from .imagenes import abrir_reducida, guardar_en_storage
+
+
+class Variante(NamedTuple):
+    ancho: int
+    formato: str  # 'AVIF' o 'WEBP'
+    calidad: int
+
+    @property
+    def extension(self) -> str:
+        return self.formato.lower()
+
+    @property
+    def clave(self) -> str:
+        return f'{self.ancho}w.{self.extension}'
+
+    @property
+    def mime(self) -> str:
+        return f'image/{self.extension}'
+
+
+def _serie(anchos, calidad_avif, calidad_webp):
+    return [
+        variante
+        for ancho in anchos
+        for variante in (Variante(ancho, 'AVIF', calidad_avif), Variante(ancho, 'WEBP', calidad_webp))
+    ]
+
+
+REGISTRO = {
+    'noticia': _serie((320, 640, 960, 1280, 1920), calidad_avif=50, calidad_webp=75),
+    'categoria': _serie((320, 614), calidad_avif=55, calidad_webp=80),
+}
+
+# Tipos cuyo banner se recorta a un tamaño fijo (ver
+# Categoria.procesar_banner_categoria): las variantes salen del mismo recorte
+RECORTES = {
+    'categoria': (614, 256),
+}
+
+# Orden de preferencia de los <source>: el navegador usa el primero que entienda
+FORMATOS = ('AVIF', 'WEBP')
+
+
+def formato_disponible(formato: str) -> bool:
+    return features.check(formato.lower())
+
+
+def variantes_de(tipo: str) -> list[Variante]:
+    return [v for v in REGISTRO[tipo] if formato_disponible(v.formato)]
+
+
+def faltantes(objeto, tipo: str) -> list[Variante]:
+    generadas = objeto.variantes or {}
+    if not generadas:
+        return variantes_de(tipo)
+    # Los anchos mayores que el original no se generan (no ampliamos)
+    ancho_original = generadas.get('original', 0)
+    minimo = min(v.ancho for v in REGISTRO[tipo])
+    return [
+        v for v in variantes_de(tipo)
+        if v.clave not in generadas and (v.ancho <= ancho_original or v.ancho == minimo)
+    ]
+
+
+def generar_variantes(objeto, tipo: str, origen: str | None = None) -> dict:
+    """
+    Genera las variantes registradas a partir de ``objeto.banner`` y
+    devuelve el diccionario clave -> ruta en el storage (no guarda el modelo).
+    La clave ``original`` guarda el ancho de partida.
+
+    Con ``origen`` (ruta en el storage) se decodifica esa imagen en lugar
+    del banner, pero se nombran igual, junto a él: así la tarea parte del
+    original subido y no del WebP ya recomprimido y limitado a 1920 px.
+
+    Se procesan de mayor a menor ancho y cada tamaño se reduce desde el
+    anterior, no desde el original. No se amplían imágenes pequeñas.
+    """
+    campo = objeto.banner
+    storage = campo.storage
+    base, _ = os.path.splitext(campo.name)
+
+    anchos = sorted({v.ancho for v in variantes_de(tipo)}, reverse=True)
+    recorte = RECORTES.get(tipo)
+    with (storage.open(origen, 'rb') if origen else campo.open('rb')) as archivo:
+        if recorte:
+            img = abrir_reducida(archivo, recorte, cubrir=True)
+            img = ImageOps.fit(img, recorte, Image.Resampling.LANCZOS)
+        else:
+            # Sin límite de alto: solo importa el ancho mayor
+            img = abrir_reducida(archivo, (anchos[0], 10 ** 6))
+            img.load()
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGB')
+
+    resultado = {'original': img.width}
+    for ancho in anchos:
+        # Sin ampliar: solo el ancho más pequeño se genera siempre
+        if ancho > img.width and ancho != anchos[-1]:
+            continue
+        if img.width > ancho:
+            alto = round(img.height * ancho / img.width)
+            img = img.resize((ancho, alto), Image.Resampling.LANCZOS)
+
+        for variante in variantes_de(tipo):
+            if variante.ancho != ancho:
+                continue
+            nombre = f'{base}-{variante.ancho}w.{variante.extension}'
+            if storage.exists(nombre):
+                storage.delete(nombre)
+            resultado[variante.clave] = guardar_en_storage(
+                storage, nombre, img, variante.formato, quality=variante.calidad,
+            )
+    return resultado
+
+
+def srcsets(objeto, tipo: str) -> list[tuple[str, str]]:
+    """
+    [(mime, srcset), ...] en orden de preferencia, solo con lo ya generado.
+    """
+    generadas = objeto.variantes or {}
+    if not generadas:
+        return []
+
+    storage = objeto.banner.storage
+    fuentes = []
+    for formato in FORMATOS:
+        candidatas = sorted(
+            (v for v in REGISTRO[tipo] if v.formato == formato and v.clave in generadas),
+            key=lambda v: v.ancho,
+        )
+        if candidatas:
+            srcset = ', '.join(f'{storage.url(generadas[v.clave])} {v.ancho}w' for v in candidatas)
+            fuentes.append((candidatas[0].mime, srcset))
+    return fuentes
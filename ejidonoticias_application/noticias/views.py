@@ -1,17 +1,44 @@
 
 from django.shortcuts import render, get_object_or_404
 from django.core.paginator import Paginator
-from django.http import HttpResponse
-from .models import Noticia, Categoria
-from django.db.models import F
+from django.http import HttpResponse, Http404
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .models import Noticia, Tag
+from . import facetas, relacionadas, sindicacion, tablas_globales
+from .contador_vistas import cliente_de, registrar_vista, vista_admitida, vistas_pendientes
+from .presupuesto_consultas import presupuesto_consultas
+from .replicas import en_replica
+from .busqueda import buscar
+from .paginacion import ANTIGUAS, codificar_cursor, paginar_por_cursor, CursorInvalido
+from .cache_paginas import cache_pagina, depende_de
+from .condicional import (condicional, validar_index, validar_blog, validar_listado,
+                          validar_feed, validar_mapa)
+from .tendencias import populares
+from . import metricas as metricas_rendimiento
 
+NOTICIAS_POR_PAGINA = 15
 
+# Las páginas numeradas (?page=N) hacen COUNT + OFFSET: solo se permiten
+# para las primeras páginas. El resto del archivo se recorre por cursor.
+# Las búsquedas, ordenadas por relevancia, no tienen tope.
+MAX_PAGINA_NUMERADA = 5
 
+
+
+# Presupuestos en frío: con tablas_globales ya cargado son una consulta menos.
+# Incluyen la consulta de validación de @condicional (ver condicional.py).
+@presupuesto_consultas(4)
+@en_replica
+@condicional(validar_index)
+@cache_pagina()
 def index(request) -> HttpResponse:
-    noticias = Noticia.objects.all().filter(publicado=True).order_by('-id')[:15]
-    mas_vistos = Noticia.objects.all().filter(publicado=True).order_by('-vistas')
+    # list() para que el slice de la plantilla no lance otra consulta
+    noticias = list(Noticia.objects.publicadas().tarjetas().order_by('-id')[:15])
+    mas_vistos = populares(5)
     
-    categorias = Categoria.objects.all()[:7]
+    categorias = tablas_globales.categorias(7)
     
     context = {
         'noticias': noticias,
@@ -21,27 +48,44 @@ def index(request) -> HttpResponse:
     }
     
     template = 'index.html'
+
+    depende_de(request, 'inicio')
     
     return render(request, template_name=template, context=context)
 
 
+def _contar_vista(request, datos) -> None:
+    # Las páginas servidas desde caché también cuentan como vista
+    registrar_vista(datos['noticia_id'])
+
+
+@presupuesto_consultas(6)
+@en_replica
+@condicional(validar_blog, al_no_modificada=_contar_vista)
+@cache_pagina(al_servir=_contar_vista)
 def blog(request, slug:str) -> HttpResponse:
     
-    blog = get_object_or_404(Noticia, slug=slug, publicado=True)
+    blog = get_object_or_404(Noticia.objects.detalle(), slug=slug, publicado=True)
 
-    noticias_populares = Noticia.objects.filter(publicado=True) \
-                                      .exclude(pk=blog.pk) \
-                                      .order_by('-vistas')[:5]
+    noticias_populares = populares(5, excluir=blog.pk)
     
-    noticias_relacionadas = Noticia.objects.filter(
-        publicado=True,
-        categoria=blog.categoria
-    ).exclude(pk=blog.pk).order_by('-fecha_publicacion')[:5]
+    # Precalculadas por similitud de tags, categoría y fecha (ver relacionadas.py)
+    noticias_relacionadas = relacionadas.de_noticia(Noticia.objects.publicadas().tarjetas(), pk=blog.pk)
 
 
-    categorias = Categoria.objects.all()[:4]
+    categorias = tablas_globales.categorias(4)
     
-    Noticia.objects.filter(slug=slug).update(vistas=F('vistas') + 1)
+    # La vista se acumula en el buffer y se escribe en lote (ver contador_vistas)
+    blog.vistas += vistas_pendientes(blog.pk)
+    # Al exportar la página no hay visita: la cuenta el beacon de la copia estática
+    exportada = getattr(request, 'exportacion', False)
+    if not exportada:
+        registrar_vista(blog.pk)
+
+    depende_de(request,
+               f'noticia:{blog.pk}',
+               f'categoria:{blog.categoria.slug.lower()}',
+               noticia_id=blog.pk)
         
     context = {
         'blog': blog,
@@ -49,16 +93,35 @@ def blog(request, slug:str) -> HttpResponse:
         'noticias_populares': noticias_populares[1:],
         'noticias_relacionadas': noticias_relacionadas,
         'categorias': categorias,
-        
+        'exportada': exportada,
     }
 
     return render(request, template_name='screens/blog.html', context=context)
 
 
+@csrf_exempt
+@require_POST
+def contar_vista(request, pk: int) -> HttpResponse:
+    # Beacon de las páginas exportadas (ver estatico.py), que no pasan por
+    # blog(). Es anónimo: solo noticias publicadas y con límite por cliente
+    if not vista_admitida(cliente_de(request), pk):
+        return HttpResponse(status=429)
+    if not Noticia.objects.filter(pk=pk, publicado=True).exists():
+        return HttpResponse(status=404)
+    registrar_vista(pk)
+    return HttpResponse(status=204)
+
+
 def not_found(request) -> HttpResponse:
     return render(request, template_name='404.html', context={})
 # Create your views here.
 
+# En SQLite la primera búsqueda construye el índice en memoria (+2 consultas).
+# Las facetas, una más cuando no están en caché.
+@presupuesto_consultas(6)
+@en_replica
+@condicional(lambda request: validar_listado(request, NOTICIAS_POR_PAGINA, facetas=True))
+@cache_pagina()
 def noticias(request) -> HttpResponse:
     
     # 1. Obtener todos los parámetros
@@ -67,12 +130,8 @@ def noticias(request) -> HttpResponse:
     tag_query = request.GET.get('tag')
 
 
-    noticias_list = Noticia.objects.filter(publicado=True)
-
-    if query:
+    noticias_list = Noticia.objects.publicadas().tarjetas()
 
-        noticias_list = noticias_list.filter(titulo__icontains=query)
-    
     if category_query:
 
         noticias_list = noticias_list.filter(categoria__slug__iexact=category_query)
@@ -81,24 +140,125 @@ def noticias(request) -> HttpResponse:
 
         noticias_list = noticias_list.filter(tags__slug__iexact=tag_query).distinct()
 
-    noticias_list = noticias_list.order_by('-fecha_publicacion')
-    
+    params = request.GET.copy()
+    for param in ('page', 'cursor'):
+        params.pop(param, None)
 
-    paginator = Paginator(noticias_list, 15)  # 10 noticias por página
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
 
-    params = request.GET.copy()
-    if 'page' in params:
-        del params['page']
-    
+    cursor_siguiente = None
+    if query or page_number:
+        # Paginación numerada: búsquedas (ordenadas por relevancia) o
+        # quien la pida explícitamente con ?page=N, solo en páginas cercanas.
+        # Las búsquedas no tienen tope: no hay cursor que siga su orden
+        if not query and page_number and page_number.isdigit() and int(page_number) > MAX_PAGINA_NUMERADA:
+            raise Http404("Página demasiado profunda: usa la navegación por cursor")
+
+        if query:
+            # Búsqueda de texto completo, ordenada por relevancia
+            noticias_list = buscar(noticias_list, query)
+        else:
+            noticias_list = noticias_list.order_by('-fecha_publicacion', '-id')
+
+        paginator = Paginator(noticias_list, NOTICIAS_POR_PAGINA)
+        page_obj = paginator.get_page(page_number)
+        por_cursor = False
+        if not query and page_obj.number >= MAX_PAGINA_NUMERADA and page_obj.has_next():
+            # En la última página numerada, "Siguiente" sigue por cursor (mismo orden)
+            cursor_siguiente = codificar_cursor(ANTIGUAS, page_obj[-1])
+    else:
+        try:
+            page_obj = paginar_por_cursor(noticias_list, request.GET.get('cursor'), NOTICIAS_POR_PAGINA)
+        except CursorInvalido:
+            raise Http404("Cursor inválido")
+        por_cursor = True
+
+        # Solo cacheamos el listado general y el de cada categoría. Las
+        # facetas de la categoría cuentan todas las demás: 'listado' también
+        if not tag_query:
+            depende_de(request, 'listado', *([f'categoria:{category_query.lower()}'] if category_query else []))
 
     context = {
         'blogs': page_obj,
+        'facetas': facetas.contar(category_query, tag_query, query),
         'q': query, 
         'category': category_query, 
         'tag': tag_query, 
         'query_params': params.urlencode(), 
+        'por_cursor': por_cursor,
+        'cursor_siguiente': cursor_siguiente,
     }
     
-    return render(request, template_name='screens/blogs.html', context=context)
\ No newline at end of file
+    return render(request, template_name='screens/blogs.html', context=context)
+
+
+# --- Feeds y sitemaps (ver sindicacion.py) ---
+
+@presupuesto_consultas(3)
+@en_replica
+@condicional(validar_feed)
+@cache_pagina()
+def feed(request, formato: str, categoria: str | None = None, tag: str | None = None) -> HttpResponse:
+    if formato not in sindicacion.FORMATOS_FEED:
+        raise Http404("Formato de feed desconocido")
+
+    noticias = Noticia.objects.publicadas()
+    if categoria:
+        encontrada = next((c for c in tablas_globales.categorias() if c.slug.lower() == categoria.lower()), None)
+        if encontrada is None:
+            raise Http404("Categoría inexistente")
+        noticias = noticias.filter(categoria=encontrada)
+        titulo = f"{sindicacion.TITULO_SITIO}: {encontrada.nombre}"
+        enlace = f"{reverse('noticias')}?category={encontrada.slug}"
+        depende_de(request, f'categoria:{categoria.lower()}')
+    elif tag:
+        encontrado = get_object_or_404(Tag, slug__iexact=tag)
+        noticias = noticias.filter(tags=encontrado)
+        titulo = f"{sindicacion.TITULO_SITIO}: {encontrado.nombre}"
+        enlace = f"{reverse('noticias')}?tag={encontrado.slug}"
+        depende_de(request, 'listado')
+    else:
+        titulo = sindicacion.TITULO_SITIO
+        enlace = reverse('index')
+        depende_de(request, 'listado')
+
+    return sindicacion.responder_feed(request, formato, titulo, enlace, f"Últimas noticias de {titulo}",
+                                      sindicacion.noticias_feed(noticias))
+
+
+@presupuesto_consultas(1)
+@en_replica
+@condicional(validar_mapa)
+@cache_pagina()
+def mapa_indice(request) -> HttpResponse:
+    depende_de(request, 'listado')
+    return sindicacion.responder_indice(request)
+
+
+@presupuesto_consultas(1)
+@en_replica
+@condicional(validar_mapa)
+@cache_pagina()
+def mapa_secciones(request) -> HttpResponse:
+    depende_de(request, 'listado')
+    return sindicacion.responder_secciones(request)
+
+
+# Tramos de hasta 50.000 URLs en streaming: no pasan por la caché de
+# páginas, pero se revalidan sin consultas (304)
+@presupuesto_consultas(1)
+@en_replica
+@condicional(validar_mapa)
+def mapa_noticias(request, numero: int) -> HttpResponse:
+    noticias = sindicacion.tramo(numero)
+    if not noticias.exists():
+        raise Http404("Tramo de sitemap vacío")
+    return sindicacion.responder_tramo(request, noticias)
+
+
+def metricas(request) -> HttpResponse:
+    # 404 y no 403: no anunciamos que el endpoint existe
+    if not metricas_rendimiento.autorizado(request):
+        raise Http404
+    return HttpResponse(metricas_rendimiento.texto_prometheus(),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
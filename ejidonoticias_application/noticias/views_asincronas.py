@@ -0,0 +1,94 @@
+"""
+Versiones asíncronas de la portada y de la página de noticia, para ASGI
+(ver ``asgi.py`` y ``ejidonoticias_application/urls_asgi.py``).
+
+Devuelven el mismo HTML que las de views.py, pero lanzan a la vez las
+consultas que no dependen unas de otras (ver asincrono.py). Para que la de
+la noticia no tenga que esperar al artículo:
+
+- las relacionadas (ver relacionadas.py) se buscan por el slug;
+- "lo más visto" pide una de más y se quita la propia noticia en Python.
+
+La visita se cuenta en segundo plano, sin retrasar la respuesta.
+"""
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, render
+
+from . import relacionadas, tablas_globales
+from .asincrono import en_hilo, en_paralelo, en_segundo_plano
+from .cache_paginas import cache_pagina, depende_de
+from .condicional import condicional, validar_blog, validar_index
+from .contador_vistas import registrar_vista, vistas_pendientes
+from .models import Noticia
+from .presupuesto_consultas import presupuesto_consultas
+from .replicas import en_replica
+from .tendencias import populares
+
+
+@presupuesto_consultas(4)
+@en_replica
+@condicional(validar_index)
+@cache_pagina()
+async def index(request) -> HttpResponse:
+    noticias, mas_vistos, categorias = await en_paralelo(
+        lambda: list(Noticia.objects.publicadas().tarjetas().order_by('-id')[:15]),
+        lambda: populares(5),
+        lambda: tablas_globales.categorias(7),
+    )
+
+    context = {
+        'noticias': noticias,
+        'noticia_mas_vista': mas_vistos[0],
+        "noticias_populares": mas_vistos[1:5],
+        'categorias': categorias,
+    }
+
+    depende_de(request, 'inicio')
+
+    return await en_hilo(render, request, template_name='index.html', context=context)
+
+
+def _relacionadas(slug: str) -> list:
+    return list(relacionadas.de_noticia(Noticia.objects.publicadas().tarjetas(), slug=slug))
+
+
+def _contar_vista(request, datos) -> None:
+    # Las páginas servidas desde caché también cuentan como vista
+    registrar_vista(datos['noticia_id'])
+
+
+@presupuesto_consultas(6)
+@en_replica
+@condicional(validar_blog, al_no_modificada=_contar_vista)
+@cache_pagina(al_servir=_contar_vista)
+async def blog(request, slug: str) -> HttpResponse:
+    blog, mas_vistos, noticias_relacionadas, categorias = await en_paralelo(
+        lambda: get_object_or_404(Noticia.objects.detalle(), slug=slug, publicado=True),
+        lambda: populares(6),
+        lambda: _relacionadas(slug),
+        lambda: tablas_globales.categorias(4),
+    )
+    noticias_populares = [noticia for noticia in mas_vistos if noticia.pk != blog.pk][:5]
+
+    # La vista se acumula en el buffer y se escribe en lote (ver contador_vistas)
+    blog.vistas += vistas_pendientes(blog.pk)
+    # Al exportar la página no hay visita: la cuenta el beacon de la copia estática
+    exportada = getattr(request, 'exportacion', False)
+    if not exportada:
+        en_segundo_plano(registrar_vista, blog.pk)
+
+    depende_de(request,
+               f'noticia:{blog.pk}',
+               f'categoria:{blog.categoria.slug.lower()}',
+               noticia_id=blog.pk)
+
+    context = {
+        'blog': blog,
+        "noticia_mas_popular": noticias_populares[0] if noticias_populares else None,
+        'noticias_populares': noticias_populares[1:],
+        'noticias_relacionadas': noticias_relacionadas,
+        'categorias': categorias,
+        'exportada': exportada,
+    }
+
+    return await en_hilo(render, request, template_name='screens/blog.html', context=context)